@@ -32,6 +32,49 @@ class Settings:
     PG_CONNECT_TIMEOUT: int = int(os.getenv("PG_CONNECT_TIMEOUT", "10"))  # 10 secondi
     PG_STATEMENT_TIMEOUT: int = int(os.getenv("PG_STATEMENT_TIMEOUT", "6000"))  # 6000ms = 6 secondi
 
+    # Connection pool (v11.7: una connessione per richiesta/job)
+    PG_POOL_MIN: int = int(os.getenv("PG_POOL_MIN", "2"))
+    PG_POOL_MAX: int = int(os.getenv("PG_POOL_MAX", "20"))
+    PG_POOL_ACQUIRE_TIMEOUT: float = float(os.getenv("PG_POOL_ACQUIRE_TIMEOUT", "30"))  # secondi
+
+    # Cache traduzione SQL e prepared statements (v11.7)
+    PG_SQL_CACHE_SIZE: int = int(os.getenv("PG_SQL_CACHE_SIZE", "2048"))
+    PG_PREPARED_STATEMENTS: bool = os.getenv("PG_PREPARED_STATEMENTS", "false").lower() == "true"
+    PG_PREPARED_THRESHOLD: int = int(os.getenv("PG_PREPARED_THRESHOLD", "5"))  # esecuzioni prima del PREPARE
+    PG_PREPARED_MAX_PER_CONN: int = int(os.getenv("PG_PREPARED_MAX_PER_CONN", "200"))
+
+    # Metriche query e slow query log (v11.7)
+    PG_QUERY_STATS: bool = os.getenv("PG_QUERY_STATS", "true").lower() == "true"
+    PG_SLOW_QUERY_MS: float = float(os.getenv("PG_SLOW_QUERY_MS", "500"))
+
+    # Coda ingestion PDF (v11.7)
+    INGESTION_WORKERS: int = int(os.getenv("INGESTION_WORKERS", "2"))  # 0 = nessun worker nel backend
+    INGESTION_POLL_SECONDS: float = float(os.getenv("INGESTION_POLL_SECONDS", "2"))
+    INGESTION_MAX_ATTEMPTS: int = int(os.getenv("INGESTION_MAX_ATTEMPTS", "3"))
+    INGESTION_RETRY_BACKOFF: int = int(os.getenv("INGESTION_RETRY_BACKOFF", "30"))  # secondi, raddoppia ad ogni tentativo
+    INGESTION_JOB_LEASE: int = int(os.getenv("INGESTION_JOB_LEASE", "120"))  # secondi, rinnovato dal worker ogni terzo di lease
+    INGESTION_JOB_TIMEOUT: int = int(os.getenv("INGESTION_JOB_TIMEOUT", "900"))  # job RUNNING senza lease oltre questa soglia = worker perso
+    INGESTION_SPOOL_DIR: str = os.getenv("INGESTION_SPOOL_DIR", "spool")
+
+    # Upload multipli: estrazione in processi paralleli, inserimento DB limitato (v11.7)
+    PDF_EXTRACT_PROCESSES: int = int(os.getenv("PDF_EXTRACT_PROCESSES", "0"))  # 0 = numero core
+    PDF_DB_CONCURRENCY: int = int(os.getenv("PDF_DB_CONCURRENCY", "4"))  # connessioni pool usate in parallelo
+    PDF_STAGE_TIMINGS: bool = os.getenv("PDF_STAGE_TIMINGS", "true").lower() == "true"  # tempi per fase in acquisizioni_tempi
+    PDF_ARTEFACTS: bool = os.getenv("PDF_ARTEFACTS", "true").lower() == "true"  # testo/parole/tabelle salvati per la ri-estrazione
+    ARTEFACT_DIR: str = os.getenv("ARTEFACT_DIR", "artefacts")
+    PDF_FAST_TEXT_VENDORS: str = os.getenv("PDF_FAST_TEXT_VENDORS", "")  # vendor letti con pdfium, es. "ANGELINI,VIATRIS"
+    PDF_DETECT_BACKEND: str = os.getenv("PDF_DETECT_BACKEND", "pdfplumber")  # prime pagine per il detect vendor (pdfplumber, pdfium)
+    DETECTION_RULES_CHECK_SECONDS: float = float(os.getenv("DETECTION_RULES_CHECK_SECONDS", "30"))  # controllo versione regole detection
+
+    # Indice anagrafica farmacie/parafarmacie in memoria per il lookup (v11.7)
+    ANAGRAFICA_INDEX: bool = os.getenv("ANAGRAFICA_INDEX", "true").lower() == "true"  # false = lookup con query SQL
+    ANAGRAFICA_INDEX_CHECK_SECONDS: float = float(os.getenv("ANAGRAFICA_INDEX_CHECK_SECONDS", "30"))  # controllo versione anagrafica
+
+    # Cache risultati lookup_farmacia_extended per dati estratti (v11.7)
+    LOOKUP_CACHE: bool = os.getenv("LOOKUP_CACHE", "true").lower() == "true"  # false = lookup sempre ricalcolato
+    LOOKUP_CACHE_SIZE: int = int(os.getenv("LOOKUP_CACHE_SIZE", "20000"))  # voci LRU per processo
+    LOOKUP_CACHE_PERSIST: bool = os.getenv("LOOKUP_CACHE_PERSIST", "false").lower() == "true"  # salva in lookup_cache
+
     # SQLite (mantenuto per compatibilita/migrazione)
     DB_PATH: str = os.getenv("DB_PATH", "extractor_to.db")
 
@@ -8,15 +8,33 @@
 import os
 import re
 import json
-from typing import Optional, Dict, Any, List
+import asyncio
+import sys
+import time
+import bisect
+import hashlib
+import logging
+import threading
+import functools
+import itertools
+import weakref
+from contextvars import ContextVar
+from datetime import datetime, date, time as dt_time
+from decimal import Decimal
+from typing import Optional, Dict, Any, List, Iterator, Iterable, NamedTuple, Set, Sequence, Tuple
 from contextlib import contextmanager
 
+import anyio
 import psycopg2
 from psycopg2 import pool
-from psycopg2.extras import RealDictCursor, RealDictRow
+from psycopg2.extras import RealDictCursor, RealDictRow, NamedTupleCursor, execute_values
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
 
 from .config import config
 
+logger = logging.getLogger('database_pg')
+
 
 # =============================================================================
 # CONNECTION POOL
@@ -24,10 +42,16 @@ from .config import config
 
 _pool: Optional[pool.ThreadedConnectionPool] = None
 
+# v11.7: Semaforo sugli slot del pool per le connessioni scoped.
+# ThreadedConnectionPool.getconn() solleva PoolError quando il pool e' esaurito:
+# il semaforo fa invece attendere il chiamante fino a PG_POOL_ACQUIRE_TIMEOUT.
+# Uno slot resta riservato alla connessione legacy condivisa (_connection).
+_pool_slots: Optional[threading.BoundedSemaphore] = None
+
 
 def init_pool():
     """Inizializza il connection pool PostgreSQL."""
-    global _pool
+    global _pool, _pool_slots
     if _pool is not None:
         return
 
@@ -35,8 +59,8 @@ def init_pool():
     # - connect_timeout: timeout connessione (secondi)
     # - options: statement_timeout per query (millisecondi)
     _pool = pool.ThreadedConnectionPool(
-        minconn=2,
-        maxconn=20,
+        minconn=config.PG_POOL_MIN,
+        maxconn=config.PG_POOL_MAX,
         host=config.PG_HOST,
         port=config.PG_PORT,
         database=config.PG_DATABASE,
@@ -45,30 +69,485 @@ def init_pool():
         connect_timeout=config.PG_CONNECT_TIMEOUT,
         options=f"-c statement_timeout={config.PG_STATEMENT_TIMEOUT}"
     )
-    print(f"   PostgreSQL pool: {config.PG_HOST}:{config.PG_PORT}/{config.PG_DATABASE} (timeout: {config.PG_STATEMENT_TIMEOUT}ms)")
+    _pool_slots = threading.BoundedSemaphore(max(1, config.PG_POOL_MAX - 1))
+    print(f"   PostgreSQL pool: {config.PG_HOST}:{config.PG_PORT}/{config.PG_DATABASE} "
+          f"(pool: {config.PG_POOL_MIN}-{config.PG_POOL_MAX}, timeout: {config.PG_STATEMENT_TIMEOUT}ms)")
+
+    # v11.7: Registry chiavi primarie per RETURNING mirato sulle INSERT
+    raw_conn = _pool.getconn()
+    try:
+        n_tables = load_pk_registry(raw_conn)
+        print(f"   PK registry: {n_tables} tabelle")
+    except Exception as e:
+        print(f"   ⚠️ PK registry non disponibile (fallback RETURNING *): {e}")
+        try:
+            raw_conn.rollback()
+        except Exception:
+            pass
+    finally:
+        _pool.putconn(raw_conn)
 
 
 def close_pool():
     """Chiude il connection pool."""
-    global _pool
+    global _pool, _pool_slots
     if _pool is not None:
         _pool.closeall()
         _pool = None
+        _pool_slots = None
+
+
+# =============================================================================
+# REGISTRY CHIAVI PRIMARIE (v11.7)
+# =============================================================================
+# Le INSERT senza RETURNING ricevono RETURNING <pk> invece di RETURNING *:
+# su tabelle larghe (ordini_dettaglio, anomalie, log_operazioni...) evita di
+# rimandare al client l'intera riga solo per leggere lastrowid.
+# =============================================================================
+
+# tabella (lowercase) -> colonna PK, solo per PK a colonna singola
+_pk_registry: Dict[str, str] = {}
+
+_INSERT_TABLE_RE = re.compile(r'^\s*INSERT\s+INTO\s+(?:"?public"?\.)?"?(\w+)"?', re.IGNORECASE)
+
+
+def load_pk_registry(raw_conn) -> int:
+    """
+    Carica il registry delle PK da information_schema.
+
+    Invalida la cache di translate_sql (le INSERT vanno ritradotte).
+    Ritorna il numero di tabelle con PK a colonna singola.
+    """
+    global _pk_registry
+    cur = raw_conn.cursor()
+    try:
+        cur.execute("""
+            SELECT tc.table_name, MIN(kcu.column_name), COUNT(*)
+            FROM information_schema.table_constraints tc
+            JOIN information_schema.key_column_usage kcu
+              ON kcu.constraint_name = tc.constraint_name
+             AND kcu.table_schema = tc.table_schema
+             AND kcu.table_name = tc.table_name
+            WHERE tc.constraint_type = 'PRIMARY KEY'
+              AND tc.table_schema = 'public'
+            GROUP BY tc.table_name
+        """)
+        rows = cur.fetchall()
+    finally:
+        cur.close()
+    raw_conn.commit()
+
+    _pk_registry = {
+        table.lower(): column
+        for table, column, n_columns in rows
+        if n_columns == 1
+    }
+    translate_sql.cache_clear()
+    _insert_batch_sql.cache_clear()
+    return len(_pk_registry)
+
+
+def get_primary_key(table: str) -> Optional[str]:
+    """Ritorna la colonna PK della tabella (None se assente o composta)."""
+    return _pk_registry.get(table.lower())
+
+
+def _returning_clause(pg_sql: str) -> str:
+    """RETURNING per una INSERT: PK della tabella se nota, altrimenti tutte le colonne."""
+    match = _INSERT_TABLE_RE.match(pg_sql)
+    pk = get_primary_key(match.group(1)) if match else None
+    return f' RETURNING {pk}' if pk else ' RETURNING *'
+
+
+# =============================================================================
+# TRADUZIONE SQL (v11.7)
+# =============================================================================
+# I testi SQL del codice sono quasi tutti letterali statici: la conversione
+# SQLite -> PostgreSQL e la classificazione dello statement vengono calcolate
+# una sola volta per testo e memorizzate in una cache LRU.
+# =============================================================================
+
+class SqlPlan(NamedTuple):
+    """Risultato (cacheato) della traduzione di uno statement."""
+    sql: str                    # SQL PostgreSQL da eseguire
+    is_insert: bool
+    auto_returning: bool        # RETURNING aggiunto per ricavare lastrowid
+    prepare_sql: Optional[str]  # SQL con placeholder $n per PREPARE (None = non preparabile)
+    param_count: int            # Numero di placeholder posizionali %s
+
+
+# Stringhe tra apici (da saltare) oppure placeholder posizionale
+_PLACEHOLDER_RE = re.compile(r"('(?:[^']|'')*')|(%s)")
+_PREPARABLE_PREFIXES = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'VALUES')
+
+
+def _convert_sql_dialect(sql: str) -> str:
+    """
+    Converte SQL da sintassi SQLite a PostgreSQL.
+    - ? -> %s (placeholder)
+    - datetime('now') -> CURRENT_TIMESTAMP
+    - date('now') -> CURRENT_DATE
+    - date('now', '-N days') -> CURRENT_DATE - INTERVAL 'N days'
+    - date(column) -> column::date
+    """
+    # Placeholder ? -> %s
+    result = sql.replace('?', '%s')
+
+    # datetime('now') -> CURRENT_TIMESTAMP
+    result = re.sub(r"datetime\s*\(\s*'now'\s*\)", 'CURRENT_TIMESTAMP', result, flags=re.IGNORECASE)
+
+    # date('now', '-N days') -> CURRENT_DATE - INTERVAL 'N days'
+    def convert_date_offset(match):
+        offset = match.group(1)  # es: "-7 days"
+        # Rimuovi il segno meno e converti
+        if offset.startswith('-'):
+            return f"CURRENT_DATE - INTERVAL '{offset[1:]}'"
+        else:
+            return f"CURRENT_DATE + INTERVAL '{offset}'"
+    result = re.sub(r"date\s*\(\s*'now'\s*,\s*'([^']+)'\s*\)", convert_date_offset, result, flags=re.IGNORECASE)
+
+    # date('now') -> CURRENT_DATE (senza offset)
+    result = re.sub(r"date\s*\(\s*'now'\s*\)", 'CURRENT_DATE', result, flags=re.IGNORECASE)
+
+    # date(column_name) -> column_name::date (solo per colonne, non per stringhe)
+    # Attenzione: questo pattern è rischioso, lo applichiamo solo per colonne comuni
+    result = re.sub(r"date\s*\(\s*(data_\w+|timestamp|created_at|updated_at|received_date)\s*\)",
+                   r'\1::date', result, flags=re.IGNORECASE)
+
+    # datetime(column_name) -> column_name (PostgreSQL timestamps sono già comparabili)
+    result = re.sub(r"datetime\s*\(\s*(\w+)\s*\)", r'\1', result, flags=re.IGNORECASE)
+
+    return result
+
+
+def _to_prepare_sql(pg_sql: str):
+    """
+    Converte i placeholder %s in $1..$n per PREPARE.
+
+    Ritorna (sql, n_param) oppure (None, n_param) se lo statement non e'
+    preparabile: placeholder con nome, %% letterali, tipo non supportato.
+    """
+    if '%(' in pg_sql or '%%' in pg_sql:
+        return None, 0
+    if not pg_sql.lstrip().upper().startswith(_PREPARABLE_PREFIXES):
+        return None, pg_sql.count('%s')
+
+    counter = 0
+
+    def number(match):
+        nonlocal counter
+        if match.group(1) is not None:
+            return match.group(1)
+        counter += 1
+        return f'${counter}'
+
+    converted = _PLACEHOLDER_RE.sub(number, pg_sql)
+    # '%' residui fuori dai placeholder: lasciamo decidere a psycopg2
+    if counter == 0 or '%' in _PLACEHOLDER_RE.sub('', pg_sql):
+        return None, counter
+    return converted, counter
+
+
+@functools.lru_cache(maxsize=config.PG_SQL_CACHE_SIZE)
+def translate_sql(sql: str) -> SqlPlan:
+    """Traduce e classifica uno statement. Risultato memoizzato (LRU)."""
+    pg_sql = _convert_sql_dialect(sql)
+
+    # Per INSERT, aggiungi RETURNING per ottenere lastrowid
+    # Ma NON per INSERT ... ON CONFLICT (upsert)
+    upper = pg_sql.upper()
+    is_insert = upper.lstrip().startswith('INSERT')
+    auto_returning = is_insert and 'RETURNING' not in upper and 'ON CONFLICT' not in upper
+    if auto_returning:
+        pg_sql = pg_sql.rstrip().rstrip(';').rstrip() + _returning_clause(pg_sql)
+
+    prepare_sql, param_count = _to_prepare_sql(pg_sql)
+    return SqlPlan(pg_sql, is_insert, auto_returning, prepare_sql, param_count)
+
+
+def get_sql_cache_info() -> Dict[str, Any]:
+    """Statistiche cache traduzione SQL (hit/miss/dimensione)."""
+    info = translate_sql.cache_info()
+    return {
+        'hits': info.hits,
+        'misses': info.misses,
+        'size': info.currsize,
+        'max_size': info.maxsize,
+    }
+
+
+_VALUES_RE = re.compile(r"('(?:[^']|'')*')|\bVALUES\s*\(", re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=256)
+def _insert_batch_sql(sql: str):
+    """
+    Riscrive una INSERT a riga singola (VALUES (?, ?, ...)) nella forma
+    multi-riga di execute_values: ritorna (sql con 'VALUES %s', template).
+    """
+    pg_sql = _convert_sql_dialect(sql).rstrip().rstrip(';').rstrip()
+    if not _INSERT_TABLE_RE.match(pg_sql):
+        raise ValueError("execute_insert richiede una INSERT INTO ... VALUES (...)")
+
+    # Posizione di VALUES ( fuori dalle stringhe
+    start = None
+    for match in _VALUES_RE.finditer(pg_sql):
+        if match.group(1) is None:
+            start = match.end() - 1
+            break
+    if start is None:
+        raise ValueError("execute_insert richiede una clausola VALUES (...)")
+
+    # Parentesi di chiusura corrispondente (saltando le stringhe)
+    depth, i, in_string = 0, start, False
+    while i < len(pg_sql):
+        ch = pg_sql[i]
+        if ch == "'":
+            in_string = not in_string
+        elif not in_string:
+            if ch == '(':
+                depth += 1
+            elif ch == ')':
+                depth -= 1
+                if depth == 0:
+                    break
+        i += 1
+    if depth != 0:
+        raise ValueError("execute_insert: parentesi VALUES non bilanciate")
+
+    template = pg_sql[start:i + 1]
+    head = pg_sql[:start]
+    tail = pg_sql[i + 1:]
+    if '%s' in head or '%s' in tail:
+        raise ValueError("execute_insert: parametri ammessi solo nella clausola VALUES")
+
+    batch_sql = f"{head}%s{tail}"
+    if 'RETURNING' not in tail.upper():
+        batch_sql += _returning_clause(pg_sql)
+    return batch_sql, template
+
+
+# =============================================================================
+# PREPARED STATEMENTS (v11.7, opt-in con PG_PREPARED_STATEMENTS)
+# =============================================================================
+# Uno statement eseguito almeno PG_PREPARED_THRESHOLD volte sulla stessa
+# connessione viene preparato lato server (PREPARE) e poi eseguito con EXECUTE,
+# risparmiando parsing e planning. Lo stato e' per connessione fisica
+# (le prepared statement vivono nella sessione PostgreSQL).
+# =============================================================================
+
+class _PreparedState:
+    """Statement preparati e contatori di esecuzione di una connessione."""
+
+    __slots__ = ('counts', 'names', 'failed')
+
+    def __init__(self):
+        self.counts: Dict[str, int] = {}
+        self.names: Dict[str, str] = {}
+        self.failed: Set[str] = set()
+
+
+_prepared_states: 'weakref.WeakKeyDictionary' = weakref.WeakKeyDictionary()
+
+
+def _prepared_state(raw_conn) -> _PreparedState:
+    state = _prepared_states.get(raw_conn)
+    if state is None:
+        state = _PreparedState()
+        _prepared_states[raw_conn] = state
+    return state
+
+
+# =============================================================================
+# METRICHE QUERY (v11.7)
+# =============================================================================
+# Registry in-process dei tempi di esecuzione per fingerprint di statement:
+# numero chiamate, istogramma latenze (p50/p95/p99), righe, modulo chiamante.
+# Gli statement oltre PG_SLOW_QUERY_MS vengono loggati con la "forma" dei
+# parametri (tipi e lunghezze, mai i valori). Esposto da /admin/db/query-stats.
+# =============================================================================
+
+# Limiti superiori dei bucket in ms: scala geometrica 0.05ms -> ~4 min
+_LATENCY_BUCKETS_MS = [0.05 * 1.25 ** i for i in range(70)]
+
+_FINGERPRINT_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_FINGERPRINT_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_FINGERPRINT_SPACE_RE = re.compile(r"\s+")
+_FINGERPRINT_IN_LIST_RE = re.compile(r"\(\s*(?:(?:\?|%s)\s*,\s*)+(?:\?|%s)\s*\)")
+
+
+@functools.lru_cache(maxsize=config.PG_SQL_CACHE_SIZE)
+def sql_fingerprint(sql: str) -> str:
+    """
+    Normalizza uno statement per aggregare le metriche: letterali e numeri
+    diventano ?, liste IN (?, ?, ...) diventano (...), spazi compattati.
+    """
+    result = _FINGERPRINT_STRING_RE.sub('?', sql)
+    result = _FINGERPRINT_NUMBER_RE.sub('?', result)
+    result = _FINGERPRINT_IN_LIST_RE.sub('(...)', result)
+    return _FINGERPRINT_SPACE_RE.sub(' ', result).strip()
+
+
+def _params_shape(params) -> str:
+    """Descrive tipi/lunghezze dei parametri senza esporne i valori."""
+    if params is None:
+        return '()'
+    if isinstance(params, dict):
+        return '{' + ', '.join(f"{k}: {_value_shape(v)}" for k, v in params.items()) + '}'
+    if isinstance(params, (list, tuple)):
+        return '(' + ', '.join(_value_shape(v) for v in params) + ')'
+    return _value_shape(params)
+
+
+def _value_shape(value) -> str:
+    if value is None:
+        return 'None'
+    if isinstance(value, (str, bytes, list, tuple)):
+        return f"{type(value).__name__}[{len(value)}]"
+    return type(value).__name__
+
+
+def _caller_module() -> str:
+    """Primo modulo fuori da database_pg nello stack."""
+    frame = sys._getframe(2)
+    while frame is not None and frame.f_globals.get('__name__') == __name__:
+        frame = frame.f_back
+    return frame.f_globals.get('__name__', '?') if frame is not None else '?'
+
+
+class _StatementStats:
+    """Metriche aggregate di un fingerprint."""
+
+    __slots__ = ('calls', 'errors', 'total_ms', 'max_ms', 'rows', 'buckets', 'callers')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.buckets = [0] * (len(_LATENCY_BUCKETS_MS) + 1)
+        self.callers: Dict[str, int] = {}
+
+    def percentile(self, pct: float) -> float:
+        """Percentile stimato dall'istogramma (limite superiore del bucket)."""
+        target = self.calls * pct / 100.0
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= target:
+                upper = _LATENCY_BUCKETS_MS[i] if i < len(_LATENCY_BUCKETS_MS) else self.max_ms
+                return min(upper, self.max_ms)
+        return self.max_ms
+
+
+_query_stats: Dict[str, _StatementStats] = {}
+_query_stats_lock = threading.Lock()
+_query_stats_since = time.time()
+
+
+def _record_query(sql: str, elapsed_ms: float, rows: int, params, failed: bool = False,
+                  batch: int = 1) -> None:
+    """Registra un'esecuzione nel registry metriche e logga le query lente."""
+    fingerprint = sql_fingerprint(sql)
+    caller = _caller_module()
+
+    with _query_stats_lock:
+        stats = _query_stats.get(fingerprint)
+        if stats is None:
+            stats = _StatementStats()
+            _query_stats[fingerprint] = stats
+        stats.calls += 1
+        stats.total_ms += elapsed_ms
+        if elapsed_ms > stats.max_ms:
+            stats.max_ms = elapsed_ms
+        if rows and rows > 0:
+            stats.rows += rows
+        if failed:
+            stats.errors += 1
+        stats.buckets[bisect.bisect_left(_LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+        stats.callers[caller] = stats.callers.get(caller, 0) + 1
+
+    if elapsed_ms >= config.PG_SLOW_QUERY_MS:
+        shape = _params_shape(params)
+        if batch > 1:
+            shape = f"{batch} x {shape}"
+        logger.warning(
+            "Slow query %.1fms (%s) rows=%s params=%s: %s",
+            elapsed_ms, caller, rows, shape, fingerprint[:500]
+        )
+
+
+# Metriche numeriche ammesse come ordinamento di get_query_stats
+QUERY_STATS_ORDER_BY = ('total_ms', 'calls', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms', 'rows', 'errors')
+
+
+def get_query_stats(limit: int = 50, order_by: str = 'total_ms') -> Dict[str, Any]:
+    """
+    Ritorna le metriche per statement ordinate per order_by (una di
+    QUERY_STATS_ORDER_BY; altri valori ordinano per total_ms).
+    """
+    if order_by not in QUERY_STATS_ORDER_BY:
+        order_by = 'total_ms'
+
+    with _query_stats_lock:
+        snapshot = []
+        for fingerprint, stats in _query_stats.items():
+            top_callers = sorted(stats.callers.items(), key=lambda kv: kv[1], reverse=True)[:5]
+            snapshot.append({
+                'fingerprint': fingerprint,
+                'calls': stats.calls,
+                'errors': stats.errors,
+                'rows': stats.rows,
+                'total_ms': round(stats.total_ms, 2),
+                'mean_ms': round(stats.total_ms / stats.calls, 3) if stats.calls else 0,
+                'p50_ms': round(stats.percentile(50), 3),
+                'p95_ms': round(stats.percentile(95), 3),
+                'p99_ms': round(stats.percentile(99), 3),
+                'max_ms': round(stats.max_ms, 3),
+                'callers': dict(top_callers),
+            })
+
+    snapshot.sort(key=lambda item: item[order_by], reverse=True)
+
+    return {
+        'since': datetime.fromtimestamp(_query_stats_since).isoformat(),
+        'statements': len(snapshot),
+        'total_calls': sum(item['calls'] for item in snapshot),
+        'slow_threshold_ms': config.PG_SLOW_QUERY_MS,
+        'sql_cache': get_sql_cache_info(),
+        'items': snapshot[:limit],
+    }
+
+
+def reset_query_stats() -> None:
+    """Azzera il registry metriche."""
+    global _query_stats_since
+    with _query_stats_lock:
+        _query_stats.clear()
+        _query_stats_since = time.time()
 
 
 # =============================================================================
 # WRAPPER COMPATIBILITA SQLITE
 # =============================================================================
 
+# Nomi univoci per i cursor server-side di iter_rows()
+_iter_cursor_ids = itertools.count(1)
+
+
 class PostgreSQLConnection:
     """
     Wrapper che simula l'interfaccia sqlite3.Connection per PostgreSQL.
     Permette di usare lo stesso codice scritto per SQLite.
     """
 
-    def __init__(self, conn):
+    def __init__(self, conn, scoped: bool = False):
         self._conn = conn
         self._cursor = None
+        # v11.7: True se la connessione appartiene a un db_scope() (il rilascio
+        # al pool e' gestito dallo scope, non da close())
+        self._scoped = scoped
 
     def _reconnect(self):
         """Riconnette al database sostituendo la connessione morta."""
@@ -100,8 +579,9 @@ class PostgreSQLConnection:
             except:
                 pass
 
-        # Converti placeholder da ? a %s
-        pg_sql = self._convert_sql(sql)
+        # Converti placeholder da ? a %s e classifica lo statement (cacheato)
+        plan = translate_sql(sql)
+        pg_sql = plan.sql
 
         # Crea cursor con risultati come dizionari
         try:
@@ -111,36 +591,38 @@ class PostgreSQLConnection:
             self._reconnect()
             cursor = self._conn.cursor(cursor_factory=RealDictCursor)
 
-        # Per INSERT, aggiungi RETURNING per ottenere lastrowid
-        # Ma NON per INSERT ... ON CONFLICT (upsert)
-        is_insert = pg_sql.strip().upper().startswith('INSERT')
-        has_on_conflict = 'ON CONFLICT' in pg_sql.upper()
-        has_returning = 'RETURNING' in pg_sql.upper()
-        auto_returning = False
-
-        if is_insert and not has_returning and not has_on_conflict:
-            # Trova la tabella per determinare la colonna ID
-            pg_sql = pg_sql.rstrip(';').rstrip() + ' RETURNING *'
-            auto_returning = True
+        prepared_name = None
+        if params and config.PG_PREPARED_STATEMENTS:
+            prepared_name = self._get_prepared(plan, params)
+            if prepared_name:
+                pg_sql = f"EXECUTE {prepared_name} ({', '.join(['%s'] * plan.param_count)})"
 
+        started = time.perf_counter()
         try:
             if params:
                 cursor.execute(pg_sql, params)
             else:
                 cursor.execute(pg_sql)
         except Exception as e:
+            if config.PG_QUERY_STATS:
+                _record_query(sql, (time.perf_counter() - started) * 1000, 0, params, failed=True)
             cursor.close()
             # Rollback per evitare "transaction aborted" sui prossimi comandi
             try:
                 self._conn.rollback()
             except:
                 pass
+            if prepared_name:
+                self._forget_prepared(plan, prepared_name)
             raise e
 
+        if config.PG_QUERY_STATS:
+            _record_query(sql, (time.perf_counter() - started) * 1000, cursor.rowcount, params)
+
         # Per INSERT con RETURNING auto-aggiunto, recupera lastrowid e consuma il risultato
         # Se RETURNING era già presente nella query originale, NON consumare il risultato
         wrapped = PostgreSQLCursor(cursor)
-        if is_insert and auto_returning:
+        if plan.auto_returning:
             try:
                 row = cursor.fetchone()
                 if row:
@@ -154,12 +636,17 @@ class PostgreSQLConnection:
 
     def executemany(self, sql: str, params_list: list):
         """Esegue la stessa query con parametri multipli."""
-        pg_sql = self._convert_sql(sql)
+        pg_sql = _convert_sql_dialect(sql)
         cursor = self._conn.cursor(cursor_factory=RealDictCursor)
 
+        started = time.perf_counter()
         try:
             cursor.executemany(pg_sql, params_list)
         except Exception as e:
+            if config.PG_QUERY_STATS:
+                _record_query(sql, (time.perf_counter() - started) * 1000, 0,
+                              params_list[0] if params_list else None,
+                              failed=True, batch=len(params_list))
             cursor.close()
             try:
                 self._conn.rollback()
@@ -167,8 +654,109 @@ class PostgreSQLConnection:
                 pass
             raise e
 
+        if config.PG_QUERY_STATS:
+            _record_query(sql, (time.perf_counter() - started) * 1000, cursor.rowcount,
+                          params_list[0] if params_list else None, batch=len(params_list))
         return PostgreSQLCursor(cursor)
 
+    def execute_insert(self, sql: str, params_list: list, page_size: int = 500) -> List[Any]:
+        """
+        INSERT batch con id di ritorno (v11.7).
+
+        Accetta la stessa INSERT a riga singola usata con execute()/executemany()
+        e la esegue come INSERT multi-riga (una per pagina di page_size righe).
+        Ritorna il primo campo del RETURNING (la PK se la tabella e' nel
+        registry) nell'ordine delle righe. Con ON CONFLICT DO NOTHING le righe
+        scartate non compaiono nel risultato.
+
+        Uso:
+            ids = db.execute_insert(
+                "INSERT INTO anomalie (id_testata, tipo_anomalia) VALUES (?, ?)",
+                [(1, 'PREZZO'), (1, 'AIC')]
+            )
+        """
+        if not params_list:
+            return []
+
+        batch_sql, template = _insert_batch_sql(sql)
+        cursor = self._conn.cursor()
+        started = time.perf_counter()
+        try:
+            rows = execute_values(cursor, batch_sql, params_list,
+                                  template=template, page_size=page_size, fetch=True)
+        except Exception as e:
+            if config.PG_QUERY_STATS:
+                _record_query(sql, (time.perf_counter() - started) * 1000, 0, params_list[0],
+                              failed=True, batch=len(params_list))
+            try:
+                self._conn.rollback()
+            except:
+                pass
+            raise e
+        finally:
+            cursor.close()
+
+        if config.PG_QUERY_STATS:
+            _record_query(sql, (time.perf_counter() - started) * 1000, len(rows), params_list[0],
+                          batch=len(params_list))
+
+        return [row[0] for row in rows]
+
+    def iter_rows(self, sql: str, params: tuple = None, batch_size: int = 2000,
+                  named: bool = True) -> Iterator[tuple]:
+        """
+        SELECT in streaming con cursor server-side (v11.7).
+
+        Il risultato resta sul server e arriva a blocchi di batch_size righe:
+        la memoria usata e' limitata al blocco corrente, anche per letture da
+        centinaia di migliaia di righe. Le righe sono namedtuple (row.vendor,
+        row[0]) o tuple semplici con named=False, non HybridRow.
+
+        Il cursor vive nella transazione corrente: consumare (o chiudere) il
+        generatore prima di commit/rollback sulla stessa connessione.
+
+        Uso:
+            for row in db.iter_rows("SELECT vendor, codice_aic FROM ...", params):
+                ws.append([row.vendor, row.codice_aic])
+        """
+        if self._conn.closed:
+            self._reconnect()
+        elif self._conn.status == psycopg2.extensions.TRANSACTION_STATUS_INERROR:
+            self._conn.rollback()
+
+        pg_sql = translate_sql(sql).sql
+        cursor = self._conn.cursor(
+            name=f"servo_iter_{next(_iter_cursor_ids)}",
+            cursor_factory=NamedTupleCursor if named else None,
+        )
+        cursor.itersize = batch_size
+        count = 0
+        failed = False
+        started = time.perf_counter()
+        try:
+            cursor.execute(pg_sql, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                count += len(rows)
+                yield from rows
+        except Exception:
+            failed = True
+            try:
+                self._conn.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+            if config.PG_QUERY_STATS:
+                _record_query(sql, (time.perf_counter() - started) * 1000, count, params,
+                              failed=failed)
+
     def executescript(self, script: str):
         """Esegue uno script SQL (multiple statements)."""
         cursor = self._conn.cursor()
@@ -190,47 +778,87 @@ class PostgreSQLConnection:
         return self._conn.cursor(cursor_factory=RealDictCursor)
 
     def close(self):
-        """Rilascia la connessione al pool."""
+        """
+        Rilascia la connessione al pool.
+
+        Per le connessioni scoped e' un no-op: il rilascio avviene all'uscita
+        dal db_scope() che le ha aperte.
+        """
+        if self._scoped:
+            return
         if _pool is not None:
             _pool.putconn(self._conn)
 
     def _convert_sql(self, sql: str) -> str:
+        """Converte SQL da sintassi SQLite a PostgreSQL (vedi translate_sql)."""
+        return translate_sql(sql).sql
+
+    def _get_prepared(self, plan: SqlPlan, params) -> Optional[str]:
         """
-        Converte SQL da sintassi SQLite a PostgreSQL.
-        - ? -> %s (placeholder)
-        - datetime('now') -> CURRENT_TIMESTAMP
-        - date('now') -> CURRENT_DATE
-        - date('now', '-N days') -> CURRENT_DATE - INTERVAL 'N days'
-        - date(column) -> column::date
+        Ritorna il nome della prepared statement per lo statement, preparandola
+        quando supera PG_PREPARED_THRESHOLD esecuzioni. None = esecuzione normale.
         """
-        # Placeholder ? -> %s
-        result = sql.replace('?', '%s')
-
-        # datetime('now') -> CURRENT_TIMESTAMP
-        result = re.sub(r"datetime\s*\(\s*'now'\s*\)", 'CURRENT_TIMESTAMP', result, flags=re.IGNORECASE)
-
-        # date('now', '-N days') -> CURRENT_DATE - INTERVAL 'N days'
-        def convert_date_offset(match):
-            offset = match.group(1)  # es: "-7 days"
-            # Rimuovi il segno meno e converti
-            if offset.startswith('-'):
-                return f"CURRENT_DATE - INTERVAL '{offset[1:]}'"
-            else:
-                return f"CURRENT_DATE + INTERVAL '{offset}'"
-        result = re.sub(r"date\s*\(\s*'now'\s*,\s*'([^']+)'\s*\)", convert_date_offset, result, flags=re.IGNORECASE)
+        if plan.prepare_sql is None or not isinstance(params, (tuple, list)):
+            return None
+        if len(params) != plan.param_count:
+            return None
 
-        # date('now') -> CURRENT_DATE (senza offset)
-        result = re.sub(r"date\s*\(\s*'now'\s*\)", 'CURRENT_DATE', result, flags=re.IGNORECASE)
+        state = _prepared_state(self._conn)
+        key = plan.prepare_sql
+        name = state.names.get(key)
+        if name is not None:
+            return name
+        if key in state.failed or len(state.names) >= config.PG_PREPARED_MAX_PER_CONN:
+            return None
 
-        # date(column_name) -> column_name::date (solo per colonne, non per stringhe)
-        # Attenzione: questo pattern è rischioso, lo applichiamo solo per colonne comuni
-        result = re.sub(r"date\s*\(\s*(data_\w+|timestamp|created_at|updated_at|received_date)\s*\)",
-                       r'\1::date', result, flags=re.IGNORECASE)
+        count = state.counts.get(key, 0) + 1
+        state.counts[key] = count
+        if count < config.PG_PREPARED_THRESHOLD:
+            return None
+
+        name = 'servo_' + hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+        # SAVEPOINT: se il PREPARE fallisce (es. tipo parametro non deducibile)
+        # la transazione del chiamante non deve essere annullata
+        use_savepoint = not self._conn.autocommit
+        cur = self._conn.cursor()
+        try:
+            if use_savepoint:
+                cur.execute("SAVEPOINT servo_prepare")
+            cur.execute(f"PREPARE {name} AS {key}")
+            if use_savepoint:
+                cur.execute("RELEASE SAVEPOINT servo_prepare")
+        except Exception:
+            state.failed.add(key)
+            try:
+                if use_savepoint:
+                    cur.execute("ROLLBACK TO SAVEPOINT servo_prepare")
+                else:
+                    self._conn.rollback()
+            except Exception:
+                pass
+            return None
+        finally:
+            cur.close()
 
-        # datetime(column_name) -> column_name (PostgreSQL timestamps sono già comparabili)
-        result = re.sub(r"datetime\s*\(\s*(\w+)\s*\)", r'\1', result, flags=re.IGNORECASE)
+        state.counts.pop(key, None)
+        state.names[key] = name
+        return name
 
-        return result
+    def _forget_prepared(self, plan: SqlPlan, name: str) -> None:
+        """Dopo un errore su EXECUTE: dealloca e non preparare piu' lo statement."""
+        state = _prepared_state(self._conn)
+        state.names.pop(plan.prepare_sql, None)
+        state.failed.add(plan.prepare_sql)
+        try:
+            cur = self._conn.cursor()
+            cur.execute(f"DEALLOCATE {name}")
+            cur.close()
+            self._conn.commit()
+        except Exception:
+            try:
+                self._conn.rollback()
+            except Exception:
+                pass
 
 
 class HybridRow(dict):
@@ -286,6 +914,232 @@ class PostgreSQLCursor:
         return iter(self._cursor)
 
 
+# =============================================================================
+# CONNESSIONI SCOPED (v11.7)
+# =============================================================================
+# Ogni richiesta HTTP / job schedulato lavora su una propria connessione presa
+# dal pool, invece di condividere l'unica connessione globale. get_db() resta
+# l'entry point per tutto il codice esistente: dentro uno scope ritorna la
+# connessione dello scope, fuori ricade sulla connessione legacy condivisa.
+# =============================================================================
+
+class PoolTimeoutError(RuntimeError):
+    """Nessuna connessione libera nel pool entro PG_POOL_ACQUIRE_TIMEOUT."""
+    pass
+
+
+class _DbScope:
+    """Stato di uno scope: la connessione viene presa dal pool solo al primo uso."""
+
+    __slots__ = ('connection',)
+
+    def __init__(self):
+        self.connection: Optional[PostgreSQLConnection] = None
+
+
+_current_scope: ContextVar[Optional[_DbScope]] = ContextVar('servo_db_scope', default=None)
+
+
+def _checkout() -> PostgreSQLConnection:
+    """Prende una connessione dal pool, attendendo se tutti gli slot sono occupati."""
+    if _pool is None:
+        init_pool()
+
+    if not _pool_slots.acquire(timeout=config.PG_POOL_ACQUIRE_TIMEOUT):
+        raise PoolTimeoutError(
+            f"Pool PostgreSQL esaurito: nessuna connessione libera entro "
+            f"{config.PG_POOL_ACQUIRE_TIMEOUT}s"
+        )
+    try:
+        raw_conn = _pool.getconn()
+        if raw_conn.closed:
+            _pool.putconn(raw_conn, close=True)
+            raw_conn = _pool.getconn()
+        raw_conn.autocommit = False
+    except Exception:
+        _pool_slots.release()
+        raise
+    return PostgreSQLConnection(raw_conn, scoped=True)
+
+
+def _release(db: PostgreSQLConnection, commit: bool) -> None:
+    """
+    Chiude la transazione aperta e restituisce la connessione al pool.
+
+    commit=True conserva la semantica della connessione condivisa, dove il
+    lavoro non committato finiva comunque nel commit successivo.
+    """
+    raw_conn = db._conn
+    broken = bool(raw_conn.closed)
+    try:
+        if not broken:
+            status = raw_conn.get_transaction_status()
+            if status == psycopg2.extensions.TRANSACTION_STATUS_INTRANS and commit:
+                raw_conn.commit()
+            elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                raw_conn.rollback()
+    except Exception:
+        broken = True
+        try:
+            raw_conn.rollback()
+        except Exception:
+            pass
+    finally:
+        try:
+            if _pool is not None:
+                _pool.putconn(raw_conn, close=broken)
+        finally:
+            if _pool_slots is not None:
+                _pool_slots.release()
+
+
+@contextmanager
+def db_scope() -> Iterator['_DbScope']:
+    """
+    Context manager che associa una connessione del pool al contesto corrente.
+
+    La connessione viene presa al primo get_db() dentro lo scope e rilasciata
+    all'uscita: commit se lo scope termina normalmente, rollback su eccezione.
+    Gli scope annidati riusano quello piu' esterno.
+
+    Uso:
+        with db_scope():
+            process_pdf(...)      # tutte le get_db() usano la stessa connessione
+    """
+    existing = _current_scope.get()
+    if existing is not None:
+        yield existing
+        return
+
+    scope = _DbScope()
+    token = _current_scope.set(scope)
+    failed = False
+    try:
+        yield scope
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        _current_scope.reset(token)
+        if scope.connection is not None:
+            _release(scope.connection, commit=not failed)
+            scope.connection = None
+
+
+def with_db_scope(func):
+    """
+    Decorator che esegue la funzione dentro un db_scope().
+    Pensato per i job APScheduler, che girano nei thread dello scheduler.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with db_scope():
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def db_session() -> Iterator[PostgreSQLConnection]:
+    """
+    Dependency FastAPI che fornisce la connessione della richiesta.
+
+    Uso:
+        @router.get("/...")
+        def endpoint(db: PostgreSQLConnection = Depends(db_session)):
+            db.execute(...)
+    """
+    if _current_scope.get() is not None:
+        # Richiesta gia' coperta da DbScopeMiddleware: stessa connessione
+        yield get_db()
+        return
+
+    db = _checkout()
+    failed = False
+    try:
+        yield db
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        _release(db, commit=not failed)
+
+
+async def _release_async(db_state: _DbScope, commit: bool) -> None:
+    """Rilascia la connessione dello scope in un thread (commit/rollback sono I/O)."""
+    db = db_state.connection
+    if db is None:
+        return
+    db_state.connection = None
+    # Schermato: il rilascio deve completare anche se la richiesta e' cancellata
+    with anyio.CancelScope(shield=True):
+        await run_in_threadpool(_release, db, commit)
+
+
+async def prefetch_db_connection(request: Request) -> None:
+    """
+    Dependency globale: per gli endpoint async def prende la connessione della
+    richiesta dal pool in un thread, prima dell'handler.
+
+    Gli handler async chiamano get_db() direttamente sull'event loop: un
+    checkout lazy li' attenderebbe il semaforo del pool (fino a
+    PG_POOL_ACQUIRE_TIMEOUT) bloccando tutte le richieste del processo.
+    Gli endpoint sync girano nel threadpool e restano con il checkout lazy.
+
+    Un errore di connessione (database irraggiungibile, fallisce subito) non
+    viene sollevato qui: lo ripete il get_db() dell'handler, che lo gestisce
+    come prima. PoolTimeoutError invece si propaga: riprovare sul loop
+    significherebbe un'altra attesa bloccante.
+    """
+    db_state = _current_scope.get()
+    if db_state is None or db_state.connection is not None:
+        return
+    endpoint = request.scope.get('endpoint')
+    if endpoint is None or not asyncio.iscoroutinefunction(endpoint):
+        return
+    try:
+        db_state.connection = await run_in_threadpool(_checkout)
+    except psycopg2.Error as e:
+        logger.warning(f"Checkout anticipato non riuscito: {e}")
+
+
+class DbScopeMiddleware:
+    """
+    Middleware ASGI che apre uno scope database per ogni richiesta HTTP.
+
+    La connessione e' rilasciata (commit) appena l'handler ritorna, cioe'
+    all'invio di http.response.start, e non a fine streaming del body; un
+    get_db() successivo (body di StreamingResponse, background task) prende
+    una nuova connessione, rilasciata a fine richiesta. Checkout e rilascio
+    non avvengono mai sull'event loop. Le richieste che non toccano il
+    database non prendono connessioni dal pool.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or _current_scope.get() is not None:
+            await self.app(scope, receive, send)
+            return
+
+        db_state = _DbScope()
+        token = _current_scope.set(db_state)
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                await _release_async(db_state, commit=True)
+            await send(message)
+
+        failed = False
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            _current_scope.reset(token)
+            await _release_async(db_state, commit=not failed)
+
+
 # =============================================================================
 # CONNESSIONE DATABASE (Compatibile con SQLite interface)
 # =============================================================================
@@ -298,11 +1152,21 @@ def get_db() -> PostgreSQLConnection:
     Ritorna connessione al database (compatibile con sqlite3.Connection).
     Usa un wrapper che simula l'interfaccia SQLite.
 
+    v11.7: Dentro un db_scope() (richieste HTTP, job scheduler) ritorna la
+    connessione dedicata dello scope; fuori (script, CLI) la connessione
+    legacy condivisa.
+
     IMPORTANTE: Fa rollback automatico di transazioni pendenti per evitare
     che connessioni "idle in transaction" blocchino le risorse.
     """
     global _connection
 
+    scope = _current_scope.get()
+    if scope is not None:
+        if scope.connection is None:
+            scope.connection = _checkout()
+        return scope.connection
+
     if _pool is None:
         init_pool()
 
@@ -361,6 +1225,243 @@ def close_db():
         _connection = None
 
 
+# =============================================================================
+# SCRITTURE MASSIVE: COPY / UPSERT / UPDATE (v11.7)
+# =============================================================================
+# Percorso unico per caricare decine di migliaia di righe (sync anagrafiche,
+# import listini/clienti): le righe vengono codificate nel formato testo di
+# COPY e trasmesse in streaming con COPY FROM STDIN, senza un round-trip
+# per riga. bulk_upsert/bulk_update passano da una tabella TEMP di staging.
+# Come execute(), non fanno commit: la transazione resta al chiamante.
+# =============================================================================
+
+_IDENTIFIER_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def _check_identifiers(*names: str) -> None:
+    """Tabelle/colonne finiscono nel testo SQL: ammessi solo identificatori semplici."""
+    for name in names:
+        if not isinstance(name, str) or not _IDENTIFIER_RE.match(name):
+            raise ValueError(f"Identificatore SQL non valido: {name!r}")
+
+
+_COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def encode_copy_value(value: Any) -> str:
+    """Codifica un valore Python nel formato testo di COPY (NULL = \\N)."""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (int, float, Decimal)):
+        return str(value)
+    if isinstance(value, (datetime, date, dt_time)):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False).translate(_COPY_ESCAPES)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return '\\\\x' + bytes(value).hex()
+    return str(value).translate(_COPY_ESCAPES)
+
+
+class _CopyStream:
+    """File-like in sola lettura che codifica le righe su richiesta di copy_expert."""
+
+    def __init__(self, rows: Iterable[Sequence[Any]], n_columns: int):
+        self._rows = iter(rows)
+        self._n_columns = n_columns
+        self._buffer = ''
+        self.count = 0
+
+    def read(self, size: int = 8192) -> str:
+        chunks = [self._buffer]
+        length = len(self._buffer)
+        while length < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            if len(row) != self._n_columns:
+                raise ValueError(
+                    f"Riga {self.count + 1}: {len(row)} valori, attese {self._n_columns} colonne"
+                )
+            line = '\t'.join(encode_copy_value(v) for v in row) + '\n'
+            chunks.append(line)
+            length += len(line)
+            self.count += 1
+        data = ''.join(chunks)
+        self._buffer = data[size:]
+        return data[:size]
+
+    readline = read
+
+
+def bulk_copy(table: str, columns: Sequence[str], rows: Iterable[Sequence[Any]],
+              db: PostgreSQLConnection = None) -> int:
+    """
+    Carica righe con COPY FROM STDIN in streaming.
+
+    Args:
+        table: Tabella destinazione
+        columns: Colonne, nell'ordine dei valori di ogni riga
+        rows: Iterabile di tuple/liste (anche un generatore)
+        db: Connessione (default get_db())
+
+    Returns:
+        Numero di righe caricate
+    """
+    _check_identifiers(table, *columns)
+    db = db or get_db()
+    sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN"
+    stream = _CopyStream(rows, len(columns))
+
+    cursor = db._conn.cursor()
+    started = time.perf_counter()
+    try:
+        cursor.copy_expert(sql, stream, size=65536)
+    except Exception as e:
+        try:
+            db._conn.rollback()
+        except Exception:
+            pass
+        raise e
+    finally:
+        cursor.close()
+
+    if config.PG_QUERY_STATS:
+        _record_query(sql, (time.perf_counter() - started) * 1000, stream.count, None)
+    return stream.count
+
+
+def _create_staging(db: PostgreSQLConnection, table: str, columns: Sequence[str]) -> str:
+    """Tabella TEMP con le sole colonne indicate (tipi della tabella reale) + ordinale."""
+    staging = f"_stg_{table}"[:63]
+    cursor = db._conn.cursor()
+    try:
+        cursor.execute(f"DROP TABLE IF EXISTS {staging}")
+        cursor.execute(
+            f"CREATE TEMP TABLE {staging} ON COMMIT DROP AS "
+            f"SELECT {', '.join(columns)} FROM {table} WITH NO DATA"
+        )
+        cursor.execute(f"ALTER TABLE {staging} ADD COLUMN _stg_ord BIGSERIAL")
+    finally:
+        cursor.close()
+    return staging
+
+
+def _bulk_upsert_sql(table: str, columns: Sequence[str], staging: str,
+                     conflict_columns: Sequence[str], update_columns: Sequence[str],
+                     extra_values: Dict[str, str], update_extra: Dict[str, str]) -> str:
+    """SQL dell'upsert da staging. Ritorna (inserite, aggiornate)."""
+    insert_cols = list(columns) + list(extra_values)
+    select_exprs = list(columns) + list(extra_values.values())
+    conflict = ', '.join(conflict_columns)
+
+    if update_columns or update_extra:
+        assignments = [f"{c} = EXCLUDED.{c}" for c in update_columns]
+        assignments += [f"{c} = EXCLUDED.{c}" for c in extra_values if c not in update_extra]
+        assignments += [f"{c} = {expr}" for c, expr in update_extra.items()]
+        on_conflict = f"ON CONFLICT ({conflict}) DO UPDATE SET {', '.join(assignments)}"
+    else:
+        on_conflict = f"ON CONFLICT ({conflict}) DO NOTHING"
+
+    # DISTINCT ON: con chiavi duplicate nel batch vince l'ultima riga
+    # (DO UPDATE non puo' toccare la stessa riga due volte)
+    return (
+        f"WITH upserted AS ("
+        f"INSERT INTO {table} ({', '.join(insert_cols)}) "
+        f"SELECT {', '.join(select_exprs)} FROM ("
+        f"SELECT DISTINCT ON ({conflict}) * FROM {staging} ORDER BY {conflict}, _stg_ord DESC"
+        f") s "
+        f"{on_conflict} "
+        f"RETURNING (xmax = 0) AS inserted) "
+        f"SELECT COUNT(*) FILTER (WHERE inserted), COUNT(*) FILTER (WHERE NOT inserted) FROM upserted"
+    )
+
+
+def bulk_upsert(table: str, columns: Sequence[str], rows: Iterable[Sequence[Any]],
+                conflict_columns: Sequence[str],
+                update_columns: Optional[Sequence[str]] = None,
+                extra_values: Optional[Dict[str, str]] = None,
+                update_extra: Optional[Dict[str, str]] = None,
+                db: PostgreSQLConnection = None) -> Tuple[int, int]:
+    """
+    INSERT ... ON CONFLICT massivo: COPY in una tabella di staging, poi un
+    solo INSERT ... SELECT verso la tabella reale.
+
+    Args:
+        table: Tabella destinazione
+        columns: Colonne valorizzate dalle righe
+        rows: Iterabile di tuple/liste
+        conflict_columns: Colonne del vincolo UNIQUE/PK per ON CONFLICT
+        update_columns: Colonne aggiornate in caso di conflitto
+            (None = tutte tranne conflict_columns, [] = DO NOTHING)
+        extra_values: Colonne con espressione SQL fissa, su insert e update
+            (es. {'attivo': 'TRUE', 'data_import': 'NOW()'})
+        update_extra: Espressioni SQL applicate solo in update
+            (es. {'data_aggiornamento': 'CURRENT_TIMESTAMP'})
+        db: Connessione (default get_db())
+
+    Returns:
+        (righe inserite, righe aggiornate)
+    """
+    extra_values = extra_values or {}
+    update_extra = update_extra or {}
+    if update_columns is None:
+        update_columns = [c for c in columns if c not in conflict_columns]
+    _check_identifiers(table, *columns, *conflict_columns, *update_columns,
+                       *extra_values, *update_extra)
+    db = db or get_db()
+
+    staging = _create_staging(db, table, columns)
+    bulk_copy(staging, columns, rows, db=db)
+
+    sql = _bulk_upsert_sql(table, columns, staging, conflict_columns,
+                           update_columns, extra_values, update_extra)
+    row = db.execute(sql).fetchone()
+    db.execute(f"DROP TABLE IF EXISTS {staging}")
+    return row[0], row[1]
+
+
+def bulk_update(table: str, columns: Sequence[str], rows: Iterable[Sequence[Any]],
+                key_columns: Sequence[str],
+                extra_values: Optional[Dict[str, str]] = None,
+                db: PostgreSQLConnection = None) -> int:
+    """
+    UPDATE massivo: COPY in staging, poi UPDATE ... FROM staging sulle chiavi.
+
+    Args:
+        table: Tabella destinazione
+        columns: Colonne delle righe (devono includere key_columns)
+        rows: Iterabile di tuple/liste
+        key_columns: Colonne per il join riga staging -> riga reale
+        extra_values: Espressioni SQL fisse (es. {'data_import': 'CURRENT_TIMESTAMP'})
+        db: Connessione (default get_db())
+
+    Returns:
+        Numero di righe aggiornate
+    """
+    extra_values = extra_values or {}
+    missing = [k for k in key_columns if k not in columns]
+    if missing:
+        raise ValueError(f"key_columns non presenti in columns: {missing}")
+    _check_identifiers(table, *columns, *extra_values)
+    db = db or get_db()
+
+    staging = _create_staging(db, table, columns)
+    bulk_copy(staging, columns, rows, db=db)
+
+    assignments = [f"{c} = s.{c}" for c in columns if c not in key_columns]
+    assignments += [f"{c} = {expr}" for c, expr in extra_values.items()]
+    join = ' AND '.join(f"t.{k} = s.{k}" for k in key_columns)
+    cursor = db.execute(
+        f"UPDATE {table} t SET {', '.join(assignments)} FROM {staging} s WHERE {join}"
+    )
+    updated = cursor.rowcount
+    db.execute(f"DROP TABLE IF EXISTS {staging}")
+    return updated
+
+
 # =============================================================================
 # INIZIALIZZAZIONE DATABASE
 # =============================================================================
@@ -589,6 +1690,37 @@ def log_operation(tipo: str, entita: str = None, id_entita: int = None,
     db.commit()
 
 
+def log_operations(tipo: str, entita: str, voci: Sequence[Tuple[int, str]]):
+    """
+    Registra nel log piu' operazioni dello stesso tipo con una sola INSERT
+    multi-riga (v11.7), es. le supervisioni create per le righe di un ordine.
+
+    Args:
+        tipo: Tipo operazione
+        entita: Tabella/entità coinvolta
+        voci: Lista di (id_entita, descrizione)
+    """
+    if not voci:
+        return
+    db = get_db()
+    db.execute_insert('''
+        INSERT INTO log_operazioni (tipo_operazione, entita, id_entita, descrizione)
+        VALUES (%s, %s, %s, %s)
+    ''', [(tipo, entita, id_entita, descrizione) for id_entita, descrizione in voci])
+    db.commit()
+
+
+_AUDIT_INSERT_SQL = """
+    INSERT INTO audit_modifiche (
+        entita, id_entita, id_testata, campo_modificato,
+        valore_precedente, valore_nuovo, fonte_modifica,
+        id_operatore, username_operatore, motivazione,
+        id_sessione, ip_address
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    RETURNING id_audit
+"""
+
+
 def log_modifica(
     entita: str,
     id_entita: int,
@@ -611,15 +1743,7 @@ def log_modifica(
     val_prec = str(valore_precedente) if valore_precedente is not None else None
     val_nuovo = str(valore_nuovo) if valore_nuovo is not None else None
 
-    cursor = db.execute("""
-        INSERT INTO audit_modifiche (
-            entita, id_entita, id_testata, campo_modificato,
-            valore_precedente, valore_nuovo, fonte_modifica,
-            id_operatore, username_operatore, motivazione,
-            id_sessione, ip_address
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        RETURNING id_audit
-    """, (
+    cursor = db.execute(_AUDIT_INSERT_SQL, (
         entita, id_entita, id_testata, campo_modificato,
         val_prec, val_nuovo, fonte_modifica,
         id_operatore, username_operatore, motivazione,
@@ -649,29 +1773,25 @@ def log_modifiche_batch(
     if not id_sessione:
         id_sessione = str(uuid.uuid4())[:8]
 
-    audit_ids = []
-    for campo, (val_prec, val_nuovo) in modifiche.items():
-        if val_prec == val_nuovo:
-            continue
-
-        audit_id = log_modifica(
-            entita=entita,
-            id_entita=id_entita,
-            campo_modificato=campo,
-            valore_precedente=val_prec,
-            valore_nuovo=val_nuovo,
-            fonte_modifica=fonte_modifica,
-            id_testata=id_testata,
-            id_operatore=id_operatore,
-            username_operatore=username_operatore,
-            motivazione=motivazione,
-            id_sessione=id_sessione,
-            ip_address=ip_address
+    # v11.7: un solo INSERT multi-riga e un solo commit per tutto il batch
+    rows = [
+        (
+            entita, id_entita, id_testata, campo,
+            str(val_prec) if val_prec is not None else None,
+            str(val_nuovo) if val_nuovo is not None else None,
+            fonte_modifica, id_operatore, username_operatore, motivazione,
+            id_sessione, ip_address
         )
-        if audit_id:
-            audit_ids.append(audit_id)
+        for campo, (val_prec, val_nuovo) in modifiche.items()
+        if val_prec != val_nuovo
+    ]
+    if not rows:
+        return []
 
-    return audit_ids
+    db = get_db()
+    audit_ids = db.execute_insert(_AUDIT_INSERT_SQL, rows)
+    db.commit()
+    return [audit_id for audit_id in audit_ids if audit_id]
 
 
 def get_supervisione_pending() -> List[Dict[str, Any]]:
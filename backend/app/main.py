@@ -24,19 +24,27 @@ from .routers import (
 )
 import os
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import JSONResponse
 
 from .config import config
-from .database_pg import init_database, get_stats
+from .database_pg import init_database, get_stats, DbScopeMiddleware, prefetch_db_connection
 from .services.scheduler import (
     init_mail_scheduler,
     init_anagrafica_scheduler,
     init_ftp_scheduler,
     shutdown_all_schedulers
 )
+from .services.ingestion import (
+    start_ingestion_workers,
+    stop_ingestion_workers,
+    shutdown_extraction_pool,
+    ensure_timings_table,
+)
+from .services.extraction import ensure_detection_rules_table, refresh_detection_rules
+from .services.lookup import get_anagrafica_index
 
 # Import router autenticazione (NUOVO v6.2)
 from .auth import auth_router
@@ -71,9 +79,26 @@ async def lifespan(app: FastAPI):
     init_anagrafica_scheduler()  # v11.2: Sync anagrafica Lun-Ven 06:30
     init_ftp_scheduler()  # v11.5: Export FTP ogni 10 minuti
 
+    # v11.7: Tempi per fase pipeline PDF
+    ensure_timings_table()
+
+    # v11.7: Regole detection vendor dal database
+    ensure_detection_rules_table()
+    refresh_detection_rules()
+
+    # v11.7: Indice in memoria per il lookup farmacie, poi cache lookup salvata
+    #        (LOOKUP_CACHE_PERSIST): costruiti in background, lookup su database
+    #        finche' l'indice non e' pronto
+    get_anagrafica_index()
+
+    # v11.7: Worker coda ingestion PDF
+    start_ingestion_workers()
+
     yield
 
     # Shutdown
+    stop_ingestion_workers()
+    shutdown_extraction_pool()
     shutdown_all_schedulers()
     print("👋 SERV.O - Arresto...")
 
@@ -89,6 +114,8 @@ app = FastAPI(
     lifespan=lifespan,
     docs_url="/docs",
     redoc_url="/redoc",
+    # v11.7: Endpoint async def: connessione presa dal pool fuori dall'event loop
+    dependencies=[Depends(prefetch_db_connection)],
 )
 
 
@@ -121,6 +148,10 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
+# v11.7: Una connessione del pool per ogni richiesta (checkout al primo get_db,
+# rilascio appena l'handler ritorna)
+app.add_middleware(DbScopeMiddleware)
+
 
 # =============================================================================
 # STATIC FILES
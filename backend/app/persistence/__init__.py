@@ -15,6 +15,9 @@ from ..database_pg import (
     init_pool,
     close_pool,
     get_db,
+    db_scope,
+    db_session,
+    with_db_scope,
     get_vendor_id,
     get_stats,
     log_operation,
@@ -25,6 +28,9 @@ __all__ = [
     'init_pool',
     'close_pool',
     'get_db',
+    'db_scope',
+    'db_session',
+    'with_db_scope',
     'get_vendor_id',
     'get_stats',
     'log_operation',
@@ -9,6 +9,9 @@ import shutil
 import os
 from datetime import datetime, date
 
+from ..auth.dependencies import require_admin
+from ..auth.models import UtenteResponse
+
 router = APIRouter(prefix="/admin", tags=["Admin"])
 
 # Path del database
@@ -608,3 +611,74 @@ async def run_anagrafica_sync_now(background_tasks: BackgroundTasks) -> Dict[str
         }
     except Exception as e:
         raise HTTPException(500, f"Errore avvio sync: {str(e)}")
+
+
+# =============================================================================
+# METRICHE DATABASE (v11.7)
+# =============================================================================
+
+@router.get("/db/query-stats")
+async def get_db_query_stats(
+    limit: int = Query(50, ge=1, le=1000, description="Numero massimo di statement"),
+    order_by: str = Query("total_ms", description="total_ms, calls, mean_ms, p50_ms, p95_ms, p99_ms, max_ms, rows, errors"),
+    current_user: UtenteResponse = Depends(require_admin)
+) -> Dict[str, Any]:
+    """
+    Metriche per statement SQL raccolte dal processo corrente.
+
+    Per ogni fingerprint (SQL normalizzato): chiamate, errori, righe,
+    latenza totale/media/p50/p95/p99/max e moduli chiamanti.
+    Serve a individuare le query da indicizzare (ordini, anomalie, viste
+    supervisione). Le metriche sono per-processo e si azzerano al riavvio.
+    """
+    from ..database_pg import get_query_stats, QUERY_STATS_ORDER_BY
+    if order_by not in QUERY_STATS_ORDER_BY:
+        raise HTTPException(
+            status_code=400,
+            detail=f"order_by non valido: usare {', '.join(QUERY_STATS_ORDER_BY)}"
+        )
+    return {"success": True, "data": get_query_stats(limit=limit, order_by=order_by)}
+
+
+@router.post("/db/query-stats/reset")
+async def reset_db_query_stats(
+    current_user: UtenteResponse = Depends(require_admin)
+) -> Dict[str, Any]:
+    """Azzera le metriche per statement SQL."""
+    from ..database_pg import reset_query_stats
+    reset_query_stats()
+    return {"success": True, "message": "Metriche query azzerate"}
+
+
+# =============================================================================
+# RI-ESTRAZIONE ORDINI DA ARTEFATTI (v11.7)
+# =============================================================================
+
+@router.post("/reextract")
+async def start_reextract_endpoint(
+    vendor: Optional[str] = Query(None, description="Solo acquisizioni di questo vendor"),
+    limit: Optional[int] = Query(None, ge=1, description="Numero massimo di acquisizioni"),
+    since_id: int = Query(0, ge=0, description="Solo id_acquisizione maggiori"),
+    current_user: UtenteResponse = Depends(require_admin)
+) -> Dict[str, Any]:
+    """
+    Riesegue gli estrattori sulle acquisizioni gia' elaborate e confronta il
+    risultato con gli ordini salvati, senza modificarli.
+
+    Usa gli artefatti di estrazione (testo, parole, tabelle) salvati da
+    process_pdf: niente parsing dei PDF. Gira in background; il risultato
+    si legge con GET /admin/reextract/status.
+    """
+    from ..services.ingestion import start_reextract
+    if not start_reextract(vendor=vendor, limit=limit, since_id=since_id):
+        raise HTTPException(409, "Ri-estrazione gia' in corso")
+    return {"success": True, "message": "Ri-estrazione avviata in background"}
+
+
+@router.get("/reextract/status")
+async def get_reextract_status_endpoint(
+    current_user: UtenteResponse = Depends(require_admin)
+) -> Dict[str, Any]:
+    """Stato della ri-estrazione e ultimo risultato (contatori e differenze)."""
+    from ..services.ingestion import get_reextract_status
+    return {"success": True, "data": get_reextract_status()}
@@ -16,6 +16,8 @@ from ..services.lookup import (
     search_farmacie,
     search_parafarmacie,
     get_alternative_lookup_by_piva,
+    get_lookup_cache_stats,
+    get_anagrafica_index_stats,
 )
 
 
@@ -373,3 +375,19 @@ async def lookup_statistics() -> Dict[str, Any]:
             "total": total
         }
     }
+
+
+@router.get("/cache")
+async def lookup_cache_statistics() -> Dict[str, Any]:
+    """
+    Contatori cache risultati lookup (v11.7): hit/miss, voci, invalidazioni.
+
+    Valori del processo backend; i worker ingestion separati hanno la propria cache.
+    """
+    return {
+        "success": True,
+        "data": {
+            **get_lookup_cache_stats(),
+            "indice_anagrafica": get_anagrafica_index_stats(),
+        }
+    }
@@ -21,6 +21,9 @@ router = APIRouter(
     responses={401: {"description": "Non autenticato"}}
 )
 
+# Righe massime per pagina di /export/data (anteprima; export completo via /export/excel)
+MAX_PREVIEW_ROWS = 1000
+
 
 # =============================================================================
 # ENDPOINT DATI REPORT
@@ -38,7 +41,8 @@ async def get_report_data(
     stati: Optional[str] = Query(None, description="Stati ordine separati da virgola"),
     clienti: Optional[str] = Query(None, description="MIN_ID clienti separati da virgola"),
     aic: Optional[str] = Query(None, description="Codici AIC separati da virgola"),
-    limit: int = Query(10, description="Limite righe visualizzazione (default 10)"),
+    limit: int = Query(10, ge=1, le=MAX_PREVIEW_ROWS, description="Limite righe visualizzazione (default 10, max 1000)"),
+    offset: int = Query(0, ge=0, description="Righe da saltare (paginazione)"),
     current_user: UtenteResponse = Depends(get_current_user)
 ):
     """
@@ -46,7 +50,8 @@ async def get_report_data(
 
     Raggruppa per Vendor + AIC (+ Cliente se filtro attivo).
     Calcola: COUNT ordini, SUM pezzi, SUM valore.
-    Default: prime 10 righe. Per export completo usare /export/excel.
+    Default: prime 10 righe, al massimo MAX_PREVIEW_ROWS per pagina (offset
+    per le successive). Per export completo usare /export/excel.
     """
     db = get_db()
 
@@ -116,7 +121,8 @@ async def get_report_data(
         conditions.append(f"""
             EXISTS (
                 SELECT 1 FROM anagrafica_clienti ac
-                WHERE (ac.partita_iva = t.partita_iva OR ac.min_id = t.min_id)
+                WHERE (ac.piva_norm = LTRIM(REPLACE(t.partita_iva, ' ', ''), '0')
+                       OR ac.min_id_norm = LTRIM(t.min_id, '0'))
                 AND ac.deposito_riferimento IN ({placeholders})
             )
         """)
@@ -198,7 +204,7 @@ async def get_report_data(
     total_count = db.execute(count_query, tuple(params)).fetchone()['total']
 
     # Query principale - usa v_ordini_completi per avere vendor e min_id
-    # Visualizzazione: FETCH FIRST N ROWS ONLY (default 10)
+    # Visualizzazione: pagina OFFSET/FETCH FIRST N ROWS ONLY (default 10)
     query = f"""
         SELECT
             {select_fields},
@@ -209,26 +215,25 @@ async def get_report_data(
         JOIN v_ordini_completi t ON d.id_testata = t.id_testata
         {where_clause}
         GROUP BY {group_by}
-        ORDER BY t.vendor, d.codice_aic
+        ORDER BY {group_by}
+        OFFSET {offset} ROWS
         FETCH FIRST {limit} ROWS ONLY
     """
 
-    rows = db.execute(query, tuple(params)).fetchall()
-
-    # Formatta risultati
+    # Formatta risultati (v11.7: pagina limitata a MAX_PREVIEW_ROWS righe)
     data = []
-    for row in rows:
+    for row in db.iter_rows(query, tuple(params)):
         item = {
-            'vendor': row['vendor'],
-            'codice_aic': row['codice_aic'],
-            'descrizione': row['descrizione'],
-            'n_ordini': row['n_ordini'],
-            'pezzi': int(row['pezzi'] or 0),
-            'valore': float(row['valore'] or 0)
+            'vendor': row.vendor,
+            'codice_aic': row.codice_aic,
+            'descrizione': row.descrizione,
+            'n_ordini': row.n_ordini,
+            'pezzi': int(row.pezzi or 0),
+            'valore': float(row.valore or 0)
         }
         if include_cliente:
-            item['min_id'] = row['min_id']
-            item['cliente'] = row['cliente']
+            item['min_id'] = row.min_id
+            item['cliente'] = row.cliente
         data.append(item)
 
     # Tracking: registra azione PREVIEW con risultati
@@ -245,6 +250,7 @@ async def get_report_data(
         'success': True,
         'include_cliente': include_cliente,
         'total_count': total_count,
+        'offset': offset,
         'count': len(data),
         'data': data
     }
@@ -338,7 +344,8 @@ async def download_excel(
         conditions.append(f"""
             EXISTS (
                 SELECT 1 FROM anagrafica_clienti ac
-                WHERE (ac.partita_iva = t.partita_iva OR ac.min_id = t.min_id)
+                WHERE (ac.piva_norm = LTRIM(REPLACE(t.partita_iva, ' ', ''), '0')
+                       OR ac.min_id_norm = LTRIM(t.min_id, '0'))
                 AND ac.deposito_riferimento IN ({placeholders})
             )
         """)
@@ -407,8 +414,6 @@ async def download_excel(
         ORDER BY t.vendor, d.codice_aic
     """
 
-    rows = db.execute(query, tuple(params)).fetchall()
-
     # Crea workbook Excel
     wb = openpyxl.Workbook()
     ws = wb.active
@@ -446,7 +451,8 @@ async def download_excel(
     filtri_applicati.append(("Tipo Prodotto", ", ".join(tipo_list) if tipo_list else "Tutti"))
     filtri_applicati.append(("Clienti", ", ".join(cliente_list) if cliente_list else "Tutti"))
     filtri_applicati.append(("AIC", ", ".join(aic_list) if aic_list else "Tutti"))
-    filtri_applicati.append(("Totale Righe", str(len(rows))))
+    # Valore scritto dopo lo streaming delle righe (conteggio non noto prima)
+    filtri_applicati.append(("Totale Righe", ""))
 
     # Scrivi filtri nel foglio
     current_row = 1
@@ -482,27 +488,28 @@ async def download_excel(
         cell.alignment = header_alignment
         cell.border = thin_border
 
-    # Dati
-    for row_idx, row in enumerate(rows, data_start_row + 1):
+    # Dati (v11.7: streaming da cursor server-side, niente lista completa in memoria)
+    n_righe = 0
+    for row_idx, row in enumerate(db.iter_rows(query, tuple(params)), data_start_row + 1):
         if include_cliente:
             values = [
-                row['vendor'],
-                row['codice_aic'],
-                row['descrizione'],
-                row['min_id'],
-                row['cliente'],
-                row['n_ordini'],
-                int(row['pezzi'] or 0),
-                float(row['valore'] or 0)
+                row.vendor,
+                row.codice_aic,
+                row.descrizione,
+                row.min_id,
+                row.cliente,
+                row.n_ordini,
+                int(row.pezzi or 0),
+                float(row.valore or 0)
             ]
         else:
             values = [
-                row['vendor'],
-                row['codice_aic'],
-                row['descrizione'],
-                row['n_ordini'],
-                int(row['pezzi'] or 0),
-                float(row['valore'] or 0)
+                row.vendor,
+                row.codice_aic,
+                row.descrizione,
+                row.n_ordini,
+                int(row.pezzi or 0),
+                float(row.valore or 0)
             ]
 
         for col, value in enumerate(values, 1):
@@ -510,6 +517,9 @@ async def download_excel(
             cell.border = thin_border
             if col == len(values):  # Colonna valore
                 cell.number_format = '#,##0.00'
+        n_righe += 1
+
+    ws.cell(row=len(filtri_applicati), column=2, value=str(n_righe))
 
     # Auto-width colonne
     for col in range(1, len(headers) + 1):
@@ -531,7 +541,7 @@ async def download_excel(
         Azione.EXPORT_EXCEL,
         request=request,
         parametri=filtri_tracking,
-        risultato={'rows_exported': len(rows), 'filename': filename}
+        risultato={'rows_exported': n_righe, 'filename': filename}
     )
 
     return StreamingResponse(
@@ -588,7 +598,8 @@ def build_cascade_conditions(data_inizio, data_fine, vendors, stati, clienti, ai
         conditions.append(f"""
             EXISTS (
                 SELECT 1 FROM anagrafica_clienti ac
-                WHERE (ac.partita_iva = t.partita_iva OR ac.min_id = t.min_id)
+                WHERE (ac.piva_norm = LTRIM(REPLACE(t.partita_iva, ' ', ''), '0')
+                       OR ac.min_id_norm = LTRIM(t.min_id, '0'))
                 AND ac.deposito_riferimento IN ({placeholders})
             )
         """)
@@ -756,7 +767,8 @@ async def get_depositi(
                   SELECT 1 FROM v_ordini_completi t
                   {"JOIN ordini_dettaglio d ON t.id_testata = d.id_testata" if aic else ""}
                   {where_clause}
-                  AND (t.partita_iva = ac.partita_iva OR t.min_id = ac.min_id)
+                  AND (ac.piva_norm = LTRIM(REPLACE(t.partita_iva, ' ', ''), '0')
+                       OR ac.min_id_norm = LTRIM(t.min_id, '0'))
               )
             ORDER BY ac.deposito_riferimento
         """
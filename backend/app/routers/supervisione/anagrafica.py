@@ -190,9 +190,9 @@ async def get_dettaglio(id_supervisione: int) -> Dict[str, Any]:
             farmacie = db.execute("""
                 SELECT id_farmacia, min_id, partita_iva, ragione_sociale, citta, provincia
                 FROM anagrafica_farmacie
-                WHERE min_id = %s OR LTRIM(min_id, '0') = LTRIM(%s, '0')
+                WHERE min_id_norm = %s
                 LIMIT 5
-            """, (min_id, min_id)).fetchall()
+            """, (min_id.lstrip('0'),)).fetchall()
             for f in farmacie:
                 if not any(s['id_farmacia'] == f['id_farmacia'] for s in suggerimenti):
                     suggerimenti.append({**dict(f), 'match_type': 'MIN_ID'})
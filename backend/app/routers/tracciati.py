@@ -301,12 +301,10 @@ async def ricerca_tracciati(
         query += " ORDER BY sort_date DESC NULLS LAST LIMIT ?"
         params.append(limit)
 
-        rows = db.execute(query, params).fetchall()
-
-        # Formatta risultati
+        # Formatta risultati (v11.7: cursor server-side, righe namedtuple)
         results = []
-        for row in rows:
-            r = dict(row)
+        for row in db.iter_rows(query, tuple(params)):
+            r = row._asdict()
             results.append({
                 "id_testata": r["id_testata"],
                 "numero_ordine": r["numero_ordine"],
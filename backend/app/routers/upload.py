@@ -5,23 +5,56 @@
 # =============================================================================
 
 import os
+import re
 from urllib.parse import quote
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form
+from pydantic import BaseModel, Field
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Query, Depends
 from fastapi.responses import JSONResponse, FileResponse
+from starlette.concurrency import run_in_threadpool
 from typing import Dict, Any, List, Optional
 
+from ..auth.dependencies import require_admin
+from ..auth.models import UtenteResponse
 from ..config import config
 from ..services.pdf_processor import (
     process_pdf,
     get_recent_uploads,
     get_upload_stats,
     get_upload_errors,
+    check_duplicate_hashes,
+)
+from ..services.extraction import (
+    detect_vendor,
+    score_vendors,
+    get_supported_vendors,
+    get_detection_rules,
+    reload_detection_rules,
+    check_detection_rules,
+)
+from ..services.ingestion import (
+    enqueue_spooled,
+    spool_stream,
+    remove_spool,
+    get_job,
+    list_jobs,
+    get_queue_stats,
+    requeue_job,
+    get_workers_status,
+    process_pdfs_parallel,
+    get_performance_stats,
+    JOB_STATES,
 )
-from ..services.extraction import detect_vendor, get_supported_vendors
 
 
 router = APIRouter(prefix="/upload")
 
+_SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+class CheckHashesRequest(BaseModel):
+    """Request verifica duplicati per hash"""
+    hashes: List[str] = Field(..., max_length=1000, description="SHA-256 hex dei PDF")
+
 
 # =============================================================================
 # UPLOAD ENDPOINTS
@@ -30,7 +63,9 @@ router = APIRouter(prefix="/upload")
 @router.post("")
 async def upload_pdf(
     file: UploadFile = File(...),
-    auto_process: bool = Form(True)
+    auto_process: bool = Form(True),
+    background: bool = Form(False),
+    fonte: str = Form('UPLOAD')
 ) -> Dict[str, Any]:
     """
     Upload singolo PDF e elaborazione.
@@ -38,6 +73,9 @@ async def upload_pdf(
     Args:
         file: File PDF da caricare
         auto_process: Se True, elabora immediatamente (default: True)
+        background: v11.7 - Se True, accoda il PDF e ritorna subito l'id job
+                    (stato consultabile su /upload/jobs/{id_job})
+        fonte: Origine del file per la coda (UPLOAD, EMAIL)
         
     Returns:
         Risultato elaborazione con statistiche
@@ -49,24 +87,31 @@ async def upload_pdf(
     if not file.filename.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Solo file PDF accettati")
     
-    # Leggi contenuto
+    # v11.7: copia a blocchi nello spool con hash incrementale (file vuoto
+    # o troppo grande -> ValueError)
     try:
-        content = await file.read()
+        spooled = await _spool_upload(file, config.MAX_FILE_SIZE)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Errore lettura file: {str(e)}")
     
-    if len(content) == 0:
-        raise HTTPException(status_code=400, detail="File vuoto")
-    
-    if len(content) > config.MAX_FILE_SIZE:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"File troppo grande (max {config.MAX_FILE_SIZE // 1024 // 1024}MB)"
-        )
-    
-    # Elabora PDF
+    # v11.7: accodamento per i worker di ingestion (il job prende il file di spool)
+    if background:
+        try:
+            job = enqueue_spooled(file.filename, spooled, fonte=fonte)
+        except Exception as e:
+            remove_spool(spooled.path)
+            raise HTTPException(status_code=500, detail=f"Errore accodamento: {str(e)}")
+        return {
+            "success": True,
+            "data": {**job, "queued": True},
+            "message": f"PDF accodato (job #{job['id_job']})"
+        }
+
+    # Elabora PDF (v11.7: in threadpool, non blocca l'event loop)
     try:
-        result = process_pdf(file.filename, content)
+        result = await run_in_threadpool(process_pdf, file.filename, spooled)
         
         return {
             "success": result['status'] == 'OK',
@@ -75,17 +120,21 @@ async def upload_pdf(
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        remove_spool(spooled.path)
 
 
 @router.post("/multiple")
 async def upload_multiple_pdfs(
-    files: List[UploadFile] = File(...)
+    files: List[UploadFile] = File(...),
+    background: bool = Form(False)
 ) -> Dict[str, Any]:
     """
     Upload multiplo di PDF.
     
     Args:
         files: Lista di file PDF
+        background: v11.7 - Se True, accoda tutti i PDF e ritorna gli id job
         
     Returns:
         Lista risultati elaborazione
@@ -93,40 +142,50 @@ async def upload_multiple_pdfs(
     if not files:
         raise HTTPException(status_code=400, detail="Nessun file caricato")
     
-    results = []
+    if background:
+        return await _enqueue_multiple(files)
+
+    results = [None] * len(files)
     totals = {'ok': 0, 'duplicati': 0, 'errori': 0, 'ordini': 0, 'righe': 0}
     
-    for file in files:
-        if not file.filename or not file.filename.lower().endswith('.pdf'):
-            results.append({
-                'filename': file.filename or 'unknown',
-                'status': 'ERRORE',
-                'error': 'Non è un file PDF'
-            })
-            totals['errori'] += 1
-            continue
-        
-        try:
-            content = await file.read()
-            result = process_pdf(file.filename, content)
-            results.append(result)
-            
-            if result['status'] == 'OK':
-                totals['ok'] += 1
-                totals['ordini'] += result['ordini']
-                totals['righe'] += result['righe']
-            elif result['status'] == 'DUPLICATO':
-                totals['duplicati'] += 1
-                totals['errori'] += 1  # Duplicati contano come errori
+    # v11.7: prima si copiano tutti i file nello spool, poi estrazione
+    # parallela su processi (che ricevono solo il percorso)
+    pending = []
+    try:
+        for i, file in enumerate(files):
+            error = None
+            if not file.filename or not file.filename.lower().endswith('.pdf'):
+                error = 'Non è un file PDF'
             else:
+                try:
+                    pending.append((i, file.filename, await _spool_upload(file)))
+                except Exception as e:
+                    error = str(e)
+            if error:
+                results[i] = {
+                    'filename': file.filename or 'unknown',
+                    'status': 'ERRORE',
+                    'error': error
+                }
                 totals['errori'] += 1
-                
-        except Exception as e:
-            results.append({
-                'filename': file.filename,
-                'status': 'ERRORE',
-                'error': str(e)
-            })
+
+        processed = await run_in_threadpool(
+            process_pdfs_parallel, [(filename, spooled) for _, filename, spooled in pending]
+        )
+    finally:
+        for _, _, spooled in pending:
+            remove_spool(spooled.path)
+    
+    for (i, _, _), result in zip(pending, processed):
+        results[i] = result
+        if result['status'] == 'OK':
+            totals['ok'] += 1
+            totals['ordini'] += result['ordini']
+            totals['righe'] += result['righe']
+        elif result['status'] == 'DUPLICATO':
+            totals['duplicati'] += 1
+            totals['errori'] += 1  # Duplicati contano come errori
+        else:
             totals['errori'] += 1
     
     return {
@@ -139,6 +198,32 @@ async def upload_multiple_pdfs(
     }
 
 
+@router.post("/check-hashes")
+async def check_hashes(request: CheckHashesRequest) -> Dict[str, Any]:
+    """
+    v11.7: Verifica in blocco quali PDF sono gia' stati acquisiti.
+
+    Usato dal mail monitor prima dell'upload: i duplicati non vengono
+    inviati ne' elaborati.
+
+    Returns:
+        duplicati: hash -> info acquisizione/ordine originale
+    """
+    hashes = [h.strip().lower() for h in request.hashes]
+    invalid = [h for h in hashes if not _SHA256_RE.match(h)]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Hash SHA-256 non valido: {invalid[0]}")
+
+    duplicati = await run_in_threadpool(check_duplicate_hashes, hashes)
+    return {
+        "success": True,
+        "data": {
+            "duplicati": duplicati,
+            "nuovi": [h for h in dict.fromkeys(hashes) if h not in duplicati],
+        }
+    }
+
+
 @router.post("/detect-vendor")
 async def detect_vendor_endpoint(
     file: UploadFile = File(...)
@@ -152,27 +237,20 @@ async def detect_vendor_endpoint(
         raise HTTPException(status_code=400, detail="Solo file PDF accettati")
     
     try:
-        content = await file.read()
+        spooled = await _spool_upload(file)
         
-        # Estrai testo per detect
-        import pdfplumber
-        import io
-        from ..services.pdf_processor import _fix_encoding_manual, FTFY_AVAILABLE
+        # v11.7: solo le pagine necessarie al detect (DETECT_CHARS caratteri),
+        # lette dal file di spool
+        from ..services.pdf_processor import open_pdf_document, _extract_text
+        from ..services.extraction import DETECT_CHARS
+
         try:
-            import ftfy
-        except ImportError:
-            pass
-
-        pdf_file = io.BytesIO(content)
-        text = ""
-        with pdfplumber.open(pdf_file) as pdf:
-            for page in pdf.pages[:2]:  # Solo prime 2 pagine
-                page_text = page.extract_text(x_tolerance=5) or ""
-                if FTFY_AVAILABLE:
-                    page_text = ftfy.fix_text(page_text)
-                page_text = _fix_encoding_manual(page_text)
-                text += page_text + "\n"
+            with open_pdf_document(spooled.path) as doc:
+                text, _ = _extract_text(doc, DETECT_CHARS)
+        finally:
+            remove_spool(spooled.path)
         
+        await run_in_threadpool(check_detection_rules)
         vendor, confidence = detect_vendor(text, file.filename)
         
         return {
@@ -180,14 +258,76 @@ async def detect_vendor_endpoint(
             "data": {
                 "vendor": vendor,
                 "confidence": confidence,
+                "candidati": score_vendors(text),
                 "filename": file.filename,
-                "size_bytes": len(content)
+                "size_bytes": spooled.size
+            }
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# =============================================================================
+# CODA INGESTION (v11.7)
+# =============================================================================
+
+@router.get("/jobs")
+async def ingestion_jobs(
+    stato: Optional[str] = Query(None, description="PENDING, RUNNING, RETRY, DONE, FAILED, DEAD"),
+    limit: int = Query(50, ge=1, le=500)
+) -> Dict[str, Any]:
+    """
+    Ritorna gli ultimi job di elaborazione e i contatori per stato.
+    """
+    if stato and stato not in JOB_STATES:
+        raise HTTPException(status_code=400, detail=f"Stato non valido: {stato}")
+    try:
+        return {
+            "success": True,
+            "data": {
+                "jobs": list_jobs(stato, limit),
+                "stats": get_queue_stats(),
+                "workers": get_workers_status()
             }
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/jobs/{id_job}")
+async def ingestion_job_status(id_job: int) -> Dict[str, Any]:
+    """
+    Stato di un job di elaborazione PDF.
+
+    A job concluso (DONE/FAILED) include il risultato di elaborazione
+    nello stesso formato di POST /upload.
+    """
+    job = get_job(id_job)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {id_job} non trovato")
+
+    job.pop('percorso_spool', None)
+    result = job.get('risultato')
+    return {
+        "success": True,
+        "data": job,
+        "message": _get_result_message(result) if result else f"Job {job['stato']}"
+    }
+
+
+@router.post("/jobs/{id_job}/retry")
+async def ingestion_job_retry(id_job: int) -> Dict[str, Any]:
+    """
+    Rimette in coda un job in dead-letter (stato DEAD).
+    """
+    if not requeue_job(id_job):
+        raise HTTPException(status_code=409, detail=f"Job {id_job} non trovato o non in stato DEAD")
+    return {
+        "success": True,
+        "message": f"Job {id_job} rimesso in coda"
+    }
+
+
 # =============================================================================
 # QUERY ENDPOINTS
 # =============================================================================
@@ -237,6 +377,26 @@ async def upload_statistics() -> Dict[str, Any]:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/stats/performance")
+async def upload_performance(
+    giorni: int = Query(30, ge=1, le=365),
+    vendor: Optional[str] = Query(None, description="Filtra un vendor")
+) -> Dict[str, Any]:
+    """
+    Tempi della pipeline PDF per vendor e per fase (v11.7).
+
+    Include medie, p95, ms per pagina/riga e la variazione rispetto
+    ai giorni precedenti di pari durata.
+    """
+    try:
+        return {
+            "success": True,
+            "data": get_performance_stats(giorni, vendor.upper() if vendor else None)
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/vendors")
 async def supported_vendors() -> Dict[str, Any]:
     """
@@ -252,6 +412,50 @@ async def supported_vendors() -> Dict[str, Any]:
     }
 
 
+@router.get("/vendors/detection-rules")
+async def vendor_detection_rules(
+    current_user: UtenteResponse = Depends(require_admin)
+) -> Dict[str, Any]:
+    """
+    Regole di detection vendor attive in questo processo (v11.7).
+
+    Richiede ruolo admin.
+    """
+    rules, version = get_detection_rules()
+    return {
+        "success": True,
+        "data": {
+            "versione": version,
+            "regole": rules,
+            "count": len(rules)
+        }
+    }
+
+
+@router.post("/vendors/detection-rules/reload")
+async def reload_vendor_detection_rules(
+    current_user: UtenteResponse = Depends(require_admin)
+) -> Dict[str, Any]:
+    """
+    Ricompila le regole di detection da vendor_detection_rules (v11.7).
+    Richiede ruolo admin: cambia la detection per tutto il processo.
+
+    Il pool di estrazione si aggiorna al prossimo upload multiplo, i worker
+    della coda entro 30 secondi, gli altri processi backend al primo detect
+    dopo DETECTION_RULES_CHECK_SECONDS.
+    """
+    try:
+        result = await run_in_threadpool(reload_detection_rules)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Regole non valide: {e}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {
+        "success": True,
+        "data": result
+    }
+
+
 @router.get("/pdf/{filename}")
 async def get_pdf(filename: str):
     """
@@ -287,6 +491,54 @@ async def get_pdf(filename: str):
 # HELPERS
 # =============================================================================
 
+async def _spool_upload(file: UploadFile, max_size: Optional[int] = None):
+    """
+    v11.7: Copia l'upload nello spool a blocchi (in threadpool: il file
+    temporaneo di Starlette puo' essere su disco), con hash SHA-256.
+    Il file di spool va rimosso dal chiamante (o passato a un job).
+    """
+    await file.seek(0)
+    return await run_in_threadpool(spool_stream, file.file, max_size)
+
+
+async def _enqueue_multiple(files: List[UploadFile]) -> Dict[str, Any]:
+    """Accoda piu' PDF (v11.7) e ritorna un job per file."""
+    results = []
+    accodati = 0
+    for file in files:
+        if not file.filename or not file.filename.lower().endswith('.pdf'):
+            results.append({
+                'filename': file.filename or 'unknown',
+                'status': 'ERRORE',
+                'error': 'Non è un file PDF'
+            })
+            continue
+        try:
+            spooled = await _spool_upload(file, config.MAX_FILE_SIZE)
+            try:
+                job = enqueue_spooled(file.filename, spooled)
+            except Exception:
+                remove_spool(spooled.path)
+                raise
+            results.append({**job, 'status': 'ACCODATO'})
+            accodati += 1
+        except Exception as e:
+            results.append({
+                'filename': file.filename,
+                'status': 'ERRORE',
+                'error': str(e)
+            })
+
+    return {
+        "success": accodati == len(files),
+        "data": {
+            "results": results,
+            "totals": {'accodati': accodati, 'errori': len(files) - accodati}
+        },
+        "message": f"Accodati {accodati} PDF su {len(files)}"
+    }
+
+
 def _get_result_message(result: Dict) -> str:
     """Genera messaggio descrittivo per risultato."""
     if result['status'] == 'OK':
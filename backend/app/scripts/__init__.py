@@ -6,8 +6,30 @@
 # SCRIPT DISPONIBILI:
 # - create_admin.py  : Crea utente admin iniziale
 # - migrate_db.py    : Migra database da v6.1 a v6.2
+# - bench_db_pool.py : Load test connessioni scoped vs connessione condivisa
+# - bench_sql_translation.py : Microbenchmark cache SQL / prepared statements
+# - bench_insert_returning.py : INSERT ordine 500 righe, RETURNING * vs pk vs batch
+# - ingestion_worker.py : Worker coda PDF standalone (con INGESTION_WORKERS=0)
+# - bench_parallel_extraction.py : Estrazione PDF sequenziale vs pool di processi
+# - bench_extraction.py : Throughput/memoria estrazione per vendor su corpus sintetico
+#   (synthetic_corpus.py) con confronto baseline
+# - reextract.py : Ri-estrazione ordini dagli artefatti salvati e confronto con il DB
+# - compare_pdf_backends.py : Ordini estratti con pdfplumber vs pdfium (PDF_FAST_TEXT_VENDORS)
+# - explain_anagrafica_keys.py : EXPLAIN delle query su chiavi normalizzate e trigrammi,
+#   verifica che usino gli indici attesi
+# - bench_lookup_fuzzy.py : Scoring fuzzy del lookup, un candidato alla volta vs in blocco
 #
 # USO:
 #   python -m app.scripts.create_admin
 #   python -m app.scripts.migrate_db
+#   python -m app.scripts.bench_db_pool
+#   python -m app.scripts.bench_sql_translation
+#   python -m app.scripts.bench_insert_returning
+#   python -m app.scripts.ingestion_worker --workers 4
+#   python -m app.scripts.bench_parallel_extraction --copies 4
+#   python -m app.scripts.bench_extraction --baseline bench_baseline.json
+#   python -m app.scripts.reextract --vendor COOPER
+#   python -m app.scripts.compare_pdf_backends uploads/ --vendor ANGELINI
+#   python -m app.scripts.explain_anagrafica_keys --force-index
+#   python -m app.scripts.bench_lookup_fuzzy --orders 500
 # =============================================================================
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# =============================================================================
+# SERV.O v11.7 - LOAD TEST CONNECTION POOL
+# =============================================================================
+# Misura il throughput di query concorrenti con:
+#   - legacy: tutti i worker sulla connessione condivisa di get_db()
+#   - scoped: ogni worker apre un db_scope() (una connessione del pool)
+# al variare della dimensione del pool.
+#
+# Ogni "richiesta" esegue SELECT pg_sleep(latency) per simulare una query
+# con latenza server fissa: con la connessione condivisa il throughput resta
+# ~1/latency, con gli scope cresce con il numero di connessioni disponibili.
+#
+# USO:
+#   python -m app.scripts.bench_db_pool
+#   python -m app.scripts.bench_db_pool --workers 32 --requests 400 --pool-sizes 2,5,10,20
+# =============================================================================
+
+import sys
+import os
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+from app import database_pg
+from app.config import config
+
+
+def _run(mode: str, workers: int, requests: int, latency: float) -> float:
+    """Esegue `requests` query su `workers` thread, ritorna richieste/secondo."""
+    # La connessione legacy e' una sola: psycopg2 serializza gia' i comandi,
+    # il lock evita solo di interlacciare execute/fetch di thread diversi.
+    legacy_lock = threading.Lock()
+
+    def one_request(_):
+        if mode == 'legacy':
+            with legacy_lock:
+                db = database_pg.get_db()
+                db.execute("SELECT pg_sleep(%s)", (latency,)).fetchone()
+                db.commit()
+        else:
+            with database_pg.db_scope():
+                db = database_pg.get_db()
+                db.execute("SELECT pg_sleep(%s)", (latency,)).fetchone()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(one_request, range(requests)))
+    elapsed = time.perf_counter() - start
+    return requests / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test connection pool PostgreSQL")
+    parser.add_argument('--workers', type=int, default=32, help='Thread concorrenti')
+    parser.add_argument('--requests', type=int, default=300, help='Richieste per misura')
+    parser.add_argument('--latency', type=float, default=0.02, help='Latenza query (secondi)')
+    parser.add_argument('--pool-sizes', default='2,5,10,20', help='Dimensioni pool da provare')
+    args = parser.parse_args()
+
+    pool_sizes = [int(x) for x in args.pool_sizes.split(',') if x.strip()]
+
+    print("=" * 60)
+    print("SERV.O - Load test connection pool")
+    print(f"   workers={args.workers} requests={args.requests} latency={args.latency * 1000:.0f}ms")
+    print("=" * 60)
+    print(f"{'pool':>6} {'legacy req/s':>14} {'scoped req/s':>14} {'speedup':>9}")
+
+    for size in pool_sizes:
+        database_pg.close_db()
+        database_pg.close_pool()
+        config.PG_POOL_MIN = min(config.PG_POOL_MIN, size)
+        config.PG_POOL_MAX = size
+        database_pg.init_pool()
+
+        legacy = _run('legacy', args.workers, args.requests, args.latency)
+        scoped = _run('scoped', args.workers, args.requests, args.latency)
+        print(f"{size:>6} {legacy:>14.1f} {scoped:>14.1f} {scoped / legacy:>8.1f}x")
+
+    database_pg.close_db()
+    database_pg.close_pool()
+
+
+if __name__ == "__main__":
+    main()
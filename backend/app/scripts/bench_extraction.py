@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# =============================================================================
+# SERV.O v11.7 - BENCHMARK ESTRAZIONE PER VENDOR
+# =============================================================================
+# Misura extract_pdf_data (testo, detect vendor, estrattore) su un corpus
+# sintetico generato per ogni layout vendor (synthetic_corpus.py):
+#   - pagine/s e righe/s (wall), ms per PDF e ripartizione per fase
+#   - picco di memoria Python (tracemalloc, in un passaggio separato)
+#   - correttezza: vendor, numero ordini e codici AIC attesi
+#
+# Con --baseline confronta con un file salvato in precedenza con
+# --save-baseline ed esce con codice 1 se un vendor peggiora oltre
+# --max-regression (throughput piu' basso o memoria piu' alta), oppure se
+# l'estrazione non restituisce i dati attesi. La baseline dipende dalla
+# macchina: va salvata e confrontata sullo stesso host.
+#
+# Non richiede PostgreSQL: nessun dato viene scritto.
+#
+# USO:
+#   python -m app.scripts.bench_extraction
+#   python -m app.scripts.bench_extraction --pages 5 --rows 25 --copies 3 --vendor COOPER
+#   python -m app.scripts.bench_extraction --save-baseline /tmp/bench_baseline.json
+#   python -m app.scripts.bench_extraction --baseline /tmp/bench_baseline.json --max-regression 0.2
+# =============================================================================
+
+import sys
+import os
+import json
+import time
+import tempfile
+import argparse
+import tracemalloc
+from typing import Dict, Any, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+# v11.7: artefatti di estrazione in una directory temporanea (il salvataggio
+# resta nella misura, anche nei processi del pool che ereditano l'ambiente)
+os.environ.setdefault('ARTEFACT_DIR', tempfile.mkdtemp(prefix='bench_artefacts_'))
+
+from app.scripts.synthetic_corpus import LAYOUTS, generate_pdf, check_extraction
+from app.services.pdf_processor import extract_pdf_data
+from app.services.extraction import (
+    get_encoding_stats, reset_encoding_stats, get_table_region_stats, reset_table_region_stats,
+)
+
+
+def _bench_vendor(vendor: str, pages: int, rows: int, copies: int) -> Dict[str, Any]:
+    corpus = [generate_pdf(vendor, pages=pages, rows=rows, seed=seed) for seed in range(copies)]
+
+    errors: List[str] = []
+    fasi: Dict[str, float] = {}
+    n_pagine = n_righe = 0
+    start = time.perf_counter()
+    for seed, (content, expected) in enumerate(corpus):
+        data = extract_pdf_data(f"{vendor}_{seed}.pdf", content)
+        errors += check_extraction(expected, data)
+        for fase, (wall_ms, _cpu_ms) in data.get('tempi', {}).items():
+            fasi[fase] = fasi.get(fase, 0.0) + wall_ms
+        n_pagine += expected['pagine']
+        n_righe += len(expected['aic'])
+    elapsed = time.perf_counter() - start
+
+    # Memoria misurata a parte: tracemalloc rallenta l'allocazione
+    content, _ = corpus[0]
+    tracemalloc.start()
+    extract_pdf_data(f"{vendor}_mem.pdf", content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'pdf': copies,
+        'pagine': n_pagine,
+        'righe': n_righe,
+        'ms_per_pdf': round(elapsed * 1000 / copies, 1),
+        'pagine_s': round(n_pagine / elapsed, 2),
+        'righe_s': round(n_righe / elapsed, 1),
+        'picco_mb': round(peak / 1024 / 1024, 2),
+        'fasi_ms': {fase: round(ms / copies, 1) for fase, ms in fasi.items()},
+        'errori': errors,
+    }
+
+
+def _regressions(results: Dict[str, Dict], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Confronto con la baseline: throughput in calo o memoria in aumento oltre soglia."""
+    problems = []
+    for vendor, res in results.items():
+        base = baseline.get('vendors', {}).get(vendor)
+        if not base:
+            continue
+        for metric in ('pagine_s', 'righe_s'):
+            if base[metric] and res[metric] < base[metric] * (1 - threshold):
+                problems.append(f"{vendor}: {metric} {res[metric]} < baseline {base[metric]}")
+        if base['picco_mb'] and res['picco_mb'] > base['picco_mb'] * (1 + threshold):
+            problems.append(f"{vendor}: picco_mb {res['picco_mb']} > baseline {base['picco_mb']}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark estrazione PDF per vendor (corpus sintetico)")
+    parser.add_argument('--pages', type=int, default=3, help='Pagine per PDF')
+    parser.add_argument('--rows', type=int, default=20, help='Righe prodotto per pagina')
+    parser.add_argument('--copies', type=int, default=3, help='PDF per vendor (seed diversi)')
+    parser.add_argument('--vendor', action='append', choices=sorted(LAYOUTS),
+                        help='Vendor da misurare (ripetibile, default tutti)')
+    parser.add_argument('--baseline', help='File JSON baseline da confrontare')
+    parser.add_argument('--save-baseline', help='Salva i risultati come baseline JSON')
+    parser.add_argument('--max-regression', type=float, default=0.20,
+                        help='Peggioramento massimo rispetto alla baseline (0.20 = 20%%)')
+    args = parser.parse_args()
+
+    vendors = args.vendor or sorted(LAYOUTS)
+    print(f"Corpus sintetico: {len(vendors)} vendor x {args.copies} PDF, "
+          f"{args.pages} pagine, {args.rows} righe/pagina")
+    print(f"{'vendor':<14} {'ms/PDF':>9} {'pagine/s':>9} {'righe/s':>9} {'picco MB':>9}  fasi (ms/PDF)")
+
+    reset_encoding_stats()
+    reset_table_region_stats()
+    results = {}
+    for vendor in vendors:
+        res = _bench_vendor(vendor, args.pages, args.rows, args.copies)
+        results[vendor] = res
+        fasi = ' '.join(f"{fase}={ms:.0f}" for fase, ms in res['fasi_ms'].items())
+        print(f"{vendor:<14} {res['ms_per_pdf']:>9.1f} {res['pagine_s']:>9.1f} {res['righe_s']:>9.1f} "
+              f"{res['picco_mb']:>9.2f}  {fasi}")
+
+    enc = get_encoding_stats()
+    print(f"Fix encoding: {enc['pulite']} pagine pulite (ftfy saltato), "
+          f"{enc['riparate']} riparate, {enc['modificate']} modificate")
+    reg = get_table_region_stats()
+    print(f"Tabelle prodotti: {reg['ritagliate']} pagine ritagliate, "
+          f"{reg['intere']} intere, {reg['rilette']} rilette dopo ritaglio scartato")
+
+    failed = False
+    for vendor, res in results.items():
+        for error in sorted(set(res['errori'])):
+            print(f"❌ {vendor}: {error}")
+            failed = True
+
+    params = {'pages': args.pages, 'rows': args.rows, 'copies': args.copies}
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump({'params': params, 'vendors': results}, f, indent=2)
+        print(f"Baseline salvata in {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('params') != params:
+            print(f"⚠️ Parametri diversi dalla baseline: {baseline.get('params')}")
+        problems = _regressions(results, baseline, args.max_regression)
+        for problem in problems:
+            print(f"❌ Regressione {problem}")
+        if problems:
+            failed = True
+        else:
+            print(f"✅ Nessuna regressione oltre {args.max_regression:.0%}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# =============================================================================
+# SERV.O v11.7 - BENCHMARK INSERT RETURNING
+# =============================================================================
+# Inserisce un ordine da N righe in una copia TEMP di ordini_dettaglio e
+# confronta:
+#   - riga per riga con RETURNING *            (comportamento pre-v11.7)
+#   - riga per riga con RETURNING id_dettaglio (registry PK)
+#   - execute_insert() multi-riga              (batch con id di ritorno)
+# Per ogni modalita' stima i byte di risultato ricevuti (messaggi DataRow del
+# protocollo: 7 byte di header + 4 byte/campo + valore in formato testo).
+#
+# Richiede PostgreSQL raggiungibile. Nessun dato reale viene modificato.
+#
+# USO:
+#   python -m app.scripts.bench_insert_returning
+#   python -m app.scripts.bench_insert_returning --rows 500 --repeat 5
+# =============================================================================
+
+import sys
+import os
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+from app import database_pg
+
+
+INSERT_SQL = """
+    INSERT INTO bench_dettaglio (
+        id_testata, n_riga, codice_aic, codice_originale, descrizione,
+        q_venduta, q_omaggio, prezzo_netto, prezzo_pubblico, aliquota_iva,
+        stato_riga, espositore_metadata, valori_originali
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'ESTRATTO', ?, ?)
+"""
+
+
+def _rows(n: int):
+    return [
+        (1, i, f"{i:09d}", f"{i:09d}", f"PRODOTTO DI TEST RIGA {i} 30 CPR RIV 10MG",
+         10, 0, 5.25, 9.90, 10, None, '{"q_venduta": 10, "prezzo_netto": 5.25}')
+        for i in range(1, n + 1)
+    ]
+
+
+def _wire_bytes(rows) -> int:
+    """Stima byte DataRow ricevuti per le righe di risultato."""
+    total = 0
+    for row in rows:
+        values = row.values() if isinstance(row, dict) else row
+        total += 7 + sum(4 + (len(str(v)) if v is not None else 0) for v in values)
+    return total
+
+
+def _setup(raw_conn) -> None:
+    cur = raw_conn.cursor()
+    cur.execute("DROP TABLE IF EXISTS bench_dettaglio")
+    cur.execute("CREATE TEMP TABLE bench_dettaglio (LIKE ordini_dettaglio INCLUDING DEFAULTS)")
+    cur.execute("CREATE TEMP SEQUENCE bench_dettaglio_seq")
+    cur.execute("ALTER TABLE bench_dettaglio ALTER COLUMN id_dettaglio SET DEFAULT nextval('bench_dettaglio_seq')")
+    cur.execute("ALTER TABLE bench_dettaglio ADD PRIMARY KEY (id_dettaglio)")
+    cur.close()
+    raw_conn.commit()
+
+
+def _per_row(raw_conn, rows, returning: str):
+    pg_sql = database_pg._convert_sql_dialect(INSERT_SQL).rstrip() + f' RETURNING {returning}'
+    cur = raw_conn.cursor()
+    received = []
+    start = time.perf_counter()
+    for params in rows:
+        cur.execute(pg_sql, params)
+        received.append(cur.fetchone())
+    raw_conn.commit()
+    elapsed = time.perf_counter() - start
+    cur.close()
+    return elapsed, _wire_bytes(received)
+
+
+def _batch(raw_conn, rows):
+    db = database_pg.PostgreSQLConnection(raw_conn)
+    start = time.perf_counter()
+    ids = db.execute_insert(INSERT_SQL, rows)
+    db.commit()
+    elapsed = time.perf_counter() - start
+    assert len(ids) == len(rows)
+    return elapsed, _wire_bytes([(i,) for i in ids])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark INSERT RETURNING")
+    parser.add_argument('--rows', type=int, default=500, help='Righe per ordine')
+    parser.add_argument('--repeat', type=int, default=5, help='Ripetizioni (si tiene la migliore)')
+    args = parser.parse_args()
+
+    database_pg.init_pool()
+    raw_conn = database_pg._pool.getconn()
+    try:
+        _setup(raw_conn)
+        # La tabella TEMP non e' nel registry di avvio
+        database_pg._pk_registry['bench_dettaglio'] = 'id_dettaglio'
+        database_pg._insert_batch_sql.cache_clear()
+
+        rows = _rows(args.rows)
+        results = {}
+        for label, fn in (
+            ('RETURNING *', lambda: _per_row(raw_conn, rows, '*')),
+            ('RETURNING pk', lambda: _per_row(raw_conn, rows, 'id_dettaglio')),
+            ('execute_insert', lambda: _batch(raw_conn, rows)),
+        ):
+            best = min((fn() for _ in range(args.repeat)), key=lambda r: r[0])
+            results[label] = best
+
+        base_time, base_bytes = results['RETURNING *']
+        print(f"Ordine da {args.rows} righe (migliore su {args.repeat})")
+        print(f"{'modalita':<16} {'tempo ms':>10} {'byte risultato':>16} {'vs RETURNING *':>16}")
+        for label, (elapsed, received) in results.items():
+            print(f"{label:<16} {elapsed * 1000:>10.1f} {received:>16,} "
+                  f"{base_time / elapsed:>8.1f}x {100 - received * 100 / base_bytes:>5.0f}%")
+    finally:
+        raw_conn.rollback()
+        database_pg._pool.putconn(raw_conn, close=True)
+        database_pg.close_pool()
+
+
+if __name__ == "__main__":
+    main()
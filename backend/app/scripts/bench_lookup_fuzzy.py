@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# =============================================================================
+# SERV.O v11.7 - MICROBENCHMARK SCORING FUZZY DEL LOOKUP
+# =============================================================================
+# Fallback fuzzy di lookup_farmacia: ogni ordine confronta fino a 200
+# farmacie + 200 parafarmacie candidate. Misura per ordine il ciclo
+# fuzzy_match_full un candidato alla volta (comportamento precedente) contro
+# fuzzy_match_full_batch, e verifica che i punteggi coincidano.
+#
+# USO:
+#   python -m app.scripts.bench_lookup_fuzzy
+#   python -m app.scripts.bench_lookup_fuzzy --orders 500 --candidates 400
+# =============================================================================
+
+import sys
+import os
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+from app.services.lookup import scoring
+
+
+_NOMI = ['FARMACIA', 'PARAFARMACIA', 'SAN', 'SANTA', 'CENTRALE', 'COMUNALE', 'DR.', 'ROSSI',
+         "DELL'OSPEDALE", 'S.N.C.', 'MARIA', 'GIUSEPPE', 'NUOVA', 'ANTICA', 'SALUTE', 'LUCÀ']
+_VIE = ['VIA', 'VIALE', 'CORSO', 'PIAZZA', 'V.LE', 'P.ZZA', 'LARGO']
+_STRADE = ['ROMA', 'GARIBALDI', 'MAZZINI', 'VITTORIO EMANUELE II', 'DEI MILLE', "SANT'AGATA",
+           'NAZIONALE', 'XX SETTEMBRE', 'CAVOUR', 'DANTE ALIGHIERI', 'TRIESTE']
+_CITTA = [('CATANIA', '95100', 'CT'), ('ACIREALE', '95024', 'CT'), ('PATERNÒ', '95047', 'CT'),
+          ('MISTERBIANCO', '95045', 'CT'), ('ADRANO', '95031', 'CT')]
+
+
+def _record(rnd: random.Random) -> dict:
+    citta, cap, provincia = rnd.choice(_CITTA)
+    return {
+        'ragione_sociale': ' '.join(rnd.sample(_NOMI, rnd.randint(2, 4))),
+        'indirizzo': f"{rnd.choice(_VIE)} {rnd.choice(_STRADE)} {rnd.randint(1, 250)}",
+        'cap': cap,
+        'citta': citta,
+        'provincia': provincia,
+    }
+
+
+def _scalar(order: dict, candidates) -> list:
+    return [
+        scoring.fuzzy_match_full(
+            order['ragione_sociale'], order['citta'], order['indirizzo'],
+            c['ragione_sociale'] or '', c['citta'] or '', c['indirizzo'] or '',
+            order['cap'], c['cap'] or '',
+            order['provincia'], c['provincia'] or ''
+        )
+        for c in candidates
+    ]
+
+
+def _batch(order: dict, candidates) -> list:
+    return scoring.fuzzy_match_full_batch(
+        order['ragione_sociale'], order['citta'], order['indirizzo'],
+        order['cap'], order['provincia'], candidates
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark scoring fuzzy lookup")
+    parser.add_argument('--orders', type=int, default=200)
+    parser.add_argument('--candidates', type=int, default=400, help='Candidati per ordine (farmacie + parafarmacie)')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    if not scoring.FUZZY_AVAILABLE:
+        print("❌ fuzzywuzzy non installato")
+        sys.exit(1)
+
+    rnd = random.Random(args.seed)
+    pool = [_record(rnd) for _ in range(args.candidates * 3)]
+    orders = [(_record(rnd), rnd.sample(pool, args.candidates)) for _ in range(args.orders)]
+
+    start = time.perf_counter()
+    expected = [_scalar(order, candidates) for order, candidates in orders]
+    scalar = time.perf_counter() - start
+
+    scoring._sorted_tokens.cache_clear()
+    start = time.perf_counter()
+    found = [_batch(order, candidates) for order, candidates in orders]
+    batch = time.perf_counter() - start
+
+    diff = max(abs(a - b) for e, f in zip(expected, found) for a, b in zip(e, f))
+
+    print(f"Scoring fuzzy ({args.orders:,} ordini x {args.candidates} candidati, "
+          f"rapidfuzz {'attivo' if scoring.RAPIDFUZZ_AVAILABLE else 'non disponibile'})")
+    print(f"   un candidato alla volta: {scalar / args.orders * 1e3:8.2f} ms/ordine")
+    print(f"   in blocco:               {batch / args.orders * 1e3:8.2f} ms/ordine  ({scalar / batch:.1f}x)")
+    print(f"   differenza massima punteggi: {diff}")
+    print(f"   cache token: {scoring._sorted_tokens.cache_info()}")
+    sys.exit(1 if diff else 0)
+
+
+if __name__ == "__main__":
+    main()
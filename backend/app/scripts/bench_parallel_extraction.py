@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# =============================================================================
+# SERV.O v11.7 - BENCHMARK ESTRAZIONE PDF PARALLELA
+# =============================================================================
+# Misura la fase CPU-bound di process_pdf (testo, detect vendor, estrattore)
+# su un corpus di PDF:
+#   - sequenziale nel processo corrente           (comportamento pre-v11.7)
+#   - ProcessPoolExecutor con 1..N processi        (upload multiplo v11.7)
+# Il corpus e' la cartella UPLOAD_DIR (o --dir), ripetuta --copies volte.
+#
+# Non richiede PostgreSQL: nessun dato viene scritto.
+#
+# USO:
+#   python -m app.scripts.bench_parallel_extraction
+#   python -m app.scripts.bench_parallel_extraction --dir uploads --copies 4 --workers 8
+# =============================================================================
+
+import sys
+import os
+import glob
+import time
+import tempfile
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+# v11.7: artefatti di estrazione in una directory temporanea (il salvataggio
+# resta nella misura, anche nei processi del pool che ereditano l'ambiente)
+os.environ.setdefault('ARTEFACT_DIR', tempfile.mkdtemp(prefix='bench_artefacts_'))
+
+from app.config import config
+from app.services.pdf_processor import extract_pdf_data
+
+
+def _load_corpus(directory: str, copies: int):
+    paths = sorted(glob.glob(os.path.join(directory, '*.pdf')) +
+                   glob.glob(os.path.join(directory, '*.PDF')))
+    corpus = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            corpus.append((os.path.basename(path), f.read()))
+    return corpus * copies
+
+
+def _sequential(corpus):
+    start = time.perf_counter()
+    results = [extract_pdf_data(filename, content) for filename, content in corpus]
+    return time.perf_counter() - start, results
+
+
+def _warmup(_):
+    import pdfplumber  # noqa: F401 - import del processo escluso dalla misura
+    return os.getpid()
+
+
+def _parallel(corpus, workers: int):
+    ctx = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        # Avvio processi escluso dalla misura (pool riusato nel backend)
+        list(pool.map(_warmup, range(workers)))
+        start = time.perf_counter()
+        results = list(pool.map(extract_pdf_data, *zip(*corpus)))
+        return time.perf_counter() - start, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark estrazione PDF parallela")
+    parser.add_argument('--dir', default=config.UPLOAD_DIR, help='Cartella con i PDF')
+    parser.add_argument('--copies', type=int, default=1, help='Ripetizioni del corpus')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Numero massimo di processi')
+    args = parser.parse_args()
+
+    corpus = _load_corpus(args.dir, args.copies)
+    if not corpus:
+        print(f"Nessun PDF in {args.dir}")
+        return
+
+    base, expected = _sequential(corpus)
+    errors = sum(1 for r in expected if r['errore_testo'] or r['errore_estrattore'])
+    print(f"Corpus: {len(corpus)} PDF da {args.dir} (errori estrazione: {errors}), "
+          f"core disponibili: {os.cpu_count()}")
+    print(f"{'modalita':<14} {'tempo s':>9} {'PDF/s':>8} {'speedup':>8}")
+    print(f"{'sequenziale':<14} {base:>9.2f} {len(corpus) / base:>8.1f} {1.0:>7.1f}x")
+
+    # 1, 2, 4, ... fino a --workers
+    steps = sorted({min(2 ** i, args.workers) for i in range(args.workers.bit_length() + 1)})
+    for workers in steps:
+        elapsed, results = _parallel(corpus, workers)
+        assert [r['vendor'] for r in results] == [r['vendor'] for r in expected]
+        print(f"{f'{workers} processi':<14} {elapsed:>9.2f} {len(corpus) / elapsed:>8.1f} "
+              f"{base / elapsed:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
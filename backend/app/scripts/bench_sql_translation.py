@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# =============================================================================
+# SERV.O v11.7 - MICROBENCHMARK TRADUZIONE SQL / PREPARED STATEMENTS
+# =============================================================================
+# 1) Traduzione: costo per statement di _convert_sql_dialect + classificazione
+#    (comportamento precedente) contro translate_sql() servito dalla cache LRU.
+# 2) Con --db: round-trip di una lookup listino ripetuta, esecuzione normale
+#    contro prepared statement (richiede PostgreSQL raggiungibile).
+#
+# USO:
+#   python -m app.scripts.bench_sql_translation
+#   python -m app.scripts.bench_sql_translation --iterations 200000 --db
+# =============================================================================
+
+import sys
+import os
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+from app import database_pg
+from app.config import config
+
+
+# Statement rappresentativi dei percorsi caldi (lookup, listino, dettaglio)
+STATEMENTS = [
+    "SELECT * FROM listini_vendor WHERE vendor = ? AND codice_aic = ? AND attivo = TRUE",
+    "SELECT min_id, partita_iva FROM anagrafica_farmacie WHERE LTRIM(min_id, '0') = %s",
+    """INSERT INTO ordini_dettaglio (id_testata, n_riga, codice_aic, descrizione, q_venduta,
+       prezzo_netto, prezzo_pubblico, aliquota_iva, stato_riga, data_estrazione)
+       VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'ESTRATTO', datetime('now'))""",
+    "UPDATE ordini_testata SET stato = ?, data_modifica = datetime('now') WHERE id_testata = ?",
+    "SELECT COUNT(*) AS cnt FROM anomalie WHERE id_testata = %s AND data_rilevazione > date('now', '-7 days')",
+]
+
+
+def _legacy_translate(sql: str):
+    """Percorso pre-v11.7: conversione + tre upper() ad ogni execute."""
+    pg_sql = database_pg._convert_sql_dialect(sql)
+    is_insert = pg_sql.strip().upper().startswith('INSERT')
+    has_on_conflict = 'ON CONFLICT' in pg_sql.upper()
+    has_returning = 'RETURNING' in pg_sql.upper()
+    if is_insert and not has_returning and not has_on_conflict:
+        pg_sql = pg_sql.rstrip(';').rstrip() + ' RETURNING *'
+    return pg_sql
+
+
+def bench_translation(iterations: int) -> None:
+    n = iterations * len(STATEMENTS)
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for sql in STATEMENTS:
+            _legacy_translate(sql)
+    legacy = time.perf_counter() - start
+
+    database_pg.translate_sql.cache_clear()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for sql in STATEMENTS:
+            database_pg.translate_sql(sql)
+    cached = time.perf_counter() - start
+
+    print(f"Traduzione SQL ({n:,} statement)")
+    print(f"   senza cache: {legacy / n * 1e6:8.2f} us/statement")
+    print(f"   cache LRU:   {cached / n * 1e6:8.2f} us/statement  ({legacy / cached:.1f}x)")
+    print(f"   cache info:  {database_pg.get_sql_cache_info()}")
+
+
+def bench_prepared(iterations: int) -> None:
+    sql = "SELECT id_vendor, codice_vendor FROM vendor WHERE codice_vendor = %s AND attivo = TRUE"
+
+    def run(prepared: bool) -> float:
+        config.PG_PREPARED_STATEMENTS = prepared
+        with database_pg.db_scope():
+            db = database_pg.get_db()
+            start = time.perf_counter()
+            for _ in range(iterations):
+                db.execute(sql, ('ANGELINI',)).fetchall()
+            return time.perf_counter() - start
+
+    plain = run(False)
+    prepared = run(True)
+    print(f"Lookup ripetuta ({iterations:,} esecuzioni)")
+    print(f"   normale:  {plain / iterations * 1e6:8.1f} us/query")
+    print(f"   prepared: {prepared / iterations * 1e6:8.1f} us/query  ({plain / prepared:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark traduzione SQL")
+    parser.add_argument('--iterations', type=int, default=50000)
+    parser.add_argument('--db', action='store_true', help='Misura anche le prepared statement su PostgreSQL')
+    args = parser.parse_args()
+
+    bench_translation(args.iterations)
+    if args.db:
+        bench_prepared(min(args.iterations, 5000))
+        database_pg.close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# =============================================================================
+# SERV.O v11.7 - CONFRONTO BACKEND TESTO PDF
+# =============================================================================
+# Estrae ogni PDF con pdfplumber (riferimento) e con pdfium e confronta
+# vendor e ordini estratti, con i tempi di estrazione per vendor. Da usare
+# sui PDF reali di un vendor prima di aggiungerlo a PDF_FAST_TEXT_VENDORS:
+# esce con codice 1 se almeno un PDF da' un risultato diverso.
+#
+# Senza percorsi usa il corpus sintetico (synthetic_corpus.py).
+# Non richiede PostgreSQL: nessun dato viene scritto.
+#
+# USO:
+#   python -m app.scripts.compare_pdf_backends uploads/
+#   python -m app.scripts.compare_pdf_backends uploads/ordine1.pdf uploads/ordine2.pdf --vendor COOPER
+#   python -m app.scripts.compare_pdf_backends --pages 5 --rows 25
+# =============================================================================
+
+import sys
+import os
+import time
+import tempfile
+import argparse
+from typing import Dict, Any, Iterator, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+# Artefatti di estrazione in una directory temporanea
+os.environ.setdefault('ARTEFACT_DIR', tempfile.mkdtemp(prefix='compare_artefacts_'))
+
+from app.config import config
+from app.scripts.synthetic_corpus import LAYOUTS, generate_pdf
+from app.services.pdf_processor import extract_pdf_data
+
+
+def _pdf_files(paths: List[str]) -> Iterator[Tuple[str, bytes]]:
+    for path in paths:
+        if os.path.isdir(path):
+            names = sorted(n for n in os.listdir(path) if n.lower().endswith('.pdf'))
+            for name in names:
+                yield from _pdf_files([os.path.join(path, name)])
+        else:
+            with open(path, 'rb') as f:
+                yield path, f.read()
+
+
+def _synthetic(pages: int, rows: int) -> Iterator[Tuple[str, bytes]]:
+    for vendor in sorted(LAYOUTS):
+        yield f"{vendor}.pdf", generate_pdf(vendor, pages=pages, rows=rows)[0]
+
+
+def _extract(filename: str, content: bytes, fast: bool) -> Tuple[Dict[str, Any], float]:
+    """Estrazione con tutti i vendor su pdfium (fast) o solo pdfplumber."""
+    config.PDF_DETECT_BACKEND = 'pdfium' if fast else 'pdfplumber'
+    config.PDF_FAST_TEXT_VENDORS = ','.join(LAYOUTS) if fast else ''
+    start = time.perf_counter()
+    data = extract_pdf_data(filename, content)
+    elapsed = time.perf_counter() - start
+    data.pop('tempi', None)
+    return data, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Confronto estrazione PDF pdfplumber vs pdfium")
+    parser.add_argument('paths', nargs='*', help='PDF o directory di PDF (default: corpus sintetico)')
+    parser.add_argument('--vendor', action='append', help='Solo PDF rilevati come questo vendor (ripetibile)')
+    parser.add_argument('--pages', type=int, default=3, help='Pagine per PDF sintetico')
+    parser.add_argument('--rows', type=int, default=20, help='Righe per pagina del PDF sintetico')
+    args = parser.parse_args()
+
+    files = _pdf_files(args.paths) if args.paths else _synthetic(args.pages, args.rows)
+    vendors = {v.upper() for v in args.vendor or []}
+
+    per_vendor: Dict[str, Dict[str, Any]] = {}
+    different: List[str] = []
+    for filename, content in files:
+        reference, t_ref = _extract(os.path.basename(filename), content, fast=False)
+        vendor = reference['vendor'] or 'UNKNOWN'
+        if vendors and vendor not in vendors:
+            continue
+        fast, t_fast = _extract(os.path.basename(filename), content, fast=True)
+
+        stats = per_vendor.setdefault(vendor, {'pdf': 0, 'diversi': 0, 'ms_ref': 0.0, 'ms_fast': 0.0})
+        stats['pdf'] += 1
+        stats['ms_ref'] += t_ref * 1000
+        stats['ms_fast'] += t_fast * 1000
+        if fast != reference:
+            stats['diversi'] += 1
+            different.append(f"{vendor}: {filename}")
+
+    print(f"{'vendor':<14} {'PDF':>5} {'diversi':>8} {'ms pdfplumber':>14} {'ms pdfium':>10}")
+    for vendor, stats in sorted(per_vendor.items()):
+        print(f"{vendor:<14} {stats['pdf']:>5} {stats['diversi']:>8} "
+              f"{stats['ms_ref'] / stats['pdf']:>14.1f} {stats['ms_fast'] / stats['pdf']:>10.1f}")
+
+    for item in different:
+        print(f"❌ Estrazione diversa con pdfium - {item}")
+    if not per_vendor:
+        print("Nessun PDF confrontato")
+    elif not different:
+        print("✅ Stesso risultato con i due backend")
+    sys.exit(1 if different else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# =============================================================================
+# SERV.O v11.7 - VERIFICA PIANI QUERY SU CHIAVI NORMALIZZATE
+# =============================================================================
+# Esegue EXPLAIN delle query di lookup e report che filtrano su min_id_norm,
+# codice_sito_norm e piva_norm (migrations/v11_7_anagrafica_chiavi.sql) o
+# cercano candidati fuzzy su chiave_fuzzy (v11_7_anagrafica_trigrammi.sql) e
+# verifica che il piano usi l'indice atteso. Esce con codice 1 se almeno una
+# query non usa l'indice.
+#
+# Su un database con poche righe il planner preferisce la scansione
+# sequenziale: --force-index disabilita seqscan per verificare solo che
+# l'indice sia utilizzabile dalla query.
+#
+# USO:
+#   python -m app.scripts.explain_anagrafica_keys
+#   python -m app.scripts.explain_anagrafica_keys --force-index --verbose
+# =============================================================================
+
+import sys
+import os
+import json
+import argparse
+from typing import Any, Dict, List, Set, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+
+# (nome, query, parametri, indici accettati)
+QUERIES: List[Tuple[str, str, tuple, Tuple[str, ...]]] = [
+    (
+        "lookup farmacia per MIN_ID",
+        "SELECT id_farmacia, min_id, partita_iva FROM anagrafica_farmacie "
+        "WHERE min_id_norm = %s AND attiva = TRUE",
+        ('12345',),
+        ('idx_anagrafica_farmacie_min_id_norm',),
+    ),
+    (
+        "lookup farmacia per P.IVA",
+        "SELECT id_farmacia, min_id, cap, citta FROM anagrafica_farmacie "
+        "WHERE piva_norm = %s AND attiva = TRUE",
+        ('1234567890',),
+        ('idx_anagrafica_farmacie_piva_norm',),
+    ),
+    (
+        "lookup parafarmacia per codice sito",
+        "SELECT id_parafarmacia, codice_sito, partita_iva FROM anagrafica_parafarmacie "
+        "WHERE codice_sito_norm = %s AND attiva = TRUE",
+        ('12345',),
+        ('idx_anagrafica_parafarmacie_codice_sito_norm',),
+    ),
+    (
+        "lookup parafarmacia per P.IVA",
+        "SELECT id_parafarmacia, codice_sito, cap, citta FROM anagrafica_parafarmacie "
+        "WHERE piva_norm = %s AND attiva = TRUE",
+        ('1234567890',),
+        ('idx_anagrafica_parafarmacie_piva_norm',),
+    ),
+    (
+        "cliente per P.IVA e MIN_ID",
+        "SELECT min_id, deposito_riferimento FROM anagrafica_clienti "
+        "WHERE piva_norm = %s AND min_id_norm = %s",
+        ('1234567890', '12345'),
+        ('idx_anagrafica_clienti_piva_norm', 'idx_anagrafica_clienti_min_id_norm'),
+    ),
+    (
+        "cliente per P.IVA",
+        "SELECT min_id, deposito_riferimento FROM anagrafica_clienti WHERE piva_norm = %s",
+        ('1234567890',),
+        ('idx_anagrafica_clienti_piva_norm',),
+    ),
+    (
+        "candidati fuzzy farmacie (trigrammi)",
+        "SELECT id_farmacia FROM anagrafica_farmacie "
+        "WHERE attiva = TRUE AND %s <%% chiave_fuzzy "
+        "ORDER BY word_similarity(%s, chiave_fuzzy) DESC, similarity(chiave_fuzzy, %s) DESC, id_farmacia LIMIT 200",
+        ('FARMACIA CENTRALE VIA ROMA 1 00100 ROMA',) * 3,
+        ('idx_anagrafica_farmacie_chiave_fuzzy_trgm',),
+    ),
+    (
+        "candidati fuzzy parafarmacie (trigrammi)",
+        "SELECT id_parafarmacia FROM anagrafica_parafarmacie "
+        "WHERE attiva = TRUE AND %s <%% chiave_fuzzy "
+        "ORDER BY word_similarity(%s, chiave_fuzzy) DESC, similarity(chiave_fuzzy, %s) DESC, id_parafarmacia LIMIT 200",
+        ('PARAFARMACIA SOLE VIA NAPOLI 4 80100 NAPOLI',) * 3,
+        ('idx_anagrafica_parafarmacie_chiave_fuzzy_trgm',),
+    ),
+    (
+        "report: filtro deposito",
+        "SELECT COUNT(*) FROM v_ordini_completi t WHERE EXISTS ("
+        " SELECT 1 FROM anagrafica_clienti ac"
+        " WHERE (ac.piva_norm = LTRIM(REPLACE(t.partita_iva, ' ', ''), '0')"
+        " OR ac.min_id_norm = LTRIM(t.min_id, '0'))"
+        " AND ac.deposito_riferimento IN (%s))",
+        ('CT',),
+        ('idx_anagrafica_clienti_piva_norm', 'idx_anagrafica_clienti_min_id_norm'),
+    ),
+]
+
+
+def plan_indexes(plan: Dict[str, Any]) -> Set[str]:
+    """Indici usati da un nodo di EXPLAIN (FORMAT JSON) e dai suoi figli."""
+    found = set()
+    if plan.get('Index Name'):
+        found.add(plan['Index Name'])
+    for child in plan.get('Plans', []):
+        found |= plan_indexes(child)
+    return found
+
+
+def explain(db, sql: str, params: tuple) -> Dict[str, Any]:
+    row = db.execute(f"EXPLAIN (FORMAT JSON) {sql}", params).fetchone()
+    result = row['QUERY PLAN']
+    if isinstance(result, str):
+        result = json.loads(result)
+    return result[0]['Plan']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EXPLAIN delle query su chiavi normalizzate anagrafica")
+    parser.add_argument('--force-index', action='store_true', help='Disabilita seqscan (database di test)')
+    parser.add_argument('--verbose', action='store_true', help='Stampa il piano di ogni query')
+    args = parser.parse_args()
+
+    from app.database_pg import get_db
+
+    db = get_db()
+    if args.force_index:
+        db.execute("SET enable_seqscan = off")
+
+    missing = []
+    for name, sql, params, expected in QUERIES:
+        plan = explain(db, sql, params)
+        used = plan_indexes(plan)
+        ok = bool(used & set(expected))
+        print(f"{'✅' if ok else '❌'} {name:<40} {', '.join(sorted(used)) or 'nessun indice'}")
+        if args.verbose:
+            print(json.dumps(plan, indent=2))
+        if not ok:
+            missing.append(name)
+
+    db.rollback()
+    if missing:
+        print(f"❌ {len(missing)} query senza indice atteso")
+    sys.exit(1 if missing else 0)
+
+
+if __name__ == "__main__":
+    main()
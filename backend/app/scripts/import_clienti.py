@@ -15,6 +15,7 @@ from datetime import datetime
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
 from app.database_pg import get_db
+from app.services.lookup.index import anagrafica_changed
 
 
 def import_clienti(csv_path: str, truncate: bool = False) -> dict:
@@ -125,6 +126,8 @@ def import_clienti(csv_path: str, truncate: bool = False) -> dict:
                 stats['errori_dettaglio'].append(f"Riga {row_num}: {str(e)}")
 
     db.commit()
+    # v11.7: invalida la cache lookup (deposito da anagrafica_clienti)
+    anagrafica_changed()
 
     print(f"\nImport completato:")
     print(f"  Totale righe: {stats['totale']}")
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# =============================================================================
+# SERV.O v11.7 - WORKER CODA INGESTION PDF
+# =============================================================================
+# Avvia i worker della coda ingestion_jobs fuori dal processo API, per
+# installazioni con INGESTION_WORKERS=0 o per aggiungere capacita' durante
+# i picchi (i worker si coordinano con SKIP LOCKED).
+#
+# USO:
+#   python -m app.scripts.ingestion_worker
+#   python -m app.scripts.ingestion_worker --workers 4
+#   python -m app.scripts.ingestion_worker --once      # svuota la coda ed esce
+# =============================================================================
+
+import sys
+import os
+import time
+import socket
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+from app.services.ingestion import (
+    ensure_jobs_table,
+    run_once,
+    start_ingestion_workers,
+    stop_ingestion_workers,
+    get_workers_status,
+)
+from app.database_pg import close_pool
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker coda ingestion PDF")
+    parser.add_argument('--workers', type=int, default=2, help='Processi worker')
+    parser.add_argument('--once', action='store_true', help='Elabora i job pronti ed esce')
+    args = parser.parse_args()
+
+    if args.once:
+        ensure_jobs_table()
+        name = f"{socket.gethostname()}:{os.getpid()}:cli"
+        n = 0
+        while run_once(name):
+            n += 1
+        print(f"Job elaborati: {n}")
+        close_pool()
+        return
+
+    start_ingestion_workers(args.workers)
+    try:
+        while get_workers_status()['running']:
+            time.sleep(5)
+    except KeyboardInterrupt:
+        print("Arresto worker...")
+    finally:
+        stop_ingestion_workers()
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,10 @@
 # Script per migrare il database da v6.1 a v6.2
 # Aggiunge: colonne OPERATORI, colonne LOG_OPERAZIONI, tabella USER_SESSIONS
 #
+# v11.7: applica anche gli script PostgreSQL in migrations/ con DDL sulle
+# anagrafiche (lock esclusivo, tempi oltre PG_STATEMENT_TIMEOUT), non piu'
+# eseguiti all'avvio dell'applicazione.
+#
 # USO:
 #   python -m app.scripts.migrate_db
 #   python -m app.scripts.migrate_db --check  (solo verifica, non applica)
@@ -13,10 +17,13 @@
 import sys
 import os
 import argparse
+import pathlib
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(
     os.path.dirname(os.path.abspath(__file__)))))
 
+MIGRATIONS_DIR = pathlib.Path(__file__).parent.parent.parent / 'migrations'
+
 
 # =============================================================================
 # DEFINIZIONE MIGRAZIONI
@@ -181,6 +188,40 @@ MIGRATIONS = [
         "check": "SELECT 1 FROM sqlite_master WHERE type='index' AND name='idx_sessions_expires'",
         "sql": "CREATE INDEX IF NOT EXISTS idx_sessions_expires ON USER_SESSIONS(expires_at)"
     },
+
+    # -------------------------------------------------------------------------
+    # STEP 6 (v11.7): Script PostgreSQL in migrations/ ("file" al posto di "sql")
+    # -------------------------------------------------------------------------
+    {
+        "name": "TABLE anagrafica_versione",
+        "check": "SELECT 1 WHERE to_regclass('anagrafica_versione') IS NOT NULL",
+        "file": "v11_7_anagrafica_versione.sql"
+    },
+    {
+        "name": "anagrafiche min_id_norm / codice_sito_norm / piva_norm",
+        "check": """
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = current_schema()
+            AND column_name IN ('min_id_norm', 'codice_sito_norm', 'piva_norm')
+            HAVING COUNT(*) = 6
+        """,
+        "file": "v11_7_anagrafica_chiavi.sql"
+    },
+    {
+        "name": "pg_trgm anagrafiche chiave_fuzzy",
+        "check": """
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = current_schema() AND column_name = 'chiave_fuzzy'
+            AND table_name IN ('anagrafica_farmacie', 'anagrafica_parafarmacie')
+            HAVING COUNT(*) = 2
+        """,
+        "file": "v11_7_anagrafica_trigrammi.sql"
+    },
+    {
+        "name": "TABLE lookup_cache, lookup_cache_invalidazioni",
+        "check": "SELECT 1 WHERE to_regclass('lookup_cache_invalidazioni') IS NOT NULL",
+        "file": "v11_7_lookup_cache.sql"
+    },
 ]
 
 
@@ -197,8 +238,10 @@ def check_migration_needed(db, migration: dict) -> bool:
     """
     try:
         result = db.execute(migration["check"]).fetchone()
+        db.commit()
         return result is None  # Se None, la migrazione è necessaria
     except Exception:
+        db.rollback()
         return True  # In caso di errore, assumiamo sia necessaria
 
 
@@ -210,10 +253,14 @@ def apply_migration(db, migration: dict) -> bool:
         True se applicata con successo
     """
     try:
-        db.execute(migration["sql"])
+        if "file" in migration:
+            db.executescript((MIGRATIONS_DIR / migration["file"]).read_text(encoding='utf-8'))
+        else:
+            db.execute(migration["sql"])
         db.commit()
         return True
     except Exception as e:
+        db.rollback()
         print(f"  ❌ Errore: {e}")
         return False
 
@@ -231,6 +278,9 @@ def run_migrations(check_only: bool = False) -> int:
     from app.database_pg import get_db
 
     db = get_db()
+    # v11.7: nessun limite PG_STATEMENT_TIMEOUT per la sessione di migrazione
+    db.execute("SET statement_timeout = 0")
+    db.commit()
 
     print("=" * 60)
     print("SERV.O v6.2 - DATABASE MIGRATION")
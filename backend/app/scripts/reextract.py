@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# =============================================================================
+# SERV.O v11.7 - RI-ESTRAZIONE ORDINI DA ARTEFATTI
+# =============================================================================
+# Dopo la correzione di un estrattore: riesegue detect vendor ed estrattori
+# sulle acquisizioni gia' elaborate, rileggendo gli artefatti di estrazione
+# (ARTEFACT_DIR) invece dei PDF, e stampa le differenze rispetto agli ordini
+# salvati. Gli ordini non vengono modificati.
+#
+# Le acquisizioni senza artefatto vengono lette dal PDF in UPLOAD_DIR e
+# l'artefatto salvato, quindi la prima esecuzione sui PDF storici e' lenta
+# quanto un'elaborazione normale, le successive no.
+#
+# Esce con codice 1 se ci sono differenze o errori.
+#
+# USO:
+#   python -m app.scripts.reextract
+#   python -m app.scripts.reextract --vendor COOPER --limit 500
+#   python -m app.scripts.reextract --since-id 12000 --output /tmp/reextract.json
+# =============================================================================
+
+import sys
+import os
+import json
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+from app.services.ingestion import reextract, shutdown_extraction_pool
+from app.database_pg import close_pool
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ri-estrazione ordini da artefatti e confronto con il DB")
+    parser.add_argument('--vendor', help='Solo acquisizioni di questo vendor')
+    parser.add_argument('--limit', type=int, help='Numero massimo di acquisizioni')
+    parser.add_argument('--since-id', type=int, default=0, help='Solo id_acquisizione maggiori')
+    parser.add_argument('--show', type=int, default=50, help='Acquisizioni con differenze da stampare')
+    parser.add_argument('--output', help='Salva il risultato completo in JSON')
+    args = parser.parse_args()
+
+    try:
+        report = reextract(vendor=args.vendor, limit=args.limit, since_id=args.since_id,
+                           max_dettagli=max(args.show, 1000 if args.output else 0))
+    finally:
+        shutdown_extraction_pool()
+        close_pool()
+
+    for item in report['dettaglio'][:args.show]:
+        print(f"#{item['id_acquisizione']} {item['vendor'] or '-'} {item['file']}")
+        for diff in item['differenze']:
+            print(f"    {diff}")
+
+    print(f"Acquisizioni: {report['acquisizioni']} in {report['secondi']}s "
+          f"(da artefatto {report['da_artefatto']}, da PDF {report['da_pdf']}, "
+          f"estrazioni rilette dal PDF {report['pdf_riletti']})")
+    print(f"Identiche: {report['identiche']}  Differenti: {report['differenti']}  "
+          f"Errori: {report['errori']}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Risultato salvato in {args.output}")
+
+    sys.exit(1 if report['differenti'] or report['errori'] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,517 @@
+# =============================================================================
+# SERV.O v11.7 - CORPUS PDF SINTETICO PER VENDOR
+# =============================================================================
+# Genera PDF ordine sintetici con il layout atteso da ciascun estrattore in
+# services/extraction/vendors (testo a righe, tabelle con bordi, colonne a
+# coordinate X), con numero di pagine e righe configurabile.
+#
+# Ogni PDF e' accompagnato dal risultato atteso (vendor, ordini, codici AIC)
+# per verificare che l'estrazione resti corretta mentre se ne misura la
+# velocita' (bench_extraction.py, tests/test_synthetic_corpus.py).
+#
+# Il writer PDF e' minimale (font standard Helvetica, WinAnsiEncoding, linee)
+# per non aggiungere dipendenze: pdfplumber lo legge come un PDF reale.
+# =============================================================================
+
+import random
+from typing import Any, Callable, Dict, List, Tuple
+
+PAGE_A4 = (595, 842)
+PAGE_A4_LANDSCAPE = (842, 595)
+
+_MARGIN_BOTTOM = 40
+
+
+# =============================================================================
+# WRITER PDF MINIMALE
+# =============================================================================
+
+def _escape(text: str) -> bytes:
+    raw = text.encode('cp1252', errors='replace')
+    return raw.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+class SyntheticPage:
+    """Pagina PDF: testo e linee con coordinate dall'alto (come pdfplumber 'top')."""
+
+    def __init__(self, size: Tuple[int, int] = PAGE_A4):
+        self.width, self.height = size
+        self._ops: List[bytes] = []
+
+    def text(self, x: float, top: float, text: str, size: float = 9) -> None:
+        baseline = self.height - top - size
+        self._ops.append(b'BT /F1 %g Tf %g %g Td (' % (size, x, baseline) + _escape(text) + b') Tj ET')
+
+    def line(self, x0: float, top0: float, x1: float, top1: float) -> None:
+        self._ops.append(b'%g %g m %g %g l S' % (x0, self.height - top0, x1, self.height - top1))
+
+    def lines(self, x: float, top: float, texts: List[str], size: float = 9,
+              leading: float = 12) -> float:
+        """Scrive righe di testo una sotto l'altra; ritorna la coordinata successiva."""
+        for text in texts:
+            self.text(x, top, text, size)
+            top += leading
+        return top
+
+    def table(self, x: float, top: float, widths: List[float], rows: List[List[str]],
+              size: float = 7, row_height: float = 13) -> float:
+        """Tabella con bordi su ogni cella; ritorna la coordinata sotto la tabella."""
+        bottom = top + row_height * len(rows)
+        if bottom > self.height - _MARGIN_BOTTOM:
+            raise ValueError(f"Tabella di {len(rows)} righe oltre il fondo pagina: ridurre le righe")
+
+        right = x + sum(widths)
+        for i in range(len(rows) + 1):
+            self.line(x, top + i * row_height, right, top + i * row_height)
+        col_x = x
+        for width in widths + [0]:
+            self.line(col_x, top, col_x, bottom)
+            col_x += width
+
+        for i, row in enumerate(rows):
+            col_x = x
+            for width, cell in zip(widths, row):
+                if cell:
+                    self.text(col_x + 2, top + i * row_height + (row_height - size) / 2, cell, size)
+                col_x += width
+        return bottom
+
+    def content(self) -> bytes:
+        return b'0.5 w\n' + b'\n'.join(self._ops)
+
+
+class SyntheticPdf:
+    """Documento PDF multipagina serializzato con xref valida."""
+
+    def __init__(self):
+        self.pages: List[SyntheticPage] = []
+
+    def new_page(self, size: Tuple[int, int] = PAGE_A4) -> SyntheticPage:
+        page = SyntheticPage(size)
+        self.pages.append(page)
+        return page
+
+    def to_bytes(self) -> bytes:
+        n_pages = len(self.pages)
+        page_ids = [4 + 2 * i for i in range(n_pages)]
+        objects = [
+            b'<< /Type /Catalog /Pages 2 0 R >>',
+            b'<< /Type /Pages /Kids [' + b' '.join(b'%d 0 R' % i for i in page_ids)
+            + b'] /Count %d >>' % n_pages,
+            b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+        ]
+        for page_id, page in zip(page_ids, self.pages):
+            stream = page.content()
+            objects.append(
+                b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] '
+                b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>'
+                % (page.width, page.height, page_id + 1)
+            )
+            objects.append(b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream')
+
+        out = bytearray(b'%PDF-1.4\n')
+        offsets = []
+        for n, body in enumerate(objects, start=1):
+            offsets.append(len(out))
+            out += b'%d 0 obj\n' % n + body + b'\nendobj\n'
+        xref = len(out)
+        out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+        out += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+        out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+        return bytes(out)
+
+
+# =============================================================================
+# DATI SINTETICI
+# =============================================================================
+
+_PRINCIPI = ['PARACETAMOLO', 'IBUPROFENE', 'AMOXICILLINA', 'OMEPRAZOLO', 'CETIRIZINA',
+             'LORATADINA', 'DICLOFENAC', 'KETOPROFENE', 'PANTOPRAZOLO', 'SIMVASTATINA']
+_FORMATI = ['500MG 20CPR', '200MG 12CPR', '1G 10BUST', '10MG 30CPR', '20MG 14CPS', '2% GEL 50G']
+
+
+def _num(value: float) -> str:
+    """Numero in formato italiano con 2 decimali (es. 12,50)."""
+    return f"{value:.2f}".replace('.', ',')
+
+
+def _products(rng: random.Random, n: int, start: int = 0) -> List[Dict[str, Any]]:
+    products = []
+    for i in range(n):
+        prezzo = round(rng.uniform(2, 40), 2)
+        qty = rng.randint(1, 60)
+        sconto = round(rng.uniform(5, 40), 2)
+        netto = round(prezzo * (100 - sconto) / 100, 2)
+        products.append({
+            'n': start + i + 1,
+            'aic': f"0{rng.randint(10000000, 99999999)}",
+            'descrizione': f"{rng.choice(_PRINCIPI)} {rng.choice(_FORMATI)}",
+            'qty': qty,
+            'prezzo': prezzo,
+            'sconto': sconto,
+            'netto': netto,
+            'totale': round(netto * qty, 2),
+        })
+    return products
+
+
+def _expected(vendor: str, ordini: int, products: List[Dict]) -> Dict[str, Any]:
+    return {'vendor': vendor, 'ordini': ordini, 'aic': sorted(p['aic'] for p in products)}
+
+
+def _note_pages(pdf: SyntheticPdf, pages: int, rows: int, size=PAGE_A4) -> None:
+    """Pagine di condizioni generali (vendor con tabella prodotti solo a pagina 1)."""
+    for p in range(1, pages):
+        page = pdf.new_page(size)
+        page.lines(40, 40, [f"Condizioni generali di fornitura - pagina {p + 1}"] + [
+            f"{n + 1}. Le condizioni di vendita si applicano a tutte le forniture del periodo."
+            for n in range(rows)
+        ])
+
+
+# =============================================================================
+# LAYOUT PER VENDOR
+# =============================================================================
+# Ogni layout riceve (rng, pages, rows) dove rows = righe prodotto per pagina
+# e ritorna (pdf, atteso).
+
+def _layout_angelini(rng, pages, rows):
+    pdf, products = SyntheticPdf(), []
+    for p in range(pages):
+        page = pdf.new_page()
+        top = 40
+        if p == 0:
+            top = page.lines(40, top, [
+                "ANGELINI PHARMA S.p.A. - Conferma ordine ACRAF",
+                "Tipo ZT01 TransferOrder Num.2008372053 del 31.10.2025",
+                "Agente MARIO ROSSI Tipo ZT01 Area vendite Italia",
+                "Data consegna 05.11.2025",
+                "Cooperativa: 100123 SOFAD SRL",
+                "P.I. 01234567890 ID MIN 123456 CLDM 998877",
+                "Indirizzo spedizione",
+                "FARMACIA CENTRALE DR. BIANCHI",
+                "VIA ROMA 12",
+                "I-95026 ACITREZZA CT",
+            ])
+        top = page.lines(40, top + 6, [
+            "AIC/MINSAN Descrizione Materiale Quantita UM Prezzo listino % Sconto Prezzo netto % IVA Valore netto"
+        ], size=7)
+        righe = _products(rng, rows, len(products))
+        page.lines(40, top, [
+            f"{r['aic']} {r['descrizione']} {100000 + r['n']} {r['qty']} PZ {_num(r['prezzo'])} "
+            f"{_num(r['sconto'])}+1 {_num(r['netto'])} 10 {_num(r['totale'])}"
+            for r in righe
+        ], size=7, leading=11)
+        page.text(40, page.height - 30, f"Pagina {p + 1}", 7)
+        products += righe
+    return pdf, _expected('ANGELINI', 1, products)
+
+
+def _layout_chiesi(rng, pages, rows):
+    pdf, products = SyntheticPdf(), []
+    for p in range(pages):
+        page = pdf.new_page()
+        top = page.lines(40, 40, [
+            "CHIESI ITALIA S.p.A. - Via Palermo 26/A Parma - P.IVA 02944970348",
+            "Numero Ordine: O-1234567 del 12/11/2025",
+            "Cliente consegna FARMACIA CENTRALE",
+            "Indirizzo consegna VIA ROMA 12",
+            "Cap e Localita IT-20100 MILANO MI",
+            "P.IVA 01234567890",
+            "Agente MARIO ROSSI Codice 123",
+            "Dilazione 90R",
+            "AIC CODICE DESCRIZIONE DATA CONS. Q.TA Q.TA S.M. SCONTO PREZZO TOTALE",
+        ])
+        righe = _products(rng, rows, len(products))
+        page.lines(40, top, [
+            f"{r['aic']} CH{r['n']:05d} {r['descrizione']} 15/11/2025 {r['qty']} 0 "
+            f"{_num(r['sconto'])}% {_num(r['netto'])} {_num(r['totale'])}"
+            for r in righe
+        ], size=7, leading=11)
+        products += righe
+    return pdf, _expected('CHIESI', 1, products)
+
+
+def _layout_codifi(rng, pages, rows):
+    """Un cliente (ordine) per pagina: CODIFI e' multi-cliente."""
+    pdf, products = SyntheticPdf(), []
+    for p in range(pages):
+        page = pdf.new_page()
+        top = page.lines(40, 40, [
+            "TRANSFER ORDER - CODIFI S.r.l.",
+            "N.Ordine Data Ordine Data Delivery",
+            f"O-98765{p:02d} 12/11/2025 15/11/2025",
+            "Cod. Cliente P.IVA Rag. Sociale",
+            f"C1002{p} 01234567890 FARMACIA CENTRALE",
+            "Indirizzo Cliente Comune Provincia",
+            "VIA ROMA 12 MILANO Milano",
+            "AIC Cod.Prodotto Descrizione Quantita",
+        ])
+        righe = _products(rng, rows, len(products))
+        page.lines(40, top, [
+            f"{r['aic']} P{r['n']:05d} {r['descrizione']} {r['qty']}" for r in righe
+        ], size=7, leading=11)
+        products += righe
+    return pdf, _expected('CODIFI', pages, products)
+
+
+def _layout_doc_generici(rng, pages, rows):
+    pdf, products = SyntheticPdf(), []
+    for p in range(pages):
+        page = pdf.new_page()
+        top = page.lines(40, 40, [
+            "TRANSFER ORDER Num. 1234567890 DEL 12/11/2025",
+            "Grossista SOFAD SRL",
+            "Agente 12345 MARIO ROSSI",
+            "Farmacia FARMACIA CENTRALE P.IVA 01234567890",
+            "Ind.Fiscale Via ROMA 12",
+            "CAP 20100 Citta MILANO Prov. MI",
+            "Ind.Consegna Merce Via ROMA 12",
+            "CAP 20100 Citta MILANO Prov. MI",
+            "Telefono 02/1234567 Fax 02/1234568",
+            "COD. A.I.C. Prodotto Quantita Classe Condizione",
+        ])
+        righe = _products(rng, rows, len(products))
+        top = page.lines(40, top, [
+            f"{r['aic']} {r['descrizione'].split()[0]} DOC {r['descrizione'].split(' ', 1)[1]} "
+            f"{r['qty']} A-A ACCORDO TO"
+            for r in righe
+        ], size=7, leading=11)
+        products += righe
+        if p == pages - 1:
+            page.text(40, top + 6, f"Totale: {sum(r['qty'] for r in products)}", 8)
+        page.text(40, page.height - 30, f"Pagina {p + 1} di {pages}", 7)
+    return pdf, _expected('DOC_GENERICI', 1, products)
+
+
+def _layout_viatris(rng, pages, rows):
+    pdf, products = SyntheticPdf(), []
+    for p in range(pages):
+        page = pdf.new_page()
+        top = 40
+        if p == 0:
+            top = page.lines(40, top, [
+                "VIATRIS ITALIA S.R.L. - ACCESS LEADERSHIP PARTNERSHIP",
+                "TRANSFER ORDER OR1234567",
+                "AGENTE MARIO ROSSI AREA NORD DATA 12/11/2025",
+                "DENOMINAZIONE SOCIALE FARMACIA CENTRALE",
+                "P.IVA IT01234567890",
+                "CAP 20100 CITTA MILANO PROV. MI",
+                "DESTINAZIONE MERCE",
+                "NOME FARMACIA CENTRALE TRACC. F123456",
+                "INDIRIZZO VIA ROMA 12 TEL. 021234567",
+                "CAP 20100 CITTA MILANO PROV. MI",
+            ])
+        top = page.lines(40, top + 6, [
+            "DESCRIZIONE PP PP.NETTO Q.TA SC.MER SC.NET% P.CESS.UNIT P.CESS.TOT DATA CONS."
+        ], size=7)
+        righe = _products(rng, rows, len(products))
+        for r in righe:
+            top = page.lines(40, top, [
+                f"{r['descrizione']} {_num(r['prezzo'])} € {_num(r['prezzo'] * 0.9)} € {r['qty']} 0 "
+                f"{_num(r['sconto'])}% {_num(r['netto'])} € {_num(r['totale'])} € 15/11/2025",
+                f"AIC: {r['aic']}",
+            ], size=7, leading=11)
+        products += righe
+    return pdf, _expected('VIATRIS', 1, products)
+
+
+def _layout_opella(rng, pages, rows):
+    """Tabella a una colonna e destinatario a destra (X >= 300) a pagina 1."""
+    pdf = SyntheticPdf()
+    page = pdf.new_page()
+    page.lines(40, 30, ["Pagina n. 1 / 1", "INFORMAZIONI SULL'ORDINE 1071429604 12.11.2025"])
+    left = ["Opella HC Italy Srl a Socio Unico", "Viale Luigi Bodio 37/B", "20158 Milano, MI, Italia",
+            "Partita IVA: IT13445820155"]
+    right = ["Il tuo ordine e stato elaborato.", "Numero ordine cliente: 05416197",
+             "Data: 12.11.2025", "Termini di pagamento: 90 gg data fattura"]
+    page.lines(40, 60, left)
+    page.lines(320, 60, right)
+    page.text(40, 120, "GROSSISTA")
+    page.text(320, 120, "DESTINATARIO DELLA MERCE")
+    page.lines(40, 132, ["100156382", "SOFAD SRL", "VIA COM. ECONOMICA EUROPEA 31", "95045 MISTERBIANCO CT", "IT"])
+    page.lines(320, 132, ["170005053", "F.CIA SALUTE E BENESSERE", "VIA SP 56 54", "95032 BELPASSO CT", "IT"])
+
+    products = _products(rng, rows)
+    page.table(40, 200, [515], [["Item n. Prodotto Descrizione Quantita UdM PU Prezzo netto"]] + [
+        [f"{r['n'] * 10} {int(r['aic'])} {r['descrizione']} {r['qty']} UNT {_num(r['prezzo'])} "
+         f"{_num(r['prezzo'] * r['qty'])}"]
+        for r in products
+    ])
+    _note_pages(pdf, pages, rows)
+    return pdf, _expected('OPELLA', 1, products)
+
+
+def _layout_menarini(rng, pages, rows):
+    """Un ordine per pagina con tabella prodotti a 9 colonne."""
+    pdf, products = SyntheticPdf(), []
+    for p in range(pages):
+        page = pdf.new_page()
+        top = page.lines(40, 40, [
+            "A. MENARINI INDUSTRIE FARMACEUTICHE RIUNITE S.r.l.",
+            f"Ordine N.: 45001{p:05d}",
+            "Cliente FARMACIA CENTRALE Cod. Cliente 12345",
+            "Partita IVA 01234567890",
+            "Indirizzo VIA ROMA 12 CAP 20100",
+            "Città MILANO Provincia MI",
+            "Rep MARIO ROSSI Tipo Ordine DIRETTO",
+            "Data Ordine 12/11/2025 Data Consegna 15/11/2025",
+            "Pagamento 90 GG",
+        ])
+        righe = _products(rng, rows, len(products))
+        page.table(30, top + 10, [170, 55, 30, 45, 45, 30, 30, 55, 60],
+                   [["Prodotto", "Cod. Min.", "Qta", "Prezzo", "Sconto", "SM", "OM", "P. Netto", "Tot. Netto"]] + [
+                       [r['descrizione'], r['aic'], str(r['qty']), _num(r['prezzo']), f"{_num(r['sconto'])}%",
+                        "--", "--", _num(r['netto']), _num(r['totale'])]
+                       for r in righe
+                   ] + [["Totale", "", "", "", "", "", "", "", _num(sum(r['totale'] for r in righe))]])
+        products += righe
+    return pdf, _expected('MENARINI', pages, products)
+
+
+def _layout_cooper(rng, pages, rows):
+    pdf, products = SyntheticPdf(), []
+    for p in range(pages):
+        page = pdf.new_page(PAGE_A4_LANDSCAPE)
+        top = 30
+        if p == 0:
+            top = page.lines(40, top, [
+                "COOPER CONSUMER HEALTH IT S.R.L.",
+                "Codice Ordine: BRETAM-PAD-000296/01",
+                "Data Ordine: 12/11/2025",
+                "Data di consegna prevista: 15/11/2025",
+                "Agente: ROSSI Telefono: 021234567",
+                "Dati Spedizione",
+                "Codice Ministeriale: 123456",
+                "Ragione Sociale: FARMACIA CENTRALE",
+                "Partita IVA: 01234567890",
+                "Indirizzo: VIA ROMA 12",
+                "CAP: 20100",
+                "Località: MILANO (MI)",
+            ], size=8, leading=10)
+        righe = _products(rng, rows, len(products))
+        page.table(40, top + 8, [50, 60, 170, 60, 35, 35, 45, 55, 55, 50, 65, 65],
+                   [["Codice", "Codice Aic", "Prodotto", "Formato", "Fascia", "IVA", "Imballo",
+                     "Q.tà vendita", "Sc. merce", "Sconto (%)", "Prezzo Totale", "Prezzo Unit."]] + [
+                       [f"CO{r['n']:04d}", r['aic'], r['descrizione'], "BLISTER", "C", "10", "6",
+                        str(r['qty']), "0", _num(r['sconto']), _num(r['totale']), _num(r['netto'])]
+                       for r in righe
+                   ])
+        products += righe
+    return pdf, _expected('COOPER', 1, products)
+
+
+def _layout_reckitt(rng, pages, rows):
+    pdf, products = SyntheticPdf(), []
+    for p in range(pages):
+        page = pdf.new_page(PAGE_A4_LANDSCAPE)
+        top = page.lines(40, 30, [
+            "Reckitt Benckiser Healthcare (Italia) S.p.A. - IT04 - HEALTHCARE",
+            "SO1234567890_01 12-11-2025",
+        ])
+        if p == 0:
+            top = page.table(40, top + 4, [120, 100, 420], [
+                ["Ordine", "Transfer Order", ""],
+                ["Data consegna", "15-11-2025",
+                 "Cliente : FARMACIA CENTRALE (1000053731) VIA ROMA 12, MILANO, MI, 20100"],
+            ])
+        righe = _products(rng, rows, len(products))
+        page.table(40, top + 8, [55, 170, 35, 50, 45, 45, 40, 30, 70, 55, 60, 70],
+                   [["Cod. Art.", "Descr. Articolo", "Qta", "Listino", "1 Col", "2 Col", "Cassa", "SM",
+                     "Data Consegna", "Netto U", "Netto", "Cod AIC"]] + [
+                       [str(3000000 + r['n']), r['descrizione'], str(r['qty']), _num(r['prezzo']),
+                        _num(r['sconto']), "0,00", "0,00", "0", "15-11-2025", _num(r['netto']),
+                        _num(r['totale']), r['aic']]
+                       for r in righe
+                   ])
+        page.text(40, page.height - 30, f"Pagina {p + 1} di {pages}", 7)
+        products += righe
+    return pdf, _expected('RECKITT', 1, products)
+
+
+def _layout_bayer(rng, pages, rows):
+    """Tabella prodotti con colonne data consegna a pagina 1."""
+    pdf = SyntheticPdf()
+    page = pdf.new_page()
+    top = page.lines(40, 30, [
+        "BAYER S.p.A. - Consumer Health",
+        "IT25O-12345",
+        "NUM. PROP. D'ORDINE",
+        "12/11/2025",
+        "DATA ACQUISIZIONE",
+        "COOPERATIVA/ GROSSISTA (SAP: 100123)",
+        "SOFAD SRL",
+        "FARMACIA (SAP: 200456)",
+        "FARMACIA CENTRALE",
+        "P.IVA: 01234567890",
+        "CLIENTE",
+        "VIA ROMA 12",
+        "20100 MILANO",
+        "(MI)",
+        "COLLABORATORE MARIO ROSSI",
+        "CONSEGNE",
+    ], size=8, leading=10)
+    products = _products(rng, rows)
+    page.table(30, top + 6, [200, 45, 55, 40, 40, 50, 50, 55],
+               [["ARTICOLO", "Q.ta Vend.", "Prezzo", "Q.ta MS", "MS Extra", "5 nov 2025", "26 nov 2025",
+                 "PAGAMENTO"]] + [
+                   [f"{r['aic']} {r['descrizione']}", str(r['qty']), f"€ {_num(r['netto'])}", "", "",
+                    str(r['qty']), "", "60 gg"]
+                   for r in products
+               ])
+    _note_pages(pdf, pages, rows)
+    return pdf, _expected('BAYER', 1, products)
+
+
+LAYOUTS: Dict[str, Callable] = {
+    'ANGELINI': _layout_angelini,
+    'BAYER': _layout_bayer,
+    'CHIESI': _layout_chiesi,
+    'CODIFI': _layout_codifi,
+    'COOPER': _layout_cooper,
+    'DOC_GENERICI': _layout_doc_generici,
+    'MENARINI': _layout_menarini,
+    'OPELLA': _layout_opella,
+    'RECKITT': _layout_reckitt,
+    'VIATRIS': _layout_viatris,
+}
+
+
+def generate_pdf(vendor: str, pages: int = 1, rows: int = 10, seed: int = 0) -> Tuple[bytes, Dict[str, Any]]:
+    """
+    Genera un PDF sintetico per il vendor.
+
+    Args:
+        vendor: Codice vendor (chiave di LAYOUTS)
+        pages: Numero di pagine
+        rows: Righe prodotto per pagina. OPELLA e BAYER hanno la tabella
+              solo a pagina 1 (le altre pagine sono condizioni generali)
+        seed: Seme per dati riproducibili
+
+    Returns:
+        Tuple (contenuto PDF, atteso) con atteso = {vendor, ordini, aic}
+    """
+    pdf, expected = LAYOUTS[vendor](random.Random(f"{vendor}:{seed}"), pages, rows)
+    expected['pagine'] = pages
+    return pdf.to_bytes(), expected
+
+
+def check_extraction(expected: Dict[str, Any], data: Dict[str, Any]) -> List[str]:
+    """
+    Confronta il risultato di extract_pdf_data con l'atteso.
+
+    Returns:
+        Lista differenze (vuota se l'estrazione e' corretta)
+    """
+    errors = []
+    if data.get('errore_testo') or data.get('errore_estrattore'):
+        return [data.get('errore_testo') or data.get('errore_estrattore')]
+    if data['vendor'] != expected['vendor']:
+        errors.append(f"vendor {data['vendor']} invece di {expected['vendor']}")
+    orders = data.get('orders_data') or []
+    if len(orders) != expected['ordini']:
+        errors.append(f"{len(orders)} ordini invece di {expected['ordini']}")
+    aic = sorted(r.get('codice_aic') for o in orders for r in o.get('righe', []))
+    if aic != expected['aic']:
+        errors.append(f"{len(aic)} righe/AIC estratte, attese {len(expected['aic'])}")
+    return errors
@@ -17,7 +17,8 @@ except ImportError:
     PANDAS_AVAILABLE = False
     print("⚠️ pandas non disponibile - import CSV disabilitato")
 
-from ...database_pg import get_db, log_operation
+from ...database_pg import get_db, log_operation, bulk_upsert
+from ..lookup.index import anagrafica_changed
 
 
 # =============================================================================
@@ -156,6 +157,7 @@ def import_anagrafica_farmacie(
                 result['ultimo_errore'] = str(e)
         
         db.commit()
+        anagrafica_changed()
         
         # Totale in DB
         result['totale_db'] = db.execute(
@@ -328,6 +330,7 @@ def import_anagrafica_parafarmacie(
                 result['ultimo_errore'] = str(e)
 
         db.commit()
+        anagrafica_changed()
         
         # Totale in DB
         result['totale_db'] = db.execute(
@@ -513,7 +516,7 @@ def get_farmacia_by_piva(piva: str) -> List[Dict]:
     
     rows = db.execute("""
         SELECT * FROM ANAGRAFICA_FARMACIE 
-        WHERE LTRIM(REPLACE(COALESCE(partita_iva,''), ' ', ''), '0') = ?
+        WHERE piva_norm = ?
         AND attiva = TRUE
     """, (piva_norm,)).fetchall()
     
@@ -530,6 +533,7 @@ def clear_anagrafica_farmacie() -> int:
     count = db.execute("SELECT COUNT(*) FROM ANAGRAFICA_FARMACIE").fetchone()[0]
     db.execute("DELETE FROM ANAGRAFICA_FARMACIE")
     db.commit()
+    anagrafica_changed()
     log_operation('CLEAR_FARMACIE', 'ANAGRAFICA_FARMACIE', None,
                  f"Eliminate {count} farmacie")
     return count
@@ -541,6 +545,7 @@ def clear_anagrafica_parafarmacie() -> int:
     count = db.execute("SELECT COUNT(*) FROM ANAGRAFICA_PARAFARMACIE").fetchone()[0]
     db.execute("DELETE FROM ANAGRAFICA_PARAFARMACIE")
     db.commit()
+    anagrafica_changed()
     log_operation('CLEAR_PARAFARMACIE', 'ANAGRAFICA_PARAFARMACIE', None,
                  f"Eliminate {count} parafarmacie")
     return count
@@ -550,6 +555,14 @@ def clear_anagrafica_parafarmacie() -> int:
 # IMPORT CLIENTI (v9.4)
 # =============================================================================
 
+# Colonne scritte dall'import clienti (ordine delle tuple riga)
+CLIENTI_COLUMNS = (
+    'codice_cliente', 'ragione_sociale_1', 'ragione_sociale_2', 'indirizzo', 'cap',
+    'localita', 'provincia', 'partita_iva', 'email', 'farmacia_categoria',
+    'codice_farmacia', 'farma_status', 'codice_pagamento', 'min_id', 'deposito_riferimento',
+)
+
+
 def import_anagrafica_clienti(
     csv_path: str = None,
     csv_content: bytes = None,
@@ -646,7 +659,9 @@ def import_anagrafica_clienti(
         # Contatori debug
         result['skip_empty_codice'] = 0
 
-        # Import righe
+        # Import righe (v11.7: raccolte e scritte con un solo bulk_upsert
+        # su codice_cliente invece di SELECT + UPDATE/INSERT per riga)
+        righe = []
         for _, row in df.iterrows():
             try:
                 codice = get_col(row, 'codice_cliente')
@@ -654,84 +669,40 @@ def import_anagrafica_clienti(
                     result['skip_empty_codice'] += 1
                     continue
 
-                # Verifica se esiste già
-                existing = db.execute(
-                    "SELECT id_cliente FROM anagrafica_clienti WHERE codice_cliente = ?",
-                    (codice,)
-                ).fetchone()
-
-                if existing:
-                    # Update (v11.2: nomi colonne corretti, aggiorna anche data_import)
-                    db.execute("""
-                        UPDATE anagrafica_clienti SET
-                            ragione_sociale_1 = ?,
-                            ragione_sociale_2 = ?,
-                            indirizzo = ?,
-                            cap = ?,
-                            localita = ?,
-                            provincia = ?,
-                            partita_iva = ?,
-                            email = ?,
-                            farmacia_categoria = ?,
-                            codice_farmacia = ?,
-                            farma_status = ?,
-                            codice_pagamento = ?,
-                            min_id = ?,
-                            deposito_riferimento = ?,
-                            data_import = CURRENT_TIMESTAMP,
-                            data_aggiornamento = CURRENT_TIMESTAMP
-                        WHERE codice_cliente = ?
-                    """, (
-                        get_col(row, 'ragione_sociale_1')[:100] or None,
-                        get_col(row, 'ragione_sociale_2')[:100] or None,
-                        get_col(row, 'indirizzo')[:200] or None,
-                        get_col(row, 'cap')[:10] or None,
-                        get_col(row, 'localita')[:100] or None,
-                        get_col(row, 'provincia')[:3] or None,
-                        get_col(row, 'partita_iva')[:16] or None,
-                        get_col(row, 'email')[:200] or None,
-                        get_col(row, 'farmacia_categoria')[:10] or None,
-                        get_col(row, 'codice_farmacia')[:20] or None,
-                        get_col(row, 'farma_status')[:10] or None,
-                        get_col(row, 'codice_pagamento')[:10] or None,
-                        get_col(row, 'min_id')[:20] or None,
-                        get_col(row, 'deposito_riferimento')[:10] or None,
-                        codice
-                    ))
-                    result['aggiornati'] += 1
-                else:
-                    # Insert (v11.2: nomi colonne corretti, imposta data_import)
-                    db.execute("""
-                        INSERT INTO anagrafica_clienti
-                        (codice_cliente, ragione_sociale_1, ragione_sociale_2, indirizzo, cap,
-                         localita, provincia, partita_iva, email, farmacia_categoria,
-                         codice_farmacia, farma_status, codice_pagamento, min_id, deposito_riferimento,
-                         data_import)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-                    """, (
-                        codice,
-                        get_col(row, 'ragione_sociale_1')[:100] or None,
-                        get_col(row, 'ragione_sociale_2')[:100] or None,
-                        get_col(row, 'indirizzo')[:200] or None,
-                        get_col(row, 'cap')[:10] or None,
-                        get_col(row, 'localita')[:100] or None,
-                        get_col(row, 'provincia')[:3] or None,
-                        get_col(row, 'partita_iva')[:16] or None,
-                        get_col(row, 'email')[:200] or None,
-                        get_col(row, 'farmacia_categoria')[:10] or None,
-                        get_col(row, 'codice_farmacia')[:20] or None,
-                        get_col(row, 'farma_status')[:10] or None,
-                        get_col(row, 'codice_pagamento')[:10] or None,
-                        get_col(row, 'min_id')[:20] or None,
-                        get_col(row, 'deposito_riferimento')[:10] or None,
-                    ))
-                    result['importate'] += 1
+                righe.append((
+                    codice,
+                    get_col(row, 'ragione_sociale_1')[:100] or None,
+                    get_col(row, 'ragione_sociale_2')[:100] or None,
+                    get_col(row, 'indirizzo')[:200] or None,
+                    get_col(row, 'cap')[:10] or None,
+                    get_col(row, 'localita')[:100] or None,
+                    get_col(row, 'provincia')[:3] or None,
+                    get_col(row, 'partita_iva')[:16] or None,
+                    get_col(row, 'email')[:200] or None,
+                    get_col(row, 'farmacia_categoria')[:10] or None,
+                    get_col(row, 'codice_farmacia')[:20] or None,
+                    get_col(row, 'farma_status')[:10] or None,
+                    get_col(row, 'codice_pagamento')[:10] or None,
+                    get_col(row, 'min_id')[:20] or None,
+                    get_col(row, 'deposito_riferimento')[:10] or None,
+                ))
 
             except Exception as e:
                 result['errori'] += 1
                 result['ultimo_errore'] = str(e)
 
+        if righe:
+            result['importate'], result['aggiornati'] = bulk_upsert(
+                'anagrafica_clienti', CLIENTI_COLUMNS, righe,
+                conflict_columns=('codice_cliente',),
+                extra_values={'data_import': 'CURRENT_TIMESTAMP'},
+                update_extra={'data_aggiornamento': 'CURRENT_TIMESTAMP'},
+                db=db,
+            )
+
         db.commit()
+        # v11.7: deposito dei risultati in cache lookup non piu' valido
+        anagrafica_changed()
 
         # Totale in DB
         result['totale_db'] = db.execute(
@@ -793,6 +764,7 @@ def clear_anagrafica_clienti() -> int:
     count = db.execute("SELECT COUNT(*) FROM anagrafica_clienti").fetchone()[0]
     db.execute("DELETE FROM anagrafica_clienti")
     db.commit()
+    anagrafica_changed()
     log_operation('CLEAR_CLIENTI', 'ANAGRAFICA_CLIENTI', None,
                  f"Eliminati {count} clienti")
     return count
@@ -871,7 +843,7 @@ def revisiona_ordini_deposito_mancante() -> Dict[str, Any]:
                 cliente = db.execute("""
                     SELECT deposito_riferimento, partita_iva, min_id, ragione_sociale_1
                     FROM anagrafica_clienti
-                    WHERE partita_iva = %s AND LTRIM(min_id, '0') = %s
+                    WHERE partita_iva = %s AND min_id_norm = %s
                       AND deposito_riferimento IS NOT NULL
                       AND deposito_riferimento != ''
                     LIMIT 1
@@ -884,7 +856,7 @@ def revisiona_ordini_deposito_mancante() -> Dict[str, Any]:
                 cliente = db.execute("""
                     SELECT deposito_riferimento, partita_iva, min_id, ragione_sociale_1
                     FROM anagrafica_clienti
-                    WHERE LTRIM(min_id, '0') = %s
+                    WHERE min_id_norm = %s
                       AND deposito_riferimento IS NOT NULL
                       AND deposito_riferimento != ''
                     LIMIT 1
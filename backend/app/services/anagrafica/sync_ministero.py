@@ -18,7 +18,8 @@ from typing import Dict, Any, Optional, Tuple, List
 from dataclasses import dataclass, field
 from enum import Enum
 
-from ...database_pg import get_db, log_operation
+from ...database_pg import get_db, log_operation, bulk_upsert, bulk_update
+from ..lookup.index import anagrafica_changed
 
 
 # =============================================================================
@@ -329,6 +330,12 @@ def normalize_piva(piva: str) -> str:
 # SYNC FARMACIE
 # =============================================================================
 
+# Colonne scritte dalla sync (ordine delle tuple riga per bulk_update/bulk_upsert)
+FARMACIE_COLUMNS = (
+    'min_id', 'partita_iva', 'ragione_sociale', 'indirizzo', 'cap', 'citta',
+    'provincia', 'regione', 'codice_farmacia_asl', 'data_inizio_validita', 'fonte_dati',
+)
+
 def parse_farmacie_json(content: bytes) -> list:
     """Parsa JSON farmacie e filtra solo record attivi."""
     # Decodifica esplicita UTF-8 con gestione BOM
@@ -343,6 +350,18 @@ def build_min_id(record: dict) -> str:
     return str(cod_farmacia).strip().zfill(9)
 
 
+def _codici_modificati(existing: Dict[str, Dict], righe_aggiornate: List[tuple],
+                       righe_nuove: List[tuple], chiuse: List[str]) -> Tuple[List[str], List[str]]:
+    """
+    v11.7: codici (MIN_ID / codice sito) e P.IVA, vecchie e nuove, delle righe
+    aggiornate, nuove e chiuse: invalidano la cache lookup per quei codici.
+    """
+    codici = [riga[0] for riga in righe_aggiornate + righe_nuove] + list(chiuse)
+    partite_iva = [riga[1] for riga in righe_aggiornate + righe_nuove]
+    partite_iva += [existing[codice]['partita_iva'] for codice in codici if codice in existing]
+    return codici, partite_iva
+
+
 def sync_farmacie(
     force_download: bool = False,
     target_date: date = None,
@@ -423,6 +442,9 @@ def sync_farmacie(
 
     json_ids = set()
     fonte = f"SYNC_{target_date.strftime('%Y%m%d')}"
+    # v11.7: righe raccolte e scritte in blocco (COPY) a fine ciclo
+    righe_aggiornate = []
+    righe_nuove = []
 
     for record in records:
         try:
@@ -461,50 +483,53 @@ def sync_farmacie(
                 )
 
                 if changed:
-                    db.execute("""
-                        UPDATE anagrafica_farmacie SET
-                            partita_iva = %s, ragione_sociale = %s, indirizzo = %s,
-                            cap = %s, citta = %s, provincia = %s, regione = %s,
-                            codice_farmacia_asl = %s, data_inizio_validita = %s,
-                            fonte_dati = %s, data_import = CURRENT_TIMESTAMP
-                        WHERE min_id = %s
-                    """, (piva, ragione_sociale, indirizzo, cap, citta, provincia,
-                          regione, cod_farmacia_asl, data_inizio, fonte, min_id))
+                    righe_aggiornate.append((
+                        min_id, piva, ragione_sociale, indirizzo, cap, citta, provincia,
+                        regione, cod_farmacia_asl, data_inizio, fonte
+                    ))
                     result.aggiornate += 1
                 else:
                     result.invariate += 1
             else:
-                # Usa ON CONFLICT per evitare che errori singoli rompano la transazione
-                cursor = db.execute("""
-                    INSERT INTO anagrafica_farmacie
-                    (min_id, partita_iva, ragione_sociale, indirizzo, cap, citta,
-                     provincia, regione, codice_farmacia_asl, data_inizio_validita,
-                     attiva, fonte_dati, data_import)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, TRUE, %s, CURRENT_TIMESTAMP)
-                    ON CONFLICT (min_id) DO NOTHING
-                """, (min_id, piva, ragione_sociale, indirizzo, cap, citta,
-                      provincia, regione, cod_farmacia_asl, data_inizio, fonte))
-                # rowcount = 1 se inserito, 0 se conflitto (record già esistente)
-                if cursor.rowcount > 0:
-                    result.nuove += 1
-                else:
-                    # Record esiste già nel DB ma non era in existing (inconsistenza)
-                    result.errori += 1
+                righe_nuove.append((
+                    min_id, piva, ragione_sociale, indirizzo, cap, citta, provincia,
+                    regione, cod_farmacia_asl, data_inizio, fonte
+                ))
 
         except Exception as e:
             result.errori += 1
 
+    if righe_aggiornate:
+        bulk_update(
+            'anagrafica_farmacie', FARMACIE_COLUMNS, righe_aggiornate,
+            key_columns=('min_id',),
+            extra_values={'data_import': 'CURRENT_TIMESTAMP'},
+            db=db,
+        )
+    if righe_nuove:
+        # ON CONFLICT DO NOTHING: un min_id gia' presente nel DB ma non tra gli
+        # attivi (inconsistenza) non viene inserito e conta come errore
+        inserite, _ = bulk_upsert(
+            'anagrafica_farmacie', FARMACIE_COLUMNS, righe_nuove,
+            conflict_columns=('min_id',), update_columns=[],
+            extra_values={'attiva': 'TRUE', 'data_import': 'CURRENT_TIMESTAMP'},
+            db=db,
+        )
+        result.nuove += inserite
+        result.errori += len(righe_nuove) - inserite
+
     # Marca chiuse
-    for min_id in existing.keys():
-        if min_id not in json_ids:
-            db.execute("""
-                UPDATE anagrafica_farmacie
-                SET attiva = FALSE, data_fine_validita = CURRENT_DATE, fonte_dati = %s
-                WHERE min_id = %s AND attiva = TRUE
-            """, (f"CHIUSA_{fonte}", min_id))
-            result.chiuse += 1
+    chiuse = [min_id for min_id in existing.keys() if min_id not in json_ids]
+    if chiuse:
+        db.execute("""
+            UPDATE anagrafica_farmacie
+            SET attiva = FALSE, data_fine_validita = CURRENT_DATE, fonte_dati = %s
+            WHERE min_id = ANY(%s) AND attiva = TRUE
+        """, (f"CHIUSA_{fonte}", chiuse))
+        result.chiuse += len(chiuse)
 
     db.commit()
+    anagrafica_changed(*_codici_modificati(existing, righe_aggiornate, righe_nuove, chiuse))
     save_sync_state(tipo, new_etag, last_modified, url, len(records))
 
     result.totale_db = db.execute(
@@ -525,6 +550,14 @@ def sync_farmacie(
 # SYNC PARAFARMACIE
 # =============================================================================
 
+# Colonne scritte dalla sync (ordine delle tuple riga per bulk_update/bulk_upsert)
+PARAFARMACIE_COLUMNS = (
+    'codice_sito', 'partita_iva', 'sito_logistico', 'indirizzo', 'cap', 'citta',
+    'provincia', 'regione', 'codice_comune', 'codice_provincia', 'codice_regione',
+    'data_inizio_validita', 'latitudine', 'longitudine', 'fonte_dati',
+)
+
+
 def parse_parafarmacie_json(content: bytes) -> list:
     """Parsa JSON parafarmacie e filtra solo record attivi."""
     # Decodifica esplicita UTF-8 con gestione BOM
@@ -613,6 +646,9 @@ def sync_parafarmacie(
 
     json_ids = set()
     fonte = f"SYNC_{target_date.strftime('%Y%m%d')}"
+    # v11.7: righe raccolte e scritte in blocco (COPY) a fine ciclo
+    righe_aggiornate = []
+    righe_nuove = []
 
     for record in records:
         try:
@@ -655,53 +691,53 @@ def sync_parafarmacie(
                 )
 
                 if changed:
-                    db.execute("""
-                        UPDATE anagrafica_parafarmacie SET
-                            partita_iva = %s, sito_logistico = %s, indirizzo = %s,
-                            cap = %s, citta = %s, provincia = %s, regione = %s,
-                            codice_comune = %s, codice_provincia = %s, codice_regione = %s,
-                            data_inizio_validita = %s, latitudine = %s, longitudine = %s,
-                            fonte_dati = %s, data_import = CURRENT_TIMESTAMP
-                        WHERE codice_sito = %s
-                    """, (piva, sito_logistico, indirizzo, cap, citta, provincia, regione,
-                          codice_comune, codice_provincia, codice_regione, data_inizio,
-                          latitudine, longitudine, fonte, codice_sito))
+                    righe_aggiornate.append((
+                        codice_sito, piva, sito_logistico, indirizzo, cap, citta, provincia,
+                        regione, codice_comune, codice_provincia, codice_regione, data_inizio,
+                        latitudine, longitudine, fonte
+                    ))
                     result.aggiornate += 1
                 else:
                     result.invariate += 1
             else:
-                # Usa ON CONFLICT per evitare che errori singoli rompano la transazione
-                cursor = db.execute("""
-                    INSERT INTO anagrafica_parafarmacie
-                    (codice_sito, partita_iva, sito_logistico, indirizzo, cap, citta,
-                     provincia, regione, codice_comune, codice_provincia, codice_regione,
-                     data_inizio_validita, latitudine, longitudine, attiva, fonte_dati, data_import)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, TRUE, %s, CURRENT_TIMESTAMP)
-                    ON CONFLICT (codice_sito) DO NOTHING
-                """, (codice_sito, piva, sito_logistico, indirizzo, cap, citta, provincia,
-                      regione, codice_comune, codice_provincia, codice_regione, data_inizio,
-                      latitudine, longitudine, fonte))
-                # rowcount = 1 se inserito, 0 se conflitto (record già esistente)
-                if cursor.rowcount > 0:
-                    result.nuove += 1
-                else:
-                    # Record esiste già nel DB ma non era in existing (inconsistenza)
-                    result.errori += 1
+                righe_nuove.append((
+                    codice_sito, piva, sito_logistico, indirizzo, cap, citta, provincia,
+                    regione, codice_comune, codice_provincia, codice_regione, data_inizio,
+                    latitudine, longitudine, fonte
+                ))
 
         except Exception as e:
             result.errori += 1
 
+    if righe_aggiornate:
+        bulk_update(
+            'anagrafica_parafarmacie', PARAFARMACIE_COLUMNS, righe_aggiornate,
+            key_columns=('codice_sito',),
+            extra_values={'data_import': 'CURRENT_TIMESTAMP'},
+            db=db,
+        )
+    if righe_nuove:
+        inserite, _ = bulk_upsert(
+            'anagrafica_parafarmacie', PARAFARMACIE_COLUMNS, righe_nuove,
+            conflict_columns=('codice_sito',), update_columns=[],
+            extra_values={'attiva': 'TRUE', 'data_import': 'CURRENT_TIMESTAMP'},
+            db=db,
+        )
+        result.nuove += inserite
+        result.errori += len(righe_nuove) - inserite
+
     # Marca chiuse
-    for codice_sito in existing.keys():
-        if codice_sito not in json_ids:
-            db.execute("""
-                UPDATE anagrafica_parafarmacie
-                SET attiva = FALSE, data_fine_validita = CURRENT_DATE, fonte_dati = %s
-                WHERE codice_sito = %s AND attiva = TRUE
-            """, (f"CHIUSA_{fonte}", codice_sito))
-            result.chiuse += 1
+    chiuse = [codice_sito for codice_sito in existing.keys() if codice_sito not in json_ids]
+    if chiuse:
+        db.execute("""
+            UPDATE anagrafica_parafarmacie
+            SET attiva = FALSE, data_fine_validita = CURRENT_DATE, fonte_dati = %s
+            WHERE codice_sito = ANY(%s) AND attiva = TRUE
+        """, (f"CHIUSA_{fonte}", chiuse))
+        result.chiuse += len(chiuse)
 
     db.commit()
+    anagrafica_changed(*_codici_modificati(existing, righe_aggiornate, righe_nuove, chiuse))
     save_sync_state(tipo, new_etag, last_modified, url, len(records))
 
     result.totale_db = db.execute(
@@ -76,7 +76,8 @@ def get_ordini_pronti_export() -> List[Dict]:
     - Con lookup valido
     """
     db = get_db()
-    rows = db.execute("""
+    # v11.7: cursor server-side, senza lista intermedia di HybridRow
+    return [row._asdict() for row in db.iter_rows("""
         SELECT
             id_testata,
             vendor,
@@ -93,8 +94,7 @@ def get_ordini_pronti_export() -> List[Dict]:
         WHERE stato = 'ESTRATTO'
         AND (lookup_method IS NULL OR lookup_method != 'NESSUNO')
         ORDER BY stato DESC, vendor, numero_ordine_vendor
-    """).fetchall()
-    return [dict(row) for row in rows]
+    """)]
 
 
 def get_esportazioni_storico(limit: int = 20) -> List[Dict]:
@@ -9,7 +9,49 @@
 
 from typing import Callable, Dict, List
 
-from .detector import detect_vendor, get_supported_vendors
+from .detector import (
+    DETECT_CHARS,
+    detect_vendor,
+    score_vendors,
+    get_supported_vendors,
+    set_detection_rules,
+    get_detection_rules,
+)
+from .detection_rules import (
+    ensure_detection_rules_table,
+    reload_detection_rules,
+    refresh_detection_rules,
+    check_detection_rules,
+)
+from .document import ParsedDocument, open_document, full_text
+from .backends import (
+    DEFAULT_BACKEND,
+    FAST_BACKEND,
+    PDFIUM_AVAILABLE,
+    PdfBackend,
+    backend_for_vendor,
+    detect_backend,
+    open_backend,
+)
+from .encoding import (
+    fix_text_encoding,
+    needs_encoding_fix,
+    get_encoding_stats,
+    reset_encoding_stats,
+)
+from .table_regions import (
+    TableProfile,
+    TableRegions,
+    get_table_region_stats,
+    reset_table_region_stats,
+)
+from .artefacts import (
+    artefact_path,
+    dump_artefact,
+    load_document,
+    save_artefact,
+    read_artefact,
+)
 from .vendors import (
     extract_angelini,
     extract_bayer,
@@ -25,6 +67,16 @@ from .vendors import (
 )
 
 
+# =============================================================================
+# v11.7: VENDOR CON TESTO LAZY
+# =============================================================================
+# Estrattori che leggono il PDF direttamente (tabelle, parole, testo con
+# tolleranze proprie): ricevono solo il testo letto per il detect vendor e
+# chiedono le altre pagine a doc.joined_text() solo nei fallback testuali.
+# Gli altri estrattori lavorano sul testo completo di tutte le pagine.
+LAZY_TEXT_VENDORS = frozenset({'COOPER', 'MENARINI'})
+
+
 # =============================================================================
 # REGISTRY ESTRATTORI
 # =============================================================================
@@ -53,13 +105,13 @@ def get_extractor(vendor: str) -> Callable:
         vendor: Codice vendor (es: 'ANGELINI', 'CHIESI')
 
     Returns:
-        Funzione estrattore: (text, lines, pdf_path) -> List[Dict]
+        Funzione estrattore: (text, lines, doc) -> List[Dict]
     """
     vendor = vendor.upper() if vendor else 'GENERIC'
     return EXTRACTORS.get(vendor, extract_generic)
 
 
-def extract_pdf(vendor: str, text: str, lines: List[str], pdf_path: str = None) -> List[Dict]:
+def extract_pdf(vendor: str, text: str, lines: List[str], doc: ParsedDocument = None) -> List[Dict]:
     """
     Estrae ordini da PDF usando l'estrattore appropriato.
 
@@ -67,13 +119,13 @@ def extract_pdf(vendor: str, text: str, lines: List[str], pdf_path: str = None)
         vendor: Codice vendor
         text: Testo completo estratto dal PDF
         lines: Lista di righe del testo
-        pdf_path: Percorso al file PDF (opzionale)
+        doc: Documento PDF gia' aperto (opzionale, per estrattori con tabelle/coordinate)
 
     Returns:
         Lista di ordini estratti
     """
     extractor = get_extractor(vendor)
-    return extractor(text, lines, pdf_path)
+    return extractor(text, lines, doc)
 
 
 __all__ = [
@@ -81,10 +133,52 @@ __all__ = [
     'get_extractor',
     'extract_pdf',
     'EXTRACTORS',
+    'LAZY_TEXT_VENDORS',
 
     # Detection
+    'DETECT_CHARS',
     'detect_vendor',
+    'score_vendors',
     'get_supported_vendors',
+    'set_detection_rules',
+    'get_detection_rules',
+    'ensure_detection_rules_table',
+    'reload_detection_rules',
+    'refresh_detection_rules',
+    'check_detection_rules',
+
+    # Documento PDF condiviso
+    'ParsedDocument',
+    'open_document',
+    'full_text',
+
+    # Backend di lettura PDF (v11.7)
+    'DEFAULT_BACKEND',
+    'FAST_BACKEND',
+    'PDFIUM_AVAILABLE',
+    'PdfBackend',
+    'backend_for_vendor',
+    'detect_backend',
+    'open_backend',
+
+    # Fix encoding (v11.7)
+    'fix_text_encoding',
+    'needs_encoding_fix',
+    'get_encoding_stats',
+    'reset_encoding_stats',
+
+    # Area tabella prodotti per vendor (v11.7)
+    'TableProfile',
+    'TableRegions',
+    'get_table_region_stats',
+    'reset_table_region_stats',
+
+    # Artefatti di estrazione (v11.7)
+    'artefact_path',
+    'dump_artefact',
+    'load_document',
+    'save_artefact',
+    'read_artefact',
 
     # Estrattori (per import diretto se necessario)
     'extract_angelini',
@@ -0,0 +1,125 @@
+# =============================================================================
+# SERV.O v11.7 - ARTEFATTI DI ESTRAZIONE PDF
+# =============================================================================
+# Testo, parole e tabelle calcolati da pdfplumber durante l'elaborazione
+# (la cache per pagina di ParsedDocument) salvati su disco, compressi, con
+# chiave l'hash SHA-256 del PDF. La ri-estrazione dopo una correzione di un
+# estrattore rilegge l'artefatto invece di ripetere il parsing del PDF.
+#
+# Formato: JSON compresso zlib, una voce per estrazione in cache
+#   {"v": 1, "pagine": N, "voci": [[kind, page_no, opzioni, valore], ...]}
+# Le parole (liste di dict con le stesse chiavi) sono salvate per colonne:
+#   {"k": ["text", "x0", ...], "r": [["ORDINE", 10.0, ...], ...]}
+# =============================================================================
+
+import os
+import json
+import zlib
+from typing import Any, Dict, List, Optional, Union
+
+from ...config import config
+from .document import ParsedDocument
+
+ARTEFACT_VERSION = 1
+
+
+def artefact_path(hash_file: str) -> str:
+    """Percorso dell'artefatto: ARTEFACT_DIR/<2 caratteri hash>/<hash>.json.z"""
+    return os.path.join(config.ARTEFACT_DIR, hash_file[:2], f"{hash_file}.json.z")
+
+
+# =============================================================================
+# SERIALIZZAZIONE
+# =============================================================================
+
+def _pack_words(words: List[Dict]) -> Dict[str, Any]:
+    keys = list(words[0]) if words else []
+    if any(list(w) != keys for w in words):
+        return {'d': words}
+    return {'k': keys, 'r': [[w[k] for k in keys] for w in words]}
+
+
+def _unpack_words(packed: Dict[str, Any]) -> List[Dict]:
+    if 'd' in packed:
+        return packed['d']
+    keys = packed['k']
+    return [dict(zip(keys, row)) for row in packed['r']]
+
+
+def dump_artefact(doc: ParsedDocument) -> bytes:
+    """Artefatto compresso con le estrazioni in cache del documento."""
+    voci = []
+    for (kind, page_no, options), value in doc.cache_items():
+        if kind == 'words':
+            value = _pack_words(value)
+        voci.append([kind, page_no, options, value])
+    payload = {'v': ARTEFACT_VERSION, 'pagine': doc.page_count, 'voci': voci}
+    raw = json.dumps(payload, ensure_ascii=False, separators=(',', ':'), default=str)
+    return zlib.compress(raw.encode('utf-8'), 6)
+
+
+def load_document(data: bytes, source: Union[bytes, str, None] = None,
+                  text_fixer=None) -> ParsedDocument:
+    """
+    ParsedDocument ricostruito da un artefatto.
+
+    Args:
+        data: Artefatto (dump_artefact)
+        source: PDF (bytes o percorso) per le estrazioni non presenti
+        text_fixer: Fix encoding per il testo non presente nell'artefatto
+
+    Raises:
+        ValueError: Artefatto non leggibile o di versione diversa
+    """
+    try:
+        payload = json.loads(zlib.decompress(data).decode('utf-8'))
+    except (zlib.error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Artefatto non leggibile: {e}")
+    if payload.get('v') != ARTEFACT_VERSION:
+        raise ValueError(f"Versione artefatto non supportata: {payload.get('v')}")
+
+    cache = {}
+    for kind, page_no, options, value in payload['voci']:
+        if kind == 'words':
+            value = _unpack_words(value)
+        cache[(kind, page_no, options)] = value
+    return ParsedDocument.from_cache(cache, payload['pagine'], source=source, text_fixer=text_fixer)
+
+
+# =============================================================================
+# PERSISTENZA SU DISCO
+# =============================================================================
+
+def save_artefact(hash_file: str, doc: ParsedDocument) -> Optional[str]:
+    """
+    Salva l'artefatto del documento (sovrascrive quello esistente, che puo'
+    contenere meno estrazioni). Non solleva: un errore non deve bloccare
+    l'elaborazione del PDF.
+
+    Returns:
+        Percorso dell'artefatto, None se disattivato o in errore
+    """
+    if not config.PDF_ARTEFACTS or not hash_file:
+        return None
+    path = artefact_path(hash_file)
+    try:
+        data = dump_artefact(doc)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Scrittura atomica: un lettore non vede mai un file a meta'
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return path
+    except Exception as e:
+        print(f"⚠️ Errore salvataggio artefatto {hash_file[:12]}: {e}")
+        return None
+
+
+def read_artefact(hash_file: str) -> Optional[bytes]:
+    """Artefatto salvato per l'hash, None se assente."""
+    try:
+        with open(artefact_path(hash_file), 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
@@ -0,0 +1,406 @@
+# =============================================================================
+# SERV.O v11.7 - BACKEND TESTO PDF
+# =============================================================================
+# Motori di lettura usati da ParsedDocument per testo, parole con coordinate
+# e tabelle di una pagina:
+#
+#   pdfplumber  (default) pdfminer in Python: lento ma di riferimento.
+#   pdfium      caratteri letti con pypdfium2 (PDFium, in C) e raggruppati
+#               in parole/righe con le stesse funzioni di pdfplumber
+#               (pdfplumber.utils): testo e parole coincidono con pdfplumber
+#               a una frazione del tempo. Le tabelle (e le pagine che PDFium
+#               non descrive come pdfminer: ruotate, con CropBox, testo non
+#               orizzontale, glifi senza Unicode) sono lette con pdfplumber,
+#               aperto solo alla prima richiesta.
+#
+# Il backend si sceglie per vendor (config.PDF_FAST_TEXT_VENDORS): il detect
+# vendor legge le prime pagine con config.PDF_DETECT_BACKEND, poi il
+# documento passa al backend del vendor (ParsedDocument.use_backend; per i
+# vendor non abilitati le pagine lette con pdfium vengono rilette con
+# pdfplumber). L'equivalenza degli ordini estratti con i due backend e'
+# verificata per ogni vendor (tests/test_pdf_backends.py sul corpus
+# sintetico, scripts/compare_pdf_backends.py sui PDF reali).
+#
+# PDFium non e' thread-safe (neanche su documenti diversi): tutte le
+# chiamate passano da _PDFIUM_LOCK.
+# =============================================================================
+
+import io
+import ctypes
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from ...config import config
+
+try:
+    import pdfplumber
+    from pdfplumber import utils as plumber_utils
+    from pdfplumber.table import TableSettings
+    PDFPLUMBER_AVAILABLE = True
+except ImportError:
+    PDFPLUMBER_AVAILABLE = False
+
+try:
+    import pypdfium2
+    import pypdfium2.raw as pdfium_c
+    from pdfminer.fontmetrics import FONT_METRICS
+    PDFIUM_AVAILABLE = PDFPLUMBER_AVAILABLE
+except ImportError:
+    PDFIUM_AVAILABLE = False
+
+
+DEFAULT_BACKEND = 'pdfplumber'
+FAST_BACKEND = 'pdfium'
+
+# (x0, top, x1, bottom) in coordinate pdfplumber
+Bbox = Tuple[float, float, float, float]
+
+# Distanza dal bordo del ritaglio entro cui una linea risulta tagliata
+_CLIP_TOLERANCE = 0.01
+
+_PDFIUM_LOCK = threading.RLock()
+
+
+class PdfBackend(ABC):
+    """
+    Interfaccia comune dei backend (pagine numerate da 0): un backend senza
+    uno dei metodi sotto non si puo' istanziare.
+    """
+
+    name = ''
+
+    @property
+    @abstractmethod
+    def page_count(self) -> int:
+        ...
+
+    @property
+    @abstractmethod
+    def pages(self) -> list:
+        """Pagine pdfplumber, per le estrazioni non coperte dai metodi sotto."""
+
+    @abstractmethod
+    def text(self, page_no: int, x_tolerance: float, y_tolerance: float) -> str:
+        ...
+
+    @abstractmethod
+    def words(self, page_no: int, x_tolerance: float, y_tolerance: float) -> List[Dict]:
+        ...
+
+    @abstractmethod
+    def page_bbox(self, page_no: int) -> List[float]:
+        """Bbox della pagina in coordinate pdfplumber."""
+
+    @abstractmethod
+    def tables(self, page_no: int, table_settings: Optional[Dict[str, Any]]) -> List[List]:
+        ...
+
+    @abstractmethod
+    def located_tables(self, page_no: int, table_settings: Optional[Dict[str, Any]],
+                       bbox: Optional[Bbox] = None) -> Dict[str, Any]:
+        """
+        Tabelle con bbox ({'bbox', 'rows'}) della pagina o della sola area
+        bbox: {'tables': [...], 'clipped': True se il ritaglio taglia delle linee}
+        """
+
+    @abstractmethod
+    def close(self) -> None:
+        ...
+
+
+# =============================================================================
+# PDFPLUMBER
+# =============================================================================
+
+class PdfplumberBackend(PdfBackend):
+    """Backend di riferimento: pdfplumber (pdfminer)."""
+
+    name = DEFAULT_BACKEND
+
+    def __init__(self, source: Union[bytes, str]):
+        if not PDFPLUMBER_AVAILABLE:
+            raise ImportError("pdfplumber non installato")
+        self._pdf = pdfplumber.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+
+    @property
+    def page_count(self) -> int:
+        return len(self._pdf.pages)
+
+    @property
+    def pages(self) -> list:
+        return self._pdf.pages
+
+    def text(self, page_no: int, x_tolerance: float, y_tolerance: float) -> str:
+        page = self._pdf.pages[page_no]
+        return page.extract_text(x_tolerance=x_tolerance, y_tolerance=y_tolerance) or ""
+
+    def words(self, page_no: int, x_tolerance: float, y_tolerance: float) -> List[Dict]:
+        return self._pdf.pages[page_no].extract_words(x_tolerance=x_tolerance, y_tolerance=y_tolerance)
+
+    def page_bbox(self, page_no: int) -> List[float]:
+        return [float(v) for v in self._pdf.pages[page_no].bbox]
+
+    def tables(self, page_no: int, table_settings: Optional[Dict[str, Any]]) -> List[List]:
+        return self._pdf.pages[page_no].extract_tables(table_settings=table_settings)
+
+    def located_tables(self, page_no: int, table_settings: Optional[Dict[str, Any]],
+                       bbox: Optional[Bbox] = None) -> Dict[str, Any]:
+        # Come extract_tables, conservando il bbox di ogni tabella
+        page = self._pdf.pages[page_no]
+        clipped = False
+        if bbox is not None:
+            # Bordi del ritaglio interni alla pagina: una linea che li raggiunge
+            # e' stata tagliata (tabella che continua fuori dall'area)
+            inner = [i for i in range(4) if bbox[i] != page.bbox[i]]
+            page = page.crop(bbox)
+            keys = ('x0', 'top', 'x1', 'bottom')
+            clipped = any(
+                abs(edge[keys[i]] - bbox[i]) <= _CLIP_TOLERANCE
+                for edge in page.edges for i in inner
+            )
+        settings = TableSettings.resolve(table_settings)
+        tables = [
+            {'bbox': list(table.bbox), 'rows': table.extract(**(settings.text_settings or {}))}
+            for table in page.find_tables(settings)
+        ]
+        return {'tables': tables, 'clipped': clipped}
+
+    def close(self) -> None:
+        self._pdf.close()
+
+
+# =============================================================================
+# PDFIUM
+# =============================================================================
+
+class PdfiumBackend(PdfBackend):
+    """
+    Testo e parole da PDFium con la geometria dei caratteri di pdfminer:
+    x0/x1 = origine e avanzamento del glifo, bottom = linea di base + discesa
+    del font (metriche pdfminer per i 14 font standard), top = bottom + corpo.
+    """
+
+    name = FAST_BACKEND
+
+    def __init__(self, source: Union[bytes, str], plumber: Optional[PdfplumberBackend] = None):
+        if not PDFIUM_AVAILABLE:
+            raise ImportError("pypdfium2 non installato")
+        self._source = source
+        self._plumber = plumber
+        with _PDFIUM_LOCK:
+            self._pdf = pypdfium2.PdfDocument(source)
+            self._page_count = len(self._pdf)
+        # Per pagina: caratteri in formato pdfplumber, None = pagina letta da pdfplumber
+        self._chars: Dict[int, Optional[List[Dict]]] = {}
+        self._doctops: Optional[List[float]] = None
+
+    @property
+    def page_count(self) -> int:
+        return self._page_count
+
+    @property
+    def plumber(self) -> PdfplumberBackend:
+        """pdfplumber per tabelle e pagine non gestite, aperto alla prima richiesta."""
+        if self._plumber is None:
+            self._plumber = PdfplumberBackend(self._source)
+        return self._plumber
+
+    @property
+    def pages(self) -> list:
+        return self.plumber.pages
+
+    def text(self, page_no: int, x_tolerance: float, y_tolerance: float) -> str:
+        chars = self._page_chars(page_no)
+        if chars is None:
+            return self.plumber.text(page_no, x_tolerance, y_tolerance)
+        if not chars:
+            return ""
+        return plumber_utils.chars_to_textmap(
+            chars, x_tolerance=x_tolerance, y_tolerance=y_tolerance
+        ).as_string
+
+    def words(self, page_no: int, x_tolerance: float, y_tolerance: float) -> List[Dict]:
+        chars = self._page_chars(page_no)
+        if chars is None:
+            return self.plumber.words(page_no, x_tolerance, y_tolerance)
+        return plumber_utils.extract_words(chars, x_tolerance=x_tolerance, y_tolerance=y_tolerance)
+
+    def page_bbox(self, page_no: int) -> List[float]:
+        return self.plumber.page_bbox(page_no)
+
+    def tables(self, page_no: int, table_settings: Optional[Dict[str, Any]]) -> List[List]:
+        return self.plumber.tables(page_no, table_settings)
+
+    def located_tables(self, page_no: int, table_settings: Optional[Dict[str, Any]],
+                       bbox: Optional[Bbox] = None) -> Dict[str, Any]:
+        return self.plumber.located_tables(page_no, table_settings, bbox)
+
+    def close(self) -> None:
+        with _PDFIUM_LOCK:
+            self._pdf.close()
+        if self._plumber is not None:
+            self._plumber.close()
+            self._plumber = None
+        self._chars.clear()
+
+    # -------------------------------------------------------------------------
+    # Caratteri
+    # -------------------------------------------------------------------------
+
+    def _doctop(self, page_no: int) -> float:
+        """Offset verticale della pagina nel documento (somma delle altezze precedenti)."""
+        if self._doctops is None:
+            doctops, total = [], 0.0
+            with _PDFIUM_LOCK:
+                for n in range(self._page_count):
+                    doctops.append(total)
+                    total += self._pdf.get_page_size(n)[1]
+            self._doctops = doctops
+        return self._doctops[page_no]
+
+    def _page_chars(self, page_no: int) -> Optional[List[Dict]]:
+        if page_no not in self._chars:
+            doctop = self._doctop(page_no)
+            with _PDFIUM_LOCK:
+                page = self._pdf[page_no]
+                try:
+                    self._chars[page_no] = _read_chars(page, doctop)
+                finally:
+                    page.close()
+        return self._chars[page_no]
+
+
+# Buffer del nome font riusato da _font_descent (sotto _PDFIUM_LOCK)
+_font_name_buf = ctypes.create_string_buffer(256) if PDFIUM_AVAILABLE else None
+
+
+def _font_descent(font, fonts: Dict[int, float]) -> float:
+    """
+    Discesa del font (per unita' di corpo, negativa) come la calcola
+    pdfminer: metriche AFM se il nome e' uno dei 14 font standard,
+    altrimenti quella del font descriptor letta da PDFium.
+    """
+    key = ctypes.cast(font, ctypes.c_void_p).value
+    if key not in fonts:
+        length = pdfium_c.FPDFFont_GetBaseFontName(font, _font_name_buf, len(_font_name_buf))
+        name = _font_name_buf.raw[:max(length - 1, 0)].decode('latin-1')
+        metrics = FONT_METRICS.get(name)
+        if metrics is not None:
+            descent = metrics[0].get('Descent', 0) / 1000
+        else:
+            out = ctypes.c_float()
+            pdfium_c.FPDFFont_GetDescent(font, ctypes.c_float(1000), out)
+            descent = out.value / 1000
+        fonts[key] = -abs(descent)
+    return fonts[key]
+
+
+def _read_chars(page, doctop: float) -> Optional[List[Dict]]:
+    """
+    Caratteri della pagina nel formato di pdfplumber (text, x0, x1, top,
+    bottom, doctop, upright, size). None se la pagina va letta con pdfplumber.
+
+    Gli spazi generati da PDFium (fine riga, spazi dedotti dalla distanza)
+    sono esclusi: pdfplumber separa le parole in base alle coordinate.
+    """
+    if page.get_rotation() or page.get_cropbox() != page.get_mediabox():
+        return None
+    x_min, y_min, _, _ = page.get_mediabox()
+    if x_min or y_min:
+        return None
+    height = page.get_height()
+
+    textpage = page.get_textpage()
+    try:
+        rect = pdfium_c.FS_RECTF()
+        matrix = pdfium_c.FS_MATRIX()
+        origin_x, origin_y = ctypes.c_double(), ctypes.c_double()
+        fonts: Dict[int, float] = {}
+        chars = []
+        # Matrice, corpo e font sono quelli dell'oggetto testo: ricalcolati
+        # solo quando cambia
+        current_obj = None
+        size = descent = 0.0
+        for i in range(pdfium_c.FPDFText_CountChars(textpage)):
+            if pdfium_c.FPDFText_IsGenerated(textpage, i):
+                continue
+            if pdfium_c.FPDFText_HasUnicodeMapError(textpage, i):
+                return None
+            text_obj = pdfium_c.FPDFText_GetTextObject(textpage, i)
+            obj_key = ctypes.cast(text_obj, ctypes.c_void_p).value
+            if obj_key != current_obj:
+                current_obj = obj_key
+                pdfium_c.FPDFText_GetMatrix(textpage, i, matrix)
+                if matrix.b or matrix.c or matrix.a <= 0 or matrix.d <= 0:
+                    return None
+                # Corpo nello spazio pagina (PDFium lo restituisce senza matrice)
+                size = pdfium_c.FPDFText_GetFontSize(textpage, i) * matrix.d
+                descent = _font_descent(pdfium_c.FPDFTextObj_GetFont(text_obj), fonts) * size
+
+            pdfium_c.FPDFText_GetLooseCharBox(textpage, i, rect)
+            pdfium_c.FPDFText_GetCharOrigin(textpage, i, origin_x, origin_y)
+            bottom = height - origin_y.value - descent
+            top = bottom - size
+            chars.append({
+                'text': chr(pdfium_c.FPDFText_GetUnicode(textpage, i)),
+                'x0': rect.left,
+                'x1': rect.right,
+                'top': top,
+                'bottom': bottom,
+                'doctop': doctop + top,
+                'upright': True,
+                'size': size,
+            })
+        return chars
+    finally:
+        textpage.close()
+
+
+# =============================================================================
+# SCELTA BACKEND
+# =============================================================================
+
+BACKENDS = {
+    DEFAULT_BACKEND: PdfplumberBackend,
+    FAST_BACKEND: PdfiumBackend,
+}
+
+
+def detect_backend() -> str:
+    """Backend per le prime pagine lette dal detect vendor (PDF_DETECT_BACKEND)."""
+    name = config.PDF_DETECT_BACKEND
+    if name == FAST_BACKEND and PDFIUM_AVAILABLE:
+        return FAST_BACKEND
+    return DEFAULT_BACKEND
+
+
+def backend_for_vendor(vendor: Optional[str]) -> str:
+    """Backend configurato per il vendor (PDF_FAST_TEXT_VENDORS), default pdfplumber."""
+    vendors = {v.strip().upper() for v in config.PDF_FAST_TEXT_VENDORS.split(',') if v.strip()}
+    if vendor and vendor.upper() in vendors and PDFIUM_AVAILABLE:
+        return FAST_BACKEND
+    return DEFAULT_BACKEND
+
+
+def open_backend(name: str, source: Union[bytes, str]) -> PdfBackend:
+    """Apre il PDF (contenuto o percorso) con il backend richiesto."""
+    if name not in BACKENDS:
+        raise ValueError(f"Backend PDF sconosciuto: {name}")
+    return BACKENDS[name](source)
+
+
+def switch_backend(current: PdfBackend, name: str, source: Union[bytes, str]) -> PdfBackend:
+    """
+    Passa al backend name sullo stesso PDF. Il documento pdfplumber gia'
+    aperto viene riusato (tabelle del backend pdfium), il resto chiuso.
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Backend PDF sconosciuto: {name}")
+    if current.name == name:
+        return current
+    if isinstance(current, PdfplumberBackend):
+        return PdfiumBackend(source, plumber=current)
+    plumber, current._plumber = current._plumber, None
+    current.close()
+    return plumber or PdfplumberBackend(source)
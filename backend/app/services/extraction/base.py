@@ -9,6 +9,8 @@ from abc import ABC, abstractmethod
 from typing import List, Dict, Any, Optional
 from collections import defaultdict
 
+from .document import ParsedDocument
+
 
 class BaseExtractor(ABC):
     """
@@ -32,14 +34,14 @@ class BaseExtractor(ABC):
         pass
     
     @abstractmethod
-    def extract(self, text: str, lines: List[str], pdf_path: str = None) -> List[Dict[str, Any]]:
+    def extract(self, text: str, lines: List[str], doc: ParsedDocument = None) -> List[Dict[str, Any]]:
         """
         Estrae ordini dal PDF.
         
         Args:
             text: Testo completo estratto dal PDF
             lines: Lista di righe del testo
-            pdf_path: Percorso al file PDF (per estrazioni con coordinate)
+            doc: Documento PDF gia' aperto (per estrazioni con coordinate/tabelle)
             
         Returns:
             Lista di dizionari ordine, ciascuno con:
@@ -248,7 +250,7 @@ class GenericExtractor(BaseExtractor):
     
     vendor = "GENERIC"
     
-    def extract(self, text: str, lines: List[str], pdf_path: str = None) -> List[Dict[str, Any]]:
+    def extract(self, text: str, lines: List[str], doc: ParsedDocument = None) -> List[Dict[str, Any]]:
         """Estrazione generica: cerca numeri ordine e codici AIC."""
         data = self.create_empty_order()
         
@@ -0,0 +1,138 @@
+# =============================================================================
+# SERV.O v11.7 - REGOLE DETECTION VENDOR SU DATABASE
+# =============================================================================
+# Carica le regole di detector.py dalla tabella vendor_detection_rules e le
+# ricompila senza riavvio. La versione delle regole e' un hash delle righe
+# attive: i processi (backend, worker ingestion, pool di estrazione)
+# ricompilano solo quando cambia.
+#
+# Il reload via API ricompila il solo processo che riceve la richiesta: gli
+# altri processi backend controllano la versione in /detect-vendor e
+# process_pdf (al piu' ogni DETECTION_RULES_CHECK_SECONDS), i worker della
+# coda ogni 30 secondi.
+# =============================================================================
+
+import json
+import pathlib
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+from ...config import config
+from ...database_pg import get_db, with_db_scope
+from .detector import DEFAULT_RULES, get_detector, set_detection_rules
+
+_MIGRATION = pathlib.Path(__file__).parent.parent.parent.parent / 'migrations' / 'v11_7_vendor_detection_rules.sql'
+
+_VERSION_SQL = """
+    SELECT md5(string_agg(row_to_json(r)::text, '|' ORDER BY r.id_regola)) AS versione
+    FROM vendor_detection_rules r
+    WHERE r.attivo
+"""
+
+
+def ensure_detection_rules_table() -> None:
+    """Crea tabella vendor_detection_rules e la popola con DEFAULT_RULES se vuota."""
+    db = get_db()
+    try:
+        db.executescript(_MIGRATION.read_text(encoding='utf-8'))
+        if not db.execute("SELECT 1 FROM vendor_detection_rules LIMIT 1").fetchone():
+            db.execute_insert("""
+                INSERT INTO vendor_detection_rules
+                (vendor, priorita, confidenza, soglia, segnali, criteri)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, [_rule_to_row(rule) for rule in DEFAULT_RULES])
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"   ⚠️ Migrazione vendor_detection_rules non applicata: {e}")
+
+
+def _rule_to_row(rule: Dict[str, Any]) -> Tuple:
+    return (
+        rule['vendor'],
+        rule['priorita'],
+        rule.get('confidenza'),
+        rule.get('soglia'),
+        json.dumps(rule['segnali'], ensure_ascii=False) if rule.get('segnali') else None,
+        json.dumps(rule['criteri'], ensure_ascii=False) if rule.get('criteri') else None,
+    )
+
+
+def _row_to_rule(row: Dict[str, Any]) -> Dict[str, Any]:
+    rule = {'vendor': row['vendor'], 'priorita': row['priorita']}
+    if row['criteri']:
+        rule['criteri'] = row['criteri']
+        rule['soglia'] = float(row['soglia'])
+    else:
+        rule['segnali'] = row['segnali']
+        rule['confidenza'] = float(row['confidenza'])
+    return rule
+
+
+def get_rules_version(db) -> Optional[str]:
+    """Hash delle regole attive (None se la tabella e' vuota)."""
+    row = db.execute(_VERSION_SQL).fetchone()
+    return row['versione'] if row else None
+
+
+def load_detection_rules(db) -> Tuple[List[Dict[str, Any]], str]:
+    """Regole attive in ordine di priorita' e relativa versione."""
+    rows = db.execute("""
+        SELECT id_regola, vendor, priorita, confidenza, soglia, segnali, criteri
+        FROM vendor_detection_rules
+        WHERE attivo
+        ORDER BY priorita, id_regola
+    """).fetchall()
+    return [_row_to_rule(dict(r)) for r in rows], get_rules_version(db)
+
+
+def reload_detection_rules(force: bool = True) -> Dict[str, Any]:
+    """
+    Ricompila le regole dal database (DEFAULT_RULES se la tabella e' vuota).
+
+    Args:
+        force: Ricompila anche se la versione non e' cambiata
+
+    Returns:
+        Dict con versione, numero regole e se sono cambiate
+
+    Raises:
+        ValueError: regole non valide (restano attive le precedenti)
+    """
+    db = get_db()
+    version = get_rules_version(db)
+    current = get_detector()
+    if not force and (version or 'default') == current.version:
+        return {'versione': current.version, 'regole': len(current.rules), 'cambiato': False}
+
+    rules, version = load_detection_rules(db) if version else (DEFAULT_RULES, 'default')
+    detector = set_detection_rules(rules, version)
+    return {'versione': version, 'regole': len(detector.rules), 'cambiato': True}
+
+
+def refresh_detection_rules() -> bool:
+    """Ricarica le regole se cambiate nel DB; errori solo segnalati (per i worker)."""
+    try:
+        return reload_detection_rules(force=False)['cambiato']
+    except Exception as e:
+        print(f"⚠️ Regole detection vendor non ricaricate: {e}")
+        return False
+
+
+_checked_at: Optional[float] = None
+
+
+@with_db_scope
+def check_detection_rules() -> None:
+    """
+    refresh_detection_rules al piu' ogni DETECTION_RULES_CHECK_SECONDS, prima
+    di un detect vendor: un reload fatto da un altro processo arriva entro
+    quell'intervallo.
+    """
+    global _checked_at
+
+    checked_at = _checked_at
+    if checked_at is not None and time.monotonic() - checked_at < config.DETECTION_RULES_CHECK_SECONDS:
+        return
+    _checked_at = time.monotonic()
+    refresh_detection_rules()
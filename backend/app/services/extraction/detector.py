@@ -3,173 +3,354 @@
 # =============================================================================
 # Funzioni per rilevare il vendor da contenuto PDF
 # Estratto da utils.py per modularità
+#
+# v11.7: Regole dichiarative (DEFAULT_RULES o tabella vendor_detection_rules)
+# compilate una volta: segnali distinti valutati al piu' una volta per testo,
+# regole in ordine di priorita'. Sostituisce la catena di if sequenziali con
+# risultati identici; le regole si ricaricano dal DB senza riavvio.
 # =============================================================================
 
 import re
-from typing import Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
+# Caratteri di testo (uppercase) esaminati per la detection: un prefisso del
+# testo lungo almeno DETECT_CHARS da' lo stesso risultato del testo completo
+DETECT_CHARS = 5000
 
-def detect_vendor(text: str, filename: str = "") -> Tuple[str, float]:
-    """
-    Rileva il vendor dal testo PDF.
-
-    v6.2: Detection basata ESCLUSIVAMENTE su contenuto PDF.
-    Il nome file viene IGNORATO per tutti i vendor.
-
-    Args:
-        text: Testo estratto dal PDF
-        filename: Nome file PDF (IGNORATO - mantenuto per retrocompatibilità)
-
-    Returns:
-        Tuple (vendor_code, confidence)
-        confidence: 0.0-1.0
-    """
-    # Normalizza per ricerca - SOLO contenuto PDF
-    t = text.upper()[:5000] if text else ""
-    # NOTA: filename NON viene più usato per detection (v6.2)
-
-    # ANGELINI (ACRAF) - v6.2: Aggiunto pattern "Tipo ZT01 TransferOrder" + "Area vendite"
-    if "ANGELINI" in t or "ACRAF" in t:
-        return "ANGELINI", 0.95
-    # Pattern specifico per T.O. ACRAF: "Tipo ZT01" + "Area vendite"
-    if "TIPO ZT" in t and "AREA VENDITE" in t:
-        return "ANGELINI", 0.95
-    # Pattern alternativo: "Tipo ZT01 TransferOrder"
-    if "ZT01" in t and "TRANSFERORDER" in t.replace(" ", ""):
-        return "ANGELINI", 0.90
-
-    # CHIESI - Pattern specifici
-    if "CHIESI ITALIA" in t or "@CHIESI.COM" in t:
-        return "CHIESI", 0.95
-    if "02944970348" in t:  # P.IVA Chiesi
-        return "CHIESI", 0.90
+# =============================================================================
+# REGOLE DI DEFAULT
+# =============================================================================
+# Ogni regola:
+#   vendor, priorita (minore = valutata prima), confidenza
+#   segnali: tutti devono essere presenti (AND). Regole alternative (OR)
+#            sono regole distinte con la stessa confidenza.
+#   criteri + soglia (al posto di segnali): punteggio = somma dei pesi dei
+#            criteri soddisfatti (ognuno con i suoi segnali in AND); la regola
+#            vale se punteggio >= soglia e la confidenza e' il punteggio.
+#
+# Segnale: {'tipo': 'testo'|'compatto'|'regex', 'valore': ...}
+#   testo    sottostringa del testo uppercase
+#   compatto sottostringa del testo senza spazi (PDF con testo concatenato)
+#   regex    espressione regolare sul testo uppercase
+#   min      occorrenze minime (default 1)
+#   finestra solo occorrenze entro i primi N caratteri
+
+DEFAULT_RULES: List[Dict[str, Any]] = [
+    # ANGELINI (ACRAF) - v6.2: "Tipo ZT01 TransferOrder" + "Area vendite"
+    {'vendor': 'ANGELINI', 'priorita': 10, 'confidenza': 0.95,
+     'segnali': [{'tipo': 'testo', 'valore': 'ANGELINI'}]},
+    {'vendor': 'ANGELINI', 'priorita': 10, 'confidenza': 0.95,
+     'segnali': [{'tipo': 'testo', 'valore': 'ACRAF'}]},
+    {'vendor': 'ANGELINI', 'priorita': 11, 'confidenza': 0.95,
+     'segnali': [{'tipo': 'testo', 'valore': 'TIPO ZT'}, {'tipo': 'testo', 'valore': 'AREA VENDITE'}]},
+    {'vendor': 'ANGELINI', 'priorita': 12, 'confidenza': 0.90,
+     'segnali': [{'tipo': 'testo', 'valore': 'ZT01'}, {'tipo': 'compatto', 'valore': 'TRANSFERORDER'}]},
+
+    # CHIESI
+    {'vendor': 'CHIESI', 'priorita': 20, 'confidenza': 0.95,
+     'segnali': [{'tipo': 'testo', 'valore': 'CHIESI ITALIA'}]},
+    {'vendor': 'CHIESI', 'priorita': 20, 'confidenza': 0.95,
+     'segnali': [{'tipo': 'testo', 'valore': '@CHIESI.COM'}]},
+    {'vendor': 'CHIESI', 'priorita': 21, 'confidenza': 0.90,
+     'segnali': [{'tipo': 'testo', 'valore': '02944970348'}]},  # P.IVA Chiesi
 
     # COOPER - v11.2 (pattern senza spazi per PDF con testo concatenato)
-    if "COOPERCONSUMER" in t.replace(" ", "") or "COOPER CONSUMER HEALTH" in t:
-        return "COOPER", 0.95
-    if "DESALUTESRL" in t.replace(" ", "") and "DATISPEDIZIONE" in t.replace(" ", ""):
-        return "COOPER", 0.90
+    {'vendor': 'COOPER', 'priorita': 30, 'confidenza': 0.95,
+     'segnali': [{'tipo': 'compatto', 'valore': 'COOPERCONSUMER'}]},
+    {'vendor': 'COOPER', 'priorita': 30, 'confidenza': 0.95,
+     'segnali': [{'tipo': 'testo', 'valore': 'COOPER CONSUMER HEALTH'}]},
+    {'vendor': 'COOPER', 'priorita': 31, 'confidenza': 0.90,
+     'segnali': [{'tipo': 'compatto', 'valore': 'DESALUTESRL'},
+                 {'tipo': 'compatto', 'valore': 'DATISPEDIZIONE'}]},
 
     # RECKITT - v11.2 Reckitt Benckiser Healthcare
-    if "RECKITT" in t:
-        return "RECKITT", 0.95
-    if "IT04 - HEALTHCARE" in t or "IT04-HEALTHCARE" in t.replace(" ", ""):
-        return "RECKITT", 0.90
-    # Pattern combinato: Transfer Order + DUREX/NUROFEN/BENAGOL (prodotti tipici)
-    if "TRANSFER ORDER" in t and ("DUREX" in t or "NUROFEN" in t or "BENAGOL" in t or "GAVISCON" in t):
-        return "RECKITT", 0.85
-
-    # VIATRIS v11.3 - Transfer Order
-    # Pattern distintivi: "ACCESS LEADERSHIP PARTNERSHIP", ordini OR#####, TRACC.F#####
-    if "VIATRIS" in t:
-        return "VIATRIS", 0.95
-    if "ACCESS LEADERSHIP PARTNERSHIP" in t:
-        return "VIATRIS", 0.95
-    # Pattern combinato: OR + TRACC.F (tracking farmacia)
-    if re.search(r'\bOR\d{7,}', t) and "TRACC.F" in t:
-        return "VIATRIS", 0.90
+    {'vendor': 'RECKITT', 'priorita': 40, 'confidenza': 0.95,
+     'segnali': [{'tipo': 'testo', 'valore': 'RECKITT'}]},
+    {'vendor': 'RECKITT', 'priorita': 41, 'confidenza': 0.90,
+     'segnali': [{'tipo': 'testo', 'valore': 'IT04 - HEALTHCARE'}]},
+    {'vendor': 'RECKITT', 'priorita': 41, 'confidenza': 0.90,
+     'segnali': [{'tipo': 'compatto', 'valore': 'IT04-HEALTHCARE'}]},
+    # Transfer Order + prodotti tipici
+    *[
+        {'vendor': 'RECKITT', 'priorita': 42, 'confidenza': 0.85,
+         'segnali': [{'tipo': 'testo', 'valore': 'TRANSFER ORDER'}, {'tipo': 'testo', 'valore': prodotto}]}
+        for prodotto in ('DUREX', 'NUROFEN', 'BENAGOL', 'GAVISCON')
+    ],
+
+    # VIATRIS v11.3 - "ACCESS LEADERSHIP PARTNERSHIP", ordini OR#####, TRACC.F#####
+    {'vendor': 'VIATRIS', 'priorita': 50, 'confidenza': 0.95,
+     'segnali': [{'tipo': 'testo', 'valore': 'VIATRIS'}]},
+    {'vendor': 'VIATRIS', 'priorita': 50, 'confidenza': 0.95,
+     'segnali': [{'tipo': 'testo', 'valore': 'ACCESS LEADERSHIP PARTNERSHIP'}]},
+    {'vendor': 'VIATRIS', 'priorita': 51, 'confidenza': 0.90,
+     'segnali': [{'tipo': 'regex', 'valore': r'\bOR\d{7,}'}, {'tipo': 'testo', 'valore': 'TRACC.F'}]},
 
     # OPELLA
-    if "INFORMAZIONI SULL'ORDINE" in t or "OPELLA" in t:
-        return "OPELLA", 0.95
+    {'vendor': 'OPELLA', 'priorita': 60, 'confidenza': 0.95,
+     'segnali': [{'tipo': 'testo', 'valore': "INFORMAZIONI SULL'ORDINE"}]},
+    {'vendor': 'OPELLA', 'priorita': 60, 'confidenza': 0.95,
+     'segnali': [{'tipo': 'testo', 'valore': 'OPELLA'}]},
 
     # MENARINI
-    if "MENARINI" in t or "A. MENARINI" in t:
-        return "MENARINI", 0.95
+    {'vendor': 'MENARINI', 'priorita': 70, 'confidenza': 0.95,
+     'segnali': [{'tipo': 'testo', 'valore': 'MENARINI'}]},
 
     # DOC_GENERICI - Transfer Order via Grossisti (v6.2)
-    # Deve essere testato PRIMA di BAYER perché entrambi usano "TRANSFER ORDER"
-    doc_generici_score = _detect_doc_generici(t)
-    if doc_generici_score >= 0.70:
-        return "DOC_GENERICI", doc_generici_score
-
-    # BAYER - v6.2: Detection basata su contenuto specifico
-    # Pattern 1: Parola "BAYER" esplicita
-    if "BAYER" in t:
-        return "BAYER", 0.95
-
-    # Pattern 2: Formato specifico BAYER Transfer Order (senza parola BAYER)
-    # - "NUM. PROP. D'ORDINE" con formato IT##O-#####
-    # - Blocco "COOPERATIVA/GROSSISTA" + "(SAP:"
-    if "NUM" in t and "PROP" in t and "ORDINE" in t:
-        # Verifica formato numero ordine BAYER: IT##O-#####
-        if re.search(r'IT\d{2}O-\d+', t):
-            return "BAYER", 0.95
-
-    # Pattern 3: Combinazione "COOPERATIVA/ GROSSISTA" + SAP (tipico BAYER)
-    # Formato esatto nel PDF: "COOPERATIVA/ GROSSISTA" (con spazio prima dello slash)
-    if "COOPERATIVA/ GROSSISTA" in t and "(SAP:" in t:
-        return "BAYER", 0.90
-    # Fallback: anche senza spazio
-    if "COOPERATIVA/GROSSISTA" in t and "(SAP:" in t:
-        return "BAYER", 0.90
-
-    # Pattern 4: Solo codici SAP multipli (fallback)
-    if t.count("(SAP:") >= 2:
-        return "BAYER", 0.85
+    # Deve precedere BAYER perche' entrambi usano "TRANSFER ORDER"
+    {'vendor': 'DOC_GENERICI', 'priorita': 80, 'soglia': 0.70, 'criteri': [
+        {'peso': 0.25, 'segnali': [{'tipo': 'regex', 'valore': r'TRANSFER\s+ORDER\s+NUM\.\s*\d{10}'}]},
+        {'peso': 0.15, 'segnali': [{'tipo': 'regex', 'valore': r'GROSSISTA\s+[A-Z]', 'finestra': 500}]},
+        {'peso': 0.15, 'segnali': [{'tipo': 'regex', 'valore': r'AGENTE\s+\d{5}'}]},
+        {'peso': 0.20, 'segnali': [{'tipo': 'testo', 'valore': 'IND.FISCALE'},
+                                   {'tipo': 'testo', 'valore': 'IND.CONSEGNA MERCE'}]},
+        {'peso': 0.15, 'segnali': [{'tipo': 'testo', 'valore': 'COD. A.I.C.'}]},
+        {'peso': 0.10, 'segnali': [{'tipo': 'regex', 'valore': r'\bDOC\b', 'min': 5}]},
+    ]},
+
+    # BAYER - v6.2: "BAYER" esplicito o formato Transfer Order BAYER
+    {'vendor': 'BAYER', 'priorita': 90, 'confidenza': 0.95,
+     'segnali': [{'tipo': 'testo', 'valore': 'BAYER'}]},
+    # "NUM. PROP. D'ORDINE" con numero IT##O-#####
+    {'vendor': 'BAYER', 'priorita': 91, 'confidenza': 0.95,
+     'segnali': [{'tipo': 'testo', 'valore': 'NUM'}, {'tipo': 'testo', 'valore': 'PROP'},
+                 {'tipo': 'testo', 'valore': 'ORDINE'}, {'tipo': 'regex', 'valore': r'IT\d{2}O-\d+'}]},
+    # Blocco "COOPERATIVA/ GROSSISTA" + "(SAP:" (con o senza spazio)
+    {'vendor': 'BAYER', 'priorita': 92, 'confidenza': 0.90,
+     'segnali': [{'tipo': 'testo', 'valore': 'COOPERATIVA/ GROSSISTA'}, {'tipo': 'testo', 'valore': '(SAP:'}]},
+    {'vendor': 'BAYER', 'priorita': 92, 'confidenza': 0.90,
+     'segnali': [{'tipo': 'testo', 'valore': 'COOPERATIVA/GROSSISTA'}, {'tipo': 'testo', 'valore': '(SAP:'}]},
+    # Solo codici SAP multipli (fallback)
+    {'vendor': 'BAYER', 'priorita': 93, 'confidenza': 0.85,
+     'segnali': [{'tipo': 'testo', 'valore': '(SAP:', 'min': 2}]},
 
     # CODIFI / altri con "Transfer Order"
-    if "TRANSFER ORDER" in t:
-        if "CODIFI" in t:
-            return "CODIFI", 0.95
-        # Transfer Order generico senza pattern specifici
-        return "UNKNOWN", 0.50
+    {'vendor': 'CODIFI', 'priorita': 100, 'confidenza': 0.95,
+     'segnali': [{'tipo': 'testo', 'valore': 'TRANSFER ORDER'}, {'tipo': 'testo', 'valore': 'CODIFI'}]},
+    # Transfer Order generico senza pattern specifici
+    {'vendor': 'UNKNOWN', 'priorita': 101, 'confidenza': 0.50,
+     'segnali': [{'tipo': 'testo', 'valore': 'TRANSFER ORDER'}]},
+]
+
+
+# =============================================================================
+# MOTORE COMPILATO
+# =============================================================================
+
+_SIGNAL_TYPES = ('testo', 'compatto', 'regex')
+
+
+class _Text:
+    """Testo normalizzato per la detection, con forma senza spazi calcolata una volta."""
+
+    __slots__ = ('t', '_compact')
+
+    def __init__(self, text: str):
+        self.t = text.upper()[:DETECT_CHARS] if text else ""
+        self._compact = None
+
+    @property
+    def compact(self) -> str:
+        if self._compact is None:
+            self._compact = self.t.replace(" ", "")
+        return self._compact
+
 
-    # v6.2: RIMOSSO fallback su filename per tutti i vendor
-    # La detection deve basarsi SOLO sul contenuto del PDF
+# \\b + letterale fisso (l'ultimo carattere non deve avere quantificatori)
+_WORD_PREFIX_RE = re.compile(r'\\b([A-Z0-9]{2,})(?![?*+{])')
 
-    # Non riconosciuto
-    return "UNKNOWN", 0.0
 
+def _literal_first(src: str) -> str:
+    """
+    Riscrive \\bLITERALE... come LITERALE(?<=\\bLITERALE)...: stesse occorrenze,
+    ma la regex inizia con un letterale e re lo cerca con la ricerca veloce
+    di prefisso invece di provare \\b in ogni posizione (~30x su 5000 char).
+    """
+    m = _WORD_PREFIX_RE.match(src)
+    if not m:
+        return src
+    literal = m.group(1)
+    return f"{literal}(?<=\\b{literal}){src[m.end():]}"
 
-def _detect_doc_generici(text: str) -> float:
+
+def _compile_signal(signal: Dict[str, Any]) -> Callable[[_Text], bool]:
     """
-    Rileva Transfer Order DOC Generici (v6.2).
+    Segnale -> verifica sul testo normalizzato.
 
-    Criteri cumulativi basati SOLO su contenuto PDF:
-    - "TRANSFER ORDER" + "Num." (10 cifre) = +0.25
-    - "Grossista" nelle prime 500 caratteri = +0.15
-    - "Agente" con codice numerico = +0.15
-    - "Ind.Fiscale Via" + "Ind.Consegna Merce Via" = +0.20
-    - "COD. A.I.C." presente = +0.15
-    - 5+ prodotti con "DOC" = +0.10
+    Testo e compatto usano la ricerca di sottostringhe di str (in C), le
+    regex sono compilate qui una volta; min > 1 conta le occorrenze senza
+    sovrapposizioni (come str.count / re.findall).
+    """
+    tipo, valore = signal.get('tipo'), signal.get('valore')
+    if tipo not in _SIGNAL_TYPES or not valore:
+        raise ValueError(f"Segnale non valido: {signal}")
+    minimo = int(signal.get('min') or 1)
+    finestra = signal.get('finestra') or DETECT_CHARS
+
+    if tipo == 'testo':
+        if minimo == 1:
+            return lambda x: x.t.find(valore, 0, finestra) >= 0
+        return lambda x: x.t.count(valore, 0, finestra) >= minimo
+
+    if tipo == 'compatto':
+        valore = valore.replace(" ", "")
+        if finestra < DETECT_CHARS:
+            return lambda x: x.t[:finestra].replace(" ", "").count(valore) >= minimo
+        if minimo == 1:
+            return lambda x: valore in x.compact
+        return lambda x: x.compact.count(valore) >= minimo
+
+    try:
+        pattern = re.compile(_literal_first(valore))
+    except re.error as e:
+        raise ValueError(f"Regex non valida '{valore}': {e}")
+    if minimo == 1:
+        return lambda x: pattern.search(x.t, 0, finestra) is not None
+    return lambda x: len(pattern.findall(x.t, 0, finestra)) >= minimo
+
+
+class VendorDetector:
+    """
+    Regole di detection compilate.
 
-    Threshold: score >= 0.70 → DOC_GENERICI
+    Ogni segnale distinto e' compilato una volta e valutato al piu' una volta
+    per testo, solo quando una regola lo richiede: le regole sono provate in
+    ordine di priorita' e la prima soddisfatta decide, quindi i vendor a
+    priorita' bassa non rallentano il riconoscimento degli altri.
+    """
 
-    Args:
-        text: Testo PDF uppercase
+    def __init__(self, rules: List[Dict[str, Any]], version: str = 'default'):
+        self.version = version
+        self.rules: List[Dict[str, Any]] = []
+        self._checks: List[Callable[[_Text], bool]] = []
+        index: Dict[Tuple, int] = {}
+
+        def signal_index(signal: Dict[str, Any]) -> int:
+            key = (signal.get('tipo'), signal.get('valore'), signal.get('finestra'), signal.get('min'))
+            if key not in index:
+                index[key] = len(self._checks)
+                self._checks.append(_compile_signal(signal))
+            return index[key]
+
+        for n, rule in enumerate(rules):
+            if not rule.get('vendor'):
+                raise ValueError(f"Regola {n} senza vendor")
+            compiled = {
+                'vendor': rule['vendor'].upper(),
+                'priorita': int(rule.get('priorita') or 0),
+                'ordine': n,
+                'definizione': rule,
+            }
+            if rule.get('criteri'):
+                compiled['soglia'] = float(rule.get('soglia') or 0)
+                compiled['criteri'] = [
+                    (float(c['peso']), [signal_index(s) for s in c['segnali']])
+                    for c in rule['criteri']
+                ]
+            elif rule.get('segnali'):
+                compiled['confidenza'] = float(rule['confidenza'])
+                compiled['segnali'] = [signal_index(s) for s in rule['segnali']]
+            else:
+                raise ValueError(f"Regola {n} ({rule['vendor']}) senza segnali o criteri")
+            self.rules.append(compiled)
+        self.rules.sort(key=lambda r: (r['priorita'], r['ordine']))
+
+    def candidates(self, text: str, first_only: bool = False) -> List[Tuple[str, float]]:
+        """Regole soddisfatte in ordine di priorita': [(vendor, confidenza)]."""
+        x = _Text(text)
+        checks = self._checks
+        memo: Dict[int, bool] = {}
+
+        def present(i: int) -> bool:
+            found = memo.get(i)
+            if found is None:
+                found = memo[i] = checks[i](x)
+            return found
+
+        result = []
+        for rule in self.rules:
+            if 'criteri' in rule:
+                score = 0.0
+                for peso, segnali in rule['criteri']:
+                    if all(present(i) for i in segnali):
+                        score += peso
+                if score < rule['soglia']:
+                    continue
+                result.append((rule['vendor'], score))
+            elif all(present(i) for i in rule['segnali']):
+                result.append((rule['vendor'], rule['confidenza']))
+            else:
+                continue
+            if first_only:
+                break
+        return result
+
+    def detect(self, text: str) -> Tuple[str, float]:
+        found = self.candidates(text, first_only=True)
+        return found[0] if found else ("UNKNOWN", 0.0)
+
+
+_detector: Optional[VendorDetector] = None
+
+
+def get_detector() -> VendorDetector:
+    """Detector corrente (regole di default finche' non caricate dal DB)."""
+    global _detector
+    if _detector is None:
+        _detector = VendorDetector(DEFAULT_RULES)
+    return _detector
+
+
+def set_detection_rules(rules: List[Dict[str, Any]], version: str = 'default') -> VendorDetector:
+    """
+    Compila e attiva un nuovo insieme di regole.
 
-    Returns:
-        Score di confidence (0.0-1.0)
+    Raises:
+        ValueError: regole non valide (il detector corrente resta attivo)
     """
-    score = 0.0
+    global _detector
+    _detector = VendorDetector(rules, version)
+    return _detector
 
-    # Check TRANSFER ORDER con numero 10 cifre
-    if re.search(r'TRANSFER\s+ORDER\s+NUM\.\s*\d{10}', text):
-        score += 0.25
 
-    # Check Grossista (caratteristica distintiva) - nelle prime 500 char
-    if re.search(r'GROSSISTA\s+[A-Z]', text[:500]):
-        score += 0.15
+def get_detection_rules() -> Tuple[List[Dict[str, Any]], str]:
+    """Regole attive (definizioni originali) e versione, es. per i processi del pool."""
+    detector = get_detector()
+    return [r['definizione'] for r in sorted(detector.rules, key=lambda r: r['ordine'])], detector.version
 
-    # Check Agente con codice 5 cifre
-    if re.search(r'AGENTE\s+\d{5}', text):
-        score += 0.15
 
-    # Check indirizzi separati (CARATTERISTICA CHIAVE DOC GENERICI)
-    if 'IND.FISCALE' in text and 'IND.CONSEGNA MERCE' in text:
-        score += 0.20
+# =============================================================================
+# API
+# =============================================================================
 
-    # Check header tabella COD. A.I.C.
-    if 'COD. A.I.C.' in text:
-        score += 0.15
+def detect_vendor(text: str, filename: str = "") -> Tuple[str, float]:
+    """
+    Rileva il vendor dal testo PDF.
+
+    v6.2: Detection basata ESCLUSIVAMENTE su contenuto PDF.
+    Il nome file viene IGNORATO per tutti i vendor.
+
+    Args:
+        text: Testo estratto dal PDF
+        filename: Nome file PDF (IGNORATO - mantenuto per retrocompatibilità)
+
+    Returns:
+        Tuple (vendor_code, confidence)
+        confidence: 0.0-1.0
+    """
+    return get_detector().detect(text)
 
-    # Check prodotti "DOC" (frequenti nei generici)
-    doc_count = len(re.findall(r'\bDOC\b', text))
-    if doc_count >= 5:
-        score += 0.10
 
-    return score
+def score_vendors(text: str) -> List[Dict[str, Any]]:
+    """
+    Tutti i vendor candidati per il testo, in ordine di priorita'.
+
+    Il primo e' quello scelto da detect_vendor; gli altri indicano
+    ambiguita' tra layout (utile per scrivere o correggere regole).
+    """
+    seen = {}
+    for vendor, confidence in get_detector().candidates(text):
+        seen.setdefault(vendor, confidence)
+    return [{'vendor': v, 'confidence': c} for v, c in seen.items()]
 
 
 # =============================================================================
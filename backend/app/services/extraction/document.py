@@ -0,0 +1,262 @@
+# =============================================================================
+# SERV.O v11.7 - PARSED DOCUMENT
+# =============================================================================
+# Documento PDF aperto una sola volta e condiviso tra
+# estrazione testo, detect vendor ed estrattori. Testo, parole e tabelle
+# vengono calcolati solo alla prima richiesta e memorizzati per pagina e
+# parametri (x_tolerance, table_settings...).
+#
+# v11.7: il testo "normalizzato" (x_tolerance=5 + fix encoding) si legge
+# pagina per pagina con joined_text(max_chars): il detect vendor legge solo
+# le prime pagine, le altre vengono estratte solo se l'estrattore le chiede.
+#
+# v11.7: la lettura passa da un backend (backends.py): pdfplumber di default,
+# pdfium per i vendor configurati (use_backend dopo il detect vendor).
+# =============================================================================
+
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+from .backends import (
+    PDFPLUMBER_AVAILABLE, DEFAULT_BACKEND, Bbox, PdfBackend, open_backend, switch_backend,
+)
+
+
+class ParsedDocument:
+    """
+    Wrapper di un documento PDF aperto, con cache lazy per pagina.
+
+    Uso:
+        with ParsedDocument(file_content) as doc:
+            text = doc.text(0, x_tolerance=5)
+            tables = doc.tables(0)
+    """
+
+    def __init__(self, source: Union[bytes, str],
+                 text_fixer: Optional[Callable[[str], str]] = None,
+                 backend: str = DEFAULT_BACKEND):
+        """
+        Args:
+            source: Contenuto binario del PDF o percorso su disco
+            text_fixer: Correzione applicata al testo di plain_text (es. ftfy)
+            backend: Backend di lettura (pdfplumber, pdfium)
+        """
+        self._source = source
+        self.backend_name = backend
+        self._pdf: Optional[PdfBackend] = open_backend(backend, source)
+        self._page_count = self._pdf.page_count
+        self._cache: Dict[tuple, Any] = {}
+        # Chiavi della cache calcolate con un backend diverso da pdfplumber
+        self._fast_keys: Set[tuple] = set()
+        self._text_fixer = text_fixer
+        # True se l'ultimo joined_text si e' fermato prima dell'ultima pagina
+        self.text_truncated = False
+        # Estrazioni calcolate dal PDF (non trovate in cache)
+        self.parsed = 0
+
+    @classmethod
+    def from_cache(cls, cache: Dict[tuple, Any], page_count: int,
+                   source: Union[bytes, str, None] = None,
+                   text_fixer: Optional[Callable[[str], str]] = None) -> 'ParsedDocument':
+        """
+        v11.7: Documento ricostruito da un artefatto salvato (vedi artefacts.py).
+
+        Le estrazioni presenti in cache non aprono il PDF; alla prima assente
+        il PDF viene aperto da source, se disponibile, altrimenti LookupError.
+        """
+        doc = cls.__new__(cls)
+        doc._source = source
+        doc.backend_name = DEFAULT_BACKEND
+        doc._pdf = None
+        doc._page_count = page_count
+        doc._cache = dict(cache)
+        doc._fast_keys = set()
+        doc._text_fixer = text_fixer
+        doc.text_truncated = False
+        doc.parsed = 0
+        return doc
+
+    def cache_items(self) -> List[Tuple[tuple, Any]]:
+        """Estrazioni in cache: (kind, page_no, opzioni) -> valore."""
+        return list(self._cache.items())
+
+    # -------------------------------------------------------------------------
+    # Ciclo di vita
+    # -------------------------------------------------------------------------
+
+    def close(self) -> None:
+        """Chiude il documento e libera la cache."""
+        if self._pdf is not None:
+            self._pdf.close()
+            self._pdf = None
+        self._source = None
+        self._cache.clear()
+        self._fast_keys.clear()
+
+    def __enter__(self) -> 'ParsedDocument':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # -------------------------------------------------------------------------
+    # Accesso pagine
+    # -------------------------------------------------------------------------
+
+    def _open(self) -> PdfBackend:
+        if self._pdf is None:
+            if self._source is None:
+                raise LookupError("estrazione non presente nell'artefatto e PDF non disponibile")
+            self._pdf = open_backend(self.backend_name, self._source)
+        return self._pdf
+
+    def use_backend(self, backend: str) -> bool:
+        """
+        v11.7: Legge le estrazioni successive con un altro backend (es. pdfium
+        per il vendor rilevato, vedi backend_for_vendor).
+
+        Passando a pdfplumber le estrazioni gia' calcolate con un altro backend
+        vengono scartate (saranno rilette con pdfplumber): per i vendor non
+        abilitati l'estrattore vede solo l'output di riferimento.
+
+        Returns:
+            True se delle estrazioni in cache sono state scartate
+        """
+        if backend == self.backend_name:
+            return False
+        if self._pdf is not None:
+            self._pdf = switch_backend(self._pdf, backend, self._source)
+        self.backend_name = backend
+
+        if backend != DEFAULT_BACKEND or not self._fast_keys:
+            return False
+        for key in self._fast_keys:
+            self._cache.pop(key, None)
+        self._fast_keys.clear()
+        return True
+
+    @property
+    def pages(self) -> list:
+        """Pagine pdfplumber (per estrazioni non coperte dai metodi in cache)."""
+        return self._open().pages
+
+    @property
+    def page_count(self) -> int:
+        return self._page_count
+
+    def _store(self, key: tuple, value: Any) -> None:
+        self._cache[key] = value
+        if self.backend_name != DEFAULT_BACKEND:
+            self._fast_keys.add(key)
+
+    def _cached(self, kind: str, page_no: int, options: Dict[str, Any], compute):
+        key = (kind, page_no, repr(sorted(options.items())))
+        if key not in self._cache:
+            self._store(key, compute(self._open()))
+            self.parsed += 1
+        return self._cache[key]
+
+    def text(self, page_no: int, x_tolerance: float = 3, y_tolerance: float = 3) -> str:
+        """Testo della pagina (extract_text), stringa vuota se assente."""
+        return self._cached(
+            'text', page_no, {'x': x_tolerance, 'y': y_tolerance},
+            lambda pdf: pdf.text(page_no, x_tolerance, y_tolerance)
+        )
+
+    def words(self, page_no: int, x_tolerance: float = 3, y_tolerance: float = 3) -> List[Dict]:
+        """Parole della pagina con coordinate (extract_words)."""
+        return self._cached(
+            'words', page_no, {'x': x_tolerance, 'y': y_tolerance},
+            lambda pdf: pdf.words(page_no, x_tolerance, y_tolerance)
+        )
+
+    def tables(self, page_no: int, table_settings: Optional[Dict[str, Any]] = None) -> List[List]:
+        """Tabelle della pagina (extract_tables)."""
+        return self._cached(
+            'tables', page_no, table_settings or {},
+            lambda pdf: pdf.tables(page_no, table_settings)
+        )
+
+    def page_bbox(self, page_no: int) -> List[float]:
+        """Bbox della pagina (x0, top, x1, bottom)."""
+        return self._cached('page_bbox', page_no, {}, lambda pdf: pdf.page_bbox(page_no))
+
+    def located_tables(self, page_no: int, table_settings: Optional[Dict[str, Any]] = None,
+                       bbox: Optional[Bbox] = None) -> Dict[str, Any]:
+        """
+        v11.7: Tabelle della pagina con il loro bbox, con bbox solo quelle
+        dell'area ritagliata (vedi table_regions.py).
+
+        Returns:
+            {'tables': [{'bbox', 'rows'}, ...], 'clipped': ritaglio che taglia delle linee}
+        """
+        options = dict(table_settings or {})
+        if bbox is not None:
+            options['crop'] = list(bbox)
+        return self._cached(
+            'located_tables', page_no, options,
+            lambda pdf: pdf.located_tables(page_no, table_settings, options.get('crop'))
+        )
+
+    # -------------------------------------------------------------------------
+    # Testo normalizzato, letto pagina per pagina (v11.7)
+    # -------------------------------------------------------------------------
+
+    def plain_text(self, page_no: int) -> str:
+        """
+        Testo della pagina usato da detect vendor ed estrattori testuali:
+        x_tolerance=5 (v10.6, evita "CANTARERODEI") e text_fixer applicato.
+        """
+        # Senza _cached: con il testo grezzo gia' in cache il PDF non va aperto
+        key = ('plain_text', page_no, '[]')
+        if key not in self._cache:
+            self._store(key, self._fix(self.text(page_no, x_tolerance=5, y_tolerance=3)))
+        return self._cache[key]
+
+    def _fix(self, page_text: str) -> str:
+        return self._text_fixer(page_text) if self._text_fixer else page_text
+
+    def joined_text(self, max_chars: Optional[int] = None) -> Tuple[str, List[str]]:
+        """
+        Testo e righe delle pagine, nel formato di process_pdf (pagina + "\n").
+
+        Con max_chars si fermano le pagine appena il testo raggiunge la
+        lunghezza richiesta: il risultato e' un prefisso del testo completo,
+        e le pagine gia' lette restano in cache per una chiamata successiva.
+        """
+        text = ""
+        lines: List[str] = []
+        self.text_truncated = False
+        for page_no in range(self.page_count):
+            if max_chars is not None and len(text) >= max_chars:
+                self.text_truncated = True
+                break
+            page_text = self.plain_text(page_no)
+            text += page_text + "\n"
+            lines.extend(page_text.split('\n'))
+        return text, lines
+
+
+def full_text(text: str, lines: List[str], doc: Any) -> Tuple[str, List[str]]:
+    """
+    Testo completo per i fallback testuali degli estrattori in LAZY_TEXT_VENDORS:
+    se il chiamante ha passato solo le prime pagine (joined_text troncato)
+    legge le restanti dal documento, altrimenti ritorna text e lines invariati.
+    """
+    if isinstance(doc, ParsedDocument) and doc.text_truncated:
+        return doc.joined_text()
+    return text, lines
+
+
+@contextmanager
+def open_document(source: Union['ParsedDocument', bytes, str, None]) -> Iterator[Optional[ParsedDocument]]:
+    """
+    Documento per gli estrattori: un ParsedDocument passato dal chiamante
+    viene riusato (e lasciato aperto); un percorso o dei bytes vengono aperti
+    e chiusi all'uscita. None se il documento non e' disponibile.
+    """
+    if source is None or isinstance(source, ParsedDocument):
+        yield source
+        return
+    with ParsedDocument(source) as doc:
+        yield doc
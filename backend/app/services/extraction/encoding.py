@@ -0,0 +1,140 @@
+# =============================================================================
+# SERV.O v11.7 - FIX ENCODING TESTO PDF
+# =============================================================================
+# Correzione del mojibake (UTF-8 letto come Latin-1/cp1252, es. "BONDÃ¬")
+# nel testo delle pagine. ftfy.fix_text costa quanto l'intera lettura del
+# testo, ma la gran parte delle pagine e' pulita: un pre-scan con una sola
+# regex compilata individua le pagine che ftfy o il fix manuale potrebbero
+# modificare, le altre sono restituite invariate.
+#
+# Pagina pulita = nessuna delle seguenti:
+#   - due caratteri non ASCII consecutivi (il mojibake e' sempre una
+#     sequenza: "Ã¨", "Â°", "â€™")
+#   - caratteri fuori da ASCII stampabile + Latin-1 (0xA0-0xFF) + "€",
+#     oppure "Ã"/"Â" anche isolati (controlli C1, virgolette curve,
+#     legature, \r, ... che ftfy normalizza)
+#   - entita' HTML ("&amp;", "&#39;")
+# Su queste pagine ftfy.fix_text e il fix manuale non cambiano il testo
+# (verificato carattere per carattere con ftfy 6.x), quindi il risultato e'
+# identico a prima.
+# =============================================================================
+
+import re
+import threading
+from typing import Dict
+
+try:
+    import ftfy
+    FTFY_AVAILABLE = True
+except ImportError:
+    FTFY_AVAILABLE = False
+    print("⚠️ ftfy non disponibile - usando fix manuale")
+
+
+# Marker di testo da correggere (vedi intestazione)
+_MOJIBAKE_MARKERS_RE = re.compile(
+    r'[^\t\n\x20-\x7e]{2}'
+    r'|[^\t\n\x20-\x7e\xa0-\xc1\xc4-\xff€]'
+    r'|&#?[0-9A-Za-z]{1,24};'
+)
+
+# Pattern mojibake comuni in italiano, applicati in un solo passaggio
+_MANUAL_REPLACEMENTS = {
+    'Ã¬': 'ì',  # ì - i grave
+    'Ã¨': 'è',  # è - e grave
+    'Ã²': 'ò',  # ò - o grave
+    'Ã¹': 'ù',  # ù - u grave
+    'Ã ': 'à',  # à - a grave (con spazio dopo)
+    'Ã©': 'é',  # é - e acute
+    'Ã³': 'ó',  # ó - o acute
+}
+_MANUAL_REPLACEMENTS_RE = re.compile('|'.join(map(re.escape, _MANUAL_REPLACEMENTS)))
+
+
+# =============================================================================
+# CONTATORI
+# =============================================================================
+# Per processo: le pagine lette nel pool di estrazione restano nei contatori
+# del processo figlio.
+
+_stats_lock = threading.Lock()
+_stats: Dict[str, int] = {'pulite': 0, 'riparate': 0, 'modificate': 0}
+
+
+def _count(percorso: str) -> None:
+    with _stats_lock:
+        _stats[percorso] += 1
+
+
+def get_encoding_stats() -> Dict[str, int]:
+    """
+    Pagine passate dal fix encoding per percorso:
+    pulite (pre-scan negativo, ftfy saltato), riparate (ftfy + fix manuale),
+    modificate (riparate il cui testo e' effettivamente cambiato).
+    """
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_encoding_stats() -> None:
+    """Azzera i contatori (test, benchmark)."""
+    with _stats_lock:
+        for key in _stats:
+            _stats[key] = 0
+
+
+# =============================================================================
+# FIX
+# =============================================================================
+
+def needs_encoding_fix(text: str) -> bool:
+    """True se il testo contiene marker di mojibake (o caratteri che ftfy normalizza)."""
+    return _MOJIBAKE_MARKERS_RE.search(text) is not None
+
+
+def fix_encoding_manual(text: str) -> str:
+    """
+    Fix manuale per mojibake UTF-8 comuni in italiano.
+    Usato come fallback se ftfy non è disponibile.
+
+    Pattern: UTF-8 bytes interpretati come Latin-1
+    """
+    if not text:
+        return text
+
+    # Approccio: prova a decodificare come se fosse Latin-1 encodato in UTF-8
+    try:
+        # Se il testo contiene sequenze mojibake tipiche, prova a fixarle
+        if 'Ã' in text:
+            # Encode come Latin-1, decode come UTF-8
+            fixed = text.encode('latin-1', errors='ignore').decode('utf-8', errors='ignore')
+            if fixed:
+                return fixed
+    except (UnicodeDecodeError, UnicodeEncodeError):
+        pass
+
+    # Fallback: replace pattern specifici comuni
+    return _MANUAL_REPLACEMENTS_RE.sub(lambda m: _MANUAL_REPLACEMENTS[m.group()], text)
+
+
+def fix_text_encoding(text: str, manual: bool = True) -> str:
+    """
+    Fix encoding del testo di una pagina: ftfy (se disponibile) e poi il fix
+    manuale per i pattern non gestiti da ftfy, solo se il pre-scan trova
+    marker di mojibake.
+
+    Args:
+        text: Testo della pagina
+        manual: Applica il fix manuale dopo ftfy (False = solo ftfy)
+    """
+    if not text or not needs_encoding_fix(text):
+        _count('pulite')
+        return text
+
+    _count('riparate')
+    fixed = ftfy.fix_text(text) if FTFY_AVAILABLE else text
+    if manual:
+        fixed = fix_encoding_manual(fixed)
+    if fixed != text:
+        _count('modificate')
+    return fixed
@@ -0,0 +1,149 @@
+# =============================================================================
+# SERV.O v11.7 - AREA TABELLA PRODOTTI PER VENDOR
+# =============================================================================
+# Gli estrattori a tabelle (COOPER, MENARINI, RECKITT) leggevano le tabelle
+# dell'intera pagina, per ogni pagina, scartando poi quelle di intestazione
+# e pie' di pagina. Il costo di extract_tables cresce con gli oggetti della
+# pagina (bordi da intersecare, caratteri da assegnare alle celle).
+#
+# Con un TableProfile per vendor la prima pagina di ogni layout viene letta
+# intera e individua il bbox delle tabelle prodotti (quelle da cui
+# l'estrattore legge righe); le pagine successive con lo stesso layout sono
+# ritagliate a quell'area (+ margine) prima della ricerca tabelle.
+#
+# Il ritaglio e' accettato solo se contiene tabelle prodotti e nessuna linea
+# attraversa un bordo del ritaglio interno alla pagina (tabella tagliata o
+# unita a una tabella fuori area): altrimenti la pagina e' riletta intera e
+# il layout non viene piu' ritagliato per il resto del documento (al piu' una
+# lettura in piu' per layout). L'area e' appresa per documento, non tra
+# documenti: la sequenza di letture dipende solo dal PDF e si ripete uguale
+# rileggendo un artefatto (artefacts.py).
+# =============================================================================
+
+import threading
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from .backends import Bbox
+
+# Margine attorno all'area appresa
+REGION_MARGIN = 8.0
+
+# Layout di pagina per cui si apprende un'area
+_FIRST_PAGE = 'prima'
+_NEXT_PAGES = 'seguenti'
+
+
+class TableProfile(NamedTuple):
+    """Layout della tabella prodotti di un vendor."""
+    vendor: str
+    # Indici delle tabelle (righe estratte) da cui l'estrattore legge prodotti
+    product_tables: Callable[[List[List]], List[int]]
+    table_settings: Optional[Dict[str, Any]] = None
+    # Tutte le pagine con il layout della prima (es. un ordine per pagina);
+    # altrimenti l'area e' appresa sulla seconda pagina per le seguenti
+    same_layout_pages: bool = False
+    # Ritaglio esteso fino a fondo pagina (tabella che continua o sezioni
+    # successive, es. RESI, sotto l'area appresa)
+    to_page_bottom: bool = False
+
+
+# =============================================================================
+# CONTATORI
+# =============================================================================
+# Per processo, come i contatori del fix encoding.
+
+_stats_lock = threading.Lock()
+_stats: Dict[str, int] = {'intere': 0, 'ritagliate': 0, 'rilette': 0}
+
+
+def _count(percorso: str) -> None:
+    with _stats_lock:
+        _stats[percorso] += 1
+
+
+def get_table_region_stats() -> Dict[str, int]:
+    """
+    Pagine lette per tabelle prodotti: intere (prima pagina del layout o
+    senza area), ritagliate (ritaglio accettato), rilette (ritaglio
+    scartato e pagina riletta intera).
+    """
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_table_region_stats() -> None:
+    """Azzera i contatori (test, benchmark)."""
+    with _stats_lock:
+        for key in _stats:
+            _stats[key] = 0
+
+
+# =============================================================================
+# LETTURA
+# =============================================================================
+
+def _union(boxes: List[Bbox]) -> Bbox:
+    return (min(b[0] for b in boxes), min(b[1] for b in boxes),
+            max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+
+class TableRegions:
+    """
+    Tabelle prodotti delle pagine di un documento, ritagliate all'area
+    appresa. Un'istanza per estrazione:
+
+        regions = TableRegions(doc, COOPER_TABLES)
+        for page_no in range(doc.page_count):
+            tables = regions.tables(page_no)
+    """
+
+    def __init__(self, doc, profile: TableProfile):
+        self._doc = doc
+        self._profile = profile
+        # Area appresa per layout, None = layout non ritagliato (ritaglio scartato)
+        self._regions: Dict[str, Optional[Bbox]] = {}
+
+    def _layout(self, page_no: int) -> str:
+        if page_no == 0 or self._profile.same_layout_pages:
+            return _FIRST_PAGE
+        return _NEXT_PAGES
+
+    def _crop_box(self, page_no: int, region: Bbox) -> Bbox:
+        page = self._doc.page_bbox(page_no)
+        x0, top, x1, bottom = region
+        bottom = page[3] if self._profile.to_page_bottom else bottom + REGION_MARGIN
+        return (max(page[0], x0 - REGION_MARGIN), max(page[1], top - REGION_MARGIN),
+                min(page[2], x1 + REGION_MARGIN), min(page[3], bottom))
+
+    def tables(self, page_no: int) -> List[List]:
+        """Tabelle della pagina (come ParsedDocument.tables) lette dall'area appresa."""
+        settings = self._profile.table_settings
+        layout = self._layout(page_no)
+
+        # Prima pagina di un layout che non si ripete: nessuna area da apprendere
+        # (stessa lettura, e cache, di doc.tables, es. intestazione RECKITT)
+        if layout == _FIRST_PAGE and not self._profile.same_layout_pages:
+            _count('intere')
+            return self._doc.tables(page_no, settings)
+
+        region = self._regions.get(layout)
+        if region is not None:
+            crop = self._crop_box(page_no, region)
+            located = self._doc.located_tables(page_no, settings, crop)
+            rows = [t['rows'] for t in located['tables']]
+            if not located['clipped'] and self._profile.product_tables(rows):
+                _count('ritagliate')
+                return rows
+            _count('rilette')
+        else:
+            _count('intere')
+
+        located = self._doc.located_tables(page_no, settings)
+        rows = [t['rows'] for t in located['tables']]
+        if layout not in self._regions:
+            boxes = [tuple(located['tables'][i]['bbox']) for i in self._profile.product_tables(rows)]
+            if boxes:
+                self._regions[layout] = _union(boxes)
+        else:
+            self._regions[layout] = None
+        return rows
@@ -8,6 +8,7 @@ import re
 from typing import Dict, List, Optional
 
 from ....utils import parse_date, parse_decimal, parse_int, normalize_aic_simple
+from ..document import ParsedDocument
 from ...espositore import elabora_righe_ordine
 
 
@@ -15,7 +16,7 @@ from ...espositore import elabora_righe_ordine
 # FUNZIONE PRINCIPALE (copiata esatta dal notebook)
 # =============================================================================
 
-def extract_angelini(text: str, lines: List[str], pdf_path: str = None) -> List[Dict]:
+def extract_angelini(text: str, lines: List[str], doc: ParsedDocument = None) -> List[Dict]:
     """
     Estrattore completo per PDF ANGELINI/ACRAF.
     COPIATO ESATTO dal notebook SERV.O_ANGELINI_v3_REAL.ipynb
@@ -372,6 +373,6 @@ def extract_angelini(text: str, lines: List[str], pdf_path: str = None) -> List[
 # WRAPPER
 # =============================================================================
 
-def extract(text: str, lines: List[str], pdf_path: str = None) -> List[Dict]:
+def extract(text: str, lines: List[str], doc: ParsedDocument = None) -> List[Dict]:
     """Wrapper per compatibilità."""
-    return extract_angelini(text, lines, pdf_path)
+    return extract_angelini(text, lines, doc)
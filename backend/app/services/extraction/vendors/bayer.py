@@ -16,11 +16,11 @@ v11.1: Rimossa logica espositore parent/child (BAYER espositori sono prodotti au
 """
 
 import re
-import pdfplumber
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 
 from ....utils import parse_date, parse_decimal, parse_int, normalize_aic_simple, format_piva
+from ..document import ParsedDocument, open_document
 
 
 # Keywords per identificare espositori (flag informativo, NO logica parent/child)
@@ -180,7 +180,7 @@ def _validate_aic(codice_raw: str) -> Tuple[str, bool, Optional[str]]:
     return (aic_norm, True, None)
 
 
-def _extract_products_from_table(pdf_path: str, date_columns: List[Tuple[str, Optional[datetime]]]) -> List[Dict]:
+def _extract_products_from_table(doc: ParsedDocument, date_columns: List[Tuple[str, Optional[datetime]]]) -> List[Dict]:
     """
     Estrae i prodotti dalla tabella PDF usando pdfplumber table extraction.
 
@@ -201,8 +201,8 @@ def _extract_products_from_table(pdf_path: str, date_columns: List[Tuple[str, Op
     products = []
 
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            tables = pdf.pages[0].extract_tables()
+        with open_document(doc) as pdf:
+            tables = pdf.tables(0)
             if not tables:
                 return []
 
@@ -285,7 +285,7 @@ def _extract_products_from_table(pdf_path: str, date_columns: List[Tuple[str, Op
     return products
 
 
-def extract_bayer(text: str, lines: List[str], pdf_path: str = None) -> List[Dict]:
+def extract_bayer(text: str, lines: List[str], doc: ParsedDocument = None) -> List[Dict]:
     """
     Estrae dati da PDF BAYER (formato SAP).
 
@@ -372,8 +372,8 @@ def extract_bayer(text: str, lines: List[str], pdf_path: str = None) -> List[Dic
 
     # Prova prima estrazione tabellare (più accurata per colonne date)
     products = []
-    if pdf_path:
-        products = _extract_products_from_table(pdf_path, date_columns)
+    if doc:
+        products = _extract_products_from_table(doc, date_columns)
 
     # Fallback: estrazione da testo se tabella fallisce
     if not products:
@@ -483,7 +483,7 @@ def extract_bayer(text: str, lines: List[str], pdf_path: str = None) -> List[Dic
     data['anomalie'] = anomalie
 
     # Stats per debug
-    extraction_method = 'table' if pdf_path and products else 'text'
+    extraction_method = 'table' if doc and products else 'text'
     data['_stats'] = {
         'extraction_method': extraction_method,
         'date_columns': len(date_columns),
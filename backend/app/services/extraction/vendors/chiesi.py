@@ -9,6 +9,7 @@ import re
 from typing import Dict, List
 
 from ....utils import parse_date, normalize_aic, format_piva
+from ..document import ParsedDocument
 
 
 # Pattern compilato per righe prodotto CHIESI
@@ -17,7 +18,7 @@ CHIESI_ROW_PATTERN = re.compile(
 )
 
 
-def extract_chiesi(text: str, lines: List[str], pdf_path: str = None) -> List[Dict]:
+def extract_chiesi(text: str, lines: List[str], doc: ParsedDocument = None) -> List[Dict]:
     """
     Estrae dati da PDF CHIESI.
     
@@ -9,9 +9,10 @@ import re
 from typing import Dict, List
 
 from ....utils import provincia_nome_to_sigla, format_piva
+from ..document import ParsedDocument
 
 
-def extract_codifi(text: str, lines: List[str], pdf_path: str = None) -> List[Dict]:
+def extract_codifi(text: str, lines: List[str], doc: ParsedDocument = None) -> List[Dict]:
     """
     Estrae dati da PDF CODIFI v3.0.
     
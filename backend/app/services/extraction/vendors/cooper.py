@@ -19,12 +19,9 @@ Particolarità:
 import re
 from typing import Dict, List, Tuple
 
-# Import pdfplumber per estrazione tabelle
-try:
-    import pdfplumber
-    PDFPLUMBER_AVAILABLE = True
-except ImportError:
-    PDFPLUMBER_AVAILABLE = False
+# v11.7: documento PDF condiviso (pdfplumber aperto una sola volta)
+from ..document import ParsedDocument, open_document, full_text, PDFPLUMBER_AVAILABLE
+from ..table_regions import TableProfile, TableRegions
 
 
 def _fix_concatenated_text(text: str) -> str:
@@ -117,7 +114,7 @@ def _fix_locality_name(text: str) -> str:
     return result.strip()
 
 
-def extract_cooper(text: str, lines: List[str], pdf_path: str = None) -> List[Dict]:
+def extract_cooper(text: str, lines: List[str], doc: ParsedDocument = None) -> List[Dict]:
     """
     Estrattore COOPER v11.2.
 
@@ -127,16 +124,18 @@ def extract_cooper(text: str, lines: List[str], pdf_path: str = None) -> List[Di
 
     # v11.2: Estrai testo direttamente dal PDF con x_tolerance=1 per spacing corretto
     # NOTA: Per COOPER, x_tolerance=1 preserva gli spazi, valori più alti li rimuovono!
-    if pdf_path and PDFPLUMBER_AVAILABLE:
+    if doc and PDFPLUMBER_AVAILABLE:
         try:
-            with pdfplumber.open(pdf_path) as pdf:
+            with open_document(doc) as pdf:
                 text_parts = []
-                for page in pdf.pages:
-                    page_text = page.extract_text(x_tolerance=1, y_tolerance=1) or ""
+                for page_no in range(pdf.page_count):
+                    page_text = pdf.text(page_no, x_tolerance=1, y_tolerance=1)
                     text_parts.append(page_text)
                 text = "\n".join(text_parts)
         except Exception as e:
             print(f"   ⚠️ Errore lettura PDF COOPER: {e}")
+            # v11.7: testo ricevuto solo per le prime pagine (LAZY_TEXT_VENDORS)
+            text, lines = full_text(text, lines, doc)
 
     # === HEADER: Codice Ordine, Data Ordine ===
     # v11.2: Estrai solo parte dopo "PAD-" (es: "BRETAM-PAD-000296/01" → "000296/01")
@@ -166,13 +165,13 @@ def extract_cooper(text: str, lines: List[str], pdf_path: str = None) -> List[Di
     _extract_spedizione_fallback(text, data)
 
     # === TABELLA PRODOTTI ===
-    if pdf_path and PDFPLUMBER_AVAILABLE:
+    if doc and PDFPLUMBER_AVAILABLE:
         try:
-            righe = _extract_products_from_pdf(pdf_path)
+            righe = _extract_products_from_pdf(doc)
             data['righe'] = righe
         except Exception as e:
             print(f"   ⚠️ Errore estrazione COOPER con PDF: {e}")
-            data['righe'] = _extract_products_from_text(lines)
+            data['righe'] = _extract_products_from_text(full_text(text, lines, doc)[1])
     else:
         data['righe'] = _extract_products_from_text(lines)
 
@@ -245,22 +244,32 @@ def _extract_spedizione_fallback(text: str, data: Dict):
         data['provincia'] = m.group(2).strip().upper()
 
 
-def _extract_products_from_pdf(pdf_path: str) -> List[Dict]:
+def _product_tables(tables: List[List]) -> List[int]:
+    """Tabelle con righe lette da _extract_products_from_pdf (almeno 5 colonne)."""
+    return [i for i, table in enumerate(tables) if any(row and len(row) >= 5 for row in table or [])]
+
+
+# v11.2: Table settings con spacing corretto
+# NOTA: Per COOPER, x_tolerance=1 preserva gli spazi originali del PDF
+# v11.7: pagine successive ritagliate all'area della tabella prodotti (fino a
+# fondo pagina: la sezione RESI segue la tabella)
+COOPER_TABLES = TableProfile(
+    'COOPER', _product_tables,
+    table_settings={"text_x_tolerance": 1, "text_y_tolerance": 1},
+    to_page_bottom=True,
+)
+
+
+def _extract_products_from_pdf(doc: ParsedDocument) -> List[Dict]:
     """Estrae prodotti usando pdfplumber per parsing tabelle accurato."""
     righe = []
     n_riga = 0
     in_resi_section = False
 
-    # v11.2: Table settings con spacing corretto
-    # NOTA: Per COOPER, x_tolerance=1 preserva gli spazi originali del PDF
-    table_settings = {
-        "text_x_tolerance": 1,
-        "text_y_tolerance": 1,
-    }
-
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            tables = page.extract_tables(table_settings=table_settings)
+    with open_document(doc) as pdf:
+        regions = TableRegions(pdf, COOPER_TABLES)
+        for page_no in range(pdf.page_count):
+            tables = regions.tables(page_no)
 
             for table in tables:
                 if not table:
@@ -23,13 +23,14 @@ import re
 from typing import Dict, List, Optional
 
 from ....utils import parse_date, parse_int
+from ..document import ParsedDocument
 
 
 # =============================================================================
 # FUNZIONE PRINCIPALE
 # =============================================================================
 
-def extract_doc_generici(text: str, lines: List[str], pdf_path: str = None) -> List[Dict]:
+def extract_doc_generici(text: str, lines: List[str], doc: ParsedDocument = None) -> List[Dict]:
     """
     Estrattore per Transfer Order DOC GENERICI.
 
@@ -49,7 +50,7 @@ def extract_doc_generici(text: str, lines: List[str], pdf_path: str = None) -> L
     Args:
         text: Testo completo PDF
         lines: Righe separate del PDF
-        pdf_path: Percorso file (non usato per questo vendor)
+        doc: Documento PDF (non usato per questo vendor)
 
     Returns:
         Lista di dict, uno per ogni ordine nel PDF
@@ -406,6 +407,6 @@ def _validate_and_detect_anomalies(data: Dict) -> List[Dict]:
 # WRAPPER
 # =============================================================================
 
-def extract(text: str, lines: List[str], pdf_path: str = None) -> List[Dict]:
+def extract(text: str, lines: List[str], doc: ParsedDocument = None) -> List[Dict]:
     """Wrapper per compatibilità."""
-    return extract_doc_generici(text, lines, pdf_path)
+    return extract_doc_generici(text, lines, doc)
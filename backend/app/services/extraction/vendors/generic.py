@@ -8,9 +8,10 @@ import re
 from typing import Dict, List
 
 from ....utils import normalize_aic, format_piva
+from ..document import ParsedDocument
 
 
-def extract_generic(text: str, lines: List[str], pdf_path: str = None) -> List[Dict]:
+def extract_generic(text: str, lines: List[str], doc: ParsedDocument = None) -> List[Dict]:
     """Estrattore generico per vendor sconosciuti."""
     data = {'vendor': 'UNKNOWN', 'righe': []}
     
@@ -16,19 +16,12 @@ from typing import Dict, List, Optional, Tuple
 from ....utils import parse_date, format_piva
 from ...espositore import elabora_righe_ordine
 
-# Import pdfplumber opzionale
-try:
-    import pdfplumber
-    PDFPLUMBER_AVAILABLE = True
-except ImportError:
-    PDFPLUMBER_AVAILABLE = False
-
-# Import ftfy per fix encoding
-try:
-    import ftfy
-    FTFY_AVAILABLE = True
-except ImportError:
-    FTFY_AVAILABLE = False
+# v11.7: documento PDF condiviso (pdfplumber aperto una sola volta)
+from ..document import ParsedDocument, open_document, full_text, PDFPLUMBER_AVAILABLE
+
+# v11.7: ftfy solo sulle pagine con marker di mojibake
+from ..encoding import fix_text_encoding
+from ..table_regions import TableProfile, TableRegions
 
 # Keywords per identificare espositori
 ESPOSITORE_KEYWORDS = r'BANCO|DBOX|FSTAND|EXPO|DISPLAY|ESPOSITORE|CESTA'
@@ -128,7 +121,54 @@ def _is_espositore_candidate(cod_min: str, descrizione: str) -> Tuple[bool, Opti
     return True, pezzi_per_unita
 
 
-def extract_menarini(text: str, lines: List[str], pdf_path: str = None) -> List[Dict]:
+def _find_data_table(tables: List[List]) -> Tuple[Optional[List], List[int]]:
+    """
+    Tabella dati prodotti della pagina.
+
+    v9.5: Gestisce caso header e dati in tabelle separate
+    pdfplumber a volte separa header (Tabella N) e dati (Tabella N+1)
+
+    Returns:
+        Tuple (righe dati senza header, indici delle tabelle usate)
+    """
+    for tidx, table in enumerate(tables):
+        if not table:
+            continue
+
+        # Caso 1: Tabella con header "Prodotto" e >= 2 righe
+        header = table[0]
+        if header and 'Prodotto' in str(header) and len(table) >= 2:
+            return table[1:], [tidx]  # Salta header
+
+        # Caso 2: Tabella solo header "Prodotto" seguita da tabella dati
+        if header and 'Prodotto' in str(header) and len(table) == 1:
+            # Cerca la prossima tabella con dati
+            if tidx + 1 < len(tables) and tables[tidx + 1]:
+                next_table = tables[tidx + 1]
+                # Verifica che non sia un'altra tabella header
+                if next_table[0] and 'Prodotto' not in str(next_table[0]):
+                    return next_table, [tidx, tidx + 1]
+
+        # Caso 3: Tabella dati senza header (cerca per contenuto)
+        # Cerca righe con codice AIC (9 cifre) o "--" nella seconda colonna
+        if len(table) >= 1 and len(table[0]) >= 2:
+            first_row = table[0]
+            cod_col = str(first_row[1] or '') if len(first_row) > 1 else ''
+            if cod_col == '--' or (cod_col.isdigit() and len(cod_col) == 9):
+                # Probabilmente è una tabella dati prodotti
+                return table, [tidx]
+
+    return None, []
+
+
+# v11.7: un ordine per pagina con lo stesso layout: le pagine dopo la prima
+# sono ritagliate all'area delle tabelle usate da _find_data_table
+MENARINI_TABLES = TableProfile(
+    'MENARINI', lambda tables: _find_data_table(tables)[1], same_layout_pages=True,
+)
+
+
+def extract_menarini(text: str, lines: List[str], doc: ParsedDocument = None) -> List[Dict]:
     """
     Estrattore MENARINI v2.0.
 
@@ -137,20 +177,20 @@ def extract_menarini(text: str, lines: List[str], pdf_path: str = None) -> List[
     - Rileva parent con codice "--" + keywords
     - Traccia relazioni parent/child per elaborazione espositore
     """
-    if not pdf_path or not PDFPLUMBER_AVAILABLE:
+    if not doc or not PDFPLUMBER_AVAILABLE:
         return _extract_menarini_text_fallback(text, lines)
 
     all_orders = []
 
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            for page_num, page in enumerate(pdf.pages):
+        with open_document(doc) as pdf:
+            regions = TableRegions(pdf, MENARINI_TABLES)
+            for page_num in range(pdf.page_count):
                 # v10.6: x_tolerance per spacing corretto, ftfy per encoding
-                page_text = page.extract_text(x_tolerance=5) or ""
-                if FTFY_AVAILABLE:
-                    page_text = ftfy.fix_text(page_text)
-                words = page.extract_words(x_tolerance=5)
-                tables = page.extract_tables()
+                page_text = pdf.text(page_num, x_tolerance=5)
+                page_text = fix_text_encoding(page_text, manual=False)
+                words = pdf.words(page_num, x_tolerance=5)
+                tables = regions.tables(page_num)
 
                 # Raggruppa parole per Y (riga)
                 rows_by_y = {}
@@ -174,39 +214,7 @@ def extract_menarini(text: str, lines: List[str], pdf_path: str = None) -> List[
                             is_child = (x0 >= 28)  # Soglia indentazione
                             product_coords.append({'y': y_key, 'is_child': is_child, 'x0': x0})
 
-                # v9.5: Gestisce caso header e dati in tabelle separate
-                # pdfplumber a volte separa header (Tabella N) e dati (Tabella N+1)
-                data_table = None
-
-                for tidx, table in enumerate(tables):
-                    if not table:
-                        continue
-
-                    # Caso 1: Tabella con header "Prodotto" e >= 2 righe
-                    header = table[0]
-                    if header and 'Prodotto' in str(header) and len(table) >= 2:
-                        data_table = table[1:]  # Salta header
-                        break
-
-                    # Caso 2: Tabella solo header "Prodotto" seguita da tabella dati
-                    if header and 'Prodotto' in str(header) and len(table) == 1:
-                        # Cerca la prossima tabella con dati
-                        if tidx + 1 < len(tables) and tables[tidx + 1]:
-                            next_table = tables[tidx + 1]
-                            # Verifica che non sia un'altra tabella header
-                            if next_table[0] and 'Prodotto' not in str(next_table[0]):
-                                data_table = next_table
-                                break
-
-                    # Caso 3: Tabella dati senza header (cerca per contenuto)
-                    # Cerca righe con codice AIC (9 cifre) o "--" nella seconda colonna
-                    if len(table) >= 1 and len(table[0]) >= 2:
-                        first_row = table[0]
-                        cod_col = str(first_row[1] or '') if len(first_row) > 1 else ''
-                        if cod_col == '--' or (cod_col.isdigit() and len(cod_col) == 9):
-                            # Probabilmente è una tabella dati prodotti
-                            data_table = table
-                            break
+                data_table, _ = _find_data_table(tables)
 
                 if not data_table:
                     continue
@@ -412,13 +420,14 @@ def extract_menarini(text: str, lines: List[str], pdf_path: str = None) -> List[
 
     except Exception as e:
         print(f"   ⚠️ Errore estrazione MENARINI: {e}")
-        return _extract_menarini_text_fallback(text, lines)
+        return _extract_menarini_text_fallback(*full_text(text, lines, doc))
 
-    return all_orders if all_orders else _extract_menarini_text_fallback(text, lines)
+    # v11.7: testo ricevuto solo per le prime pagine (LAZY_TEXT_VENDORS)
+    return all_orders if all_orders else _extract_menarini_text_fallback(*full_text(text, lines, doc))
 
 
 def _extract_menarini_text_fallback(text: str, lines: List[str]) -> List[Dict]:
-    """Fallback MENARINI quando pdf_path non è disponibile."""
+    """Fallback MENARINI quando il documento PDF non è disponibile."""
     data = {'vendor': 'MENARINI', 'righe': []}
 
     m = re.search(r'Ordine\s+N\.?:?\s*(\d+)(?:_\d{8})?', text)
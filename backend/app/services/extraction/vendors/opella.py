@@ -50,12 +50,8 @@ def _normalize_aic_opella(codice: str, descrizione: str = '') -> Tuple[str, str,
 
     return aic_padded, aic_orig, is_espositore, is_child
 
-# Import pdfplumber opzionale
-try:
-    import pdfplumber
-    PDFPLUMBER_AVAILABLE = True
-except ImportError:
-    PDFPLUMBER_AVAILABLE = False
+# v11.7: documento PDF condiviso (pdfplumber aperto una sola volta)
+from ..document import ParsedDocument, open_document, PDFPLUMBER_AVAILABLE
 
 # Import ftfy per fix encoding
 try:
@@ -65,7 +61,7 @@ except ImportError:
     FTFY_AVAILABLE = False
 
 
-def extract_opella(text: str, lines: List[str], pdf_path: str = None) -> List[Dict]:
+def extract_opella(text: str, lines: List[str], doc: ParsedDocument = None) -> List[Dict]:
     """
     Estrattore OPELLA v2.0.
     
@@ -96,13 +92,12 @@ def extract_opella(text: str, lines: List[str], pdf_path: str = None) -> List[Di
         if m:
             data['data_consegna'] = parse_date(m.group(1))
 
-    # === DESTINATARIO: Estrazione con coordinate X se pdf_path disponibile ===
-    if pdf_path and PDFPLUMBER_AVAILABLE:
+    # === DESTINATARIO: Estrazione con coordinate X se documento disponibile ===
+    if doc and PDFPLUMBER_AVAILABLE:
         try:
-            with pdfplumber.open(pdf_path) as pdf:
-                page = pdf.pages[0]
+            with open_document(doc) as pdf:
                 # v10.6: x_tolerance per spacing corretto
-                words = page.extract_words(x_tolerance=5)
+                words = pdf.words(0, x_tolerance=5)
 
                 # Raggruppa parole per Y
                 rows_by_y = {}
@@ -207,7 +202,7 @@ def extract_opella(text: str, lines: List[str], pdf_path: str = None) -> List[Di
                         data['provincia'] = provincia
 
                 # === TABELLA PRODOTTI ===
-                tables = page.extract_tables()
+                tables = pdf.tables(0)
                 if tables:
                     n = 0
                     for row in tables[0]:
@@ -253,7 +248,7 @@ def extract_opella(text: str, lines: List[str], pdf_path: str = None) -> List[Di
 
 
 def _extract_opella_text_fallback(text: str, lines: List[str]) -> List[Dict]:
-    """Fallback OPELLA quando pdf_path non è disponibile."""
+    """Fallback OPELLA quando il documento PDF non è disponibile."""
     data = {'vendor': 'OPELLA', 'righe': []}
 
     m = re.search(r'Numero\s+ordine\s+cliente:?\s*(\d+)', text, re.I)
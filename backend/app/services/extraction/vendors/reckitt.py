@@ -30,12 +30,9 @@ from typing import Dict, List, Tuple
 
 from ....utils import parse_date
 
-# Import pdfplumber opzionale
-try:
-    import pdfplumber
-    PDFPLUMBER_AVAILABLE = True
-except ImportError:
-    PDFPLUMBER_AVAILABLE = False
+# v11.7: documento PDF condiviso (pdfplumber aperto una sola volta)
+from ..document import ParsedDocument, open_document, PDFPLUMBER_AVAILABLE
+from ..table_regions import TableProfile, TableRegions
 
 
 def _normalize_aic_reckitt(codice: str, descrizione: str = '') -> Tuple[str, str, bool, bool]:
@@ -77,7 +74,7 @@ def _normalize_aic_reckitt(codice: str, descrizione: str = '') -> Tuple[str, str
     return aic_padded, aic_orig, is_espositore, is_child
 
 
-def extract_reckitt(text: str, lines: List[str], pdf_path: str = None) -> List[Dict]:
+def extract_reckitt(text: str, lines: List[str], doc: ParsedDocument = None) -> List[Dict]:
     """
     Estrattore RECKITT v11.4.
 
@@ -90,12 +87,12 @@ def extract_reckitt(text: str, lines: List[str], pdf_path: str = None) -> List[D
     - Header ripetuto su pagine successive viene ignorato (stesso numero ordine)
 
     Usa pdfplumber per estrarre tabelle strutturate.
-    Fallback su parsing testo se pdf_path non disponibile.
+    Fallback su parsing testo se il documento PDF non e' disponibile.
 
     Args:
         text: Testo completo del PDF
         lines: Linee del testo
-        pdf_path: Percorso al file PDF (opzionale)
+        doc: Documento PDF gia' aperto (opzionale)
 
     Returns:
         Lista di dict, uno per ogni ordine nel PDF
@@ -124,7 +121,7 @@ def extract_reckitt(text: str, lines: List[str], pdf_path: str = None) -> List[D
 
             # Numero ordine diverso: finalizza ordine precedente e inizia nuovo
             if current_order and current_order.get('numero_ordine'):
-                _finalize_order(current_order, current_lines, pdf_path)
+                _finalize_order(current_order, current_lines, doc)
                 orders.append(current_order)
 
             # Inizia nuovo ordine
@@ -150,7 +147,7 @@ def extract_reckitt(text: str, lines: List[str], pdf_path: str = None) -> List[D
 
             # Se è l'ultima pagina dell'ordine (n = y), finalizza
             if pagina_corrente == pagina_totale:
-                _finalize_order(current_order, current_lines, pdf_path)
+                _finalize_order(current_order, current_lines, doc)
                 orders.append(current_order)
                 current_order = None
                 current_lines = []
@@ -164,7 +161,7 @@ def extract_reckitt(text: str, lines: List[str], pdf_path: str = None) -> List[D
     # Finalizza l'ultimo ordine se non è già stato finalizzato
     # (caso di PDF senza footer "Pagina n di y")
     if current_order and current_order.get('numero_ordine'):
-        _finalize_order(current_order, current_lines, pdf_path)
+        _finalize_order(current_order, current_lines, doc)
         orders.append(current_order)
 
     return orders
@@ -187,7 +184,7 @@ def _create_new_order() -> Dict:
     }
 
 
-def _finalize_order(order: Dict, lines: List[str], pdf_path: str = None):
+def _finalize_order(order: Dict, lines: List[str], doc: ParsedDocument = None):
     """
     Finalizza un ordine estraendo header e prodotti.
 
@@ -197,15 +194,14 @@ def _finalize_order(order: Dict, lines: List[str], pdf_path: str = None):
     Args:
         order: Dizionario ordine da completare
         lines: Righe di testo accumulate per questo ordine
-        pdf_path: Percorso PDF (opzionale, necessario per pdfplumber)
+        doc: Documento PDF (opzionale, necessario per le tabelle)
     """
     text = '\n'.join(lines)
 
-    if pdf_path and PDFPLUMBER_AVAILABLE:
+    if doc and PDFPLUMBER_AVAILABLE:
         try:
-            with pdfplumber.open(pdf_path) as pdf:
-                page0 = pdf.pages[0]
-                tables = page0.extract_tables()
+            with open_document(doc) as pdf:
+                tables = pdf.tables(0)
 
                 if tables and len(tables) >= 2:
                     # Header da prima tabella
@@ -316,9 +312,23 @@ def _extract_header_from_table(order: Dict, header_table: list):
         order['cap'] = m.group(5).strip()[:5]
 
 
+def _product_tables(tables: List[List]) -> List[int]:
+    """Tabelle con righe prodotto (>= 10 colonne, codice articolo numerico)."""
+    return [
+        i for i, table in enumerate(tables)
+        if any(row and len(row) >= 10 and re.match(r'^\d+$', str(row[0] or '').strip())
+               for row in table or [])
+    ]
+
+
+# v11.7: pagine successive alla prima ritagliate all'area della tabella
+# prodotti (fino a fondo pagina: la tabella continua fino al pie' di pagina)
+RECKITT_TABLES = TableProfile('RECKITT', _product_tables, to_page_bottom=True)
+
+
 def _extract_products_from_tables(pdf) -> List[Dict]:
     """
-    Estrae prodotti da tutte le tabelle di un PDF pdfplumber già aperto.
+    Estrae prodotti da tutte le tabelle di un documento PDF già aperto.
 
     Colonne tabella RECKITT:
     | Cod. Art. | Descr. Articolo | Qta | Listino | 1°Col | 2°Col | Cassa | SM | Data Consegna | Netto U | Netto | Cod AIC |
@@ -326,8 +336,9 @@ def _extract_products_from_tables(pdf) -> List[Dict]:
     righe = []
     n = 0
 
-    for page in pdf.pages:
-        tables = page.extract_tables()
+    regions = TableRegions(pdf, RECKITT_TABLES)
+    for page_no in range(pdf.page_count):
+        tables = regions.tables(page_no)
 
         for table in tables:
             if not table:
@@ -407,7 +418,7 @@ def _extract_products_from_tables(pdf) -> List[Dict]:
     return righe
 
 
-def _extract_products_from_pdf(pdf_path: str, data: Dict) -> List[Dict]:
+def _extract_products_from_pdf(doc: ParsedDocument, data: Dict) -> List[Dict]:
     """
     Estrae prodotti dalla tabella PDF usando pdfplumber.
 
@@ -417,9 +428,9 @@ def _extract_products_from_pdf(pdf_path: str, data: Dict) -> List[Dict]:
     righe = []
     n = 0
 
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            tables = page.extract_tables()
+    with open_document(doc) as pdf:
+        for page_no in range(pdf.page_count):
+            tables = pdf.tables(page_no)
 
             for table in tables:
                 if not table:
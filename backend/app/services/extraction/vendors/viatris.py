@@ -21,6 +21,7 @@ import re
 from typing import Dict, List, Optional, Tuple
 
 from ....utils import parse_date
+from ..document import ParsedDocument
 
 
 def _normalize_aic_viatris(codice: str) -> Tuple[str, str, bool, bool]:
@@ -198,14 +199,14 @@ def _parse_product_line(product_line: str) -> Optional[Dict]:
     }
 
 
-def extract_viatris(text: str, lines: List[str], pdf_path: str = None) -> List[Dict]:
+def extract_viatris(text: str, lines: List[str], doc: ParsedDocument = None) -> List[Dict]:
     """
     Estrattore VIATRIS v11.5.
 
     Args:
         text: Testo completo del PDF
         lines: Linee del testo
-        pdf_path: Percorso file PDF (opzionale)
+        doc: Documento PDF (opzionale)
 
     Returns:
         Lista con dizionario ordine estratto
@@ -0,0 +1,125 @@
+# =============================================================================
+# SERV.O v11.7 - INGESTION SERVICES
+# =============================================================================
+# Coda PostgreSQL per l'elaborazione asincrona dei PDF caricati ed
+# elaborazione parallela degli upload multipli, tempi per fase della pipeline,
+# ri-estrazione degli ordini dagli artefatti salvati, spool su disco degli upload
+# =============================================================================
+
+from .jobs import (
+    # Stati
+    JOB_PENDING,
+    JOB_RUNNING,
+    JOB_RETRY,
+    JOB_DONE,
+    JOB_FAILED,
+    JOB_DEAD,
+    JOB_STATES,
+    # Coda
+    ensure_jobs_table,
+    enqueue_pdf,
+    enqueue_spooled,
+    claim_job,
+    renew_lease,
+    finish_job,
+    next_state,
+    retry_delay,
+    recover_stale_jobs,
+    # Consultazione / dead-letter
+    get_job,
+    list_jobs,
+    get_queue_stats,
+    requeue_job,
+)
+
+from .spool import (
+    SpooledPdf,
+    spool_stream,
+    spool_file,
+    store_spooled,
+    pdf_hash,
+    remove_spool,
+)
+
+from .worker import (
+    run_once,
+    worker_loop,
+    start_ingestion_workers,
+    stop_ingestion_workers,
+    get_workers_status,
+)
+
+from .parallel import (
+    process_pdfs_parallel,
+    extraction_processes,
+    shutdown_extraction_pool,
+)
+
+from .reextraction import (
+    reextract,
+    replay_acquisition,
+    normalize_extracted,
+    diff_orders,
+    start_reextract,
+    get_reextract_status,
+)
+
+from .timing import (
+    PipelineTimer,
+    pipeline_timer,
+    lap,
+    record_pages,
+    ensure_timings_table,
+    save_timings,
+    get_performance_stats,
+)
+
+__all__ = [
+    'JOB_PENDING',
+    'JOB_RUNNING',
+    'JOB_RETRY',
+    'JOB_DONE',
+    'JOB_FAILED',
+    'JOB_DEAD',
+    'JOB_STATES',
+    'ensure_jobs_table',
+    'enqueue_pdf',
+    'enqueue_spooled',
+    'claim_job',
+    'renew_lease',
+    'finish_job',
+    'next_state',
+    'retry_delay',
+    'recover_stale_jobs',
+    'get_job',
+    'list_jobs',
+    'get_queue_stats',
+    'requeue_job',
+    'SpooledPdf',
+    'spool_stream',
+    'spool_file',
+    'store_spooled',
+    'pdf_hash',
+    'remove_spool',
+    'run_once',
+    'worker_loop',
+    'start_ingestion_workers',
+    'stop_ingestion_workers',
+    'get_workers_status',
+    'process_pdfs_parallel',
+    'extraction_processes',
+    'shutdown_extraction_pool',
+    'reextract',
+    'replay_acquisition',
+    'normalize_extracted',
+    'diff_orders',
+    'start_reextract',
+    'get_reextract_status',
+    'PipelineTimer',
+    'pipeline_timer',
+    'lap',
+    'record_pages',
+    'ensure_timings_table',
+    'save_timings',
+    'get_performance_stats',
+]
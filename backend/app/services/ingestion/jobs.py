@@ -0,0 +1,318 @@
+# =============================================================================
+# SERV.O v11.7 - CODA INGESTION PDF: JOB
+# =============================================================================
+# Tabella ingestion_jobs: accodamento, presa in carico (SKIP LOCKED),
+# esito, retry con backoff e dead-letter.
+#
+# Stati: PENDING -> RUNNING -> DONE | FAILED
+#                           -> RETRY -> RUNNING ... -> DEAD
+#
+# Un job RUNNING ha un lease (lease_scade) rinnovato dal worker durante
+# l'elaborazione: solo a lease scaduto (worker terminato) torna in coda.
+# =============================================================================
+
+import os
+import json
+import uuid
+import pathlib
+from typing import Dict, Any, List, Optional, Tuple
+
+from ...config import config
+from ...database_pg import get_db
+from .spool import SpooledPdf, remove_spool
+
+
+# Stati job
+JOB_PENDING = 'PENDING'
+JOB_RUNNING = 'RUNNING'
+JOB_RETRY = 'RETRY'
+JOB_DONE = 'DONE'        # PDF elaborato (anche DUPLICATO: esito di business, non si ritenta)
+JOB_FAILED = 'FAILED'    # Errore dopo la creazione dell'acquisizione: visibile in /upload/errors
+JOB_DEAD = 'DEAD'        # Tentativi esauriti: spool conservato per requeue manuale
+
+JOB_STATES = (JOB_PENDING, JOB_RUNNING, JOB_RETRY, JOB_DONE, JOB_FAILED, JOB_DEAD)
+
+_MIGRATION = pathlib.Path(__file__).parent.parent.parent.parent / 'migrations' / 'v11_7_ingestion_jobs.sql'
+
+
+def ensure_jobs_table() -> None:
+    """Crea tabella ingestion_jobs se non esiste (auto-migrazione)."""
+    db = get_db()
+    try:
+        db.executescript(_MIGRATION.read_text(encoding='utf-8'))
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"   ⚠️ Migrazione ingestion_jobs non applicata: {e}")
+
+
+# =============================================================================
+# ACCODAMENTO
+# =============================================================================
+
+def spool_pdf(content: bytes) -> str:
+    """Salva il PDF nella cartella di spool e ritorna il percorso."""
+    os.makedirs(config.INGESTION_SPOOL_DIR, exist_ok=True)
+    path = os.path.join(config.INGESTION_SPOOL_DIR, f"{uuid.uuid4().hex}.pdf")
+    tmp_path = path + '.part'
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+    return path
+
+
+def enqueue_pdf(
+    filename: str,
+    content: bytes,
+    fonte: str = 'UPLOAD',
+    id_operatore: int = None
+) -> Dict[str, Any]:
+    """
+    Accoda un PDF per l'elaborazione asincrona.
+
+    Args:
+        filename: Nome file originale
+        content: Contenuto binario del PDF
+        fonte: Origine del file (UPLOAD, EMAIL, ...)
+        id_operatore: Operatore che ha caricato il file
+
+    Returns:
+        Dict con id_job, filename, stato
+    """
+    path = spool_pdf(content)
+    try:
+        return _insert_job(filename, path, len(content), fonte, id_operatore)
+    except Exception:
+        remove_spool(path)
+        raise
+
+
+def enqueue_spooled(
+    filename: str,
+    spooled: SpooledPdf,
+    fonte: str = 'UPLOAD',
+    id_operatore: int = None
+) -> Dict[str, Any]:
+    """
+    Accoda un PDF gia' copiato nella cartella di spool (upload in streaming):
+    il file passa al job, che lo rimuove a elaborazione conclusa. Se
+    l'accodamento fallisce il file resta al chiamante.
+
+    Returns:
+        Dict con id_job, filename, stato
+    """
+    return _insert_job(filename, spooled.path, spooled.size, fonte, id_operatore)
+
+
+def _insert_job(filename: str, path: str, size: int, fonte: str,
+                id_operatore: Optional[int]) -> Dict[str, Any]:
+    db = get_db()
+    row = db.execute("""
+        INSERT INTO ingestion_jobs
+        (filename, percorso_spool, dimensione_bytes, fonte, max_tentativi, id_operatore)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        RETURNING id_job, filename, stato, created_at
+    """, (filename, path, size, fonte, config.INGESTION_MAX_ATTEMPTS,
+          id_operatore)).fetchone()
+    db.commit()
+    return dict(row)
+
+
+# =============================================================================
+# PRESA IN CARICO / ESITO (worker)
+# =============================================================================
+
+def claim_job(worker: str) -> Optional[Dict[str, Any]]:
+    """
+    Prende in carico il prossimo job pronto.
+
+    SKIP LOCKED: worker concorrenti non si bloccano a vicenda e non prendono
+    mai lo stesso job. Il claim viene committato subito, prima dell'elaborazione.
+    """
+    db = get_db()
+    row = db.execute("""
+        UPDATE ingestion_jobs SET
+            stato = %s, tentativi = tentativi + 1, worker = %s,
+            started_at = NOW(), lease_scade = NOW() + make_interval(secs => %s),
+            updated_at = NOW()
+        WHERE id_job = (
+            SELECT id_job FROM ingestion_jobs
+            WHERE stato IN (%s, %s) AND prossimo_tentativo <= NOW()
+            ORDER BY prossimo_tentativo, id_job
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING *
+    """, (JOB_RUNNING, worker, config.INGESTION_JOB_LEASE, JOB_PENDING, JOB_RETRY)).fetchone()
+    db.commit()
+    return dict(row) if row else None
+
+
+def renew_lease(id_job: int, worker: str) -> bool:
+    """
+    Rinnova il lease di un job RUNNING (heartbeat del worker).
+
+    Returns:
+        False se il job non e' piu' RUNNING su questo worker
+    """
+    db = get_db()
+    cursor = db.execute("""
+        UPDATE ingestion_jobs SET
+            lease_scade = NOW() + make_interval(secs => %s), updated_at = NOW()
+        WHERE id_job = %s AND stato = %s AND worker = %s
+    """, (config.INGESTION_JOB_LEASE, id_job, JOB_RUNNING, worker))
+    db.commit()
+    return cursor.rowcount > 0
+
+
+def retry_delay(tentativi: int) -> int:
+    """Backoff esponenziale in secondi prima del prossimo tentativo."""
+    return config.INGESTION_RETRY_BACKOFF * (2 ** max(tentativi - 1, 0))
+
+
+def next_state(job: Dict[str, Any], result: Dict[str, Any] = None) -> Tuple[str, int]:
+    """
+    Decide lo stato successivo di un job elaborato.
+
+    Args:
+        job: Job preso in carico (tentativi gia' incrementato)
+        result: Risultato di process_pdf, None se l'elaborazione ha sollevato eccezione
+
+    Returns:
+        (stato, secondi di attesa prima del retry)
+    """
+    if result is not None:
+        if result.get('status') in ('OK', 'DUPLICATO'):
+            return JOB_DONE, 0
+        if result.get('id_acquisizione'):
+            # Acquisizione gia' registrata in ERRORE: un retry la vedrebbe
+            # come PDF duplicato, quindi l'errore e' definitivo
+            return JOB_FAILED, 0
+
+    if job['tentativi'] >= job['max_tentativi']:
+        return JOB_DEAD, 0
+    return JOB_RETRY, retry_delay(job['tentativi'])
+
+
+def finish_job(job: Dict[str, Any], result: Dict[str, Any] = None, error: str = None) -> Optional[str]:
+    """
+    Registra l'esito di un job e ritorna il nuovo stato.
+
+    Lo spool viene rimosso per DONE/FAILED, conservato per RETRY/DEAD.
+    Come il rinnovo del lease, aggiorna solo se il job e' ancora RUNNING per
+    questo worker e tentativo: se il lease e' scaduto e il job e' stato
+    rimesso in coda (o ripreso da un altro worker) l'esito viene scartato e
+    ritorna None.
+    """
+    stato, delay = next_state(job, result)
+    if error is None and result is not None and result.get('status') == 'ERRORE':
+        anomalie = result.get('anomalie') or []
+        error = anomalie[-1] if anomalie else 'Errore elaborazione'
+
+    db = get_db()
+    cursor = db.execute("""
+        UPDATE ingestion_jobs SET
+            stato = %s,
+            prossimo_tentativo = NOW() + make_interval(secs => %s),
+            ultimo_errore = %s,
+            risultato = %s,
+            id_acquisizione = %s,
+            completed_at = CASE WHEN %s THEN NOW() ELSE NULL END,
+            lease_scade = NULL,
+            updated_at = NOW()
+        WHERE id_job = %s AND stato = %s AND worker = %s AND tentativi = %s
+    """, (
+        stato, delay, error,
+        json.dumps(result, default=str) if result is not None else None,
+        result.get('id_acquisizione') if result else None,
+        stato in (JOB_DONE, JOB_FAILED, JOB_DEAD),
+        job['id_job'], JOB_RUNNING, job.get('worker'), job['tentativi']
+    ))
+    db.commit()
+    if cursor.rowcount == 0:
+        return None
+
+    if stato in (JOB_DONE, JOB_FAILED):
+        remove_spool(job['percorso_spool'])
+    return stato
+
+
+def recover_stale_jobs() -> int:
+    """
+    Rimette in coda i job RUNNING con lease scaduto (worker terminato durante
+    l'elaborazione: nessun heartbeat). Un job lento ma vivo rinnova il lease e
+    non viene ripreso da un altro worker. Job senza lease (presi in carico
+    prima della colonna lease_scade): soglia INGESTION_JOB_TIMEOUT da started_at.
+    A tentativi esauriti finiscono in DEAD, con completed_at.
+    """
+    db = get_db()
+    cursor = db.execute("""
+        UPDATE ingestion_jobs SET
+            stato = CASE WHEN tentativi >= max_tentativi THEN %s ELSE %s END,
+            ultimo_errore = 'Worker perso durante l''elaborazione (worker ' || COALESCE(worker, 'n/d') || ')',
+            prossimo_tentativo = NOW(),
+            completed_at = CASE WHEN tentativi >= max_tentativi THEN NOW() ELSE NULL END,
+            lease_scade = NULL,
+            updated_at = NOW()
+        WHERE stato = %s
+          AND (lease_scade < NOW()
+               OR (lease_scade IS NULL AND started_at < NOW() - make_interval(secs => %s)))
+    """, (JOB_DEAD, JOB_RETRY, JOB_RUNNING, config.INGESTION_JOB_TIMEOUT))
+    db.commit()
+    return cursor.rowcount
+
+
+# =============================================================================
+# CONSULTAZIONE / DEAD-LETTER
+# =============================================================================
+
+def get_job(id_job: int) -> Optional[Dict[str, Any]]:
+    """Ritorna un job per ID."""
+    db = get_db()
+    row = db.execute(
+        "SELECT * FROM ingestion_jobs WHERE id_job = %s", (id_job,)
+    ).fetchone()
+    return dict(row) if row else None
+
+
+def list_jobs(stato: str = None, limit: int = 50) -> List[Dict[str, Any]]:
+    """Ritorna gli ultimi job, opzionalmente filtrati per stato."""
+    db = get_db()
+    query = """
+        SELECT id_job, filename, fonte, stato, tentativi, max_tentativi,
+               prossimo_tentativo, ultimo_errore, id_acquisizione,
+               created_at, started_at, lease_scade, completed_at
+        FROM ingestion_jobs
+    """
+    params = []
+    if stato:
+        query += " WHERE stato = %s"
+        params.append(stato)
+    query += " ORDER BY id_job DESC LIMIT %s"
+    params.append(limit)
+    return [dict(row) for row in db.execute(query, tuple(params)).fetchall()]
+
+
+def get_queue_stats() -> Dict[str, int]:
+    """Conteggio job per stato."""
+    db = get_db()
+    rows = db.execute(
+        "SELECT stato, COUNT(*) AS n FROM ingestion_jobs GROUP BY stato"
+    ).fetchall()
+    stats = {stato: 0 for stato in JOB_STATES}
+    for row in rows:
+        stats[row['stato']] = row['n']
+    return stats
+
+
+def requeue_job(id_job: int) -> bool:
+    """Rimette in coda un job DEAD (dead-letter) azzerando i tentativi."""
+    db = get_db()
+    cursor = db.execute("""
+        UPDATE ingestion_jobs SET
+            stato = %s, tentativi = 0, prossimo_tentativo = NOW(),
+            completed_at = NULL, updated_at = NOW()
+        WHERE id_job = %s AND stato = %s
+    """, (JOB_PENDING, id_job, JOB_DEAD))
+    db.commit()
+    return cursor.rowcount > 0
@@ -0,0 +1,155 @@
+# =============================================================================
+# SERV.O v11.7 - ELABORAZIONE PDF PARALLELA
+# =============================================================================
+# Upload multipli: la fase CPU-bound di process_pdf (testo pdfplumber, detect
+# vendor, estrattore) gira in un ProcessPoolExecutor, uno per core; la fase
+# DB (acquisizione, lookup, inserimento ordini) resta nel processo del
+# backend, su PDF_DB_CONCURRENCY connessioni del pool.
+# I PDF in spool (upload in streaming) arrivano al pool come percorso.
+# =============================================================================
+
+import os
+import logging
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple, Union
+
+from ...config import config
+from ...database_pg import with_db_scope
+from ..extraction import check_detection_rules, get_detection_rules, set_detection_rules
+from .spool import SpooledPdf, pdf_hash
+
+logger = logging.getLogger('ingestion')
+
+# PDF in memoria o in spool su disco (v11.7)
+PdfContent = Union[bytes, SpooledPdf]
+
+_executor: Optional[ProcessPoolExecutor] = None
+# Versione delle regole di detection vendor passate ai processi del pool
+_executor_rules_version: Optional[str] = None
+
+
+def extraction_processes() -> int:
+    """Numero processi di estrazione (PDF_EXTRACT_PROCESSES, 0 = numero core)."""
+    return config.PDF_EXTRACT_PROCESSES or os.cpu_count() or 1
+
+
+def get_extraction_pool() -> ProcessPoolExecutor:
+    """
+    Pool di processi condiviso, creato al primo upload multiplo.
+
+    I processi ricevono le regole di detection vendor correnti; se sono state
+    ricaricate dal DB il pool viene ricreato.
+    """
+    global _executor, _executor_rules_version
+    check_detection_rules()
+    rules, version = get_detection_rules()
+    if _executor is not None and _executor_rules_version != version:
+        # Senza cancel_futures: le estrazioni gia' inviate completano
+        _executor.shutdown(wait=False)
+        _executor = None
+    if _executor is None:
+        # spawn: niente fork di connessioni psycopg2 e thread degli scheduler
+        _executor = ProcessPoolExecutor(
+            max_workers=extraction_processes(),
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=set_detection_rules,
+            initargs=(rules, version),
+        )
+        _executor_rules_version = version
+    return _executor
+
+
+def shutdown_extraction_pool() -> None:
+    """Chiude il pool di processi (shutdown applicazione)."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+@with_db_scope
+def _duplicate_flags(files: List[Tuple[str, PdfContent]]) -> List[bool]:
+    """PDF gia' acquisiti (una query per tutto il lotto): non vanno estratti."""
+    from ..pdf_processor import check_duplicate_hashes
+
+    hashes = [pdf_hash(content) for _, content in files]
+    duplicati = check_duplicate_hashes(hashes)
+    return [h in duplicati for h in hashes]
+
+
+def _extract_async(files: List[Tuple[str, PdfContent]]) -> List[Optional[Future]]:
+    """Invia la fase di estrazione al pool; None = estrazione nel processo corrente."""
+    from ..pdf_processor import extract_pdf_data
+
+    try:
+        skip = _duplicate_flags(files)
+    except Exception as e:
+        logger.warning(f"Verifica duplicati non riuscita: {e}")
+        skip = [False] * len(files)
+
+    try:
+        pool = get_extraction_pool()
+        return [
+            # Duplicati: process_pdf li risolve dal solo hash, senza estrazione
+            None if duplicate else pool.submit(extract_pdf_data, filename, content)
+            for (filename, content), duplicate in zip(files, skip)
+        ]
+    except Exception as e:
+        logger.warning(f"Pool di estrazione non disponibile, elaborazione sequenziale: {e}")
+        shutdown_extraction_pool()
+        return [None] * len(files)
+
+
+@with_db_scope
+def _store(filename: str, content: PdfContent, future: Optional[Future]) -> Dict[str, Any]:
+    """Fase DB di process_pdf su una connessione del pool, a estrazione completata."""
+    from ..pdf_processor import process_pdf
+
+    extracted = None
+    if future is not None:
+        try:
+            extracted = future.result()
+        except Exception as e:
+            # Processo del pool terminato (BrokenProcessPool, pickling...):
+            # process_pdf ripete l'estrazione in questo processo
+            logger.warning(f"Estrazione parallela fallita per {filename}: {e}")
+    return process_pdf(filename, content, extracted=extracted)
+
+
+def process_pdfs_parallel(files: List[Tuple[str, PdfContent]]) -> List[Dict[str, Any]]:
+    """
+    Elabora piu' PDF: estrazione in parallelo sui core, inserimento DB con
+    al massimo PDF_DB_CONCURRENCY connessioni.
+
+    Args:
+        files: Lista di (filename, contenuto o SpooledPdf)
+
+    Returns:
+        Risultati di process_pdf, nello stesso ordine di files
+    """
+    if not files:
+        return []
+
+    futures = _extract_async(files)
+    with ThreadPoolExecutor(max_workers=max(config.PDF_DB_CONCURRENCY, 1),
+                            thread_name_prefix='servo-pdf-db') as db_pool:
+        stored = [
+            db_pool.submit(_store, filename, content, future)
+            for (filename, content), future in zip(files, futures)
+        ]
+        results = []
+        for (filename, _), task in zip(files, stored):
+            try:
+                results.append(task.result())
+            except Exception as e:
+                results.append({
+                    'filename': filename,
+                    'status': 'ERRORE',
+                    'vendor': '',
+                    'ordini': 0,
+                    'righe': 0,
+                    'anomalie': [str(e)],
+                    'id_acquisizione': None,
+                })
+    return results
@@ -0,0 +1,362 @@
+# =============================================================================
+# SERV.O v11.7 - RI-ESTRAZIONE DA ARTEFATTI
+# =============================================================================
+# Dopo la correzione di un estrattore: riesegue detect vendor ed estrattori
+# sulle acquisizioni gia' elaborate rileggendo gli artefatti salvati da
+# process_pdf (testo, parole e tabelle pdfplumber per hash del PDF), nei
+# processi del pool di estrazione, e confronta il risultato con gli ordini
+# in ordini_testata/ordini_dettaglio. Non modifica gli ordini.
+#
+# Il confronto usa i valori registrati all'inserimento (*_estratto/a,
+# codice_originale, q_originale, descrizione_estratta), che le correzioni
+# degli operatori non modificano. I prezzi non sono confrontati: dipendono
+# anche dal listino.
+#
+# Senza artefatto (PDF elaborati prima della v11.7) il PDF viene letto da
+# percorso_storage e l'artefatto salvato: la ri-estrazione successiva e'
+# veloce.
+# =============================================================================
+
+import os
+import time
+import logging
+import threading
+from collections import Counter
+from datetime import date, datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from ...database_pg import get_db, with_db_scope
+from ...utils import calcola_q_totale
+from ..extraction import read_artefact, save_artefact
+
+logger = logging.getLogger('ingestion')
+
+# Acquisizioni per lotto: una query ordini e un map sul pool per lotto
+_BATCH = 200
+
+_ACQUISIZIONI_SQL = """
+    SELECT a.id_acquisizione, a.hash_file, a.nome_file_originale, a.percorso_storage,
+           v.codice_vendor AS vendor
+    FROM acquisizioni a
+    LEFT JOIN vendor v ON v.id_vendor = a.id_vendor
+    WHERE a.hash_file IS NOT NULL
+      AND NOT COALESCE(a.is_duplicato, FALSE)
+      AND a.id_acquisizione > %s
+      AND (%s::text IS NULL OR v.codice_vendor = %s)
+    ORDER BY a.id_acquisizione
+    LIMIT %s
+"""
+
+_TESTATE_SQL = """
+    SELECT id_testata, id_acquisizione, numero_ordine_vendor,
+           partita_iva_estratta, codice_ministeriale_estratto, ragione_sociale_1_estratta,
+           indirizzo_estratto, cap_estratto, citta_estratta, provincia_estratta,
+           data_ordine_estratta, data_consegna_estratta
+    FROM ordini_testata
+    WHERE id_acquisizione = ANY(%s)
+    ORDER BY id_testata
+"""
+
+_RIGHE_SQL = """
+    SELECT od.id_testata,
+           COALESCE(NULLIF(od.codice_originale, ''), od.codice_aic, '') AS codice,
+           COALESCE(od.q_originale, 0) AS quantita,
+           COALESCE(od.descrizione_estratta, '') AS descrizione
+    FROM ordini_dettaglio od
+    JOIN ordini_testata ot ON ot.id_testata = od.id_testata
+    WHERE ot.id_acquisizione = ANY(%s)
+"""
+
+# Campo estratto -> colonna ordini_testata (valori come in _insert_order)
+CAMPI_TESTATA = [
+    ('partita_iva', 'partita_iva_estratta'),
+    ('codice_ministeriale', 'codice_ministeriale_estratto'),
+    ('ragione_sociale', 'ragione_sociale_1_estratta'),
+    ('indirizzo', 'indirizzo_estratto'),
+    ('cap', 'cap_estratto'),
+    ('citta', 'citta_estratta'),
+    ('provincia', 'provincia_estratta'),
+    ('data_ordine', 'data_ordine_estratta'),
+    ('data_consegna', 'data_consegna_estratta'),
+]
+
+_TRONCATI = {'ragione_sociale': 50, 'indirizzo': 50}
+
+_status_lock = threading.Lock()
+_status: Dict[str, Any] = {'in_corso': False, 'avviata': None, 'filtri': None, 'ultimo': None}
+
+
+# =============================================================================
+# RI-ESTRAZIONE (processi del pool, senza database)
+# =============================================================================
+
+def replay_acquisition(hash_file: str, filename: str, percorso: Optional[str]) -> Dict[str, Any]:
+    """
+    Detect vendor ed estrattore da artefatto (o dal PDF su disco).
+
+    Returns:
+        Dict con vendor, orders_data, errore, fonte ('artefatto'/'pdf')
+        e pdf_riletti (estrazioni non presenti nell'artefatto)
+    """
+    from ..pdf_processor import open_pdf_document, extract_document_data
+
+    source = percorso if percorso and os.path.exists(percorso) else None
+    artefact = read_artefact(hash_file)
+    fonte = 'artefatto'
+    try:
+        if artefact is not None:
+            try:
+                doc = open_pdf_document(source, artefact=artefact)
+            except ValueError as e:
+                # Artefatto di versione precedente o danneggiato: si rilegge il PDF
+                logger.warning(f"Artefatto {hash_file[:12]} ignorato: {e}")
+                artefact = None
+        if artefact is None:
+            if source is None:
+                return {'vendor': '', 'orders_data': None, 'fonte': None, 'pdf_riletti': 0,
+                        'errore': 'Artefatto e PDF originale non disponibili'}
+            doc = open_pdf_document(source)
+            fonte = 'pdf'
+    except Exception as e:
+        return {'vendor': '', 'orders_data': None, 'fonte': None, 'pdf_riletti': 0,
+                'errore': f"PDF non leggibile: {e}"}
+
+    try:
+        data = extract_document_data(doc, filename)
+        # Estrazioni nuove (estrattore corretto, artefatto assente): aggiorna l'artefatto
+        if doc.parsed:
+            save_artefact(hash_file, doc)
+        return {
+            'vendor': data['vendor'],
+            'orders_data': data['orders_data'],
+            'fonte': fonte,
+            'pdf_riletti': doc.parsed,
+            'errore': data['errore_testo'] or data['errore_estrattore'],
+        }
+    finally:
+        doc.close()
+
+
+def _replay_job(job: Tuple[str, str, Optional[str]]) -> Dict[str, Any]:
+    return replay_acquisition(*job)
+
+
+# =============================================================================
+# CONFRONTO CON GLI ORDINI SALVATI
+# =============================================================================
+
+def _text(value: Any) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()[:10]
+    return str(value)
+
+
+def normalize_extracted(orders_data: Optional[List[Dict]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Ordini estratti nella forma confrontabile con il DB, per numero ordine:
+    {numero: {'testata': {colonna: valore}, 'righe': Counter((codice, q, descrizione))}}
+    """
+    from ..pdf_processor import _convert_date_to_iso
+
+    result = {}
+    for order in orders_data or []:
+        # Come process_pdf: ordini senza numero e senza righe non vengono inseriti
+        if not order.get('numero_ordine') and not order.get('righe'):
+            continue
+        testata = {}
+        for campo, colonna in CAMPI_TESTATA:
+            value = order.get(campo) or ''
+            if campo in _TRONCATI:
+                value = value[:_TRONCATI[campo]]
+            elif campo.startswith('data_'):
+                value = _convert_date_to_iso(value) or ''
+            testata[colonna] = _text(value)
+        righe = Counter(
+            (riga.get('codice_originale') or riga.get('codice_aic') or '',
+             calcola_q_totale(riga),
+             (riga.get('descrizione') or '')[:40])
+            for riga in order.get('righe', [])
+        )
+        result[_text(order.get('numero_ordine', ''))] = {'testata': testata, 'righe': righe}
+    return result
+
+
+def diff_orders(stored: Dict[str, Dict[str, Any]], extracted: Dict[str, Dict[str, Any]]) -> List[str]:
+    """Differenze leggibili tra ordini salvati ed estratti (stessa forma di normalize_extracted)."""
+    diffs = []
+    for numero in sorted(set(stored) | set(extracted)):
+        if numero not in extracted:
+            diffs.append(f"Ordine {numero}: non piu' estratto")
+            continue
+        if numero not in stored:
+            diffs.append(f"Ordine {numero}: nuovo (non presente nel DB)")
+            continue
+        old, new = stored[numero], extracted[numero]
+        for colonna, value in new['testata'].items():
+            if old['testata'].get(colonna, '') != value:
+                diffs.append(f"Ordine {numero}: {colonna} '{old['testata'].get(colonna, '')}' -> '{value}'")
+        if old['righe'] != new['righe']:
+            rimosse = old['righe'] - new['righe']
+            aggiunte = new['righe'] - old['righe']
+            diffs.append(
+                f"Ordine {numero}: righe {sum(old['righe'].values())} -> {sum(new['righe'].values())}"
+                f" ({sum(rimosse.values())} non piu' estratte, {sum(aggiunte.values())} nuove/diverse)"
+            )
+            for codice, q, descrizione in sorted(rimosse)[:5]:
+                diffs.append(f"Ordine {numero}:   - {codice} q={q} {descrizione}")
+            for codice, q, descrizione in sorted(aggiunte)[:5]:
+                diffs.append(f"Ordine {numero}:   + {codice} q={q} {descrizione}")
+    return diffs
+
+
+@with_db_scope
+def _select_acquisitions(after_id: int, vendor: Optional[str], limit: int) -> List[Dict[str, Any]]:
+    db = get_db()
+    rows = db.execute(_ACQUISIZIONI_SQL, (after_id, vendor, vendor, limit)).fetchall()
+    return [dict(row) for row in rows]
+
+
+@with_db_scope
+def _stored_orders(ids: List[int]) -> Dict[int, Dict[str, Dict[str, Any]]]:
+    """Ordini salvati per acquisizione, nella forma di normalize_extracted."""
+    db = get_db()
+    result: Dict[int, Dict[str, Dict[str, Any]]] = {id_acq: {} for id_acq in ids}
+    by_testata = {}
+    for row in db.execute(_TESTATE_SQL, (ids,)).fetchall():
+        order = {
+            'testata': {colonna: _text(row[colonna]) for _, colonna in CAMPI_TESTATA},
+            'righe': Counter(),
+        }
+        result[row['id_acquisizione']][_text(row['numero_ordine_vendor'])] = order
+        by_testata[row['id_testata']] = order
+    for row in db.execute(_RIGHE_SQL, (ids,)).fetchall():
+        order = by_testata.get(row['id_testata'])
+        if order is not None:
+            order['righe'][(row['codice'], row['quantita'], row['descrizione'][:40])] += 1
+    return result
+
+
+# =============================================================================
+# ESECUZIONE
+# =============================================================================
+
+def _replay_batch(jobs: List[Tuple[str, str, Optional[str]]]) -> List[Dict[str, Any]]:
+    """Ri-estrazione di un lotto sul pool di processi (in-process se non disponibile)."""
+    from .parallel import get_extraction_pool, shutdown_extraction_pool, extraction_processes
+
+    try:
+        pool = get_extraction_pool()
+        chunksize = max(1, len(jobs) // (extraction_processes() * 4))
+        return list(pool.map(_replay_job, jobs, chunksize=chunksize))
+    except Exception as e:
+        logger.warning(f"Pool di estrazione non disponibile, ri-estrazione sequenziale: {e}")
+        shutdown_extraction_pool()
+        return [_replay_job(job) for job in jobs]
+
+
+def reextract(vendor: Optional[str] = None, limit: Optional[int] = None, since_id: int = 0,
+              max_dettagli: int = 200) -> Dict[str, Any]:
+    """
+    Riesegue gli estrattori sulle acquisizioni e le confronta con gli ordini salvati.
+
+    Args:
+        vendor: Solo acquisizioni di questo vendor (codice_vendor)
+        limit: Numero massimo di acquisizioni
+        since_id: Solo acquisizioni con id_acquisizione maggiore
+        max_dettagli: Acquisizioni con differenze/errori riportate nel dettaglio
+
+    Returns:
+        Contatori (acquisizioni, identiche, differenti, errori, da_artefatto,
+        da_pdf, pdf_riletti), secondi e dettaglio delle differenze
+    """
+    start = time.perf_counter()
+    report = {
+        'acquisizioni': 0, 'identiche': 0, 'differenti': 0, 'errori': 0,
+        'da_artefatto': 0, 'da_pdf': 0, 'pdf_riletti': 0,
+        'dettaglio': [],
+    }
+    vendor = vendor.upper() if vendor else None
+    after_id = since_id
+
+    while limit is None or report['acquisizioni'] < limit:
+        batch = _BATCH if limit is None else min(_BATCH, limit - report['acquisizioni'])
+        rows = _select_acquisitions(after_id, vendor, batch)
+        if not rows:
+            break
+        after_id = rows[-1]['id_acquisizione']
+
+        results = _replay_batch([
+            (row['hash_file'], row['nome_file_originale'] or '', row['percorso_storage'])
+            for row in rows
+        ])
+        stored = _stored_orders([row['id_acquisizione'] for row in rows])
+
+        for row, res in zip(rows, results):
+            report['acquisizioni'] += 1
+            if res['fonte'] == 'artefatto':
+                report['da_artefatto'] += 1
+            elif res['fonte'] == 'pdf':
+                report['da_pdf'] += 1
+            report['pdf_riletti'] += res['pdf_riletti']
+
+            differenze = []
+            if res['errore']:
+                report['errori'] += 1
+                differenze.append(f"Errore: {res['errore']}")
+            else:
+                vendor_db = row['vendor'] or ''
+                vendor_new = 'GENERIC' if res['vendor'] == 'UNKNOWN' else res['vendor']
+                if vendor_db and vendor_new != vendor_db:
+                    differenze.append(f"Vendor {vendor_db} -> {vendor_new}")
+                differenze += diff_orders(stored[row['id_acquisizione']],
+                                          normalize_extracted(res['orders_data']))
+                if differenze:
+                    report['differenti'] += 1
+                else:
+                    report['identiche'] += 1
+
+            if differenze and len(report['dettaglio']) < max_dettagli:
+                report['dettaglio'].append({
+                    'id_acquisizione': row['id_acquisizione'],
+                    'file': row['nome_file_originale'],
+                    'vendor': row['vendor'],
+                    'differenze': differenze,
+                })
+
+    report['secondi'] = round(time.perf_counter() - start, 1)
+    return report
+
+
+# =============================================================================
+# ESECUZIONE IN BACKGROUND (endpoint admin)
+# =============================================================================
+
+def start_reextract(**filters) -> bool:
+    """
+    Avvia reextract in un thread. False se una ri-estrazione e' gia' in corso.
+    Il risultato si legge con get_reextract_status().
+    """
+    with _status_lock:
+        if _status['in_corso']:
+            return False
+        _status.update(in_corso=True, avviata=datetime.now().isoformat(), filtri=filters)
+
+    def _run():
+        try:
+            result = reextract(**filters)
+        except Exception as e:
+            logger.exception("Ri-estrazione fallita")
+            result = {'errore': str(e)}
+        with _status_lock:
+            _status.update(in_corso=False, ultimo=result)
+
+    threading.Thread(target=_run, name='reextract', daemon=True).start()
+    return True
+
+
+def get_reextract_status() -> Dict[str, Any]:
+    """Stato della ri-estrazione in background e ultimo risultato."""
+    with _status_lock:
+        return dict(_status)
@@ -0,0 +1,123 @@
+# =============================================================================
+# SERV.O v11.7 - SPOOL PDF SU DISCO
+# =============================================================================
+# I PDF caricati vengono copiati a blocchi in un file della cartella di spool
+# (INGESTION_SPOOL_DIR) calcolando l'hash SHA-256 durante la copia: il
+# contenuto non viene mai tenuto tutto in memoria. Elaborazione, coda e
+# archiviazione in UPLOAD_DIR lavorano sul percorso.
+#
+# Il file di spool appartiene a chi lo crea (router, job della coda) che lo
+# rimuove a fine elaborazione: l'archiviazione in UPLOAD_DIR usa un hard link
+# (o una copia a blocchi su filesystem diversi) e non lo consuma.
+# =============================================================================
+
+import os
+import uuid
+import shutil
+import hashlib
+from typing import BinaryIO, NamedTuple, Optional, Union
+
+from ...config import config
+from ...utils import compute_file_hash
+
+# Dimensione dei blocchi letti/scritti
+SPOOL_CHUNK_SIZE = 1024 * 1024
+
+
+class SpooledPdf(NamedTuple):
+    """PDF salvato nella cartella di spool."""
+    path: str
+    hash_file: str
+    size: int
+
+
+def spool_stream(
+    stream: BinaryIO,
+    max_size: Optional[int] = None,
+    chunk_size: int = SPOOL_CHUNK_SIZE
+) -> SpooledPdf:
+    """
+    Copia uno stream nella cartella di spool, a blocchi, con hash incrementale.
+
+    Il file compare con il nome definitivo solo a copia completa (.part +
+    os.replace); in caso di errore il file parziale viene rimosso.
+
+    Args:
+        stream: File binario aperto (es. UploadFile.file)
+        max_size: Dimensione massima in byte (None = nessun limite)
+        chunk_size: Dimensione dei blocchi
+
+    Raises:
+        ValueError: File vuoto o piu' grande di max_size
+    """
+    os.makedirs(config.INGESTION_SPOOL_DIR, exist_ok=True)
+    path = os.path.join(config.INGESTION_SPOOL_DIR, f"{uuid.uuid4().hex}.pdf")
+    tmp_path = path + '.part'
+
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, 'wb') as f:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_size is not None and size > max_size:
+                    raise ValueError(f"File troppo grande (max {max_size // 1024 // 1024}MB)")
+                digest.update(chunk)
+                f.write(chunk)
+        if size == 0:
+            raise ValueError("File vuoto")
+        os.replace(tmp_path, path)
+    except BaseException:
+        remove_spool(tmp_path)
+        raise
+    return SpooledPdf(path, digest.hexdigest(), size)
+
+
+def spool_file(path: str, chunk_size: int = SPOOL_CHUNK_SIZE) -> SpooledPdf:
+    """SpooledPdf per un file gia' su disco (es. spool di un job): hash letto a blocchi."""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+            size += len(chunk)
+    return SpooledPdf(path, digest.hexdigest(), size)
+
+
+def store_spooled(spooled: SpooledPdf, dest_path: str) -> None:
+    """
+    Archivia il PDF in dest_path senza leggerlo in memoria: hard link se
+    spool e destinazione sono sullo stesso filesystem, altrimenti copia a
+    blocchi su file temporaneo e os.replace.
+    """
+    os.makedirs(os.path.dirname(dest_path) or '.', exist_ok=True)
+    try:
+        os.link(spooled.path, dest_path)
+        return
+    except OSError:
+        pass
+    tmp_path = dest_path + '.part'
+    try:
+        shutil.copyfile(spooled.path, tmp_path)
+        os.replace(tmp_path, dest_path)
+    except BaseException:
+        remove_spool(tmp_path)
+        raise
+
+
+def pdf_hash(content: Union[bytes, SpooledPdf]) -> str:
+    """Hash SHA-256 di un PDF in memoria o in spool (gia' calcolato)."""
+    if isinstance(content, SpooledPdf):
+        return content.hash_file
+    return compute_file_hash(content)
+
+
+def remove_spool(path: str) -> None:
+    """Rimuove un file di spool (assente = gia' rimosso)."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,198 @@
+# =============================================================================
+# SERV.O v11.7 - TEMPI PIPELINE PDF
+# =============================================================================
+# Misura wall e CPU per fase di process_pdf. Le fasi sono "giri" (lap): ogni
+# lap('fase') attribuisce alla fase il tempo trascorso dal lap precedente,
+# quindi le fasi coprono l'intera elaborazione senza sovrapposizioni.
+#
+# Il timer attivo e' in una ContextVar: lap() fuori da process_pdf non fa
+# nulla, e i thread del pool di upload non condividono il timer.
+# =============================================================================
+
+import time
+import pathlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, Iterator, List, Optional
+
+from ...config import config
+from ...database_pg import get_db
+
+_MIGRATION = pathlib.Path(__file__).parent.parent.parent.parent / 'migrations' / 'v11_7_pdf_timings.sql'
+
+FASE_TOTALE = 'totale'
+
+_current_timer: ContextVar[Optional['PipelineTimer']] = ContextVar('pipeline_timer', default=None)
+
+
+class PipelineTimer:
+    """Tempi accumulati per fase: {fase: [wall_ms, cpu_ms]}."""
+
+    def __init__(self):
+        self.stages: Dict[str, List[float]] = {}
+        self.n_pagine: Optional[int] = None
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+
+    def lap(self, fase: str) -> None:
+        wall, cpu = time.perf_counter(), time.thread_time()
+        entry = self.stages.setdefault(fase, [0.0, 0.0])
+        entry[0] += (wall - self._wall) * 1000
+        entry[1] += (cpu - self._cpu) * 1000
+        self._wall, self._cpu = wall, cpu
+
+    def merge(self, stages: Optional[Dict[str, List[float]]], n_pagine: int = None) -> None:
+        """Aggiunge i tempi misurati altrove (processo di estrazione)."""
+        for fase, (wall_ms, cpu_ms) in (stages or {}).items():
+            entry = self.stages.setdefault(fase, [0.0, 0.0])
+            entry[0] += wall_ms
+            entry[1] += cpu_ms
+        if n_pagine is not None:
+            self.n_pagine = n_pagine
+
+    def totals(self) -> List[float]:
+        return [sum(v[0] for v in self.stages.values()),
+                sum(v[1] for v in self.stages.values())]
+
+
+@contextmanager
+def pipeline_timer() -> Iterator[PipelineTimer]:
+    """Attiva un timer per il contesto corrente (un PDF)."""
+    timer = PipelineTimer()
+    token = _current_timer.set(timer)
+    try:
+        yield timer
+    finally:
+        _current_timer.reset(token)
+
+
+def lap(fase: str) -> None:
+    """Chiude la fase corrente del timer attivo (no-op se nessun timer)."""
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.lap(fase)
+
+
+def record_pages(n_pagine: int) -> None:
+    """Registra il numero di pagine del PDF sul timer attivo."""
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.n_pagine = n_pagine
+
+
+# =============================================================================
+# PERSISTENZA
+# =============================================================================
+
+def ensure_timings_table() -> None:
+    """Crea tabella acquisizioni_tempi se non esiste (auto-migrazione)."""
+    db = get_db()
+    try:
+        db.executescript(_MIGRATION.read_text(encoding='utf-8'))
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"   ⚠️ Migrazione acquisizioni_tempi non applicata: {e}")
+
+
+def save_timings(db, id_acquisizione: int, vendor: str, timer: PipelineTimer,
+                 n_righe: int = None) -> None:
+    """
+    Salva i tempi per fase di un'acquisizione (un INSERT multi-riga).
+
+    Un errore di salvataggio non deve far fallire l'elaborazione del PDF.
+    """
+    if not config.PDF_STAGE_TIMINGS or not timer.stages:
+        return
+
+    rows = [
+        (id_acquisizione, vendor, fase, round(wall_ms, 2), round(cpu_ms, 2),
+         timer.n_pagine, n_righe)
+        for fase, (wall_ms, cpu_ms) in timer.stages.items()
+    ]
+    wall_ms, cpu_ms = timer.totals()
+    rows.append((id_acquisizione, vendor, FASE_TOTALE, round(wall_ms, 2), round(cpu_ms, 2),
+                 timer.n_pagine, n_righe))
+
+    try:
+        db.execute_insert("""
+            INSERT INTO acquisizioni_tempi
+            (id_acquisizione, vendor, fase, wall_ms, cpu_ms, n_pagine, n_righe)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, rows)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"⚠️ Tempi pipeline non salvati per acquisizione {id_acquisizione}: {e}")
+
+
+# =============================================================================
+# STATISTICHE
+# =============================================================================
+
+# Finestra corrente (ultimi N giorni) e precedente (N giorni prima) per
+# evidenziare le regressioni, es. un nuovo layout di un vendor
+_PERFORMANCE_SQL = """
+    SELECT {group_by},
+           COUNT(*) FILTER (WHERE corrente) AS n,
+           ROUND(AVG(wall_ms) FILTER (WHERE corrente), 1) AS wall_ms_medio,
+           ROUND((PERCENTILE_CONT(0.95) WITHIN GROUP (ORDER BY wall_ms)
+                  FILTER (WHERE corrente))::numeric, 1) AS wall_ms_p95,
+           ROUND(MAX(wall_ms) FILTER (WHERE corrente), 1) AS wall_ms_max,
+           ROUND(AVG(cpu_ms) FILTER (WHERE corrente), 1) AS cpu_ms_medio,
+           ROUND(SUM(wall_ms) FILTER (WHERE corrente)
+                 / NULLIF(SUM(n_pagine) FILTER (WHERE corrente), 0), 1) AS wall_ms_per_pagina,
+           ROUND(SUM(wall_ms) FILTER (WHERE corrente)
+                 / NULLIF(SUM(n_righe) FILTER (WHERE corrente), 0), 1) AS wall_ms_per_riga,
+           ROUND(AVG(wall_ms) FILTER (WHERE NOT corrente), 1) AS wall_ms_medio_precedente
+    FROM (
+        SELECT t.*, t.created_at >= NOW() - make_interval(days => %s) AS corrente
+        FROM acquisizioni_tempi t
+        WHERE t.created_at >= NOW() - make_interval(days => %s)
+          {filtro}
+    ) t
+    GROUP BY {group_by}
+    HAVING COUNT(*) FILTER (WHERE corrente) > 0
+    ORDER BY {order_by}
+"""
+
+
+def _variazione(row: Dict[str, Any]) -> Dict[str, Any]:
+    row = dict(row)
+    prima, ora = row['wall_ms_medio_precedente'], row['wall_ms_medio']
+    row['variazione_pct'] = round(float((ora - prima) * 100 / prima), 1) if prima else None
+    return row
+
+
+def get_performance_stats(giorni: int = 30, vendor: str = None) -> Dict[str, Any]:
+    """
+    Tempi aggregati per vendor (fase 'totale') e per vendor/fase.
+
+    Args:
+        giorni: Finestra di analisi; la finestra precedente di pari durata
+                fornisce il confronto (variazione_pct)
+        vendor: Filtra un vendor
+
+    Returns:
+        Dict con per_vendor e per_fase
+    """
+    db = get_db()
+    filtro = "AND t.vendor = %s" if vendor else ""
+    params = (giorni, giorni * 2) + ((vendor,) if vendor else ())
+
+    per_vendor = db.execute(
+        _PERFORMANCE_SQL.format(group_by='vendor', order_by='wall_ms_medio DESC',
+                                filtro=filtro + f" AND t.fase = '{FASE_TOTALE}'"),
+        params
+    ).fetchall()
+    per_fase = db.execute(
+        _PERFORMANCE_SQL.format(group_by='vendor, fase', order_by='vendor, wall_ms_medio DESC',
+                                filtro=filtro + f" AND t.fase <> '{FASE_TOTALE}'"),
+        params
+    ).fetchall()
+
+    return {
+        'giorni': giorni,
+        'per_vendor': [_variazione(r) for r in per_vendor],
+        'per_fase': [_variazione(r) for r in per_fase],
+    }
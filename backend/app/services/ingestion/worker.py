@@ -0,0 +1,222 @@
+# =============================================================================
+# SERV.O v11.7 - CODA INGESTION PDF: WORKER
+# =============================================================================
+# Processi worker che elaborano i job di ingestion_jobs fuori dall'event loop
+# del backend. Ogni processo ha il proprio pool PostgreSQL e lavora un job
+# alla volta dentro uno scope DB dedicato.
+#
+# Avvio:
+#   - dal backend (lifespan): INGESTION_WORKERS processi
+#   - standalone: python -m app.scripts.ingestion_worker --workers N
+# =============================================================================
+
+import os
+import time
+import socket
+import logging
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from typing import Dict, Any, List
+
+from ...config import config
+from ...database_pg import with_db_scope
+from .jobs import (
+    ensure_jobs_table,
+    claim_job,
+    renew_lease,
+    finish_job,
+    recover_stale_jobs,
+    JOB_DEAD,
+)
+from .spool import spool_file
+
+logger = logging.getLogger('ingestion')
+
+# Ogni quanto un worker controlla i job RUNNING orfani (lease scaduto)
+_RECOVER_INTERVAL = 60
+
+# Ogni quanto un worker verifica se le regole di detection vendor sono cambiate
+_RULES_INTERVAL = 30
+
+# Processi avviati da start_ingestion_workers()
+_processes: List[multiprocessing.Process] = []
+_stop_event = None
+
+
+@contextmanager
+def _lease_heartbeat(job: Dict[str, Any], worker: str):
+    """
+    Rinnova il lease del job ogni terzo di INGESTION_JOB_LEASE finche'
+    l'elaborazione e' in corso, in un thread con connessione propria (la
+    transazione dell'elaborazione non viene toccata).
+    """
+    stop = threading.Event()
+
+    @with_db_scope
+    def renew():
+        if not renew_lease(job['id_job'], worker):
+            logger.warning(f"Job {job['id_job']}: lease non rinnovato (job non piu' RUNNING su {worker})")
+
+    def heartbeat():
+        while not stop.wait(config.INGESTION_JOB_LEASE / 3):
+            try:
+                renew()
+            except Exception as e:
+                logger.error(f"Job {job['id_job']}: rinnovo lease fallito: {e}")
+
+    thread = threading.Thread(target=heartbeat, name=f"lease-job-{job['id_job']}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+@with_db_scope
+def run_once(worker: str) -> bool:
+    """
+    Prende in carico ed elabora un job.
+
+    Returns:
+        True se un job e' stato elaborato, False se la coda e' vuota
+    """
+    from ..pdf_processor import process_pdf
+
+    job = claim_job(worker)
+    if not job:
+        return False
+
+    started = time.perf_counter()
+    try:
+        # v11.7: PDF letto dallo spool, mai caricato tutto in memoria
+        with _lease_heartbeat(job, worker):
+            result = process_pdf(job['filename'], spool_file(job['percorso_spool']))
+    except Exception as e:
+        stato = finish_job(job, error=str(e))
+        logger.error(f"Job {job['id_job']} ({job['filename']}): {e} -> {stato}")
+    else:
+        stato = finish_job(job, result)
+        logger.info(
+            f"Job {job['id_job']} ({job['filename']}): {result['status']} -> {stato} "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+
+    if stato is None:
+        logger.warning(f"Job {job['id_job']}: esito scartato, lease scaduto e job non piu' RUNNING su {worker}")
+    elif stato == JOB_DEAD:
+        logger.error(f"Job {job['id_job']} in dead-letter dopo {job['tentativi']} tentativi")
+    return True
+
+
+@with_db_scope
+def _recover() -> None:
+    recovered = recover_stale_jobs()
+    if recovered:
+        logger.warning(f"Rimessi in coda {recovered} job RUNNING orfani")
+
+
+@with_db_scope
+def _refresh_rules() -> None:
+    from ..extraction import refresh_detection_rules
+
+    if refresh_detection_rules():
+        logger.info("Regole detection vendor ricaricate")
+
+
+def worker_loop(worker: str, stop_event=None) -> None:
+    """Ciclo del worker: elabora finche' ci sono job, poi attende il polling."""
+    last_recover = last_rules = 0.0
+    while stop_event is None or not stop_event.is_set():
+        try:
+            if time.monotonic() - last_recover > _RECOVER_INTERVAL:
+                _recover()
+                last_recover = time.monotonic()
+            if time.monotonic() - last_rules > _RULES_INTERVAL:
+                _refresh_rules()
+                last_rules = time.monotonic()
+            if run_once(worker):
+                continue
+        except Exception as e:
+            logger.error(f"Worker {worker}: {e}")
+
+        if stop_event is not None:
+            stop_event.wait(config.INGESTION_POLL_SECONDS)
+        else:
+            time.sleep(config.INGESTION_POLL_SECONDS)
+
+
+def _process_main(worker: str, stop_event) -> None:
+    """Entry point del processo worker (spawn: stato del backend non ereditato)."""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(message)s')
+    try:
+        worker_loop(worker, stop_event)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        from ...database_pg import close_pool
+        close_pool()
+
+
+def start_ingestion_workers(workers: int = None) -> int:
+    """
+    Avvia i processi worker.
+
+    Args:
+        workers: Numero processi (default INGESTION_WORKERS, 0 = nessuno)
+
+    Returns:
+        Numero processi avviati
+    """
+    global _stop_event
+
+    workers = config.INGESTION_WORKERS if workers is None else workers
+    if workers <= 0 or _processes:
+        return 0
+
+    ensure_jobs_table()
+
+    # spawn: niente fork di connessioni psycopg2 e thread degli scheduler
+    ctx = multiprocessing.get_context('spawn')
+    _stop_event = ctx.Event()
+    host = socket.gethostname()
+    for n in range(workers):
+        name = f"{host}:{os.getpid()}:{n + 1}"
+        process = ctx.Process(
+            target=_process_main, args=(name, _stop_event),
+            name=f"servo-ingestion-{n + 1}", daemon=True
+        )
+        process.start()
+        _processes.append(process)
+
+    print(f"✅ Ingestion worker avviati: {workers}")
+    return workers
+
+
+def stop_ingestion_workers(timeout: float = 30) -> None:
+    """Arresta i worker: attende il job in corso, poi termina."""
+    global _stop_event
+
+    if not _processes:
+        return
+    _stop_event.set()
+    deadline = time.monotonic() + timeout
+    for process in _processes:
+        process.join(max(deadline - time.monotonic(), 0))
+        if process.is_alive():
+            process.terminate()
+    _processes.clear()
+    _stop_event = None
+
+
+def get_workers_status() -> Dict[str, Any]:
+    """Stato dei processi worker avviati da questo backend."""
+    return {
+        'configured': config.INGESTION_WORKERS,
+        'running': sum(1 for p in _processes if p.is_alive()),
+        'workers': [
+            {'name': p.name, 'pid': p.pid, 'alive': p.is_alive()}
+            for p in _processes
+        ],
+    }
@@ -7,7 +7,7 @@
 import csv
 import os
 from typing import Dict, Any, Tuple
-from ...database_pg import get_db
+from ...database_pg import get_db, bulk_upsert
 from .parsing import (
     parse_decimal_it,
     parse_prezzo_intero,
@@ -18,6 +18,17 @@ from .parsing import (
 )
 
 
+# Colonne listini_vendor valorizzate dall'import (ordine delle tuple riga)
+LISTINO_COLUMNS = (
+    'vendor', 'codice_aic', 'descrizione',
+    'sconto_1', 'sconto_2', 'sconto_3', 'sconto_4',
+    'prezzo_netto', 'prezzo_scontare', 'prezzo_pubblico',
+    'aliquota_iva', 'scorporo_iva',
+    'prezzo_csv_originale', 'prezzo_pubblico_csv',
+    'data_decorrenza', 'fonte_file',
+)
+
+
 # Mapping colonne CSV -> campi database per ogni vendor
 VENDOR_CSV_MAPPINGS = {
     'CODIFI': {
@@ -115,6 +126,7 @@ def import_listino_csv(
                 'error': f"Colonne obbligatorie mancanti nel CSV: {missing}. Colonne trovate: {headers}"
             }
 
+        righe = []
         for row_num, row in enumerate(reader, start=2):
             try:
                 codice_aic_raw = row.get(mapping['codice_aic'], '').strip()
@@ -192,33 +204,7 @@ def import_listino_csv(
 
                     flag_scorporo = 'N'
 
-                db.execute("""
-                    INSERT INTO listini_vendor (
-                        vendor, codice_aic, descrizione,
-                        sconto_1, sconto_2, sconto_3, sconto_4,
-                        prezzo_netto, prezzo_scontare, prezzo_pubblico,
-                        aliquota_iva, scorporo_iva,
-                        prezzo_csv_originale, prezzo_pubblico_csv,
-                        data_decorrenza, fonte_file, attivo, data_import
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, TRUE, NOW())
-                    ON CONFLICT (vendor, codice_aic) DO UPDATE SET
-                        descrizione = EXCLUDED.descrizione,
-                        sconto_1 = EXCLUDED.sconto_1,
-                        sconto_2 = EXCLUDED.sconto_2,
-                        sconto_3 = EXCLUDED.sconto_3,
-                        sconto_4 = EXCLUDED.sconto_4,
-                        prezzo_netto = EXCLUDED.prezzo_netto,
-                        prezzo_scontare = EXCLUDED.prezzo_scontare,
-                        prezzo_pubblico = EXCLUDED.prezzo_pubblico,
-                        aliquota_iva = EXCLUDED.aliquota_iva,
-                        scorporo_iva = EXCLUDED.scorporo_iva,
-                        prezzo_csv_originale = EXCLUDED.prezzo_csv_originale,
-                        prezzo_pubblico_csv = EXCLUDED.prezzo_pubblico_csv,
-                        data_decorrenza = EXCLUDED.data_decorrenza,
-                        fonte_file = EXCLUDED.fonte_file,
-                        attivo = TRUE,
-                        data_import = NOW()
-                """, (
+                righe.append((
                     vendor_upper, codice_aic, descrizione,
                     sconto_1, sconto_2, sconto_3, sconto_4,
                     prezzo_netto, prezzo_scontare, prezzo_pubblico,
@@ -233,6 +219,15 @@ def import_listino_csv(
                 result['errors'].append(f"Riga {row_num}: {str(e)}")
                 result['skipped'] += 1
 
+        # v11.7: un solo COPY + INSERT ... ON CONFLICT invece di un INSERT per riga
+        if righe:
+            bulk_upsert(
+                'listini_vendor', LISTINO_COLUMNS, righe,
+                conflict_columns=('vendor', 'codice_aic'),
+                extra_values={'attivo': 'TRUE', 'data_import': 'NOW()'},
+                db=db,
+            )
+
         db.commit()
 
         count = db.execute(
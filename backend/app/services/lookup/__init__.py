@@ -7,6 +7,9 @@
 # - scoring.py: Funzioni di scoring e fuzzy matching
 # - matching.py: Logica principale di lookup
 # - queries.py: Query database e operazioni batch
+# - index.py: Indice anagrafiche in memoria (v11.7)
+# - keys.py: Chiavi normalizzate MIN_ID/P.IVA e chiave fuzzy a trigrammi (v11.7)
+# - cache.py: Cache risultati lookup con invalidazione per codici (v11.7)
 #
 # v11.2: Aggiunta integrazione anagrafica_clienti per lookup MIN_ID
 # =============================================================================
@@ -14,9 +17,13 @@
 # Scoring
 from .scoring import (
     FUZZY_AVAILABLE,
+    RAPIDFUZZ_AVAILABLE,
     build_indirizzo_concatenato,
     fuzzy_match_address,
     fuzzy_match_full,
+    fuzzy_match_address_batch,
+    fuzzy_match_full_batch,
+    token_sort_scores,
 )
 
 # Matching
@@ -25,9 +32,36 @@ from .matching import (
     lookup_farmacia,
     lookup_farmacia_extended,
     lookup_cliente_by_piva,
+    get_codice_ministeriale,
     _disambiguate_multipunto,
 )
 
+# Chiavi normalizzate (v11.7)
+from .keys import (
+    chiave_fuzzy,
+    normalize_codice,
+    normalize_piva_key,
+    trigram_sequence,
+    trigrams,
+    word_similarity,
+)
+
+# Cache risultati lookup (v11.7)
+from .cache import (
+    clear_lookup_cache,
+    get_lookup_cache_stats,
+    load_lookup_cache,
+    lookup_cache_key,
+)
+
+# Indice anagrafiche (v11.7)
+from .index import (
+    AnagraficaIndex,
+    anagrafica_changed,
+    get_anagrafica_index,
+    get_anagrafica_index_stats,
+)
+
 # Queries
 from .queries import (
     popola_header_da_anagrafica,
@@ -43,15 +77,37 @@ from .queries import (
 __all__ = [
     # Scoring
     'FUZZY_AVAILABLE',
+    'RAPIDFUZZ_AVAILABLE',
     'build_indirizzo_concatenato',
     'fuzzy_match_address',
     'fuzzy_match_full',
+    'fuzzy_match_address_batch',
+    'fuzzy_match_full_batch',
+    'token_sort_scores',
     # Matching
     'FUZZY_THRESHOLD',
     'lookup_farmacia',
     'lookup_farmacia_extended',
     'lookup_cliente_by_piva',
+    'get_codice_ministeriale',
     '_disambiguate_multipunto',
+    # Chiavi normalizzate
+    'chiave_fuzzy',
+    'normalize_codice',
+    'normalize_piva_key',
+    'trigram_sequence',
+    'trigrams',
+    'word_similarity',
+    # Cache risultati lookup
+    'clear_lookup_cache',
+    'get_lookup_cache_stats',
+    'load_lookup_cache',
+    'lookup_cache_key',
+    # Indice anagrafiche
+    'AnagraficaIndex',
+    'anagrafica_changed',
+    'get_anagrafica_index',
+    'get_anagrafica_index_stats',
     # Queries
     'popola_header_da_anagrafica',
     'run_lookup_batch',
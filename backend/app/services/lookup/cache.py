@@ -0,0 +1,312 @@
+# =============================================================================
+# SERV.O v11.7 - CACHE RISULTATI LOOKUP
+# =============================================================================
+# Le stesse farmacie ordinano piu' volte al giorno: lookup_farmacia_extended
+# ricalcolava ad ogni PDF lo stesso risultato (matching anagrafica +
+# deposito da anagrafica_clienti).
+#
+# Cache LRU di LOOKUP_CACHE_SIZE voci con chiave normalizzata dei dati
+# estratti: P.IVA, MIN_ID, CAP e impronta di ragione sociale, indirizzo,
+# citta' e provincia (i valori che il lookup usa davvero).
+#
+# Ogni voce vale per la versione anagrafica dell'indice in memoria con cui
+# e' stata calcolata (index.py). anagrafica_changed registra per ogni nuova
+# versione i MIN_ID e le P.IVA modificati (lookup_cache_invalidazioni): quando
+# l'indice passa alla nuova versione la cache scarta solo le voci che
+# dipendono da quei codici, piu' i risultati FUZZY/NESSUNO (dipendono da tutti
+# i candidati). Modifiche senza dettaglio (import CSV, pulizia, anagrafica
+# clienti) svuotano la cache.
+#
+# Con LOOKUP_CACHE_PERSIST le voci sono scritte in lookup_cache (tabelle
+# create da scripts/migrate_db.py) e ricaricate dopo la prima costruzione
+# dell'indice nel processo. Senza indice in memoria la cache non e' usata.
+# =============================================================================
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from ...config import config
+from ...database_pg import get_db
+from ...utils import normalize_piva
+from .keys import normalize_codice, normalize_piva_key
+
+
+# Metodi il cui risultato dipende da tutti i candidati fuzzy
+_METODI_GLOBALI = ('FUZZY', 'NESSUNO')
+
+
+class _Entry(NamedTuple):
+    risultato: Dict[str, Any]
+    codici: frozenset  # MIN_ID / codici sito normalizzati
+    pive: frozenset  # P.IVA normalizzate
+    globale: bool
+
+
+# =============================================================================
+# CHIAVE
+# =============================================================================
+
+def _impronta(*values: str) -> str:
+    testo = '\x1f'.join(' '.join(value.split()) for value in values)
+    return hashlib.sha1(testo.encode('utf-8')).hexdigest()[:20]
+
+
+def lookup_cache_key(data: Dict[str, Any]) -> Tuple[str, str, str]:
+    """
+    Chiave della cache per i dati estratti: (chiave, P.IVA normalizzata,
+    MIN_ID normalizzato).
+
+    P.IVA e MIN_ID entrano nella chiave come li usa il lookup (MIN_ID solo
+    con almeno 4 caratteri, P.IVA per anagrafica_clienti solo con almeno 8);
+    ragione sociale, indirizzo, citta' e provincia con spazi compattati.
+    """
+    piva_raw = (data.get('partita_iva') or '').strip()
+    min_id = (data.get('codice_ministeriale') or '').strip()
+    piva = normalize_piva(piva_raw)
+    piva_cliente = normalize_piva_key(piva_raw) if len(piva_raw) >= 8 else ''
+    min_id_norm = normalize_codice(min_id) if len(min_id) >= 4 else ''
+    cap = (data.get('cap') or '').strip()
+    impronta = _impronta(*((data.get(field) or '').strip() for field in
+                           ('ragione_sociale', 'indirizzo', 'citta', 'provincia')))
+    chiave = '|'.join((piva, piva_cliente, min_id_norm, cap, impronta))
+    return chiave, normalize_piva_key(piva_raw), min_id_norm
+
+
+# =============================================================================
+# STATO
+# =============================================================================
+
+_lock = threading.Lock()
+_entries: 'OrderedDict[str, _Entry]' = OrderedDict()
+_versione: Optional[int] = None
+_stats = {'hits': 0, 'misses': 0, 'invalidate': 0, 'svuotamenti': 0}
+_tables_available: Optional[bool] = None
+
+
+def _enabled() -> bool:
+    return config.LOOKUP_CACHE and config.LOOKUP_CACHE_SIZE > 0
+
+
+def _tables(db) -> bool:
+    """Tabelle lookup_cache presenti (verificato una volta per processo)."""
+    global _tables_available
+
+    if _tables_available is None:
+        rows = db.execute("""
+            SELECT table_name FROM information_schema.tables
+            WHERE table_schema = current_schema()
+            AND table_name IN ('lookup_cache', 'lookup_cache_invalidazioni')
+        """).fetchall()
+        _tables_available = len(rows) == 2
+    return _tables_available
+
+
+# =============================================================================
+# INVALIDAZIONE
+# =============================================================================
+
+def record_invalidation(db, versione: int, codici: Optional[Iterable[str]],
+                        partite_iva: Optional[Iterable[str]]) -> None:
+    """
+    Registra i codici modificati per la nuova versione anagrafica, nella
+    transazione che incrementa la versione. codici e partite_iva None =
+    modifica senza dettaglio (la cache viene svuotata).
+    """
+    if not _tables(db):
+        return
+    tutto = codici is None and partite_iva is None
+    db.execute("""
+        INSERT INTO lookup_cache_invalidazioni (versione, codici, pive, tutto)
+        VALUES (%s, %s::text[], %s::text[], %s)
+        ON CONFLICT (versione) DO NOTHING
+    """, (
+        versione,
+        sorted({normalize_codice(c) for c in codici or () if normalize_codice(c)}),
+        sorted({normalize_piva_key(p) for p in partite_iva or () if normalize_piva_key(p)}),
+        tutto,
+    ))
+
+
+def _invalidations(db, da: int, a: int) -> Optional[List[Tuple[frozenset, frozenset]]]:
+    """
+    (codici, pive) modificati dalle versioni da+1..a; None se manca una
+    versione o una modifica e' senza dettaglio.
+    """
+    if not _tables(db):
+        return None
+    rows = db.execute("""
+        SELECT versione, codici, pive, tutto FROM lookup_cache_invalidazioni
+        WHERE versione > %s AND versione <= %s
+    """, (da, a)).fetchall()
+    if len(rows) != a - da or any(r['tutto'] for r in rows):
+        return None
+    return [(frozenset(r['codici'] or ()), frozenset(r['pive'] or ())) for r in rows]
+
+
+def _obsoleta(entry: _Entry, invalidazioni: List[Tuple[frozenset, frozenset]]) -> bool:
+    for codici, pive in invalidazioni:
+        if entry.globale and (codici or pive):
+            return True
+        if entry.codici & codici or entry.pive & pive:
+            return True
+    return False
+
+
+def _sync_version(versione: int) -> None:
+    """Porta la cache (chiamante con _lock) alla versione dell'indice."""
+    global _versione
+
+    if _versione == versione:
+        return
+    invalidazioni = None
+    if _versione is not None and versione > _versione and _entries:
+        try:
+            invalidazioni = _invalidations(get_db(), _versione, versione)
+        except Exception as e:
+            print(f"⚠️ Invalidazioni cache lookup non lette: {e}")
+    if invalidazioni is None:
+        if _entries:
+            _stats['svuotamenti'] += 1
+        _entries.clear()
+    else:
+        obsolete = [k for k, entry in _entries.items() if _obsoleta(entry, invalidazioni)]
+        for chiave in obsolete:
+            del _entries[chiave]
+        _stats['invalidate'] += len(obsolete)
+    _versione = versione
+
+
+# =============================================================================
+# LETTURA / SCRITTURA
+# =============================================================================
+
+def get_cached_lookup(chiave: str, versione: Optional[int]) -> Optional[Dict[str, Any]]:
+    """Risultato in cache per la versione anagrafica dell'indice (copia)."""
+    if not _enabled() or versione is None:
+        return None
+    with _lock:
+        _sync_version(versione)
+        entry = _entries.get(chiave)
+        if entry is None:
+            _stats['misses'] += 1
+            return None
+        _entries.move_to_end(chiave)
+        _stats['hits'] += 1
+        return dict(entry.risultato)
+
+
+def _put(chiave: str, entry: _Entry) -> None:
+    _entries[chiave] = entry
+    _entries.move_to_end(chiave)
+    while len(_entries) > config.LOOKUP_CACHE_SIZE:
+        _entries.popitem(last=False)
+
+
+def store_lookup(chiave: str, versione: Optional[int], risultato: Dict[str, Any],
+                 codici: Iterable[str], partite_iva: Iterable[str]) -> None:
+    """
+    Salva il risultato calcolato con l'indice alla versione data. codici e
+    partite_iva: MIN_ID e P.IVA da cui dipende (estratti e del match).
+    """
+    if not _enabled() or versione is None:
+        return
+    entry = _Entry(
+        dict(risultato),
+        frozenset(c for c in map(normalize_codice, codici) if c),
+        frozenset(p for p in map(normalize_piva_key, partite_iva) if p),
+        risultato.get('lookup_method') in _METODI_GLOBALI,
+    )
+    with _lock:
+        _sync_version(versione)
+        if versione != _versione:
+            return
+        _put(chiave, entry)
+
+    if config.LOOKUP_CACHE_PERSIST:
+        db = get_db()
+        if _tables(db):
+            db.execute("""
+                INSERT INTO lookup_cache (chiave, versione, risultato, codici, pive, globale, updated_at)
+                VALUES (%s, %s, %s::jsonb, %s::text[], %s::text[], %s, CURRENT_TIMESTAMP)
+                ON CONFLICT (chiave) DO UPDATE SET
+                    versione = EXCLUDED.versione, risultato = EXCLUDED.risultato,
+                    codici = EXCLUDED.codici, pive = EXCLUDED.pive,
+                    globale = EXCLUDED.globale, updated_at = CURRENT_TIMESTAMP
+            """, (chiave, versione, json.dumps(entry.risultato), sorted(entry.codici),
+                  sorted(entry.pive), entry.globale))
+
+
+def load_lookup_cache(versione: Optional[int]) -> int:
+    """
+    Ricarica le voci salvate (LOOKUP_CACHE_PERSIST) alla versione del primo
+    indice costruito nel processo, le piu' recenti fino a LOOKUP_CACHE_SIZE, scartando quelle invalidate dopo la
+    loro versione. Rimuove dal database le voci non ricaricate.
+    """
+    if not _enabled() or not config.LOOKUP_CACHE_PERSIST or versione is None:
+        return 0
+    db = get_db()
+    try:
+        if not _tables(db):
+            return 0
+        rows = db.execute("""
+            SELECT chiave, versione, risultato, codici, pive, globale FROM lookup_cache
+            WHERE versione <= %s
+            ORDER BY updated_at DESC
+            LIMIT %s
+        """, (versione, config.LOOKUP_CACHE_SIZE)).fetchall()
+
+        invalidazioni = {
+            v: (_invalidations(db, v, versione) if v < versione else [])
+            for v in {r['versione'] for r in rows}
+        }
+        loaded = []
+        for r in reversed(rows):
+            entry = _Entry(
+                r['risultato'] if isinstance(r['risultato'], dict) else json.loads(r['risultato']),
+                frozenset(r['codici'] or ()), frozenset(r['pive'] or ()), r['globale'],
+            )
+            if invalidazioni[r['versione']] is None or _obsoleta(entry, invalidazioni[r['versione']]):
+                continue
+            loaded.append((r['chiave'], entry))
+
+        db.execute("DELETE FROM lookup_cache WHERE NOT (chiave = ANY(%s::text[]))", ([k for k, _ in loaded],))
+        if loaded:
+            db.execute("UPDATE lookup_cache SET versione = %s WHERE versione <> %s", (versione, versione))
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"   ⚠️ Cache lookup non ricaricata: {e}")
+        return 0
+
+    with _lock:
+        _sync_version(versione)
+        for chiave, entry in loaded:
+            if chiave not in _entries:
+                _put(chiave, entry)
+    return len(loaded)
+
+
+def clear_lookup_cache() -> None:
+    """Svuota la cache del processo e azzera i contatori."""
+    with _lock:
+        _entries.clear()
+        for key in _stats:
+            _stats[key] = 0
+
+
+def get_lookup_cache_stats() -> Dict[str, Any]:
+    """Contatori della cache nel processo corrente."""
+    with _lock:
+        richieste = _stats['hits'] + _stats['misses']
+        return {
+            'attiva': _enabled(),
+            'persistente': config.LOOKUP_CACHE_PERSIST,
+            'voci': len(_entries),
+            'max_voci': config.LOOKUP_CACHE_SIZE,
+            'versione': _versione,
+            **_stats,
+            'hit_rate': round(_stats['hits'] / richieste * 100, 1) if richieste else 0.0,
+        }
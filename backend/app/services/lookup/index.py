@@ -0,0 +1,436 @@
+# =============================================================================
+# SERV.O v11.7 - INDICE ANAGRAFICA IN MEMORIA
+# =============================================================================
+# lookup_farmacia cercava per ogni ordine su ANAGRAFICA_FARMACIE e
+# ANAGRAFICA_PARAFARMACIE con espressioni (LTRIM, REPLACE) che non usano gli
+# indici: scansione completa delle tabelle ad ogni lookup.
+#
+# AnagraficaIndex tiene in memoria i record attivi delle due anagrafiche con
+# le stesse chiavi delle query:
+# - MIN_ID / codice sito senza zeri iniziali (keys.py)
+# - P.IVA senza spazi e zeri iniziali (keys.py)
+# - trigrammi della chiave fuzzy ragione sociale + indirizzo + CAP + citta'
+#   (indice GIN pg_trgm): candidati fuzzy per word similarity decrescente,
+#   calcolata come word_similarity() di pg_trgm (keys.py)
+#
+# L'indice e' immutabile: viene ricostruito per intero e sostituito quando
+# cambia la versione in anagrafica_versione, incrementata da sync ministero,
+# import CSV e pulizia (anagrafica_changed). Ogni processo (backend, worker
+# ingestion) controlla la versione al piu' ogni ANAGRAFICA_INDEX_CHECK_SECONDS
+# e ricostruisce l'indice in un thread in background: fino al primo
+# caricamento il lookup usa le query SQL.
+# =============================================================================
+
+import heapq
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
+
+from ...config import config
+from ...database_pg import get_db, with_db_scope
+from .cache import load_lookup_cache, record_invalidation
+from .keys import chiave_fuzzy, normalize_codice, normalize_piva_key, trigram_sequence, word_similarity
+
+
+FARMACIA = 'FARMACIA'
+PARAFARMACIA = 'PARAFARMACIA'
+
+# Candidati fuzzy per anagrafica (LIMIT della query SQL)
+FUZZY_CANDIDATES = 200
+
+# Word similarity minima dei candidati (pg_trgm.word_similarity_threshold impostata
+# dalla query SQL per l'operatore <%). Non la similarity() sull'intera chiave:
+# un'estrazione con soli CAP e citta' ha similarity ~0.16 col proprio record.
+TRIGRAM_THRESHOLD = 0.3
+
+
+class _Record(NamedTuple):
+    id: int
+    codice: str  # min_id (farmacie) o codice_sito (parafarmacie)
+    partita_iva: str
+    ragione_sociale: str  # sito_logistico per le parafarmacie
+    indirizzo: str
+    cap: str
+    citta: str
+    provincia: str
+
+
+def _text(value: Any) -> str:
+    return sys.intern(value) if value else ''
+
+
+def _group(keys: Iterable[Tuple[str, Any]]) -> Dict[str, Tuple]:
+    grouped: Dict[str, List] = {}
+    for key, value in keys:
+        grouped.setdefault(key, []).append(value)
+    return {key: tuple(values) for key, values in grouped.items()}
+
+
+# =============================================================================
+# ANAGRAFICA
+# =============================================================================
+
+class _Registry:
+    """Record attivi di un'anagrafica (ordinati per id) e chiavi di ricerca."""
+
+    def __init__(self, records: List[_Record], id_field: str, codice_field: str):
+        self.id_field = id_field
+        self.codice_field = codice_field
+        self.records = sorted(records, key=lambda r: r.id)
+        self.by_id = {r.id: r for r in self.records}
+
+        # Primo record per id a parita' di codice (come fetchone)
+        self.by_codice: Dict[str, _Record] = {}
+        for r in self.records:
+            if normalize_codice(r.codice):
+                self.by_codice.setdefault(normalize_codice(r.codice), r)
+        self.by_piva = _group(
+            (normalize_piva_key(r.partita_iva), r) for r in self.records if normalize_piva_key(r.partita_iva)
+        )
+
+        # Trigrammi della chiave fuzzy -> posizioni (come l'indice GIN), e
+        # sequenza dei trigrammi (id) di ogni record per word_similarity()
+        ids: Dict[str, int] = {}
+        postings: List[List[int]] = []
+        sizes = []
+        sequences = []
+        recurs = []
+        offsets = [0]
+        for pos, r in enumerate(self.records):
+            sequence = [ids.setdefault(gram, len(ids))
+                        for gram in trigram_sequence(chiave_fuzzy(r.ragione_sociale, r.indirizzo, r.cap, r.citta))]
+            grams = set(sequence)
+            sizes.append(len(grams))
+            later = set()
+            repeated = []
+            for gram in reversed(sequence):
+                repeated.append(gram in later)
+                later.add(gram)
+            recurs.extend(reversed(repeated))
+            postings.extend([] for _ in range(len(ids) - len(postings)))
+            for gram in grams:
+                postings[gram].append(pos)
+            sequences.extend(sequence)
+            offsets.append(len(sequences))
+        self._trigram_ids = ids
+        self._trigrams = [np.array(p, dtype=np.int32) for p in postings]
+        self._trigram_sizes = np.array(sizes, dtype=np.int32)
+        self._sequences = np.array(sequences, dtype=np.int32)
+        self._offsets = np.array(offsets, dtype=np.int64)
+        # Posizioni il cui trigramma si ripete piu' avanti nel record
+        self._recurs = np.array(recurs, dtype=bool)
+
+    def row(self, r: _Record) -> Dict[str, Any]:
+        """Record nel formato delle righe SQL del lookup."""
+        return {
+            self.id_field: r.id,
+            self.codice_field: r.codice,
+            'partita_iva': r.partita_iva,
+            'ragione_sociale': r.ragione_sociale,
+            'indirizzo': r.indirizzo,
+            'cap': r.cap,
+            'citta': r.citta,
+            'provincia': r.provincia,
+        }
+
+    def _extent_bound(self, positions: np.ndarray, query: Set[int], n_grams: int) -> np.ndarray:
+        """
+        Limite superiore di word_similarity() per i record in positions.
+
+        word_similarity = trovati / (n_grams + non trovati distinti) su
+        un'estensione contigua. Ridotta ai trigrammi trovati agli estremi,
+        un'estensione copre dei blocchi consecutivi di trigrammi trovati e i
+        buchi tra un blocco e l'altro: trovati <= lunghezza dei blocchi, non
+        trovati distinti >= lunghezza dei buchi - non trovati ripetuti nel
+        record. Il limite e' il massimo su tutte le coppie di blocchi.
+        """
+        starts = self._offsets[positions]
+        lengths = self._offsets[positions + 1] - starts
+        record = np.repeat(np.arange(len(positions)), lengths)
+        flat = np.arange(lengths.sum()) + np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        query_mask = np.zeros(len(self._trigram_ids), dtype=bool)
+        query_mask[[gram for gram in query if gram >= 0]] = True
+        found = query_mask[self._sequences[flat]]
+        repeated = np.bincount(record, weights=~found & self._recurs[flat], minlength=len(positions))[:, None]
+
+        # Segmenti di trigrammi tutti trovati o tutti non trovati
+        first = np.ones(len(found), dtype=bool)
+        first[1:] = (found[1:] != found[:-1]) | (record[1:] != record[:-1])
+        segment_start = np.flatnonzero(first)
+        segment_length = np.diff(np.append(segment_start, len(found)))
+        segment_record = record[segment_start]
+        blocks = np.flatnonzero(found[segment_start])
+        block_record = segment_record[blocks]
+        block_length = segment_length[blocks]
+        new_record = np.ones(len(blocks), dtype=bool)
+        new_record[1:] = block_record[1:] != block_record[:-1]
+        # Buco prima di ogni blocco (non il tratto iniziale del record)
+        gap = np.where(new_record, 0, segment_length[np.maximum(blocks - 1, 0)])
+
+        # Somme cumulative per record, in matrici record x blocco
+        first_block = np.maximum.accumulate(np.where(new_record, np.arange(len(blocks)), 0))
+        rank = np.arange(len(blocks)) - first_block
+        n_blocks = int(rank.max()) + 1
+        block_end = np.cumsum(block_length)
+        block_start = block_end - block_length
+        gap_sum = np.cumsum(gap)
+        before = np.full((len(positions), n_blocks), np.nan)
+        until = np.full((len(positions), n_blocks), np.nan)
+        gaps = np.full((len(positions), n_blocks), np.nan)
+        before[block_record, rank] = block_start - block_start[first_block]
+        until[block_record, rank] = block_end - block_start[first_block]
+        gaps[block_record, rank] = gap_sum - gap_sum[first_block]
+
+        bound = np.zeros(len(positions))
+        for span in range(n_blocks):
+            found_max = until[:, span:] - before[:, :n_blocks - span]
+            missing_min = np.maximum(gaps[:, span:] - gaps[:, :n_blocks - span] - repeated, 0)
+            ratio = found_max / (n_grams + missing_min)
+            bound = np.fmax(bound, np.nanmax(ratio, axis=1, initial=0))
+        return bound
+
+    def fuzzy_candidates(self, chiave: str, limit: int) -> List[_Record]:
+        """
+        Candidati della query SQL (matching.py): record con word_similarity()
+        della chiave estratta in chiave_fuzzy >= TRIGRAM_THRESHOLD, i primi
+        limit per word similarity decrescente, poi similarity e id.
+
+        word_similarity() e' calcolata in ordine di limite superiore
+        (_extent_bound), solo finche' un record restante puo' entrare tra i
+        primi limit.
+        """
+        # Trigrammi assenti dall'anagrafica con id negativi: contano nel
+        # totale della chiave estratta ma non compaiono in nessun record
+        grams = set(trigram_sequence(chiave))
+        query = {self._trigram_ids.get(gram, -1 - n) for n, gram in enumerate(grams)}
+        postings = [self._trigrams[gram] for gram in query if gram >= 0]
+        if not postings:
+            return []
+        shared = np.bincount(np.concatenate(postings), minlength=len(self.records))
+        similarity = shared / (len(query) + self._trigram_sizes - shared)
+        # Trigrammi in comune / trigrammi della chiave estratta: primo limite
+        positions = np.flatnonzero(shared >= TRIGRAM_THRESHOLD * len(query))
+        if not len(positions):
+            return []
+        bound = np.minimum(shared[positions] / len(query), self._extent_bound(positions, query, len(query)))
+        keep = bound >= TRIGRAM_THRESHOLD
+        positions, bound = positions[keep], bound[keep]
+        order = np.lexsort((positions, -similarity[positions], -bound))
+        positions, bound = positions[order], bound[order]
+
+        # Primi limit in un min-heap di (word similarity, similarity, -posizione).
+        # I record seguono (limite, similarity, -posizione) decrescente: quando
+        # il peggiore dei primi limit supera questa chiave nessun record
+        # successivo puo' entrare.
+        best: List[Tuple[float, float, int]] = []
+        for pos, upper, sim in zip(positions.tolist(), bound.tolist(), similarity[positions].tolist()):
+            if len(best) >= limit and best[0] > (upper, sim, -pos):
+                break
+            sequence = self._sequences[self._offsets[pos]:self._offsets[pos + 1]].tolist()
+            key = (word_similarity(query, sequence), sim, -pos)
+            if key[0] < TRIGRAM_THRESHOLD:
+                continue
+            if len(best) < limit:
+                heapq.heappush(best, key)
+            elif key > best[0]:
+                heapq.heapreplace(best, key)
+        return [self.records[-pos] for _, _, pos in sorted(best, reverse=True)]
+
+
+class AnagraficaIndex:
+    """
+    Fotografia immutabile delle anagrafiche attive per lookup_farmacia.
+
+    Stessa interfaccia della lettura SQL in matching.py: i metodi ritornano
+    dict con le colonne delle query (id_farmacia/id_parafarmacia, min_id/
+    codice_sito, partita_iva, ragione_sociale, indirizzo, cap, citta, provincia).
+    """
+
+    def __init__(self, farmacie: List[_Record], parafarmacie: List[_Record],
+                 farmacie_totali: int, versione: Optional[int] = None):
+        self._registries = {
+            FARMACIA: _Registry(farmacie, 'id_farmacia', 'min_id'),
+            PARAFARMACIA: _Registry(parafarmacie, 'id_parafarmacia', 'codice_sito'),
+        }
+        self.farmacie_totali = farmacie_totali
+        self.versione = versione
+        self.caricato_il = datetime.now()
+
+    def has_farmacie(self) -> bool:
+        """Anagrafica farmacie caricata (anche solo record non attivi)."""
+        return self.farmacie_totali > 0
+
+    def by_codice(self, tipo: str, codice_norm: str) -> Optional[Dict[str, Any]]:
+        registry = self._registries[tipo]
+        record = registry.by_codice.get(codice_norm)
+        return registry.row(record) if record else None
+
+    def by_piva(self, tipo: str, piva: str) -> List[Dict[str, Any]]:
+        registry = self._registries[tipo]
+        return [registry.row(r) for r in registry.by_piva.get(piva, ())]
+
+    def fuzzy_candidates(self, tipo: str, ragione_sociale: str, indirizzo: str, cap: str, citta: str,
+                         limit: int = FUZZY_CANDIDATES) -> List[Dict[str, Any]]:
+        registry = self._registries[tipo]
+        chiave = chiave_fuzzy(ragione_sociale, indirizzo, cap, citta)
+        return [registry.row(r) for r in registry.fuzzy_candidates(chiave, limit)]
+
+    def codice(self, tipo: str, id_record: int) -> Optional[str]:
+        record = self._registries[tipo].by_id.get(id_record)
+        return record.codice if record else None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'versione': self.versione,
+            'farmacie': len(self._registries[FARMACIA].records),
+            'parafarmacie': len(self._registries[PARAFARMACIA].records),
+            'caricato_il': self.caricato_il.isoformat(),
+        }
+
+
+# =============================================================================
+# CARICAMENTO E VERSIONE
+# =============================================================================
+
+_FARMACIE_SQL = """
+    SELECT id_farmacia, min_id, partita_iva, ragione_sociale, indirizzo, cap, citta, provincia
+    FROM anagrafica_farmacie
+    WHERE attiva = TRUE
+"""
+
+_PARAFARMACIE_SQL = """
+    SELECT id_parafarmacia, codice_sito, partita_iva, sito_logistico, indirizzo, cap, citta, provincia
+    FROM anagrafica_parafarmacie
+    WHERE attiva = TRUE
+"""
+
+
+def _records(rows) -> List[_Record]:
+    return [_Record(row[0], *(_text(value) for value in row[1:])) for row in rows]
+
+
+def get_anagrafica_version(db) -> Optional[int]:
+    row = db.execute("SELECT versione FROM anagrafica_versione WHERE id = 1").fetchone()
+    return row['versione'] if row else None
+
+
+def load_anagrafica_index(db) -> AnagraficaIndex:
+    """Legge le anagrafiche attive; versione letta prima dei dati."""
+    versione = get_anagrafica_version(db)
+    farmacie = _records(
+        (r['id_farmacia'], r['min_id'], r['partita_iva'], r['ragione_sociale'],
+         r['indirizzo'], r['cap'], r['citta'], r['provincia'])
+        for r in db.execute(_FARMACIE_SQL).fetchall()
+    )
+    parafarmacie = _records(
+        (r['id_parafarmacia'], r['codice_sito'], r['partita_iva'], r['sito_logistico'],
+         r['indirizzo'], r['cap'], r['citta'], r['provincia'])
+        for r in db.execute(_PARAFARMACIE_SQL).fetchall()
+    )
+    totali = db.execute("SELECT COUNT(*) FROM anagrafica_farmacie").fetchone()[0]
+    return AnagraficaIndex(farmacie, parafarmacie, totali, versione)
+
+
+_lock = threading.Lock()
+_index: Optional[AnagraficaIndex] = None
+_checked_at: Optional[float] = None
+_cache_loaded = False
+
+
+def _checked_recently() -> bool:
+    checked_at = _checked_at
+    return checked_at is not None and \
+        time.monotonic() - checked_at < config.ANAGRAFICA_INDEX_CHECK_SECONDS
+
+
+@with_db_scope
+def _refresh_index() -> None:
+    """
+    Controlla la versione e, se cambiata, ricostruisce l'indice. Eseguita in
+    un thread dedicato da _start_refresh, che ha acquisito _lock. Dopo la
+    prima costruzione ricarica la cache lookup salvata (cache.py).
+    """
+    global _index, _checked_at, _cache_loaded
+
+    try:
+        index = _index
+        db = get_db()
+        try:
+            versione = get_anagrafica_version(db)
+            if index is None or versione is None or versione != index.versione:
+                index = load_anagrafica_index(db)
+        except Exception as e:
+            print(f"⚠️ Indice anagrafica non caricato, lookup su database: {e}")
+            index = None
+        _index = index
+        _checked_at = time.monotonic()
+        if index is not None and not _cache_loaded:
+            _cache_loaded = True
+            load_lookup_cache(index.versione)
+    finally:
+        _lock.release()
+
+
+def _start_refresh() -> None:
+    threading.Thread(target=_refresh_index, name='anagrafica-index', daemon=True).start()
+
+
+def get_anagrafica_index() -> Optional[AnagraficaIndex]:
+    """
+    Indice corrente per il lookup; None se disabilitato, non ancora costruito
+    o non caricabile (lookup con le query SQL).
+
+    La versione nel DB e' controllata al piu' ogni ANAGRAFICA_INDEX_CHECK_SECONDS
+    in un thread in background: se e' cambiata l'indice viene ricostruito e
+    sostituito. La chiamata non attende mai la costruzione: fino ad allora si
+    usa l'indice precedente (o le query SQL al primo caricamento).
+    """
+    if not config.ANAGRAFICA_INDEX:
+        return None
+    index = _index
+    if not _checked_recently() and _lock.acquire(blocking=False):
+        if _checked_recently():
+            _lock.release()
+        else:
+            _start_refresh()
+    return index
+
+
+def anagrafica_changed(codici: Optional[Iterable[str]] = None,
+                       partite_iva: Optional[Iterable[str]] = None) -> None:
+    """
+    Segnala una modifica committata delle anagrafiche: incrementa la versione
+    (gli altri processi ricostruiscono l'indice al prossimo controllo) e
+    anticipa il controllo nel processo corrente alla prossima richiesta.
+
+    v11.7: codici (MIN_ID / codice sito) e partite_iva modificati sono
+    registrati per la cache lookup (cache.py); senza dettaglio la cache
+    viene svuotata.
+    """
+    global _checked_at
+
+    db = get_db()
+    try:
+        row = db.execute("""
+            UPDATE anagrafica_versione
+            SET versione = versione + 1, updated_at = CURRENT_TIMESTAMP
+            WHERE id = 1
+            RETURNING versione
+        """).fetchone()
+        if row:
+            record_invalidation(db, row['versione'], codici, partite_iva)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"⚠️ Versione anagrafica non aggiornata: {e}")
+    _checked_at = None
+
+
+def get_anagrafica_index_stats() -> Optional[Dict[str, Any]]:
+    """Record e versione dell'indice caricato nel processo (None se non caricato)."""
+    index = _index
+    return index.stats() if index else None
@@ -0,0 +1,148 @@
+# =============================================================================
+# SERV.O v11.7 - CHIAVI NORMALIZZATE ANAGRAFICHE
+# =============================================================================
+# MIN_ID, codice sito e P.IVA senza zeri iniziali (e spazi per la P.IVA):
+# colonne generate min_id_norm, codice_sito_norm, piva_norm con indice B-tree
+# su anagrafica_farmacie, anagrafica_parafarmacie e anagrafica_clienti
+# (migrations/v11_7_anagrafica_chiavi.sql). Le query filtrano sulle colonne
+# passando la chiave calcolata qui con la stessa espressione.
+#
+# Chiave fuzzy (ragione sociale, indirizzo, CAP, citta') con indice GIN
+# pg_trgm (migrations/v11_7_anagrafica_trigrammi.sql); trigrammi e
+# word_similarity() calcolati come pg_trgm per la ricerca candidati
+# nell'indice in memoria.
+#
+# Le migrazioni sono applicate da scripts/migrate_db.py, non all'avvio:
+# ALTER TABLE con lock esclusivo sulle anagrafiche.
+# =============================================================================
+
+import re
+from typing import AbstractSet, FrozenSet, List, Optional, Sequence
+
+
+# Parole per pg_trgm: sequenze di caratteri alfanumerici
+_WORD = re.compile(r"[^\W_]+")
+
+# Colonne create dalla migrazione (tabella, colonna)
+NORM_COLUMNS = (
+    ('anagrafica_farmacie', 'min_id_norm'),
+    ('anagrafica_farmacie', 'piva_norm'),
+    ('anagrafica_parafarmacie', 'codice_sito_norm'),
+    ('anagrafica_parafarmacie', 'piva_norm'),
+    ('anagrafica_clienti', 'min_id_norm'),
+    ('anagrafica_clienti', 'piva_norm'),
+)
+
+# Tabelle con colonna chiave_fuzzy e indice GIN pg_trgm
+TRIGRAM_TABLES = ('anagrafica_farmacie', 'anagrafica_parafarmacie')
+
+
+def normalize_codice(codice: str) -> str:
+    """Chiave MIN_ID / codice sito: NULLIF(LTRIM(codice, '0'), '') ('' = NULL)."""
+    return (codice or '').lstrip('0')
+
+
+def normalize_piva_key(piva: str) -> str:
+    """Chiave P.IVA: NULLIF(LTRIM(REPLACE(COALESCE(partita_iva, ''), ' ', ''), '0'), '')."""
+    return (piva or '').replace(' ', '').lstrip('0')
+
+
+def chiave_fuzzy(ragione_sociale: str, indirizzo: str, cap: str, citta: str) -> str:
+    """Chiave fuzzy: espressione della colonna generata chiave_fuzzy."""
+    return ' '.join(value or '' for value in (ragione_sociale, indirizzo, cap, citta))
+
+
+def trigram_sequence(text: str) -> List[str]:
+    """
+    Trigrammi di pg_trgm in ordine e con ripetizioni (generate_trgm_only):
+    ogni parola in minuscolo con due spazi prima e uno dopo.
+    """
+    grams = []
+    for word in _WORD.findall((text or '').lower()):
+        padded = f"  {word} "
+        grams.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def trigrams(text: str) -> FrozenSet[str]:
+    """
+    Trigrammi di pg_trgm (show_trgm). similarity() = comuni / (totale A +
+    totale B - comuni).
+    """
+    return frozenset(trigram_sequence(text))
+
+
+def word_similarity(query: AbstractSet, sequence: Sequence) -> float:
+    """
+    word_similarity(query, testo) di pg_trgm: similarity tra i trigrammi
+    della query e l'estensione contigua della sequenza del testo
+    (trigram_sequence) scelta dalla procedura greedy di iterate_word_similarity
+    (trgm_op.c). Stesso risultato dell'operatore <% (query <% testo vero se
+    >= soglia).
+
+    Per ogni trigramma trovato (fine estensione) PostgreSQL prova tutti gli
+    inizi dal limite inferiore corrente e tiene il primo migliore: qui sono
+    provati solo gli inizi dei blocchi di trigrammi trovati consecutivi (gli
+    altri inizi non danno valori maggiori), con i conteggi dei trigrammi
+    distinti aggiornati solo sulle ripetizioni.
+
+    query: trigrammi distinti della query; sequence: trigrammi del testo,
+    anche come id interi purche' confrontabili con quelli della query.
+    """
+    ulen1 = len(query)
+    last = {}
+    # Inizi candidati: [posizione, trovati prima, ripetuti, ripetuti trovati]
+    starts = []
+    found_count = 0
+    previous_found = False
+    best = 0.0
+    for upper, gram in enumerate(sequence):
+        found = gram in query
+        previous = last.get(gram)
+        last[gram] = upper
+        if previous is not None:
+            # Il trigramma in previous non e' piu' distinto nelle estensioni che lo contengono
+            for start in starts:
+                if start[0] > previous:
+                    break
+                start[2] += 1
+                start[3] += found
+        if not found:
+            previous_found = False
+            continue
+        found_count += 1
+        if not previous_found:
+            starts.append([upper, found_count - 1, 0, 0])
+        previous_found = True
+
+        current, lower = -1.0, 0
+        for k, (start, found_before, repeated, repeated_found) in enumerate(starts):
+            count = found_count - found_before - repeated_found
+            ulen2 = upper - start + 1 - repeated
+            similarity = count / (ulen1 + ulen2 - count)
+            if similarity > current:
+                current, lower = similarity, k
+        del starts[:lower]
+        if current > best:
+            best = current
+    return best
+
+
+_trigram_available: Optional[bool] = None
+
+
+def trigram_key_available(db) -> bool:
+    """
+    Colonne chiave_fuzzy presenti (verificato una volta per processo). Senza
+    la migrazione (es. pg_trgm non installabile) i candidati fuzzy su
+    database restano per citta'/CAP.
+    """
+    global _trigram_available
+
+    if _trigram_available is None:
+        rows = db.execute("""
+            SELECT table_name, column_name FROM information_schema.columns
+            WHERE table_schema = current_schema() AND column_name = 'chiave_fuzzy'
+        """).fetchall()
+        _trigram_available = {r['table_name'] for r in rows} >= set(TRIGRAM_TABLES)
+    return _trigram_available
@@ -3,6 +3,10 @@
 # =============================================================================
 # Logica principale di lookup farmacia/parafarmacia
 # v11.2: Integrazione anagrafica_clienti per lookup MIN_ID e deposito_riferimento
+# v11.7: Anagrafiche lette dall'indice in memoria (index.py), query SQL se
+#        l'indice e' disabilitato o non caricabile
+# v11.7: Punteggi fuzzy dei candidati calcolati in blocco (scoring.py)
+# v11.7: Cache dei risultati di lookup_farmacia_extended (cache.py)
 # =============================================================================
 
 from typing import Dict, Any, List, Tuple, Optional
@@ -13,9 +17,12 @@ from ...utils import normalize_piva
 
 from .scoring import (
     FUZZY_AVAILABLE,
-    fuzzy_match_address,
-    fuzzy_match_full,
+    fuzzy_match_address_batch,
+    fuzzy_match_full_batch,
 )
+from .cache import get_cached_lookup, lookup_cache_key, store_lookup
+from .index import FARMACIA, PARAFARMACIA, FUZZY_CANDIDATES, TRIGRAM_THRESHOLD, get_anagrafica_index
+from .keys import chiave_fuzzy, normalize_codice, normalize_piva_key, trigram_key_available
 
 
 # =============================================================================
@@ -25,6 +32,111 @@ from .scoring import (
 FUZZY_THRESHOLD = config.FUZZY_THRESHOLD  # Default: 60
 
 
+# =============================================================================
+# LETTURA ANAGRAFICHE SU DATABASE (v11.7)
+# =============================================================================
+
+class _SqlAnagrafica:
+    """
+    Stessa interfaccia di AnagraficaIndex con query dirette: usata se
+    l'indice in memoria e' disabilitato o non caricabile.
+    """
+
+    _TABLES = {
+        FARMACIA: ('ANAGRAFICA_FARMACIE', 'id_farmacia', 'min_id', 'ragione_sociale'),
+        PARAFARMACIA: ('ANAGRAFICA_PARAFARMACIE', 'id_parafarmacia', 'codice_sito',
+                       'sito_logistico as ragione_sociale'),
+    }
+    # v11.7: colonne normalizzate indicizzate (keys.py)
+    _CODICE_NORM = {FARMACIA: 'min_id_norm', PARAFARMACIA: 'codice_sito_norm'}
+
+    def __init__(self, db):
+        self._db = db
+
+    def has_farmacie(self) -> bool:
+        return self._db.execute("SELECT COUNT(*) FROM ANAGRAFICA_FARMACIE").fetchone()[0] > 0
+
+    def by_codice(self, tipo: str, codice_norm: str) -> Optional[Dict[str, Any]]:
+        table, id_field, codice_field, _ = self._TABLES[tipo]
+        return self._db.execute(f"""
+            SELECT {id_field}, {codice_field}, partita_iva
+            FROM {table}
+            WHERE {self._CODICE_NORM[tipo]} = %s
+            AND attiva = TRUE
+        """, (codice_norm,)).fetchone()
+
+    def by_piva(self, tipo: str, piva: str) -> List[Dict[str, Any]]:
+        table, id_field, codice_field, ragione_sociale = self._TABLES[tipo]
+        return self._db.execute(f"""
+            SELECT {id_field}, {codice_field}, cap, citta, indirizzo, {ragione_sociale}, provincia
+            FROM {table}
+            WHERE piva_norm = %s
+            AND attiva = TRUE
+        """, (piva,)).fetchall()
+
+    def fuzzy_candidates(self, tipo: str, ragione_sociale: str, indirizzo: str, cap: str, citta: str,
+                         limit: int = FUZZY_CANDIDATES) -> List[Dict[str, Any]]:
+        table, id_field, _, ragione_sociale_col = self._TABLES[tipo]
+        if trigram_key_available(self._db):
+            # v11.7: righe che contengono meglio la chiave estratta (indice GIN
+            # pg_trgm). word_similarity e non similarity: un'estrazione parziale
+            # (solo CAP e citta') resta simile al proprio record completo.
+            chiave = chiave_fuzzy(ragione_sociale, indirizzo, cap, citta)
+            self._db.execute(
+                "SELECT set_config('pg_trgm.word_similarity_threshold', %s, true)",
+                (str(TRIGRAM_THRESHOLD),)
+            )
+            return self._db.execute(f"""
+                SELECT {id_field}, {ragione_sociale_col}, citta, indirizzo, cap, provincia
+                FROM {table}
+                WHERE attiva = TRUE
+                AND %s <%% chiave_fuzzy
+                ORDER BY word_similarity(%s, chiave_fuzzy) DESC, similarity(chiave_fuzzy, %s) DESC, {id_field}
+                LIMIT %s
+            """, (chiave, chiave, chiave, limit)).fetchall()
+
+        # Senza pg_trgm: candidati per citta' (LIKE) o prefisso CAP
+        use_citta = bool(citta and len(citta) >= 3)
+        if not use_citta and not cap:
+            return []
+        citta_clause = "(citta LIKE %s OR citta LIKE %s)" if use_citta else "1=0"
+        cap_clause = "cap LIKE %s" if cap else "1=0"
+        params = []
+        if use_citta:
+            params.extend([f"%{citta[:4]}%", f"%{citta}%"])
+        if cap:
+            params.append(f"{cap}%")
+        params.append(limit)
+        return self._db.execute(f"""
+            SELECT {id_field}, {ragione_sociale_col}, citta, indirizzo, cap, provincia
+            FROM {table}
+            WHERE attiva = TRUE
+            AND ({citta_clause} OR {cap_clause})
+            LIMIT %s
+        """, params).fetchall()
+
+    def codice(self, tipo: str, id_record: int) -> Optional[str]:
+        table, id_field, codice_field, _ = self._TABLES[tipo]
+        row = self._db.execute(
+            f"SELECT {codice_field} FROM {table} WHERE {id_field} = %s", (id_record,)
+        ).fetchone()
+        return row[codice_field] if row else None
+
+
+def _anagrafica():
+    """Indice in memoria se disponibile, altrimenti query sul database."""
+    return get_anagrafica_index() or _SqlAnagrafica(get_db())
+
+
+def get_codice_ministeriale(id_farmacia: Optional[int], id_parafarmacia: Optional[int]) -> Optional[str]:
+    """MIN_ID della farmacia o codice sito della parafarmacia trovata dal lookup."""
+    if id_farmacia:
+        return _anagrafica().codice(FARMACIA, id_farmacia)
+    if id_parafarmacia:
+        return _anagrafica().codice(PARAFARMACIA, id_parafarmacia)
+    return None
+
+
 # =============================================================================
 # LOOKUP ANAGRAFICA CLIENTI (v11.2)
 # =============================================================================
@@ -38,7 +150,7 @@ def lookup_cliente_by_piva(piva: str, min_id: str = None) -> Optional[Dict[str,
     (il matching avviene su anagrafica_farmacie ministeriale).
 
     Args:
-        piva: Partita IVA normalizzata (senza zeri iniziali)
+        piva: Partita IVA (confrontata senza spazi e zeri iniziali)
         min_id: Se fornito, disambigua il record corretto in caso multipunto
 
     Returns:
@@ -48,15 +160,17 @@ def lookup_cliente_by_piva(piva: str, min_id: str = None) -> Optional[Dict[str,
         return None
 
     db = get_db()
+    # v11.7: confronto su colonne normalizzate indicizzate (keys.py)
+    piva_norm = normalize_piva_key(piva)
 
     # Se abbiamo il MIN_ID (dal matching ministeriale), cerchiamo il record esatto
-    if min_id:
-        min_id_norm = min_id.lstrip('0')
+    min_id_norm = normalize_codice(min_id)
+    if min_id_norm:
         cliente = db.execute("""
             SELECT min_id, deposito_riferimento, ragione_sociale_1, codice_cliente
             FROM anagrafica_clienti
-            WHERE partita_iva = %s AND LTRIM(min_id, '0') = %s
-        """, (piva, min_id_norm)).fetchone()
+            WHERE piva_norm = %s AND min_id_norm = %s
+        """, (piva_norm, min_id_norm)).fetchone()
         if cliente and cliente.get('min_id'):
             return {
                 'min_id': cliente['min_id'],
@@ -69,8 +183,8 @@ def lookup_cliente_by_piva(piva: str, min_id: str = None) -> Optional[Dict[str,
     cliente = db.execute("""
         SELECT min_id, deposito_riferimento, ragione_sociale_1, codice_cliente
         FROM anagrafica_clienti
-        WHERE partita_iva = %s
-    """, (piva,)).fetchone()
+        WHERE piva_norm = %s
+    """, (piva_norm,)).fetchone()
 
     if cliente and cliente.get('min_id'):
         return {
@@ -101,43 +215,41 @@ def lookup_farmacia_extended(data: Dict[str, Any]) -> Dict[str, Any]:
         - lookup_method: str
         - lookup_source: str
         - score: int
+        - codice_ministeriale: MIN_ID / codice sito del match o None
         - deposito_riferimento: str o None (da anagrafica_clienti)
         - cliente_trovato: bool (True se P.IVA trovata in anagrafica_clienti)
     """
-    db = get_db()
+    # v11.7: risultato in cache per gli stessi dati estratti (cache.py)
+    index = get_anagrafica_index()
+    versione = index.versione if index else None
+    chiave, piva_norm, min_id_norm = lookup_cache_key(data)
+    cached = get_cached_lookup(chiave, versione)
+    if cached is not None:
+        return cached
+
     id_farm, id_parafarm, method, source, score = lookup_farmacia(data)
 
     # Recupera il MIN_ID dal match ministeriale per disambiguare anagrafica_clienti
-    matched_min_id = None
-    if id_farm:
-        row = db.execute(
-            "SELECT min_id FROM anagrafica_farmacie WHERE id_farmacia = %s",
-            (id_farm,)
-        ).fetchone()
-        if row:
-            matched_min_id = row['min_id']
-    elif id_parafarm:
-        row = db.execute(
-            "SELECT codice_sito FROM anagrafica_parafarmacie WHERE id_parafarmacia = %s",
-            (id_parafarm,)
-        ).fetchone()
-        if row:
-            matched_min_id = row['codice_sito']
+    matched_min_id = get_codice_ministeriale(id_farm, id_parafarm)
 
     # Cerca in anagrafica_clienti per deposito_riferimento, disambiguando con MIN_ID
     piva_raw = data.get('partita_iva', '').strip()
     cliente_info = lookup_cliente_by_piva(piva_raw, min_id=matched_min_id)
 
-    return {
+    result = {
         'id_farmacia': id_farm,
         'id_parafarmacia': id_parafarm,
         'lookup_method': method,
         'lookup_source': source,
         'score': score,
+        'codice_ministeriale': matched_min_id,
         'deposito_riferimento': cliente_info.get('deposito_riferimento') if cliente_info else None,
         'cliente_trovato': cliente_info is not None,
         'min_id_cliente': cliente_info.get('min_id') if cliente_info else None,
     }
+    store_lookup(chiave, versione, result,
+                 codici=(min_id_norm, matched_min_id or ''), partite_iva=(piva_norm,))
+    return result
 
 
 # =============================================================================
@@ -166,7 +278,7 @@ def lookup_farmacia(data: Dict[str, Any]) -> Tuple[Optional[int], Optional[int],
         - FUZZY: Solo fuzzy matching su indirizzo concatenato
         - NESSUNO: Nessun match trovato
     """
-    db = get_db()
+    anagrafica = _anagrafica()
 
     piva_raw = data.get('partita_iva', '').strip()
     piva = normalize_piva(piva_raw)
@@ -178,8 +290,7 @@ def lookup_farmacia(data: Dict[str, Any]) -> Tuple[Optional[int], Optional[int],
     provincia = data.get('provincia', '').strip()
 
     # Verifica anagrafica caricata
-    count_farm = db.execute("SELECT COUNT(*) FROM ANAGRAFICA_FARMACIE").fetchone()[0]
-    if count_farm == 0:
+    if not anagrafica.has_farmacie():
         return None, None, 'NESSUNO', 'FARMACIA', 0
 
     # =========================================================================
@@ -191,12 +302,7 @@ def lookup_farmacia(data: Dict[str, Any]) -> Tuple[Optional[int], Optional[int],
     if min_id and len(min_id) >= 4:
         min_id_norm = min_id.lstrip('0')
 
-        farmacia = db.execute("""
-            SELECT id_farmacia, min_id, partita_iva, ragione_sociale
-            FROM ANAGRAFICA_FARMACIE
-            WHERE LTRIM(min_id, '0') = %s
-            AND attiva = TRUE
-        """, (min_id_norm,)).fetchone()
+        farmacia = anagrafica.by_codice(FARMACIA, min_id_norm)
 
         if farmacia:
             # v8.2: Verifica coerenza P.IVA tra PDF e anagrafica
@@ -210,12 +316,7 @@ def lookup_farmacia(data: Dict[str, Any]) -> Tuple[Optional[int], Optional[int],
             return farmacia['id_farmacia'], None, 'MIN_ID', 'FARMACIA', 100
 
         # Prova anche nelle parafarmacie (codice_sito)
-        parafarmacia = db.execute("""
-            SELECT id_parafarmacia, codice_sito, partita_iva
-            FROM ANAGRAFICA_PARAFARMACIE
-            WHERE LTRIM(codice_sito, '0') = %s
-            AND attiva = TRUE
-        """, (min_id_norm,)).fetchone()
+        parafarmacia = anagrafica.by_codice(PARAFARMACIA, min_id_norm)
 
         if parafarmacia:
             # v8.2: Verifica coerenza P.IVA anche per parafarmacie
@@ -231,12 +332,7 @@ def lookup_farmacia(data: Dict[str, Any]) -> Tuple[Optional[int], Optional[int],
     # =========================================================================
     if piva and len(piva) >= 8:
         # Cerca nelle farmacie
-        farmacie = db.execute("""
-            SELECT id_farmacia, min_id, cap, citta, indirizzo, ragione_sociale, provincia
-            FROM ANAGRAFICA_FARMACIE
-            WHERE LTRIM(REPLACE(COALESCE(partita_iva,''), ' ', ''), '0') = %s
-            AND attiva = TRUE
-        """, (piva,)).fetchall()
+        farmacie = anagrafica.by_piva(FARMACIA, piva)
 
         if len(farmacie) == 1:
             return farmacie[0]['id_farmacia'], None, 'PIVA', 'FARMACIA', 100
@@ -253,12 +349,7 @@ def lookup_farmacia(data: Dict[str, Any]) -> Tuple[Optional[int], Optional[int],
                 return farmacie[0]['id_farmacia'], None, 'PIVA_AMBIGUA', 'FARMACIA', best_score
 
         # Cerca nelle parafarmacie
-        parafarmacie = db.execute("""
-            SELECT id_parafarmacia, codice_sito, cap, citta, indirizzo, sito_logistico as ragione_sociale, provincia
-            FROM ANAGRAFICA_PARAFARMACIE
-            WHERE LTRIM(REPLACE(COALESCE(partita_iva,''), ' ', ''), '0') = %s
-            AND attiva = TRUE
-        """, (piva,)).fetchall()
+        parafarmacie = anagrafica.by_piva(PARAFARMACIA, piva)
 
         if len(parafarmacie) == 1:
             return None, parafarmacie[0]['id_parafarmacia'], 'PIVA', 'PARAFARMACIA', 100
@@ -277,69 +368,30 @@ def lookup_farmacia(data: Dict[str, Any]) -> Tuple[Optional[int], Optional[int],
     # 2. FALLBACK: FUZZY SU INDIRIZZO CONCATENATO
     # =========================================================================
     if FUZZY_AVAILABLE and (ragione_sociale or citta):
-        search_patterns = []
-        if citta and len(citta) >= 3:
-            search_patterns.extend([f"%{citta[:4]}%", f"%{citta}%"])
-        if cap:
-            search_patterns.append(f"{cap}%")
-
-        candidates = []
-        if search_patterns:
-            citta_clause = "(citta LIKE %s OR citta LIKE %s)" if citta and len(citta) >= 3 else "1=0"
-            cap_clause = "cap LIKE %s" if cap else "1=0"
-            query = f"""
-                SELECT id_farmacia, ragione_sociale, citta, indirizzo, cap, provincia
-                FROM ANAGRAFICA_FARMACIE
-                WHERE attiva = TRUE
-                AND ({citta_clause} OR {cap_clause})
-                LIMIT 200
-            """
-            params = []
-            if citta and len(citta) >= 3:
-                params.extend([f"%{citta[:4]}%", f"%{citta}%"])
-            if cap:
-                params.append(f"{cap}%")
-            candidates = db.execute(query, params).fetchall()
+        # v11.7: candidati piu' simili per trigrammi di ragione sociale, indirizzo, CAP, citta'
+        candidates = anagrafica.fuzzy_candidates(FARMACIA, ragione_sociale, indirizzo, cap, citta)
+        # Cerca anche in parafarmacie
+        candidates_para = anagrafica.fuzzy_candidates(PARAFARMACIA, ragione_sociale, indirizzo, cap, citta)
+
+        # v11.7: punteggi di tutti i candidati in un solo passaggio
+        scores = fuzzy_match_full_batch(
+            ragione_sociale, citta, indirizzo, cap, provincia,
+            candidates + candidates_para
+        )
 
         best_match = None
         best_score = 0
         best_is_parafarmacia = False
 
-        for c in candidates:
-            score = fuzzy_match_full(
-                ragione_sociale, citta, indirizzo,
-                c['ragione_sociale'] or '', c['citta'] or '', c['indirizzo'] or '',
-                cap, c['cap'] or '',
-                provincia, c['provincia'] or ''
-            )
-            if score > best_score:
-                best_score = score
-                best_match = c
-                best_is_parafarmacia = False
-
-        # Cerca anche in parafarmacie
-        candidates_para = []
-        if search_patterns:
-            query_para = f"""
-                SELECT id_parafarmacia, sito_logistico as ragione_sociale, citta, indirizzo, cap, provincia
-                FROM ANAGRAFICA_PARAFARMACIE
-                WHERE attiva = TRUE
-                AND ({citta_clause} OR {cap_clause})
-                LIMIT 200
-            """
-            candidates_para = db.execute(query_para, params).fetchall()
-
-        for c in candidates_para:
-            score = fuzzy_match_full(
-                ragione_sociale, citta, indirizzo,
-                c['ragione_sociale'] or '', c['citta'] or '', c['indirizzo'] or '',
-                cap, c['cap'] or '',
-                provincia, c['provincia'] or ''
-            )
+        for pos, score in enumerate(scores):
             if score > best_score:
                 best_score = score
-                best_match = c
-                best_is_parafarmacia = True
+                if pos < len(candidates):
+                    best_match = candidates[pos]
+                    best_is_parafarmacia = False
+                else:
+                    best_match = candidates_para[pos - len(candidates)]
+                    best_is_parafarmacia = True
 
         if best_match and best_score >= FUZZY_THRESHOLD:
             if best_is_parafarmacia:
@@ -378,13 +430,8 @@ def _disambiguate_multipunto(
     best_match = None
     best_score = 0
 
-    for r in records:
-        score = fuzzy_match_address(
-            citta, indirizzo,
-            r['citta'] or '', r['indirizzo'] or '',
-            cap, r.get('cap') or '',
-            provincia, r.get('provincia') or ''
-        )
+    scores = fuzzy_match_address_batch(citta, indirizzo, cap, provincia, records)
+    for r, score in zip(records, scores):
         if score > best_score:
             best_score = score
             best_match = dict(r)
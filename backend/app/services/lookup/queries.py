@@ -11,7 +11,7 @@ from ...database_pg import get_db
 from ...utils import normalize_piva
 
 from .matching import lookup_farmacia
-from .scoring import fuzzy_match_full
+from .scoring import fuzzy_match_full_batch
 
 
 # =============================================================================
@@ -124,7 +124,7 @@ def popola_header_da_anagrafica(id_testata: int, operatore: str = None) -> bool:
         cliente = db.execute("""
             SELECT deposito_riferimento
             FROM anagrafica_clienti
-            WHERE LTRIM(min_id, '0') = %s
+            WHERE min_id_norm = %s
             LIMIT 1
         """, (min_id_norm,)).fetchone()
         if cliente and cliente['deposito_riferimento']:
@@ -746,24 +746,17 @@ def get_alternative_lookup_by_piva(id_testata: int) -> Dict[str, Any]:
         SELECT id_farmacia, min_id, partita_iva, ragione_sociale,
                indirizzo, cap, citta, provincia
         FROM ANAGRAFICA_FARMACIE
-        WHERE LTRIM(REPLACE(COALESCE(partita_iva,''), ' ', ''), '0') = %s
+        WHERE piva_norm = %s
         AND attiva = TRUE
         ORDER BY ragione_sociale
     """, (piva,)).fetchall()
 
-    farmacie = []
-    for f in farmacie_rows:
-        f_dict = dict(f)
-        # Calcola fuzzy score per questa alternativa
-        score = fuzzy_match_full(
-            ragione_sociale, citta, indirizzo,
-            f_dict.get('ragione_sociale') or '', f_dict.get('citta') or '', f_dict.get('indirizzo') or '',
-            cap, f_dict.get('cap') or '',
-            provincia, f_dict.get('provincia') or ''
-        )
+    farmacie = [dict(f) for f in farmacie_rows]
+    # Calcola fuzzy score per ogni alternativa
+    scores = fuzzy_match_full_batch(ragione_sociale, citta, indirizzo, cap, provincia, farmacie)
+    for f_dict, score in zip(farmacie, scores):
         f_dict['fuzzy_score'] = score
         f_dict['is_selected'] = (ordine_data.get('id_farmacia_lookup') == f_dict['id_farmacia'])
-        farmacie.append(f_dict)
 
     # Ordina per score decrescente
     farmacie.sort(key=lambda x: x['fuzzy_score'], reverse=True)
@@ -773,24 +766,17 @@ def get_alternative_lookup_by_piva(id_testata: int) -> Dict[str, Any]:
         SELECT id_parafarmacia, codice_sito, partita_iva, sito_logistico as ragione_sociale,
                indirizzo, cap, citta, provincia
         FROM ANAGRAFICA_PARAFARMACIE
-        WHERE LTRIM(REPLACE(COALESCE(partita_iva,''), ' ', ''), '0') = %s
+        WHERE piva_norm = %s
         AND attiva = TRUE
         ORDER BY sito_logistico
     """, (piva,)).fetchall()
 
-    parafarmacie = []
-    for p in parafarmacie_rows:
-        p_dict = dict(p)
-        # Calcola fuzzy score
-        score = fuzzy_match_full(
-            ragione_sociale, citta, indirizzo,
-            p_dict.get('ragione_sociale') or '', p_dict.get('citta') or '', p_dict.get('indirizzo') or '',
-            cap, p_dict.get('cap') or '',
-            provincia, p_dict.get('provincia') or ''
-        )
+    parafarmacie = [dict(p) for p in parafarmacie_rows]
+    # Calcola fuzzy score per ogni alternativa
+    scores = fuzzy_match_full_batch(ragione_sociale, citta, indirizzo, cap, provincia, parafarmacie)
+    for p_dict, score in zip(parafarmacie, scores):
         p_dict['fuzzy_score'] = score
         p_dict['is_selected'] = (ordine_data.get('id_parafarmacia_lookup') == p_dict['id_parafarmacia'])
-        parafarmacie.append(p_dict)
 
     # Ordina per score decrescente
     parafarmacie.sort(key=lambda x: x['fuzzy_score'], reverse=True)
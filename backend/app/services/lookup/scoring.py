@@ -2,8 +2,13 @@
 # SERV.O v8.1 - LOOKUP SCORING
 # =============================================================================
 # Funzioni di scoring e fuzzy matching per lookup farmacia
+# v11.7: Scoring in blocco dei candidati con rapidfuzz (stessi punteggi)
 # =============================================================================
 
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Sequence
+
 # Fuzzy matching (opzionale)
 try:
     from fuzzywuzzy import fuzz
@@ -12,6 +17,14 @@ except ImportError:
     FUZZY_AVAILABLE = False
     print("Warning: fuzzywuzzy non disponibile - fuzzy matching disabilitato")
 
+# Scoring in blocco (opzionale, v11.7): senza rapidfuzz un candidato alla volta
+try:
+    from rapidfuzz.distance import Indel
+    from rapidfuzz.process import cdist
+    RAPIDFUZZ_AVAILABLE = True
+except ImportError:
+    RAPIDFUZZ_AVAILABLE = False
+
 
 # =============================================================================
 # NORMALIZZAZIONE INDIRIZZO
@@ -166,9 +179,133 @@ def fuzzy_match_full(ragione_sociale_e: str, citta_e: str, indirizzo_e: str,
             scores.append(score_indirizzo)
             weights.append(0.3)
 
+    return _weighted_score(scores, weights)
+
+
+def _weighted_score(scores: List[int], weights: List[float]) -> int:
+    """Media pesata troncata (0 senza punteggi)."""
     if scores and weights:
-        # Media pesata
         total_weight = sum(weights)
         if total_weight > 0:
             return int(sum(s * w for s, w in zip(scores, weights)) / total_weight)
     return 0
+
+
+# =============================================================================
+# SCORING IN BLOCCO (v11.7)
+# =============================================================================
+# fuzz.token_sort_ratio normalizza entrambe le stringhe ad ogni chiamata
+# (caratteri latin-1 non ASCII rimossi, non alfanumerici -> spazio,
+# minuscolo, token ordinati) e ne calcola la distanza Indel. Qui la
+# normalizzazione dei candidati e' fatta una volta (e memorizzata: gli stessi
+# indirizzi tornano ad ogni ordine della stessa zona) e le distanze di tutti
+# i candidati arrivano da una sola chiamata rapidfuzz.process.cdist.
+# Punteggi identici a fuzzywuzzy con python-Levenshtein (requirements.txt):
+# stesso ratio Indel, stesso arrotondamento.
+
+_NON_ALNUM = re.compile(r"(?ui)\W")
+_LATIN1_NON_ASCII = {i: None for i in range(128, 256)}
+
+
+@lru_cache(maxsize=65536)
+def _sorted_tokens(value: str) -> str:
+    """Stringa confrontata da fuzz.token_sort_ratio (force_ascii, full_process)."""
+    value = _NON_ALNUM.sub(' ', value.translate(_LATIN1_NON_ASCII)).lower().strip()
+    return ' '.join(sorted(value.split()))
+
+
+def token_sort_scores(query: str, choices: Sequence[str]) -> List[int]:
+    """fuzz.token_sort_ratio(query, choice) per ogni choice, in una chiamata."""
+    if not choices:
+        return []
+    if not RAPIDFUZZ_AVAILABLE:
+        return [fuzz.token_sort_ratio(query, choice) for choice in choices]
+
+    query = _sorted_tokens(query)
+    processed = [_sorted_tokens(choice) for choice in choices]
+    distances = cdist([query], processed, scorer=Indel.distance)[0]
+
+    scores = []
+    for choice, distance in zip(processed, distances):
+        if choice == query:
+            scores.append(100)
+        elif not choice or not query:
+            scores.append(0)
+        else:
+            ratio = 1 - int(distance) / (len(query) + len(choice))
+            scores.append(int(round(100 * ratio)))
+    return scores
+
+
+def _field(candidate: Dict[str, Any], name: str) -> str:
+    return candidate.get(name) or ''
+
+
+def _address_scores(indirizzo: str, cap: str, citta: str, provincia: str,
+                    candidates: Sequence[Dict[str, Any]]) -> Dict[int, int]:
+    """Score indirizzo concatenato per posizione dei candidati con indirizzo non vuoto."""
+    addr_estratto = build_indirizzo_concatenato(indirizzo, cap, citta, provincia)
+    if not addr_estratto:
+        return {}
+    addresses = {}
+    for pos, c in enumerate(candidates):
+        addr_db = build_indirizzo_concatenato(
+            _field(c, 'indirizzo'), _field(c, 'cap'), _field(c, 'citta'), _field(c, 'provincia')
+        )
+        if addr_db:
+            addresses[pos] = addr_db
+    return dict(zip(addresses, token_sort_scores(addr_estratto, list(addresses.values()))))
+
+
+def fuzzy_match_full_batch(ragione_sociale: str, citta: str, indirizzo: str,
+                           cap: str, provincia: str,
+                           candidates: Sequence[Dict[str, Any]]) -> List[int]:
+    """
+    fuzzy_match_full del dato estratto contro ogni candidato (dict con
+    ragione_sociale, citta, indirizzo, cap, provincia), stesso ordine.
+
+    Candidati con indirizzo concatenato vuoto (ramo citta'/indirizzo
+    separati): fuzzy_match_full un candidato alla volta.
+    """
+    if not FUZZY_AVAILABLE or not candidates:
+        return [0] * len(candidates)
+
+    addr_scores = _address_scores(indirizzo, cap, citta, provincia, candidates)
+    rs_positions = [pos for pos, c in enumerate(candidates) if ragione_sociale and _field(c, 'ragione_sociale')]
+    rs_scores = dict(zip(rs_positions, token_sort_scores(
+        ragione_sociale.upper(), [_field(candidates[pos], 'ragione_sociale').upper() for pos in rs_positions]
+    )))
+
+    scores = []
+    for pos, c in enumerate(candidates):
+        if pos not in addr_scores:
+            scores.append(fuzzy_match_full(
+                ragione_sociale, citta, indirizzo,
+                _field(c, 'ragione_sociale'), _field(c, 'citta'), _field(c, 'indirizzo'),
+                cap, _field(c, 'cap'), provincia, _field(c, 'provincia'),
+            ))
+            continue
+        if pos in rs_scores:
+            scores.append(_weighted_score([rs_scores[pos], addr_scores[pos]], [0.4, 0.6]))
+        else:
+            scores.append(_weighted_score([addr_scores[pos]], [0.6]))
+    return scores
+
+
+def fuzzy_match_address_batch(citta: str, indirizzo: str, cap: str, provincia: str,
+                              candidates: Sequence[Dict[str, Any]]) -> List[int]:
+    """fuzzy_match_address del dato estratto contro ogni candidato, stesso ordine."""
+    if not FUZZY_AVAILABLE:
+        return [
+            fuzzy_match_address(citta, indirizzo, _field(c, 'citta'), _field(c, 'indirizzo'),
+                                cap, _field(c, 'cap'), provincia, _field(c, 'provincia'))
+            for c in candidates
+        ]
+
+    addr_scores = _address_scores(indirizzo, cap, citta, provincia, candidates)
+    return [
+        addr_scores[pos] if pos in addr_scores else fuzzy_match_address(
+            citta, indirizzo, _field(c, 'citta'), _field(c, 'indirizzo'),
+            cap, _field(c, 'cap'), provincia, _field(c, 'provincia'))
+        for pos, c in enumerate(candidates)
+    ]
@@ -217,7 +217,7 @@ def get_ordine_detail(id_testata: int) -> Optional[Dict[str, Any]]:
                 min_id_norm = min_id.lstrip('0')
                 cliente = db.execute("""
                     SELECT deposito_riferimento FROM anagrafica_clienti
-                    WHERE partita_iva = %s AND LTRIM(min_id, '0') = %s
+                    WHERE partita_iva = %s AND min_id_norm = %s
                     LIMIT 1
                 """, (piva, min_id_norm)).fetchone()
                 if cliente:
@@ -6,9 +6,11 @@
 # =============================================================================
 
 import os
-import io
+import re
+import json
 import uuid
-from typing import Dict, Any, List, Optional
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from typing import Dict, Any, List, Optional, Tuple, Union
 from datetime import datetime
 
 # PDF extraction
@@ -19,66 +21,26 @@ except ImportError:
     PDFPLUMBER_AVAILABLE = False
     print("⚠️ pdfplumber non disponibile")
 
-# Text encoding fix
-try:
-    import ftfy
-    FTFY_AVAILABLE = True
-except ImportError:
-    FTFY_AVAILABLE = False
-    print("⚠️ ftfy non disponibile - usando fix manuale")
-
-
-def _fix_encoding_manual(text: str) -> str:
-    """
-    Fix manuale per mojibake UTF-8 comuni in italiano.
-    Usato come fallback se ftfy non è disponibile.
-
-    Pattern: UTF-8 bytes interpretati come Latin-1
-    """
-    if not text:
-        return text
-
-    # Approccio: prova a decodificare come se fosse Latin-1 encodato in UTF-8
-    try:
-        # Se il testo contiene sequenze mojibake tipiche, prova a fixarle
-        if '\xc3' in text or 'Ã' in text:
-            # Encode come Latin-1, decode come UTF-8
-            fixed = text.encode('latin-1', errors='ignore').decode('utf-8', errors='ignore')
-            if fixed and len(fixed) > 0:
-                return fixed
-    except (UnicodeDecodeError, UnicodeEncodeError):
-        pass
-
-    # Fallback: replace pattern specifici comuni
-    replacements = [
-        ('Ã¬', 'ì'),  # ì - i grave
-        ('Ã¨', 'è'),  # è - e grave
-        ('Ã²', 'ò'),  # ò - o grave
-        ('Ã¹', 'ù'),  # ù - u grave
-        ('Ã ', 'à'),  # à - a grave (con spazio dopo)
-        ('Ã©', 'é'),  # é - e acute
-        ('Ã³', 'ó'),  # ó - o acute
-    ]
-
-    for mojibake, correct in replacements:
-        text = text.replace(mojibake, correct)
-
-    return text
 
 from ..config import config
 from ..database_pg import get_db, get_vendor_id, log_operation
-from ..utils import compute_file_hash, generate_order_key, calcola_q_totale
-from .extraction import get_extractor, detect_vendor
-from .lookup import lookup_farmacia, lookup_cliente_by_piva
+from ..utils import generate_order_key, calcola_q_totale
+from .extraction import (
+    get_extractor, detect_vendor, check_detection_rules, ParsedDocument, DETECT_CHARS, LAZY_TEXT_VENDORS,
+    save_artefact, load_document, fix_text_encoding, backend_for_vendor, detect_backend,
+)
+from .lookup import lookup_farmacia_extended, lookup_cliente_by_piva, normalize_codice
 from .supervisione import (
     valuta_anomalia_con_apprendimento,
     crea_richiesta_supervisione,
+    crea_supervisioni_listino,
     blocca_ordine_per_supervisione,
 )
 from .espositore import CODICI_ANOMALIA, LOOKUP_SCORE_GRAVE, LOOKUP_SCORE_ORDINARIA
 from .listini import arricchisci_ordine_con_listino
-from .crm.tickets.commands import crea_ticket_sistema, SYSTEM_USER_ID
-from .crm.attachments import save_attachment
+from .crm.tickets.commands import crea_ticket_sistema
+from .ingestion.timing import pipeline_timer, lap, record_pages, save_timings
+from .ingestion.spool import SpooledPdf, store_spooled, pdf_hash
 
 
 # =============================================================================
@@ -141,23 +103,9 @@ Il documento originale è allegato a questo ticket."""
         if not result.get('success'):
             return None
 
-        ticket_id = result['id_ticket']
-
-        # Allega il PDF al ticket
-        attach_result = save_attachment(
-            db,
-            ticket_id,
-            file_content,
-            filename,
-            'application/pdf',
-            SYSTEM_USER_ID
-        )
-
-        if not attach_result.get('success'):
-            print(f"⚠️ Errore allegato ticket: {attach_result.get('error')}")
-            # Ticket creato ma senza allegato - non è critico
-
-        return ticket_id
+        # Il PDF viene allegato al ticket da crea_ticket_sistema
+        # (v11.7: rimosso il secondo salvataggio dello stesso allegato)
+        return result['id_ticket']
 
     except Exception as e:
         print(f"⚠️ Errore creazione ticket vendor sconosciuto: {e}")
@@ -190,24 +138,261 @@ def _convert_date_to_iso(date_str: str) -> Optional[str]:
     return date_str
 
 
+# =============================================================================
+# FASE DI ESTRAZIONE (CPU-bound, senza database)
+# =============================================================================
+
+def _fix_page_text(page_text: str) -> str:
+    """Fix encoding del testo di una pagina (text_fixer di ParsedDocument)."""
+    lap('testo')
+
+    # v10.6: Fix encoding issues (UTF-8 mojibake come "BONDÃ¬" -> "BONDì")
+    # v11.7: ftfy + fix manuale solo sulle pagine con marker di mojibake
+    page_text = fix_text_encoding(page_text)
+    lap('ftfy')
+    return page_text
+
+
+def open_pdf_document(source: Union[bytes, str, None], artefact: Optional[bytes] = None) -> ParsedDocument:
+    """
+    Apre il PDF (contenuto o percorso) con il fix encoding applicato al
+    testo delle pagine. Con artefact (v11.7) il documento e' ricostruito
+    dalle estrazioni salvate e source serve solo per quelle mancanti.
+    """
+    if artefact is not None:
+        return load_document(artefact, source=source, text_fixer=_fix_page_text)
+    return ParsedDocument(source, text_fixer=_fix_page_text, backend=detect_backend())
+
+
+def _extract_text(doc: ParsedDocument, max_chars: Optional[int] = None) -> Tuple[str, List[str]]:
+    """
+    Estrae testo e righe delle pagine del documento (tutte, oppure solo
+    quelle necessarie a raggiungere max_chars caratteri).
+
+    v10.6: x_tolerance=5 per rilevare meglio gli spazi tra parole
+    (evita "CANTARERODEI" invece di "CANTARERO DEI"), vedi plain_text.
+    """
+    record_pages(doc.page_count)
+    return doc.joined_text(max_chars)
+
+
+def _detect_and_read(doc: ParsedDocument, filename: str) -> Tuple[str, float, str, List[str]]:
+    """
+    v11.7: Detect vendor sulle sole prime pagine (DETECT_CHARS caratteri,
+    stesso risultato del testo completo), poi testo delle pagine restanti
+    solo per gli estrattori che ne hanno bisogno (non in LAZY_TEXT_VENDORS).
+
+    Returns:
+        (vendor, confidence, text, lines)
+    """
+    text, lines = _extract_text(doc, DETECT_CHARS)
+    vendor, confidence = detect_vendor(text, filename)
+    # v11.7: pagine restanti, parole e tabelle con il backend del vendor
+    # (prime pagine rilette se lette con pdfium e il vendor non e' abilitato)
+    if doc.use_backend(backend_for_vendor(vendor)):
+        text, lines = _extract_text(doc, DETECT_CHARS)
+    lap('detect_vendor')
+
+    if doc.text_truncated and vendor not in LAZY_TEXT_VENDORS:
+        text, lines = _extract_text(doc)
+    return vendor, confidence, text, lines
+
+
+def _extraction_result(errore_testo: Optional[str] = None) -> Dict[str, Any]:
+    return {
+        'vendor': '',
+        'confidence': 0.0,
+        'orders_data': None,
+        'errore_testo': errore_testo,
+        'errore_estrattore': None,
+    }
+
+
+def extract_document_data(doc: ParsedDocument, filename: str) -> Dict[str, Any]:
+    """
+    Detect vendor ed estrattore su un documento gia' aperto (dal PDF o da un
+    artefatto salvato, vedi reextract). Il documento resta aperto.
+
+    Returns:
+        Dict con vendor, confidence, orders_data, errore_testo, errore_estrattore
+    """
+    data = _extraction_result()
+    try:
+        data['vendor'], data['confidence'], text, lines = _detect_and_read(doc, filename)
+    except Exception as e:
+        data['errore_testo'] = str(e)
+        return data
+    try:
+        # v11.7: estrattori con tabelle/coordinate usano lo stesso documento
+        extractor = get_extractor(data['vendor'])
+        data['orders_data'] = extractor(text, lines, doc)
+    except Exception as e:
+        data['errore_estrattore'] = str(e)
+    lap('estrattore')
+    return data
+
+
+def _pdf_source(file_content: Union[bytes, SpooledPdf]) -> Tuple[Union[bytes, str], int]:
+    """v11.7: (sorgente per open_pdf_document, dimensione) di un PDF in memoria o in spool."""
+    if isinstance(file_content, SpooledPdf):
+        return file_content.path, file_content.size
+    return file_content, len(file_content)
+
+
+def _read_pdf(file_content: Union[bytes, SpooledPdf]) -> bytes:
+    """Contenuto del PDF (letto dallo spool se necessario)."""
+    if isinstance(file_content, SpooledPdf):
+        with open(file_content.path, 'rb') as f:
+            return f.read()
+    return file_content
+
+
+def extract_pdf_data(filename: str, file_content: Union[bytes, SpooledPdf]) -> Dict[str, Any]:
+    """
+    Fase di estrazione di process_pdf (v11.7): testo, detect vendor, estrattore.
+    Un PDF in spool viene letto dal percorso (al pool passa solo il percorso).
+
+    Non accede al database e ritorna solo tipi semplici, quindi puo' girare
+    in un processo separato (ProcessPoolExecutor). Gli errori non vengono
+    sollevati ma riportati, e process_pdf li rilancia nello stesso punto del
+    flusso sequenziale (prima o dopo la creazione dell'acquisizione).
+
+    Returns:
+        Dict con vendor, confidence, orders_data, errore_testo, errore_estrattore,
+        tempi (per fase, uniti da process_pdf) e n_pagine
+    """
+    with pipeline_timer() as timer:
+        try:
+            doc = open_pdf_document(_pdf_source(file_content)[0])
+        except Exception as e:
+            data = _extraction_result(errore_testo=str(e))
+        else:
+            try:
+                data = extract_document_data(doc, filename)
+                # v11.7: estrazioni pdfplumber riusabili da reextract (anche se
+                # l'estrattore e' fallito: e' il caso da ri-validare)
+                if not data['errore_testo']:
+                    save_artefact(pdf_hash(file_content), doc)
+                    lap('artefatto')
+            finally:
+                doc.close()
+
+    data['tempi'] = timer.stages
+    data['n_pagine'] = timer.n_pagine
+    return data
+
+
+# =============================================================================
+# v11.7: DUPLICATI PER HASH (prima di qualsiasi parsing)
+# =============================================================================
+
+# Prima acquisizione con l'hash (l'originale) e primo ordine estratto da essa
+_DUPLICATI_SQL = """
+    SELECT DISTINCT ON (a.hash_file)
+           a.hash_file, a.id_acquisizione,
+           v.codice_vendor AS vendor,
+           ot.numero_ordine_vendor, ot.stato, ot.ragione_sociale_1
+    FROM acquisizioni a
+    LEFT JOIN ordini_testata ot ON ot.id_acquisizione = a.id_acquisizione
+    LEFT JOIN vendor v ON v.id_vendor = COALESCE(ot.id_vendor, a.id_vendor)
+    WHERE a.hash_file = ANY(%s)
+    ORDER BY a.hash_file, a.id_acquisizione, ot.id_testata
+"""
+
+# Acquisizione SCARTATO + anomalia in un solo statement. File e vendor sono
+# quelli dell'originale: stesso hash, stesso contenuto
+_REGISTRA_DUPLICATO_SQL = """
+    WITH acq AS (
+        INSERT INTO acquisizioni
+        (nome_file_originale, nome_file_storage, percorso_storage, hash_file,
+         dimensione_bytes, id_vendor, is_duplicato, id_acquisizione_originale, stato)
+        SELECT %s, o.nome_file_storage, o.percorso_storage, o.hash_file,
+               %s, o.id_vendor, TRUE, o.id_acquisizione, 'SCARTATO'
+        FROM acquisizioni o
+        WHERE o.id_acquisizione = %s
+        RETURNING id_acquisizione
+    )
+    INSERT INTO anomalie (id_acquisizione, tipo_anomalia, livello, descrizione)
+    SELECT id_acquisizione, 'DUPLICATO_PDF', 'ATTENZIONE', 'PDF già caricato precedentemente'
+    FROM acq
+    RETURNING id_acquisizione
+"""
+
+
+def check_duplicate_hashes(hashes: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Verifica in blocco quali hash SHA-256 corrispondono a PDF gia' acquisiti.
+
+    Args:
+        hashes: Lista di hash (hex)
+
+    Returns:
+        Dict hash -> {id_acquisizione_originale, vendor, stato_ordine, info_ordine},
+        solo per gli hash gia' presenti
+    """
+    if not hashes:
+        return {}
+
+    db = get_db()
+    rows = db.execute(_DUPLICATI_SQL, (list(set(hashes)),)).fetchall()
+
+    duplicati = {}
+    for row in rows:
+        info_ordine = ''
+        if row['numero_ordine_vendor'] is not None:
+            info_ordine = f"Ordine {row['numero_ordine_vendor']} ({row['vendor']}) - {row['ragione_sociale_1']}"
+        duplicati[row['hash_file']] = {
+            'id_acquisizione_originale': row['id_acquisizione'],
+            'vendor': row['vendor'] or '',
+            'stato_ordine': row['stato'] or 'SCONOSCIUTO',
+            'info_ordine': info_ordine,
+        }
+    return duplicati
+
+
+def _register_duplicate(db, result: Dict[str, Any], file_size: int,
+                        duplicato: Dict[str, Any]) -> Dict[str, Any]:
+    """Registra il PDF duplicato senza parsing ne' scrittura su disco."""
+    id_acquisizione = db.execute(_REGISTRA_DUPLICATO_SQL, (
+        result['filename'], file_size, duplicato['id_acquisizione_originale']
+    )).fetchone()[0]
+    db.commit()
+
+    result['id_acquisizione'] = id_acquisizione
+    result['vendor'] = duplicato['vendor']
+    result['status'] = 'DUPLICATO'
+    result['duplicato_info'] = {
+        'id_acquisizione_originale': duplicato['id_acquisizione_originale'],
+        'stato_ordine': duplicato['stato_ordine'],
+        'info_ordine': duplicato['info_ordine'],
+    }
+    result['anomalie'].append(
+        f"PDF già caricato. {duplicato['info_ordine']} - Stato: {duplicato['stato_ordine']}"
+    )
+    return result
+
+
 # =============================================================================
 # FUNZIONE PRINCIPALE
 # =============================================================================
 
 def process_pdf(
     filename: str, 
-    file_content: bytes, 
-    pdf_path: str = None,
-    save_to_disk: bool = True
+    file_content: Union[bytes, SpooledPdf], 
+    save_to_disk: bool = True,
+    extracted: Dict[str, Any] = None
 ) -> Dict[str, Any]:
     """
     Elabora un PDF e inserisce i dati nel database.
     
     Args:
         filename: Nome file originale
-        file_content: Contenuto binario del PDF
-        pdf_path: Percorso file su disco (opzionale, per estrattori con coordinate)
+        file_content: Contenuto binario del PDF, oppure (v11.7) PDF in spool
+                      su disco: letto dal percorso e archiviato senza copie
+                      in memoria; il file di spool resta al chiamante
         save_to_disk: Se True, salva il PDF nella cartella uploads
+        extracted: v11.7 - Risultato di extract_pdf_data() gia' calcolato
+                   (es. in un processo del pool): salta testo/vendor/estrattore
         
     Returns:
         Dict con statistiche elaborazione:
@@ -219,6 +404,27 @@ def process_pdf(
         - anomalie: lista messaggi anomalia
         - id_acquisizione: ID record ACQUISIZIONI
     """
+    # v11.7: tempi per fase salvati in acquisizioni_tempi
+    with pipeline_timer() as timer:
+        if extracted is not None:
+            timer.merge(extracted.get('tempi'), extracted.get('n_pagine'))
+        result = _process_pdf(filename, file_content, save_to_disk, extracted)
+        timer.lap('finalizza')
+
+    # I duplicati (solo hash) falserebbero le medie per vendor
+    if result['id_acquisizione'] and result['status'] != 'DUPLICATO':
+        save_timings(get_db(), result['id_acquisizione'], result['vendor'], timer,
+                     n_righe=result['righe'])
+    return result
+
+
+def _process_pdf(
+    filename: str,
+    file_content: Union[bytes, SpooledPdf],
+    save_to_disk: bool,
+    extracted: Optional[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """Corpo di process_pdf; ogni fase chiude il proprio giro sul timer attivo."""
     result = {
         'filename': filename,
         'status': 'OK',
@@ -230,51 +436,36 @@ def process_pdf(
     }
     
     db = get_db()
+    doc = None
     
     try:
         # =====================================================================
         # 1. CALCOLA HASH E VERIFICA DUPLICATO
         # =====================================================================
-        hash_file = compute_file_hash(file_content)
-        
-        existing = db.execute(
-            "SELECT id_acquisizione FROM ACQUISIZIONI WHERE hash_file = ?",
-            (hash_file,)
-        ).fetchone()
-        
-        is_duplicato = True if existing else False
-        id_acq_originale = existing['id_acquisizione'] if existing else None
-        
-        # =====================================================================
-        # 2. ESTRAI TESTO DAL PDF
-        # =====================================================================
-        if not PDFPLUMBER_AVAILABLE:
-            raise ImportError("pdfplumber non installato")
+        hash_file = pdf_hash(file_content)
+        source, file_size = _pdf_source(file_content)
         
-        pdf_file = io.BytesIO(file_content)
-        text = ""
-        lines = []
-
-        with pdfplumber.open(pdf_file) as pdf:
-            for page in pdf.pages:
-                # v10.6: x_tolerance aumentata per rilevare meglio gli spazi tra parole
-                # Default è 3, aumentiamo a 5 per evitare "CANTARERODEI" invece di "CANTARERO DEI"
-                page_text = page.extract_text(x_tolerance=5, y_tolerance=3) or ""
-
-                # v10.6: Fix encoding issues (UTF-8 mojibake come "BONDÃ¬" -> "BONDì")
-                # Prima prova con ftfy se disponibile, poi applica fix manuale come backup
-                if FTFY_AVAILABLE:
-                    page_text = ftfy.fix_text(page_text)
-                # Applica sempre il fix manuale per catturare pattern non gestiti da ftfy
-                page_text = _fix_encoding_manual(page_text)
-
-                text += page_text + "\n"
-                lines.extend(page_text.split('\n'))
+        # v11.7: Duplicato risolto dal solo hash: niente testo, detect vendor,
+        # scrittura su disco ne' ticket
+        duplicato = check_duplicate_hashes([hash_file]).get(hash_file)
+        lap('hash')
+        if duplicato:
+            return _register_duplicate(db, result, file_size, duplicato)
         
         # =====================================================================
-        # 3. RILEVA VENDOR
+        # 2-3. ESTRAI TESTO DAL PDF E RILEVA VENDOR
         # =====================================================================
-        vendor, confidence = detect_vendor(text, filename)
+        if extracted is not None:
+            if extracted['errore_testo']:
+                raise Exception(extracted['errore_testo'])
+            vendor, confidence = extracted['vendor'], extracted['confidence']
+        else:
+            # v11.7: documento aperto una sola volta, riusato dall'estrattore;
+            # detect vendor sulle prime pagine, le altre lette solo se servono
+            # (regole ricaricate se cambiate da un altro processo)
+            check_detection_rules()
+            doc = open_pdf_document(source)
+            vendor, confidence, text, lines = _detect_and_read(doc, filename)
         result['vendor'] = vendor
 
         # v6.2: Vendor UNKNOWN non blocca più l'elaborazione
@@ -311,20 +502,21 @@ def process_pdf(
             # Crea directory se non esiste
             os.makedirs(config.UPLOAD_DIR, exist_ok=True)
             percorso_storage = os.path.join(config.UPLOAD_DIR, nome_storage)
-            with open(percorso_storage, 'wb') as f:
-                f.write(file_content)
-            # Usa questo path per estrattori che richiedono coordinate
-            if not pdf_path:
-                pdf_path = percorso_storage
+            if isinstance(file_content, SpooledPdf):
+                # v11.7: hard link/copia a blocchi dello spool
+                store_spooled(file_content, percorso_storage)
+            else:
+                with open(percorso_storage, 'wb') as f:
+                    f.write(file_content)
         
         cursor = db.execute("""
             INSERT INTO acquisizioni
             (nome_file_originale, nome_file_storage, percorso_storage, hash_file,
              dimensione_bytes, id_vendor, is_duplicato, id_acquisizione_originale, stato)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, 'IN_ELABORAZIONE')
+            VALUES (%s, %s, %s, %s, %s, %s, FALSE, NULL, 'IN_ELABORAZIONE')
             RETURNING id_acquisizione
         """, (filename, nome_storage, percorso_storage, hash_file,
-              len(file_content), id_vendor, is_duplicato, id_acq_originale))
+              file_size, id_vendor))
         id_acquisizione = cursor.fetchone()[0]
         db.commit()
         result['id_acquisizione'] = id_acquisizione
@@ -333,59 +525,36 @@ def process_pdf(
         # 5.5 v11.3: TICKET AUTOMATICO PER VENDOR SCONOSCIUTO
         # =====================================================================
         if is_vendor_unknown:
+            # v11.7: allegato ed email richiedono il contenuto (solo per
+            # i documenti non riconosciuti)
             ticket_id = _crea_ticket_vendor_sconosciuto(
-                db, filename, file_content, id_acquisizione, confidence
+                db, filename, _read_pdf(file_content), id_acquisizione, confidence
             )
             if ticket_id:
                 result['ticket_assistenza'] = ticket_id
                 result['anomalie'].append(
                     f'Ticket assistenza #{ticket_id} creato per analisi documento'
                 )
+        lap('acquisizione')
 
-        # =====================================================================
-        # 6. GESTIONE DUPLICATO PDF
-        # =====================================================================
-        if is_duplicato:
-            # Recupera info sull'ordine esistente
-            ordine_esistente = db.execute("""
-                SELECT ot.numero_ordine_vendor, ot.stato, ot.ragione_sociale_1,
-                       v.codice_vendor as vendor
-                FROM ORDINI_TESTATA ot
-                JOIN VENDOR v ON ot.id_vendor = v.id_vendor
-                WHERE ot.id_acquisizione = %s
-                LIMIT 1
-            """, (id_acq_originale,)).fetchone()
-            
-            stato_ordine = 'SCONOSCIUTO'
-            info_ordine = ''
-            if ordine_esistente:
-                stato_ordine = ordine_esistente['stato']
-                info_ordine = f"Ordine {ordine_esistente['numero_ordine_vendor']} ({ordine_esistente['vendor']}) - {ordine_esistente['ragione_sociale_1']}"
-            
-            db.execute("""
-                INSERT INTO ANOMALIE (id_acquisizione, tipo_anomalia, livello, descrizione)
-                VALUES (%s, 'DUPLICATO_PDF', 'ATTENZIONE', 'PDF già caricato precedentemente')
-            """, (id_acquisizione,))
-            db.execute(
-                "UPDATE ACQUISIZIONI SET stato = 'SCARTATO' WHERE id_acquisizione = ?", 
-                (id_acquisizione,)
-            )
-            db.commit()
-            
-            result['status'] = 'DUPLICATO'
-            result['duplicato_info'] = {
-                'id_acquisizione_originale': id_acq_originale,
-                'stato_ordine': stato_ordine,
-                'info_ordine': info_ordine
-            }
-            result['anomalie'].append(f'PDF già caricato. {info_ordine} - Stato: {stato_ordine}')
-            return result
-        
         # =====================================================================
         # 7. ESTRAI DATI CON ESTRATTORE SPECIFICO
         # =====================================================================
-        extractor = get_extractor(vendor)
-        orders_data = extractor(text, lines, pdf_path)
+        if extracted is not None:
+            if extracted['errore_estrattore']:
+                raise Exception(extracted['errore_estrattore'])
+            orders_data = extracted['orders_data']
+        else:
+            try:
+                extractor = get_extractor(vendor)
+                orders_data = extractor(text, lines, doc)
+                lap('estrattore')
+            finally:
+                # v11.7: estrazioni pdfplumber riusabili da reextract, anche
+                # se l'estrattore e' fallito
+                save_artefact(hash_file, doc)
+                doc.close()
+                lap('artefatto')
         
         # =====================================================================
         # 7.5 ARRICCHIMENTO LISTINO (v10.0 - Generale per tutti i vendor)
@@ -398,6 +567,7 @@ def process_pdf(
                 result['anomalie'].append(
                     f"Ordine {order_data.get('numero_ordine')}: {len(anomalie_listino)} anomalie listino"
                 )
+        lap('listino')
 
         # =====================================================================
         # 8. INSERISCI ORDINI NEL DATABASE
@@ -441,6 +611,9 @@ def process_pdf(
                 WHERE id_acquisizione = %s
             """, (str(e), result['id_acquisizione']))
             db.commit()
+    finally:
+        if doc is not None:
+            doc.close()
     
     return result
 
@@ -472,40 +645,36 @@ def _insert_order(
     
     # Se ho MIN_ID (almeno 6 cifre) e P.IVA (11 cifre), i dati sono completi
     # Non serve lookup, uso direttamente i dati estratti
+    # v11.7: match anagrafica e deposito da lookup_farmacia_extended (in cache
+    # per gli stessi dati estratti)
+    lookup = lookup_farmacia_extended(order_data)
+    id_farm, id_parafarm = lookup['id_farmacia'], lookup['id_parafarmacia']
+    lookup_method, lookup_source, lookup_score = lookup['lookup_method'], lookup['lookup_source'], lookup['score']
+
     if min_id_estratto and len(min_id_estratto) >= 6 and piva_estratta and len(piva_estratta) == 11:
         # Dati completi dal documento - lookup opzionale per collegamento anagrafica
-        id_farm, id_parafarm, lookup_method, lookup_source, lookup_score = lookup_farmacia(order_data)
-
         # Se lookup non trova, non è un errore - i dati estratti sono sufficienti
         if lookup_method == 'NESSUNO':
             lookup_method = 'DOCUMENTO_COMPLETO'
             lookup_score = 100  # I dati vengono dal documento, sono affidabili
-    else:
-        # Dati incompleti - lookup necessario
-        id_farm, id_parafarm, lookup_method, lookup_source, lookup_score = lookup_farmacia(order_data)
 
     # Genera chiave univoca - recupera MIN_ID dal match ministeriale
     cod_min = order_data.get('codice_ministeriale', '')
-    if not cod_min and id_farm:
-        farm_row = db.execute(
-            "SELECT min_id FROM ANAGRAFICA_FARMACIE WHERE id_farmacia = %s",
-            (id_farm,)
-        ).fetchone()
-        cod_min = farm_row['min_id'] if farm_row else ''
-    if not cod_min and id_parafarm:
-        para_row = db.execute(
-            "SELECT codice_sito FROM ANAGRAFICA_PARAFARMACIE WHERE id_parafarmacia = %s",
-            (id_parafarm,)
-        ).fetchone()
-        cod_min = para_row['codice_sito'] if para_row else ''
+    if not cod_min:
+        cod_min = lookup['codice_ministeriale'] or ''
 
     # v11.2: Recupera deposito_riferimento da anagrafica_clienti
     # Usa il MIN_ID dal match ministeriale per disambiguare in caso multipunto
     deposito_riferimento = None
     if piva_estratta:
-        cliente_info = lookup_cliente_by_piva(piva_estratta, min_id=cod_min)
-        if cliente_info:
-            deposito_riferimento = cliente_info.get('deposito_riferimento')
+        if normalize_codice(cod_min) == normalize_codice(lookup['codice_ministeriale']):
+            deposito_riferimento = lookup['deposito_riferimento']
+        else:
+            # MIN_ID del documento diverso da quello del match
+            cliente_info = lookup_cliente_by_piva(piva_estratta, min_id=cod_min)
+            if cliente_info:
+                deposito_riferimento = cliente_info.get('deposito_riferimento')
+    lap('lookup_farmacia')
     
     chiave_univoca = generate_order_key(vendor, order_data.get('numero_ordine', 'ND'), cod_min)
 
@@ -812,112 +981,77 @@ def _insert_order(
             f"Ordine {order_data.get('numero_ordine')}: deposito di riferimento mancante (farmacia trovata via lookup) - richiede impostazione manuale"
         )
 
+    lap('inserimento_testata')
+
     # Inserisci righe dettaglio (con gestione parent-child espositori)
     # v10.6: Propaga data_consegna dalla testata alle righe che non hanno data propria
     data_consegna_testata = order_data.get('data_consegna', '')
-    current_parent_id = None
-    for riga in order_data.get('righe', []):
+    righe = order_data.get('righe', [])
+    for riga in righe:
         # v10.6: Se la riga non ha data_consegna propria, usa quella della testata
         if not riga.get('data_consegna_riga') and not riga.get('data_consegna'):
             riga['data_consegna'] = data_consegna_testata
 
-        # Se è un parent espositore, traccia il suo id per i child successivi
-        if riga.get('tipo_riga') == 'PARENT_ESPOSITORE':
-            row_id = _insert_detail_row(db, id_testata, riga)
-            current_parent_id = row_id
-        elif riga.get('_belongs_to_parent') and current_parent_id:
-            # Child espositore: collega al parent
-            riga['id_parent_espositore'] = current_parent_id
-            _insert_detail_row(db, id_testata, riga)
-        else:
-            # Riga normale
-            _insert_detail_row(db, id_testata, riga)
-            current_parent_id = None  # Reset parent se non è child
-        result['righe'] += 1
+    # v11.7: INSERT multi-riga; i valori salvati restano in memoria per i
+    # controlli LST-A01 e AIC-A01 (nessuna rilettura di ordini_dettaglio)
+    righe_salvate = _insert_detail_rows(db, id_testata, righe)
+    result['righe'] += len(righe_salvate)
 
     # Aggiorna contatori righe nella testata
     from .ordini import _aggiorna_contatori_ordine
     _aggiorna_contatori_ordine(id_testata)
+    lap('inserimento_righe')
 
     # =========================================================================
     # CHECK LST-A01: PRODOTTI IN VENDITA SENZA PREZZO (v10.1)
     # =========================================================================
-    # Cerca righe con q_venduta > 0 e prezzo_netto = 0/NULL
+    # Righe con q_venduta > 0 e prezzo_netto = 0/NULL
     # Crea supervisione_listino per ogni riga (unificato con anomalie listino)
     # v10.3: Escludi anche:
     # - Righe SC.MERCE/omaggi (q_sconto_merce > 0 o q_omaggio > 0)
     # - Parent espositori (is_espositore = TRUE)
     # - Righe con tipo_riga SC.MERCE o omaggio
-    righe_senza_prezzo = db.execute("""
-        SELECT od.id_dettaglio, od.n_riga, od.codice_aic, od.descrizione, od.q_venduta, od.prezzo_netto
-        FROM ordini_dettaglio od
-        WHERE od.id_testata = %s
-          AND COALESCE(od.q_venduta, 0) > 0
-          AND COALESCE(od.prezzo_netto, 0) = 0
-          AND COALESCE(od.is_child, FALSE) = FALSE  -- Escludi child espositori
-          AND COALESCE(od.is_espositore, FALSE) = FALSE  -- v10.3: Escludi parent espositori
-          AND COALESCE(od.q_sconto_merce, 0) = 0  -- v10.3: Escludi righe sconto merce
-          AND COALESCE(od.q_omaggio, 0) = 0  -- v10.3: Escludi righe omaggio
-          AND COALESCE(od.tipo_riga, '') NOT IN ('SCONTO_MERCE', 'MATERIALE_POP', 'PARENT_ESPOSITORE', 'CHILD_ESPOSITORE')
-          AND NOT EXISTS (
-              SELECT 1 FROM anomalie a
-              WHERE a.id_dettaglio = od.id_dettaglio
-              AND a.codice_anomalia = 'LST-A01'
-          )
-        ORDER BY od.n_riga
-    """, (id_testata,)).fetchall()
+    # v11.7: Controllo sui valori appena salvati. L'ordine e' nuovo: non
+    # esistono anomalie LST-A01 (specifiche o generiche, v10.4) da riusare,
+    # quelle generiche del listino sono create piu' avanti.
+    righe_senza_prezzo = sorted(
+        (r for r in righe_salvate if _riga_senza_prezzo(r)),
+        key=_ordine_n_riga
+    )
+    # Valori delle anomalie LST-A01 dell'ordine (per la sezione listino)
+    valori_lst_a01 = set()
 
     if righe_senza_prezzo:
-        for riga in righe_senza_prezzo:
-            descrizione_specifica = f"Prezzo mancante per AIC {riga['codice_aic'] or 'N/D'} - {riga['descrizione'][:40] if riga['descrizione'] else 'N/D'}"
-
-            # v10.4: Verifica se esiste già un'anomalia generica (senza id_dettaglio) per lo stesso AIC
-            # Se sì, aggiornala con i dettagli specifici invece di crearne una nuova
-            existing_generic = db.execute("""
-                SELECT id_anomalia FROM anomalie
-                WHERE id_testata = %s
-                AND codice_anomalia = 'LST-A01'
-                AND valore_anomalo = %s
-                AND id_dettaglio IS NULL
-            """, (id_testata, riga['codice_aic'])).fetchone()
-
-            if existing_generic:
-                # Aggiorna anomalia generica con dettagli specifici
-                db.execute("""
-                    UPDATE anomalie SET
-                        id_dettaglio = %s,
-                        descrizione = %s,
-                        livello = 'ERRORE'
-                    WHERE id_anomalia = %s
-                """, (riga['id_dettaglio'], descrizione_specifica, existing_generic['id_anomalia']))
-                id_anomalia = existing_generic['id_anomalia']
-            else:
-                # Crea nuova anomalia LST-A01 per la riga
-                cursor = db.execute("""
-                    INSERT INTO anomalie
-                    (id_testata, id_dettaglio, tipo_anomalia, livello, codice_anomalia,
-                     descrizione, valore_anomalo, richiede_supervisione)
-                    VALUES (%s, %s, 'LISTINO', 'ERRORE', 'LST-A01', %s, %s, TRUE)
-                    RETURNING id_anomalia
-                """, (
-                    id_testata,
-                    riga['id_dettaglio'],
-                    descrizione_specifica,
-                    riga['codice_aic'] or 'NO_AIC'
-                ))
-                id_anomalia = cursor.fetchone()[0]
-
-            # Crea supervisione_listino per ogni riga
-            anomalia_listino = {
+        ids_anomalie = db.execute_insert("""
+            INSERT INTO anomalie
+            (id_testata, id_dettaglio, tipo_anomalia, livello, codice_anomalia,
+             descrizione, valore_anomalo, richiede_supervisione)
+            VALUES (%s, %s, 'LISTINO', 'ERRORE', 'LST-A01', %s, %s, TRUE)
+            RETURNING id_anomalia
+        """, [
+            (
+                id_testata,
+                riga['id_dettaglio'],
+                f"Prezzo mancante per AIC {riga['codice_aic'] or 'N/D'} - {riga['descrizione'][:40] if riga['descrizione'] else 'N/D'}",
+                riga['codice_aic'] or 'NO_AIC',
+            )
+            for riga in righe_senza_prezzo
+        ])
+        valori_lst_a01.update(riga['codice_aic'] or 'NO_AIC' for riga in righe_senza_prezzo)
+
+        # Crea supervisione_listino per ogni riga
+        crea_supervisioni_listino(id_testata, [
+            (id_anomalia, {
                 'tipo_anomalia': 'LISTINO',
                 'codice_anomalia': 'LST-A01',
                 'vendor': vendor,
                 'valore_anomalo': riga['codice_aic'],
                 'n_riga': riga['n_riga'],
                 'descrizione': riga['descrizione'],
-                'id_dettaglio': riga['id_dettaglio'],  # Passa id_dettaglio direttamente
-            }
-            crea_richiesta_supervisione(id_testata, id_anomalia, anomalia_listino)
+                'id_dettaglio': riga['id_dettaglio'],
+            })
+            for id_anomalia, riga in zip(ids_anomalie, righe_senza_prezzo)
+        ])
 
         richiede_supervisione = True
         result['anomalie'].append(
@@ -927,58 +1061,60 @@ def _insert_order(
     # =========================================================================
     # CHECK AIC-A01: PRODOTTI SENZA CODICE AIC VALIDO (v9.1)
     # =========================================================================
-    # Cerca righe senza codice AIC valido (esattamente 9 CIFRE NUMERICHE)
-    # IMPORTANTE: regex ^\d{9}$ verifica che sia ESATTAMENTE 9 cifre numeriche
+    # Righe senza codice AIC valido (esattamente 9 CIFRE NUMERICHE)
     # Esclude child espositori che possono non avere AIC
-    righe_senza_aic = db.execute("""
-        SELECT id_dettaglio, n_riga, codice_aic, codice_originale, descrizione
-        FROM ordini_dettaglio
-        WHERE id_testata = %s
-          AND (codice_aic IS NULL OR codice_aic = '' OR codice_aic !~ '^[0-9]{9}$')
-          AND COALESCE(is_child, FALSE) = FALSE
-        ORDER BY n_riga
-    """, (id_testata,)).fetchall()
+    righe_senza_aic = sorted(
+        (r for r in righe_salvate
+         if not r['is_child'] and not _AIC_VALIDO_RE.fullmatch(str(r['codice_aic'] or ''))),
+        key=_ordine_n_riga
+    )
 
     if righe_senza_aic:
-        from .supervision.aic import crea_supervisione_aic, valuta_anomalia_aic
-
-        for riga_senza_aic in righe_senza_aic:
-            # Prepara descrizione anomalia
-            descrizione_anomalia = f"{CODICI_ANOMALIA.get('AIC-A01', 'Codice AIC mancante o non valido - verifica obbligatoria')}"
-
-            # Inserisci anomalia GRAVE per ogni riga
-            cursor = db.execute("""
-                INSERT INTO anomalie
-                (id_testata, id_dettaglio, tipo_anomalia, livello, codice_anomalia,
-                 descrizione, valore_anomalo, richiede_supervisione)
-                VALUES (%s, %s, 'AIC', 'ERRORE', 'AIC-A01', %s, %s, TRUE)
-                RETURNING id_anomalia
-            """, (
+        from .supervision.aic import crea_supervisioni_aic, valuta_anomalie_aic
+
+        # Anomalia GRAVE per ogni riga
+        descrizione_anomalia = f"{CODICI_ANOMALIA.get('AIC-A01', 'Codice AIC mancante o non valido - verifica obbligatoria')}"
+        ids_anomalie_aic = db.execute_insert("""
+            INSERT INTO anomalie
+            (id_testata, id_dettaglio, tipo_anomalia, livello, codice_anomalia,
+             descrizione, valore_anomalo, richiede_supervisione)
+            VALUES (%s, %s, 'AIC', 'ERRORE', 'AIC-A01', %s, %s, TRUE)
+            RETURNING id_anomalia
+        """, [
+            (
                 id_testata,
-                riga_senza_aic['id_dettaglio'],
+                riga['id_dettaglio'],
                 descrizione_anomalia,
-                f"Codice originale: {riga_senza_aic['codice_originale'] or 'N/D'}, Descrizione: {riga_senza_aic['descrizione'][:30] if riga_senza_aic['descrizione'] else 'N/D'}"
-            ))
-            id_anomalia_aic = cursor.fetchone()[0]
+                f"Codice originale: {riga['codice_originale'] or 'N/D'}, Descrizione: {riga['descrizione'][:30] if riga['descrizione'] else 'N/D'}",
+            )
+            for riga in righe_senza_aic
+        ])
 
-            # Prepara dati anomalia per supervisione
-            anomalia_aic = {
+        # Dati anomalia per supervisione
+        anomalie_aic = [
+            {
                 'tipo_anomalia': 'AIC',
                 'codice_anomalia': 'AIC-A01',
                 'vendor': vendor or 'UNKNOWN',
-                'n_riga': riga_senza_aic['n_riga'],
-                'id_dettaglio': riga_senza_aic['id_dettaglio'],
-                'descrizione_prodotto': riga_senza_aic['descrizione'],
-                'codice_originale': riga_senza_aic['codice_originale'],
+                'n_riga': riga['n_riga'],
+                'id_dettaglio': riga['id_dettaglio'],
+                'descrizione_prodotto': riga['descrizione'],
+                'codice_originale': riga['codice_originale'],
             }
-
-            # Valuta con apprendimento ML - può auto-applicare se pattern ordinario
-            applicato_auto, _ = valuta_anomalia_aic(id_testata, anomalia_aic)
-
-            if not applicato_auto:
-                # Crea richiesta supervisione AIC
-                crea_supervisione_aic(id_testata, id_anomalia_aic, anomalia_aic)
-                richiede_supervisione = True
+            for riga in righe_senza_aic
+        ]
+
+        # Valuta con apprendimento ML - può auto-applicare se pattern ordinario
+        esiti = valuta_anomalie_aic(id_testata, anomalie_aic)
+        da_supervisionare = [
+            (id_anomalia_aic, anomalia_aic)
+            for id_anomalia_aic, anomalia_aic, (applicato_auto, _) in zip(ids_anomalie_aic, anomalie_aic, esiti)
+            if not applicato_auto
+        ]
+        if da_supervisionare:
+            # Crea richieste supervisione AIC
+            crea_supervisioni_aic(id_testata, da_supervisionare)
+            richiede_supervisione = True
 
         if richiede_supervisione:
             result['anomalie'].append(
@@ -1043,17 +1179,12 @@ def _insert_order(
 
         # v10.4: Verifica se esiste già un'anomalia LST-A01 per questo AIC
         # (creata dalla sezione CHECK LST-A01 con descrizione più specifica)
+        # v11.7: verifica in memoria sulle anomalie create per l'ordine
         if codice_anomalia == 'LST-A01' and codice_aic:
-            existing = db.execute("""
-                SELECT id_anomalia FROM anomalie
-                WHERE id_testata = %s
-                AND codice_anomalia = 'LST-A01'
-                AND valore_anomalo = %s
-            """, (id_testata, codice_aic)).fetchone()
-
-            if existing:
+            if codice_aic in valori_lst_a01:
                 # Anomalia specifica già esiste, skip questa generica
                 continue
+            valori_lst_a01.add(codice_aic)
 
         # Inserisci anomalia nel database
         cursor = db.execute("""
@@ -1118,29 +1249,54 @@ def _insert_order(
         result['stato'] = 'ANOMALIA'
 
     db.commit()
+    # Controlli LST/AIC, espositore/ML, listino e blocco supervisione
+    lap('supervisione')
     return result
 
 
-def _insert_detail_row(db, id_testata: int, riga: Dict) -> int:
-    """
-    Inserisce una riga dettaglio nel database con supporto espositori v3.0.
+# =============================================================================
+# v11.7: INSERIMENTO RIGHE DETTAGLIO IN BLOCCO
+# =============================================================================
+# Le righe di un ordine sono inserite con una INSERT multi-riga (execute_insert,
+# id nell'ordine delle righe); i child espositore sono collegati al parent con
+# un solo UPDATE. Le query per ordine non dipendono dal numero di righe.
+# =============================================================================
+
+_COLONNE_DETTAGLIO = (
+    'id_testata', 'n_riga', 'codice_aic', 'codice_originale', 'descrizione',
+    'q_venduta', 'q_sconto_merce', 'q_omaggio', 'data_consegna_riga',
+    'sconto_1', 'sconto_2', 'sconto_3', 'sconto_4',
+    'prezzo_netto', 'prezzo_pubblico', 'prezzo_scontare', 'aliquota_iva',
+    'is_espositore', 'is_child', 'is_no_aic',
+    'tipo_riga', 'id_parent_espositore', 'espositore_metadata',
+    'q_originale', 'q_residua', 'q_esportata',
+    'descrizione_estratta', 'fonte_codice_aic', 'fonte_quantita',
+)
+
+_INSERT_DETTAGLIO_SQL = f"""
+    INSERT INTO ordini_dettaglio
+    ({', '.join(_COLONNE_DETTAGLIO)})
+    VALUES ({', '.join(['%s'] * len(_COLONNE_DETTAGLIO))})
+    RETURNING id_dettaglio
+"""
+
+# Tipi riga esclusi dal controllo prezzo mancante (LST-A01, v10.3)
+_TIPI_RIGA_SENZA_PREZZO = ('SCONTO_MERCE', 'MATERIALE_POP', 'PARENT_ESPOSITORE', 'CHILD_ESPOSITORE')
+
+# Codice AIC valido: esattamente 9 cifre (come '^[0-9]{9}$' in PostgreSQL)
+_AIC_VALIDO_RE = re.compile(r'[0-9]{9}')
 
-    Returns:
-        int: id_dettaglio della riga inserita
-    """
-    import json
 
-    n_riga = riga.get('n_riga', 1)
+def _valori_riga_dettaglio(id_testata: int, riga: Dict) -> Dict[str, Any]:
+    """
+    Valori di una riga dettaglio per colonna, con supporto espositori v3.0.
+    """
     is_esp = True if riga.get('is_espositore') else False
     is_child = True if riga.get('is_child') else False
     is_no_aic = True if not riga.get('codice_aic') or riga.get('is_no_aic') else False
 
-    # Nuovi campi espositore v3.0
-    tipo_riga = riga.get('tipo_riga', '')
-    id_parent = riga.get('id_parent_espositore')
-    esp_metadata = riga.get('espositore_metadata')
-
     # Serializza metadata se è dict
+    esp_metadata = riga.get('espositore_metadata')
     if isinstance(esp_metadata, dict):
         esp_metadata = json.dumps(esp_metadata, ensure_ascii=False)
 
@@ -1154,77 +1310,158 @@ def _insert_detail_row(db, id_testata: int, riga: Dict) -> int:
     if codice_originale_val and codice_originale_val != codice_aic_val:
         fonte_codice_aic = 'NORMALIZZATO'
 
-    cursor = db.execute("""
-        INSERT INTO ordini_dettaglio
-        (id_testata, n_riga, codice_aic, codice_originale, descrizione,
-         q_venduta, q_sconto_merce, q_omaggio, data_consegna_riga,
-         sconto_1, sconto_2, sconto_3, sconto_4,
-         prezzo_netto, prezzo_pubblico, prezzo_scontare, aliquota_iva,
-         is_espositore, is_child, is_no_aic,
-         tipo_riga, id_parent_espositore, espositore_metadata,
-         q_originale, q_residua, q_esportata,
-         descrizione_estratta, fonte_codice_aic, fonte_quantita)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-                %s, %s, %s)
-        RETURNING id_dettaglio
-    """, (
-        id_testata, n_riga,
-        codice_aic_val,
-        codice_originale_val,
-        descrizione_val,
-        riga.get('q_venduta', 0),
-        riga.get('q_sconto_merce', 0) + riga.get('merce_sconto_extra', 0),  # v6.2: BAYER sconto extra
-        riga.get('q_omaggio', 0),
-        _convert_date_to_iso(riga.get('data_consegna_riga') or riga.get('data_consegna', '')),
-        riga.get('sconto1', 0), riga.get('sconto2', 0),
-        riga.get('sconto3', 0), riga.get('sconto4', 0),
-        riga.get('prezzo_netto', 0), riga.get('prezzo_pubblico', 0),
-        riga.get('prezzo_scontare', 0),
-        riga.get('aliquota_iva', 10),
-        is_esp, is_child, is_no_aic,
-        tipo_riga, id_parent, esp_metadata,
-        calcola_q_totale(riga),  # q_originale
-        calcola_q_totale(riga),  # q_residua
-        0,  # q_esportata = 0
-        descrizione_val,  # descrizione_estratta
-        fonte_codice_aic,  # fonte_codice_aic
-        'ESTRATTO'  # fonte_quantita
-    ))
+    q_totale = calcola_q_totale(riga)
+    return {
+        'id_testata': id_testata,
+        'n_riga': riga.get('n_riga', 1),
+        'codice_aic': codice_aic_val,
+        'codice_originale': codice_originale_val,
+        'descrizione': descrizione_val,
+        'q_venduta': riga.get('q_venduta', 0),
+        'q_sconto_merce': riga.get('q_sconto_merce', 0) + riga.get('merce_sconto_extra', 0),  # v6.2: BAYER sconto extra
+        'q_omaggio': riga.get('q_omaggio', 0),
+        'data_consegna_riga': _convert_date_to_iso(riga.get('data_consegna_riga') or riga.get('data_consegna', '')),
+        'sconto_1': riga.get('sconto1', 0),
+        'sconto_2': riga.get('sconto2', 0),
+        'sconto_3': riga.get('sconto3', 0),
+        'sconto_4': riga.get('sconto4', 0),
+        'prezzo_netto': riga.get('prezzo_netto', 0),
+        'prezzo_pubblico': riga.get('prezzo_pubblico', 0),
+        'prezzo_scontare': riga.get('prezzo_scontare', 0),
+        'aliquota_iva': riga.get('aliquota_iva', 10),
+        'is_espositore': is_esp,
+        'is_child': is_child,
+        'is_no_aic': is_no_aic,
+        'tipo_riga': riga.get('tipo_riga', ''),
+        'id_parent_espositore': riga.get('id_parent_espositore'),
+        'espositore_metadata': esp_metadata,
+        'q_originale': q_totale,
+        'q_residua': q_totale,
+        'q_esportata': 0,
+        'descrizione_estratta': descrizione_val,
+        'fonte_codice_aic': fonte_codice_aic,
+        'fonte_quantita': 'ESTRATTO',
+    }
 
-    # Ottieni id riga inserita
-    id_det = cursor.fetchone()[0]
 
-    # v9.4: Anomalia espositore INFO con dettaglio child
-    if is_esp:
-        # Estrai dettaglio child dai metadata
-        import json
-        child_desc = ""
-        metadata_str = riga.get('espositore_metadata', '')
-        if metadata_str:
-            try:
-                metadata = json.loads(metadata_str) if isinstance(metadata_str, str) else metadata_str
-                child_dettaglio = metadata.get('child_dettaglio', [])
-                if child_dettaglio:
-                    child_parts = []
-                    for c in child_dettaglio[:5]:  # Max 5 child
-                        desc_short = c.get('descrizione', '')[:15] if c.get('descrizione') else c.get('codice', '')
-                        child_parts.append(f"{c.get('aic', c.get('codice', 'N/D'))} {desc_short} x{c.get('quantita', 0)}")
-                    child_desc = ", ".join(child_parts)
-                    if len(child_dettaglio) > 5:
-                        child_desc += f" (+{len(child_dettaglio) - 5} altri)"
-            except:
-                pass
-
-        descrizione_anomalia = "Riga espositore parent elaborata"
-        if child_desc:
-            descrizione_anomalia += f"\nChild: {child_desc}"
+def _descrizione_anomalia_espositore(riga: Dict) -> str:
+    """v9.4: Descrizione anomalia espositore INFO con dettaglio child."""
+    child_desc = ""
+    metadata_str = riga.get('espositore_metadata', '')
+    if metadata_str:
+        try:
+            metadata = json.loads(metadata_str) if isinstance(metadata_str, str) else metadata_str
+            child_dettaglio = metadata.get('child_dettaglio', [])
+            if child_dettaglio:
+                child_parts = []
+                for c in child_dettaglio[:5]:  # Max 5 child
+                    desc_short = c.get('descrizione', '')[:15] if c.get('descrizione') else c.get('codice', '')
+                    child_parts.append(f"{c.get('aic', c.get('codice', 'N/D'))} {desc_short} x{c.get('quantita', 0)}")
+                child_desc = ", ".join(child_parts)
+                if len(child_dettaglio) > 5:
+                    child_desc += f" (+{len(child_dettaglio) - 5} altri)"
+        except:
+            pass
+
+    descrizione_anomalia = "Riga espositore parent elaborata"
+    if child_desc:
+        descrizione_anomalia += f"\nChild: {child_desc}"
+    return descrizione_anomalia
+
+
+def _insert_detail_rows(db, id_testata: int, righe: List[Dict]) -> List[Dict[str, Any]]:
+    """
+    Inserisce le righe dettaglio di un ordine.
 
+    Ogni child espositore (_belongs_to_parent) che segue un parent
+    PARENT_ESPOSITORE viene collegato al parent (id_parent_espositore, anche
+    nella riga estratta). Per ogni parent espositore crea l'anomalia INFO.
+
+    Returns:
+        Valori salvati per riga (colonne di ordini_dettaglio + id_dettaglio)
+    """
+    salvate = [_valori_riga_dettaglio(id_testata, riga) for riga in righe]
+    if not salvate:
+        return []
+
+    ids = db.execute_insert(_INSERT_DETTAGLIO_SQL, [tuple(v.values()) for v in salvate])
+
+    collegamenti = []
+    anomalie_esp = []
+    current_parent_id = None
+    for riga, valori, id_det in zip(righe, salvate, ids):
+        valori['id_dettaglio'] = id_det
+
+        # Se è un parent espositore, traccia il suo id per i child successivi
+        if riga.get('tipo_riga') == 'PARENT_ESPOSITORE':
+            current_parent_id = id_det
+        elif riga.get('_belongs_to_parent') and current_parent_id:
+            # Child espositore: collega al parent
+            riga['id_parent_espositore'] = current_parent_id
+            valori['id_parent_espositore'] = current_parent_id
+            collegamenti.append((id_det, current_parent_id))
+        else:
+            current_parent_id = None  # Reset parent se non è child
+
+        if valori['is_espositore']:
+            anomalie_esp.append((
+                id_testata, id_det, _descrizione_anomalia_espositore(riga), riga.get('descrizione', '')
+            ))
+
+    if collegamenti:
         db.execute("""
+            UPDATE ordini_dettaglio AS od
+            SET id_parent_espositore = v.id_parent
+            FROM unnest(%s::int[], %s::int[]) AS v(id_dettaglio, id_parent)
+            WHERE od.id_dettaglio = v.id_dettaglio
+        """, ([c[0] for c in collegamenti], [c[1] for c in collegamenti]))
+
+    if anomalie_esp:
+        db.execute_insert("""
             INSERT INTO ANOMALIE (id_testata, id_dettaglio, tipo_anomalia, livello, descrizione, valore_anomalo)
             VALUES (%s, %s, 'ESPOSITORE', 'INFO', %s, %s)
-        """, (id_testata, id_det, descrizione_anomalia, riga.get('descrizione', '')))
+        """, anomalie_esp)
+
+    return salvate
 
-    return id_det
+
+def _valore_intero(value) -> int:
+    """Valore come salvato in una colonna integer (arrotondamento PostgreSQL), NULL = 0."""
+    if value is None:
+        return 0
+    try:
+        return int(Decimal(str(value)).to_integral_value(rounding=ROUND_HALF_UP))
+    except (InvalidOperation, ValueError):
+        return 0
+
+
+def _valore_decimale(value) -> Decimal:
+    """Valore come salvato in una colonna numeric, NULL = 0."""
+    if value is None:
+        return Decimal(0)
+    try:
+        return Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        return Decimal(0)
+
+
+def _riga_senza_prezzo(valori: Dict[str, Any]) -> bool:
+    """Riga in vendita senza prezzo da segnalare con LST-A01 (v10.1, v10.3)."""
+    return (
+        _valore_intero(valori['q_venduta']) > 0
+        and _valore_decimale(valori['prezzo_netto']) == 0
+        and not valori['is_child']
+        and not valori['is_espositore']
+        and _valore_intero(valori['q_sconto_merce']) == 0
+        and _valore_intero(valori['q_omaggio']) == 0
+        and (valori['tipo_riga'] or '') not in _TIPI_RIGA_SENZA_PREZZO
+    )
+
+
+def _ordine_n_riga(valori: Dict[str, Any]):
+    """Chiave ORDER BY n_riga (NULL in fondo)."""
+    n_riga = valori['n_riga']
+    return (n_riga is None, _valore_intero(n_riga))
 
 
 def _save_acquisition_error(db, filename: str, hash_file: str, 
@@ -14,7 +14,7 @@ from apscheduler.triggers.cron import CronTrigger
 
 from ..anagrafica.sync_ministero import sync_all, SyncAllResult
 from ..email.sender import EmailSender
-from ...database_pg import get_db
+from ...database_pg import get_db, with_db_scope
 
 # Scheduler globale
 _scheduler: Optional[BackgroundScheduler] = None
@@ -159,6 +159,7 @@ def _format_sync_email(result: SyncAllResult) -> tuple:
     return subject, body
 
 
+@with_db_scope
 def _run_anagrafica_sync():
     """
     Esegue la sincronizzazione anagrafica e invia email di report.
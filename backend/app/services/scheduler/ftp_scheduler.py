@@ -12,7 +12,7 @@ from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED
 
-from ...database_pg import get_db, log_operation
+from ...database_pg import get_db, log_operation, with_db_scope
 
 # Logger
 logger = logging.getLogger('ftp_scheduler')
@@ -23,6 +23,7 @@ _scheduler: Optional[BackgroundScheduler] = None
 _is_running = False
 
 
+@with_db_scope
 def _ftp_batch_job():
     """
     Job eseguito ogni 10 minuti per invio tracciati FTP.
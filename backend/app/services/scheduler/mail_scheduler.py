@@ -16,6 +16,8 @@ from typing import Dict, Any, Optional
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 
+from ...database_pg import with_db_scope
+
 # Scheduler globale
 _scheduler: Optional[BackgroundScheduler] = None
 _last_run: Optional[datetime] = None
@@ -132,6 +134,7 @@ Verificare la connessione al server email e le credenziali IMAP.""",
         print(f"⚠️ Impossibile creare ticket per errore mail: {e}")
 
 
+@with_db_scope
 def _run_mail_sync():
     """
     Esegue il mail_monitor.py per sincronizzare le email.
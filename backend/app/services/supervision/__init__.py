@@ -26,6 +26,7 @@ from .patterns import (
 # Requests
 from .requests import (
     crea_richiesta_supervisione,
+    crea_supervisioni_listino,
     blocca_ordine_per_supervisione,
     sblocca_ordine_se_completo,
 )
@@ -97,6 +98,7 @@ __all__ = [
     'genera_descrizione_pattern',
     # Requests
     'crea_richiesta_supervisione',
+    'crea_supervisioni_listino',
     'blocca_ordine_per_supervisione',
     'sblocca_ordine_se_completo',
     # Decisions
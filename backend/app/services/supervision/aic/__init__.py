@@ -47,6 +47,8 @@ from .queries import (
     get_storico_modifiche_aic,
     crea_supervisione_aic,
     valuta_anomalia_aic,
+    crea_supervisioni_aic,
+    valuta_anomalie_aic,
 )
 
 # Corrections
@@ -84,6 +86,8 @@ __all__ = [
     'get_storico_modifiche_aic',
     'crea_supervisione_aic',
     'valuta_anomalia_aic',
+    'crea_supervisioni_aic',
+    'valuta_anomalie_aic',
     # Corrections
     'correggi_aic_errato',
     # Wrappers
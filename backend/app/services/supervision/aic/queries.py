@@ -7,7 +7,7 @@
 
 from typing import Dict, List, Tuple
 
-from ....database_pg import get_db, log_operation
+from ....database_pg import get_db, log_operation, log_operations
 from .validation import normalizza_descrizione, calcola_pattern_signature
 
 
@@ -286,3 +286,130 @@ def valuta_anomalia_aic(id_testata: int, anomalia: Dict) -> Tuple[bool, str]:
             return True, pattern_sig
 
     return False, pattern_sig
+
+
+# =============================================================================
+# VERSIONI BATCH PER LE RIGHE DI UN ORDINE (v11.7)
+# =============================================================================
+# Usate da pdf_processor per le anomalie AIC-A01 di un ordine appena inserito:
+# numero di query costante, indipendente dal numero di righe senza AIC.
+# =============================================================================
+
+def _descrizione_anomalia_aic(anomalia: Dict) -> str:
+    # Supporta sia 'descrizione_prodotto' (pdf_processor) che 'descrizione' (fallback)
+    return anomalia.get('descrizione_prodotto', anomalia.get('descrizione', ''))
+
+
+def valuta_anomalie_aic(id_testata: int, anomalie: List[Dict]) -> List[Tuple[bool, str]]:
+    """
+    Come valuta_anomalia_aic per una lista di anomalie: una SELECT dei
+    pattern e un solo UPDATE per gli AIC applicati automaticamente.
+
+    Returns:
+        Lista di (applicato_auto, pattern_signature) nell'ordine delle anomalie
+    """
+    if not anomalie:
+        return []
+    db = get_db()
+
+    firme = [
+        calcola_pattern_signature(a.get('vendor', 'UNKNOWN'), _descrizione_anomalia_aic(a))
+        for a in anomalie
+    ]
+    rows = db.execute("""
+        SELECT pattern_signature, codice_aic_default
+        FROM criteri_ordinari_aic
+        WHERE pattern_signature = ANY(%s)
+          AND is_ordinario = TRUE
+          AND COALESCE(codice_aic_default, '') <> ''
+    """, (list(set(firme)),)).fetchall()
+    aic_default = {r['pattern_signature']: r['codice_aic_default'] for r in rows}
+
+    esiti = []
+    da_applicare = []
+    for anomalia, pattern_sig in zip(anomalie, firme):
+        codice_aic = aic_default.get(pattern_sig)
+        id_dettaglio = anomalia.get('id_dettaglio')
+        if codice_aic and id_dettaglio:
+            da_applicare.append((id_dettaglio, codice_aic, pattern_sig))
+            esiti.append((True, pattern_sig))
+        else:
+            esiti.append((False, pattern_sig))
+
+    if da_applicare:
+        db.execute("""
+            UPDATE ordini_dettaglio AS od
+            SET codice_aic = v.codice_aic
+            FROM unnest(%s::int[], %s::text[]) AS v(id_dettaglio, codice_aic)
+            WHERE od.id_dettaglio = v.id_dettaglio
+              AND (od.codice_aic IS NULL OR od.codice_aic = '' OR od.codice_aic !~ '^[0-9]{9}$')
+        """, ([d[0] for d in da_applicare], [d[1] for d in da_applicare]))
+        db.commit()
+        log_operations('AUTO_APPLY_AIC', 'ORDINI_DETTAGLIO', [
+            (id_dettaglio, f"AIC {codice_aic} applicato automaticamente da pattern {pattern_sig}")
+            for id_dettaglio, codice_aic, pattern_sig in da_applicare
+        ])
+
+    return esiti
+
+
+def crea_supervisioni_aic(id_testata: int, richieste: List[Tuple[int, Dict]]) -> List[int]:
+    """
+    Come crea_supervisione_aic per piu' anomalie dello stesso ordine:
+    INSERT multi-riga delle supervisioni e dei pattern mancanti.
+
+    Args:
+        id_testata: ID ordine in ORDINI_TESTATA
+        richieste: Lista di (id_anomalia, anomalia)
+
+    Returns:
+        ID supervisioni create, nell'ordine delle richieste
+    """
+    if not richieste:
+        return []
+    db = get_db()
+
+    righe = []
+    patterns = {}
+    for id_anomalia, anomalia in richieste:
+        vendor = anomalia.get('vendor', 'UNKNOWN')
+        descrizione = _descrizione_anomalia_aic(anomalia)
+        desc_norm = normalizza_descrizione(descrizione)
+        pattern_sig = calcola_pattern_signature(vendor, descrizione)
+        righe.append((
+            id_testata,
+            id_anomalia,
+            anomalia.get('id_dettaglio'),
+            'AIC-A01',
+            vendor,
+            anomalia.get('n_riga'),
+            descrizione[:100] if descrizione else '',
+            desc_norm,
+            anomalia.get('codice_originale', ''),
+            pattern_sig,
+        ))
+        patterns.setdefault(pattern_sig, (pattern_sig, f"AIC {vendor} - {desc_norm[:30]}", vendor, desc_norm))
+
+    ids = db.execute_insert("""
+        INSERT INTO supervisione_aic
+        (id_testata, id_anomalia, id_dettaglio, codice_anomalia, vendor,
+         n_riga, descrizione_prodotto, descrizione_normalizzata, codice_originale,
+         pattern_signature, stato)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, 'PENDING')
+        RETURNING id_supervisione
+    """, righe)
+
+    # Pattern nella tabella criteri (pattern_signature e' la PK)
+    db.execute_insert("""
+        INSERT INTO criteri_ordinari_aic
+        (pattern_signature, pattern_descrizione, vendor, descrizione_normalizzata)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (pattern_signature) DO NOTHING
+    """, list(patterns.values()))
+    db.commit()
+
+    log_operations('CREA_SUPERVISIONE', 'SUPERVISIONE_AIC', [
+        (id_supervisione, f"Creata supervisione AIC per ordine {id_testata}, prodotto {riga[7][:30]}")
+        for id_supervisione, riga in zip(ids, righe)
+    ])
+    return ids
@@ -5,9 +5,9 @@
 # =============================================================================
 
 import hashlib
-from typing import Dict
+from typing import Dict, List, Tuple
 
-from ...database_pg import get_db, log_operation
+from ...database_pg import get_db, log_operation, log_operations
 from .patterns import calcola_pattern_signature, normalizza_fascia_scostamento
 from .ml import _assicura_pattern_esistente
 
@@ -159,6 +159,75 @@ def _crea_supervisione_listino(
     return id_supervisione
 
 
+def crea_supervisioni_listino(id_testata: int, richieste: List[Tuple[int, Dict]]) -> List[int]:
+    """
+    Come _crea_supervisione_listino per piu' anomalie dello stesso ordine
+    (v11.7): INSERT multi-riga delle supervisioni e dei pattern mancanti,
+    numero di query indipendente dal numero di anomalie.
+
+    Le anomalie devono gia' contenere id_dettaglio (righe appena inserite).
+
+    Args:
+        id_testata: ID ordine in ORDINI_TESTATA
+        richieste: Lista di (id_anomalia, anomalia)
+
+    Returns:
+        ID supervisioni create, nell'ordine delle richieste
+    """
+    if not richieste:
+        return []
+    db = get_db()
+
+    righe = []
+    patterns = {}
+    for id_anomalia, anomalia in richieste:
+        vendor = anomalia.get('vendor', 'UNKNOWN')
+        codice_aic = anomalia.get('valore_anomalo', '')
+        codice_anomalia = anomalia.get('codice_anomalia', '')
+        pattern_sig = _calcola_pattern_signature_listino(vendor, codice_anomalia, codice_aic)
+        righe.append((
+            id_testata,
+            id_anomalia,
+            anomalia.get('id_dettaglio'),
+            codice_anomalia,
+            vendor,
+            codice_aic,
+            anomalia.get('n_riga'),
+            anomalia.get('descrizione', ''),
+            pattern_sig,
+        ))
+        patterns.setdefault(pattern_sig, (
+            pattern_sig,
+            f"Listino {vendor} - {codice_anomalia} - AIC {codice_aic}",
+            vendor,
+            codice_anomalia,
+            codice_aic,
+        ))
+
+    ids = db.execute_insert("""
+        INSERT INTO supervisione_listino
+        (id_testata, id_anomalia, id_dettaglio, codice_anomalia, vendor, codice_aic,
+         n_riga, descrizione_prodotto, pattern_signature, stato)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, 'PENDING')
+        RETURNING id_supervisione
+    """, righe)
+
+    # Pattern nella tabella criteri listino (pattern_signature e' la PK)
+    db.execute_insert("""
+        INSERT INTO criteri_ordinari_listino
+        (pattern_signature, pattern_descrizione, vendor, codice_anomalia, codice_aic)
+        VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT (pattern_signature) DO NOTHING
+    """, list(patterns.values()))
+    db.commit()
+
+    log_operations('CREA_SUPERVISIONE', 'SUPERVISIONE_LISTINO', [
+        (id_supervisione, f"Creata supervisione listino per ordine {id_testata}, AIC {riga[5]}")
+        for id_supervisione, riga in zip(ids, righe)
+    ])
+    return ids
+
+
 def _crea_supervisione_espositore(
     id_testata: int,
     id_anomalia: int,
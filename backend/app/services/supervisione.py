@@ -27,6 +27,7 @@ from .supervision import (
     genera_descrizione_pattern,
     # Requests
     crea_richiesta_supervisione,
+    crea_supervisioni_listino,
     blocca_ordine_per_supervisione,
     sblocca_ordine_se_completo,
     # Decisions
@@ -54,6 +55,7 @@ __all__ = [
     'normalizza_fascia_scostamento',
     'genera_descrizione_pattern',
     'crea_richiesta_supervisione',
+    'crea_supervisioni_listino',
     'blocca_ordine_per_supervisione',
     'sblocca_ordine_se_completo',
     'approva_supervisione',
@@ -0,0 +1,44 @@
+-- =============================================================================
+-- SERV.O v11.7 - CHIAVI NORMALIZZATE ANAGRAFICHE
+-- =============================================================================
+-- Lookup e report confrontavano MIN_ID, codice sito e P.IVA con espressioni
+-- calcolate riga per riga (LTRIM(min_id, '0'), LTRIM(REPLACE(...), '0')) che
+-- non usano gli indici sulle colonne originali.
+--
+-- Colonne generate (mantenute da PostgreSQL ad ogni INSERT/UPDATE di sync,
+-- import CSV e modifiche manuali) con le stesse espressioni e indice B-tree.
+-- NULL invece di stringa vuota: P.IVA o codice mancanti non si abbinano tra loro.
+-- Corrispondenti Python: services/lookup/keys.py
+-- =============================================================================
+
+ALTER TABLE anagrafica_farmacie
+    ADD COLUMN IF NOT EXISTS min_id_norm TEXT
+        GENERATED ALWAYS AS (NULLIF(LTRIM(min_id, '0'), '')) STORED,
+    ADD COLUMN IF NOT EXISTS piva_norm TEXT
+        GENERATED ALWAYS AS (NULLIF(LTRIM(REPLACE(COALESCE(partita_iva, ''), ' ', ''), '0'), '')) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_anagrafica_farmacie_min_id_norm ON anagrafica_farmacie(min_id_norm);
+CREATE INDEX IF NOT EXISTS idx_anagrafica_farmacie_piva_norm ON anagrafica_farmacie(piva_norm);
+
+ALTER TABLE anagrafica_parafarmacie
+    ADD COLUMN IF NOT EXISTS codice_sito_norm TEXT
+        GENERATED ALWAYS AS (NULLIF(LTRIM(codice_sito, '0'), '')) STORED,
+    ADD COLUMN IF NOT EXISTS piva_norm TEXT
+        GENERATED ALWAYS AS (NULLIF(LTRIM(REPLACE(COALESCE(partita_iva, ''), ' ', ''), '0'), '')) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_anagrafica_parafarmacie_codice_sito_norm ON anagrafica_parafarmacie(codice_sito_norm);
+CREATE INDEX IF NOT EXISTS idx_anagrafica_parafarmacie_piva_norm ON anagrafica_parafarmacie(piva_norm);
+
+ALTER TABLE anagrafica_clienti
+    ADD COLUMN IF NOT EXISTS min_id_norm TEXT
+        GENERATED ALWAYS AS (NULLIF(LTRIM(min_id, '0'), '')) STORED,
+    ADD COLUMN IF NOT EXISTS piva_norm TEXT
+        GENERATED ALWAYS AS (NULLIF(LTRIM(REPLACE(COALESCE(partita_iva, ''), ' ', ''), '0'), '')) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_anagrafica_clienti_min_id_norm ON anagrafica_clienti(min_id_norm);
+CREATE INDEX IF NOT EXISTS idx_anagrafica_clienti_piva_norm ON anagrafica_clienti(piva_norm);
+
+COMMENT ON COLUMN anagrafica_farmacie.min_id_norm IS 'MIN_ID senza zeri iniziali (v11.7)';
+COMMENT ON COLUMN anagrafica_farmacie.piva_norm IS 'P.IVA senza spazi e zeri iniziali (v11.7)';
+COMMENT ON COLUMN anagrafica_parafarmacie.codice_sito_norm IS 'Codice sito senza zeri iniziali (v11.7)';
+COMMENT ON COLUMN anagrafica_clienti.min_id_norm IS 'MIN_ID senza zeri iniziali (v11.7)';
@@ -0,0 +1,40 @@
+-- =============================================================================
+-- SERV.O v11.7 - CANDIDATI FUZZY PER SIMILARITA' TRIGRAMMI
+-- =============================================================================
+-- I candidati del fallback fuzzy di lookup_farmacia erano le prime 200 righe
+-- con citta LIKE '%ROMA%' OR cap LIKE '001%' (scansione completa, LIMIT prima
+-- di qualunque ordinamento): a Roma o Milano la farmacia giusta poteva non
+-- essere tra i candidati.
+--
+-- Chiave concatenata ragione sociale + indirizzo + CAP + citta' (colonna
+-- generata) con indice GIN pg_trgm: i candidati sono le righe con
+-- chiave estratta <% chiave_fuzzy ordinate per word_similarity() decrescente
+-- (un'estrazione parziale, es. solo CAP e citta', ha similarity() bassa
+-- rispetto alla chiave completa ma word_similarity() alta).
+-- Corrispondente Python (indice in memoria): services/lookup/keys.py
+-- =============================================================================
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE anagrafica_farmacie
+    ADD COLUMN IF NOT EXISTS chiave_fuzzy TEXT
+        GENERATED ALWAYS AS (
+            COALESCE(ragione_sociale, '') || ' ' || COALESCE(indirizzo, '') || ' ' ||
+            COALESCE(cap, '') || ' ' || COALESCE(citta, '')
+        ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_anagrafica_farmacie_chiave_fuzzy_trgm
+    ON anagrafica_farmacie USING GIN (chiave_fuzzy gin_trgm_ops);
+
+ALTER TABLE anagrafica_parafarmacie
+    ADD COLUMN IF NOT EXISTS chiave_fuzzy TEXT
+        GENERATED ALWAYS AS (
+            COALESCE(sito_logistico, '') || ' ' || COALESCE(indirizzo, '') || ' ' ||
+            COALESCE(cap, '') || ' ' || COALESCE(citta, '')
+        ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_anagrafica_parafarmacie_chiave_fuzzy_trgm
+    ON anagrafica_parafarmacie USING GIN (chiave_fuzzy gin_trgm_ops);
+
+COMMENT ON COLUMN anagrafica_farmacie.chiave_fuzzy IS 'Ragione sociale, indirizzo, CAP e citta per candidati fuzzy (v11.7)';
+COMMENT ON COLUMN anagrafica_parafarmacie.chiave_fuzzy IS 'Sito logistico, indirizzo, CAP e citta per candidati fuzzy (v11.7)';
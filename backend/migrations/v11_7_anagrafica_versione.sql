@@ -0,0 +1,19 @@
+-- =============================================================================
+-- SERV.O v11.7 - VERSIONE ANAGRAFICA FARMACIE/PARAFARMACIE
+-- =============================================================================
+-- Contatore incrementato da sync ministero, import CSV e pulizia delle
+-- anagrafiche. Backend e worker ingestion tengono in memoria un indice delle
+-- anagrafiche attive (services/lookup/index.py) e lo ricostruiscono quando la
+-- versione cambia (controllo ogni ANAGRAFICA_INDEX_CHECK_SECONDS secondi).
+-- =============================================================================
+
+CREATE TABLE IF NOT EXISTS anagrafica_versione (
+    id SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    versione BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO anagrafica_versione (id, versione) VALUES (1, 0)
+ON CONFLICT (id) DO NOTHING;
+
+COMMENT ON TABLE anagrafica_versione IS 'Versione anagrafiche per indice lookup in memoria (v11.7)';
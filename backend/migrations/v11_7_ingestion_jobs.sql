@@ -0,0 +1,46 @@
+-- =============================================================================
+-- SERV.O v11.7 - CODA INGESTION PDF
+-- =============================================================================
+-- Job di elaborazione PDF accodati dagli upload (UI e mail monitor) e presi
+-- in carico dai worker con SELECT ... FOR UPDATE SKIP LOCKED.
+--
+-- Stati: PENDING -> RUNNING -> DONE | FAILED
+--                           -> RETRY -> RUNNING ... -> DEAD (dead-letter)
+-- =============================================================================
+
+CREATE TABLE IF NOT EXISTS ingestion_jobs (
+    id_job SERIAL PRIMARY KEY,
+    filename VARCHAR(255) NOT NULL,
+    percorso_spool TEXT NOT NULL,
+    dimensione_bytes INTEGER,
+    fonte VARCHAR(30) DEFAULT 'UPLOAD',          -- UPLOAD, EMAIL, ...
+    stato VARCHAR(20) NOT NULL DEFAULT 'PENDING',
+    tentativi INTEGER NOT NULL DEFAULT 0,
+    max_tentativi INTEGER NOT NULL DEFAULT 3,
+    prossimo_tentativo TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    worker VARCHAR(100),
+    ultimo_errore TEXT,
+    risultato JSONB,
+    id_acquisizione INTEGER,
+    id_operatore INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    completed_at TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Indice parziale per il claim dei worker (solo job in attesa)
+CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_coda
+ON ingestion_jobs(prossimo_tentativo, id_job) WHERE stato IN ('PENDING', 'RETRY');
+
+CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_stato ON ingestion_jobs(stato, created_at DESC);
+
+-- Lease del worker: rinnovato durante l'elaborazione (heartbeat), scaduto =
+-- worker perso. recover_stale_jobs rimette in coda solo i job con lease scaduto.
+ALTER TABLE ingestion_jobs ADD COLUMN IF NOT EXISTS lease_scade TIMESTAMP;
+
+COMMENT ON TABLE ingestion_jobs IS 'Coda elaborazione PDF (v11.7)';
+COMMENT ON COLUMN ingestion_jobs.percorso_spool IS 'PDF salvato su disco in attesa di elaborazione';
+COMMENT ON COLUMN ingestion_jobs.stato IS 'PENDING, RUNNING, RETRY, DONE, FAILED, DEAD';
+COMMENT ON COLUMN ingestion_jobs.lease_scade IS 'Scadenza lease del worker (job RUNNING), rinnovata dal heartbeat';
+COMMENT ON COLUMN ingestion_jobs.risultato IS 'Risultato di process_pdf (status, vendor, ordini, righe, anomalie)';
@@ -0,0 +1,37 @@
+-- =============================================================================
+-- SERV.O v11.7 - CACHE RISULTATI LOOKUP
+-- =============================================================================
+-- lookup_cache: risultati di lookup_farmacia_extended per chiave normalizzata
+-- dei dati estratti (P.IVA, MIN_ID, CAP, impronta indirizzo), salvati solo con
+-- LOOKUP_CACHE_PERSIST=true e ricaricati all'avvio. versione = versione
+-- anagrafica (anagrafica_versione) con cui il risultato e' stato calcolato.
+--
+-- lookup_cache_invalidazioni: per ogni incremento di anagrafica_versione i
+-- MIN_ID/codici sito e P.IVA modificati (sync ministero), oppure tutto = TRUE
+-- (import CSV, pulizia, anagrafica clienti). Ogni processo scarta dalla
+-- propria cache solo le voci che dipendono da quei codici.
+-- Corrispondente Python: services/lookup/cache.py
+-- =============================================================================
+
+CREATE TABLE IF NOT EXISTS lookup_cache (
+    chiave TEXT PRIMARY KEY,
+    versione BIGINT NOT NULL,
+    risultato JSONB NOT NULL,
+    codici TEXT[] NOT NULL DEFAULT '{}',
+    pive TEXT[] NOT NULL DEFAULT '{}',
+    globale BOOLEAN NOT NULL DEFAULT FALSE,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_lookup_cache_updated_at ON lookup_cache(updated_at);
+
+CREATE TABLE IF NOT EXISTS lookup_cache_invalidazioni (
+    versione BIGINT PRIMARY KEY,
+    codici TEXT[] NOT NULL DEFAULT '{}',
+    pive TEXT[] NOT NULL DEFAULT '{}',
+    tutto BOOLEAN NOT NULL DEFAULT FALSE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON TABLE lookup_cache IS 'Risultati lookup farmacia per dati estratti (v11.7)';
+COMMENT ON TABLE lookup_cache_invalidazioni IS 'Codici modificati per versione anagrafica (v11.7)';
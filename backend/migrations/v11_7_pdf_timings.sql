@@ -0,0 +1,26 @@
+-- =============================================================================
+-- SERV.O v11.7 - TEMPI PIPELINE PDF
+-- =============================================================================
+-- Tempo wall e CPU per fase di process_pdf (hash, testo, ftfy, detect vendor,
+-- estrattore, listino, lookup, inserimenti, supervisione...), una riga per
+-- fase e acquisizione. La fase 'totale' riassume il PDF.
+-- Aggregati in GET /api/v1/upload/stats/performance.
+-- =============================================================================
+
+CREATE TABLE IF NOT EXISTS acquisizioni_tempi (
+    id_tempo SERIAL PRIMARY KEY,
+    id_acquisizione INTEGER NOT NULL,
+    vendor VARCHAR(50),
+    fase VARCHAR(30) NOT NULL,
+    wall_ms NUMERIC(12, 2) NOT NULL,
+    cpu_ms NUMERIC(12, 2) NOT NULL,
+    n_pagine INTEGER,
+    n_righe INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_acquisizioni_tempi_acq ON acquisizioni_tempi(id_acquisizione);
+CREATE INDEX IF NOT EXISTS idx_acquisizioni_tempi_periodo ON acquisizioni_tempi(created_at, vendor, fase);
+
+COMMENT ON TABLE acquisizioni_tempi IS 'Tempi per fase della pipeline PDF (v11.7)';
+COMMENT ON COLUMN acquisizioni_tempi.cpu_ms IS 'CPU del thread di elaborazione (o del processo di estrazione)';
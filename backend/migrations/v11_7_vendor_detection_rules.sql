@@ -0,0 +1,34 @@
+-- =============================================================================
+-- SERV.O v11.7 - REGOLE DETECTION VENDOR
+-- =============================================================================
+-- Regole dichiarative di services/extraction/detector.py. Al primo avvio la
+-- tabella e' popolata con DEFAULT_RULES; le modifiche si applicano senza
+-- riavvio con POST /api/v1/upload/vendors/detection-rules/reload (worker
+-- ingestion: automaticamente entro 30 secondi).
+--
+-- segnali: [{"tipo": "testo"|"compatto"|"regex", "valore": "...",
+--            "min": 1, "finestra": 500}]          tutti richiesti
+-- criteri: [{"peso": 0.25, "segnali": [...]}]      punteggio >= soglia
+-- =============================================================================
+
+CREATE TABLE IF NOT EXISTS vendor_detection_rules (
+    id_regola SERIAL PRIMARY KEY,
+    vendor VARCHAR(50) NOT NULL,
+    priorita INTEGER NOT NULL DEFAULT 100,
+    confidenza NUMERIC(4, 2),
+    soglia NUMERIC(4, 2),
+    segnali JSONB,
+    criteri JSONB,
+    attivo BOOLEAN NOT NULL DEFAULT TRUE,
+    note TEXT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT chk_detection_rule_tipo CHECK (
+        (segnali IS NOT NULL AND confidenza IS NOT NULL) OR (criteri IS NOT NULL AND soglia IS NOT NULL)
+    )
+);
+
+CREATE INDEX IF NOT EXISTS idx_vendor_detection_rules_priorita
+ON vendor_detection_rules(priorita, id_regola) WHERE attivo;
+
+COMMENT ON TABLE vendor_detection_rules IS 'Regole detection vendor PDF (v11.7)';
+COMMENT ON COLUMN vendor_detection_rules.priorita IS 'Minore = valutata prima; la prima regola soddisfatta decide';
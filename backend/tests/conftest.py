@@ -118,6 +118,16 @@ def cleanup_test_data():
         pass
 
 
+@pytest.fixture(autouse=True)
+def isolated_artefact_dir(tmp_path, monkeypatch):
+    """
+    v11.7: artefatti di estrazione PDF (salvati da extract_pdf_data e
+    process_pdf) in una directory temporanea invece di ARTEFACT_DIR.
+    """
+    from app.config import config
+    monkeypatch.setattr(config, 'ARTEFACT_DIR', str(tmp_path / 'artefacts'))
+
+
 # =============================================================================
 # SAMPLE DATA FIXTURES
 # =============================================================================
@@ -0,0 +1,394 @@
+# =============================================================================
+# SERV.O v11.7 - INDICE ANAGRAFICA IN MEMORIA TESTS
+# =============================================================================
+# Unit tests per AnagraficaIndex: stesse chiavi delle query di lookup
+# (LTRIM min_id, P.IVA normalizzata, similarita' trigrammi), lookup_farmacia
+# senza query SQL, ricostruzione quando cambia la versione nel DB.
+# Non richiedono PostgreSQL, tranne la parita' con la query pg_trgm
+# (TestSqlParity, saltati senza database).
+# =============================================================================
+
+import random
+import threading
+
+import numpy as np
+import pytest
+
+from app.config import config
+from app.services.lookup import index, keys, matching
+from app.services.lookup.index import FARMACIA, PARAFARMACIA, AnagraficaIndex, _Record
+
+
+def _farmacia(id_, min_id, piva, citta, cap, indirizzo='VIA ROMA 1', nome='FARMACIA', provincia='RM'):
+    return _Record(id_, min_id, piva, nome, indirizzo, cap, citta, provincia)
+
+
+_FARMACIE = [
+    _farmacia(1, '012345', '01234567890', 'ROMA', '00100', 'VIA APPIA 10', 'FARMACIA APPIA'),
+    _farmacia(2, '000777', '1234 5678 901', 'ROMA', '00165', 'VIA AURELIA 5', 'FARMACIA AURELIA'),
+    _farmacia(3, '888888', '99999999999', 'MILANO', '20100', 'CORSO BUENOS AIRES 3',
+              'FARMACIA BUENOS AIRES', 'MI'),
+    _farmacia(4, '888889', '99999999999', 'MILANO', '20121', 'VIA TORINO 8', 'FARMACIA TORINO', 'MI'),
+    _farmacia(5, '555555', '', 'FRASCATI', '00044', 'PIAZZA ROMA 2', 'FARMACIA CENTRALE'),
+]
+_PARAFARMACIE = [
+    _Record(10, 'PF001', '11111111111', 'PARAFARMACIA SOLE', 'VIA NAPOLI 4', '80100', 'NAPOLI', 'NA'),
+]
+
+
+def _random_records(rnd, n=600):
+    nomi = ['FARMACIA', 'CENTRALE', 'SAN', 'MARCO', 'ROSSI', 'DR.', 'NUOVA', "DELL'ORSO"]
+    strade = ['VIA ROMA', 'VIA APPIA', 'CORSO ITALIA', 'PIAZZA DANTE', 'VIALE MAZZINI']
+    comuni = ['ROMA', 'ROMANO', 'CASTEL ROMANO', 'MILANO', 'MILANO MARITTIMA', 'BARI', '']
+    records = [
+        _farmacia(i, f'{i:06d}', '', rnd.choice(comuni), rnd.choice(['00100', '00165', '20100', '']),
+                  f"{rnd.choice(strade)} {rnd.randint(1, 30)}", ' '.join(rnd.sample(nomi, 3)))
+        for i in range(1, n)
+    ]
+    rnd.shuffle(records)
+    return records
+
+
+def _estratto(rnd, r):
+    """Dati estratti da un ordine per il record r, con indirizzo e CAP a volte mancanti."""
+    return r.ragione_sociale, rnd.choice([r.indirizzo, '']), rnd.choice([r.cap, '']), r.citta
+
+
+class _NoSqlDb:
+    """Database che fallisce ad ogni query (lookup servito dall'indice)."""
+
+    def execute(self, sql, params=None):
+        raise AssertionError(f"query inattesa: {sql}")
+
+
+@pytest.fixture
+def anagrafica(monkeypatch):
+    idx = AnagraficaIndex(_FARMACIE, _PARAFARMACIE, farmacie_totali=len(_FARMACIE), versione=1)
+    monkeypatch.setattr(matching, 'get_anagrafica_index', lambda: idx)
+    monkeypatch.setattr(matching, 'get_db', lambda: _NoSqlDb())
+    return idx
+
+
+class TestIndexKeys:
+    """Test chiavi dell'indice equivalenti alle espressioni SQL."""
+
+    def test_codice_without_leading_zeros(self, anagrafica):
+        assert anagrafica.by_codice(FARMACIA, '777')['id_farmacia'] == 2
+        assert anagrafica.by_codice(PARAFARMACIA, 'PF001')['id_parafarmacia'] == 10
+        assert anagrafica.by_codice(FARMACIA, '999') is None
+
+    def test_piva_without_spaces_and_zeros(self, anagrafica):
+        assert [r['id_farmacia'] for r in anagrafica.by_piva(FARMACIA, '12345678901')] == [2]
+        assert [r['id_farmacia'] for r in anagrafica.by_piva(FARMACIA, '1234567890')] == [1]
+        assert [r['id_farmacia'] for r in anagrafica.by_piva(FARMACIA, '99999999999')] == [3, 4]
+
+    @pytest.mark.parametrize('limit', [index.FUZZY_CANDIDATES, 5])
+    def test_fuzzy_candidates_ranked_by_trigram(self, limit):
+        """
+        Candidati = word_similarity() >= soglia, per word similarity, similarity
+        e id: confronto con tutti i record, senza il taglio sul limite superiore.
+        """
+        rnd = random.Random(5)
+        records = _random_records(rnd)
+        idx = AnagraficaIndex(records, [], farmacie_totali=len(records))
+
+        def similarity(a, b):
+            comuni_ = len(a & b)
+            return comuni_ / (len(a) + len(b) - comuni_) if a or b else 0
+
+        for _ in range(30):
+            r = rnd.choice(records)
+            estratto = _estratto(rnd, r)
+            query = keys.trigrams(keys.chiave_fuzzy(*estratto))
+            ranked = []
+            for c in records:
+                sequenza = keys.trigram_sequence(keys.chiave_fuzzy(c.ragione_sociale, c.indirizzo, c.cap, c.citta))
+                ranked.append((-keys.word_similarity(query, sequenza), -similarity(query, set(sequenza)), c.id))
+            ranked.sort()
+            expected = [id_ for wsim, _, id_ in ranked if -wsim >= index.TRIGRAM_THRESHOLD][:limit]
+            found = [c['id_farmacia'] for c in idx.fuzzy_candidates(FARMACIA, *estratto, limit=limit)]
+            assert found == expected, estratto
+            if limit == index.FUZZY_CANDIDATES:
+                assert r.id in found
+
+    def test_extent_bound(self):
+        """Il limite usato per fermare la ricerca non e' mai sotto word_similarity()."""
+        rnd = random.Random(9)
+        records = _random_records(rnd, 300)
+        registry = AnagraficaIndex(records, [], farmacie_totali=len(records))._registries[FARMACIA]
+        positions = np.arange(len(registry.records))
+        for _ in range(20):
+            grams = keys.trigrams(keys.chiave_fuzzy(*_estratto(rnd, rnd.choice(records))))
+            query = {registry._trigram_ids.get(gram, -1 - n) for n, gram in enumerate(grams)}
+            bound = registry._extent_bound(positions, query, len(query))
+            for pos, r in enumerate(registry.records):
+                sequenza = [registry._trigram_ids[gram] for gram in
+                            keys.trigram_sequence(keys.chiave_fuzzy(r.ragione_sociale, r.indirizzo, r.cap, r.citta))]
+                assert bound[pos] >= keys.word_similarity(query, sequenza) - 1e-12
+
+    def test_fuzzy_candidates_rank_best_first(self):
+        """In una grande citta' la farmacia giusta e' tra i candidati anche oltre il limite per id."""
+        records = [_farmacia(i, f'{i:06d}', '', 'ROMA', '00100', f'VIA APPIA {i}', 'FARMACIA APPIA')
+                   for i in range(1, 400)]
+        records.append(_farmacia(400, '000400', '', 'ROMA', '00165', 'VIA AURELIA 5', 'FARMACIA AURELIA'))
+        idx = AnagraficaIndex(records, [], farmacie_totali=len(records))
+
+        found = idx.fuzzy_candidates(FARMACIA, 'FARMACIA AURELIA', 'VIA AURELIA 5', '00165', 'ROMA', limit=10)
+        assert found[0]['id_farmacia'] == 400
+        assert len(found) == 10
+
+    def test_fuzzy_candidates_sparse_extraction(self):
+        """Solo CAP e citta' estratti: similarity ~0.16 col record completo, ma resta candidato."""
+        records = [
+            _farmacia(1, '000001', '', 'MILANO', '20121', 'CORSO VITTORIO EMANUELE II 15',
+                      'FARMACIA SAN BABILA DOTT. ROSSI', 'MI'),
+            _farmacia(2, '000002', '', 'ROMA', '00100', 'VIA APPIA 10', 'FARMACIA APPIA'),
+        ]
+        idx = AnagraficaIndex(records, [], farmacie_totali=len(records))
+        query = keys.trigrams(keys.chiave_fuzzy('', '', '20121', 'MILANO'))
+        record = keys.trigrams(keys.chiave_fuzzy(records[0].ragione_sociale, records[0].indirizzo,
+                                                 records[0].cap, records[0].citta))
+        assert len(query & record) / len(query | record) < index.TRIGRAM_THRESHOLD
+
+        found = idx.fuzzy_candidates(FARMACIA, '', '', '20121', 'MILANO')
+        assert [c['id_farmacia'] for c in found] == [1]
+
+    def test_fuzzy_candidates_empty_key(self, anagrafica):
+        assert anagrafica.fuzzy_candidates(FARMACIA, '', '', '', '') == []
+        assert anagrafica.fuzzy_candidates(FARMACIA, '', '', '', '...') == []
+
+    def test_codice_by_id(self, anagrafica):
+        assert anagrafica.codice(FARMACIA, 3) == '888888'
+        assert anagrafica.codice(PARAFARMACIA, 10) == 'PF001'
+        assert anagrafica.codice(FARMACIA, 99) is None
+
+
+class TestLookupWithIndex:
+    """Test lookup_farmacia servito dall'indice, senza query."""
+
+    def test_min_id(self, anagrafica):
+        result = matching.lookup_farmacia({'codice_ministeriale': '0012345', 'partita_iva': '01234567890'})
+        assert result == (1, None, 'MIN_ID', 'FARMACIA', 100)
+
+    def test_min_id_piva_mismatch(self, anagrafica):
+        result = matching.lookup_farmacia({'codice_ministeriale': '012345', 'partita_iva': '55555555555'})
+        assert result == (1, None, 'MIN_ID_PIVA_MISMATCH', 'FARMACIA', 50)
+
+    def test_parafarmacia_by_codice_sito(self, anagrafica):
+        result = matching.lookup_farmacia({'codice_ministeriale': 'PF001'})
+        assert result == (None, 10, 'MIN_ID', 'PARAFARMACIA', 100)
+
+    def test_piva(self, anagrafica):
+        result = matching.lookup_farmacia({'partita_iva': '12345678901'})
+        assert result == (2, None, 'PIVA', 'FARMACIA', 100)
+
+    def test_piva_multipunto(self, anagrafica):
+        result = matching.lookup_farmacia({
+            'partita_iva': '99999999999', 'citta': 'MILANO', 'indirizzo': 'VIA TORINO 8',
+            'cap': '20121', 'provincia': 'MI',
+        })
+        assert result[:4] == (4, None, 'PIVA+FUZZY', 'FARMACIA')
+
+    def test_fuzzy(self, anagrafica):
+        id_farm, id_parafarm, method, source, score = matching.lookup_farmacia({
+            'ragione_sociale': 'FARMACIA AURELIA', 'citta': 'ROMA', 'indirizzo': 'VIA AURELIA 5',
+            'cap': '00165', 'provincia': 'RM',
+        })
+        assert (id_farm, method, source) == (2, 'FUZZY', 'FARMACIA')
+        assert score >= matching.FUZZY_THRESHOLD
+
+    def test_empty_registry(self, monkeypatch):
+        idx = AnagraficaIndex([], [], farmacie_totali=0)
+        monkeypatch.setattr(matching, 'get_anagrafica_index', lambda: idx)
+        assert matching.lookup_farmacia({'partita_iva': '12345678901'}) == \
+            (None, None, 'NESSUNO', 'FARMACIA', 0)
+
+    def test_extended_uses_indexed_min_id(self, anagrafica, monkeypatch):
+        chiamate = []
+        monkeypatch.setattr(matching, 'lookup_cliente_by_piva',
+                            lambda piva, min_id=None: chiamate.append((piva, min_id)) or None)
+        result = matching.lookup_farmacia_extended({'partita_iva': '12345678901'})
+        assert result['id_farmacia'] == 2
+        assert chiamate == [('12345678901', '000777')]
+
+
+class _VersionDb:
+    """Tabelle anagrafica e anagrafica_versione simulate."""
+
+    def __init__(self):
+        self.versione = 1
+        self.farmacie = [{'id_farmacia': 1, 'min_id': '012345', 'partita_iva': '01234567890',
+                          'ragione_sociale': 'FARMACIA APPIA', 'indirizzo': 'VIA APPIA 10',
+                          'cap': '00100', 'citta': 'ROMA', 'provincia': 'RM'}]
+        self.loads = 0
+
+    def execute(self, sql, params=None):
+        if 'UPDATE anagrafica_versione' in sql:
+            self.versione += 1
+            rows = []
+        elif 'anagrafica_versione' in sql:
+            rows = [{'versione': self.versione}]
+        elif 'COUNT(*)' in sql:
+            rows = [{0: len(self.farmacie)}]
+        elif 'FROM anagrafica_farmacie' in sql:
+            self.loads += 1
+            rows = self.farmacie
+        else:
+            rows = []
+
+        class _Cursor:
+            def fetchone(self):
+                return rows[0] if rows else None
+
+            def fetchall(self):
+                return rows
+        return _Cursor()
+
+    def commit(self):
+        pass
+
+
+_start_refresh = index._start_refresh
+
+
+@pytest.fixture
+def version_db(monkeypatch):
+    db = _VersionDb()
+    monkeypatch.setattr(index, 'get_db', lambda: db)
+    monkeypatch.setattr(index, '_index', None)
+    monkeypatch.setattr(index, '_checked_at', None)
+    monkeypatch.setattr(index, '_cache_loaded', False)
+    # Ricostruzione nel thread chiamante: i test leggono l'indice subito dopo
+    monkeypatch.setattr(index, '_start_refresh', index._refresh_index)
+    monkeypatch.setattr(config, 'ANAGRAFICA_INDEX', True)
+    monkeypatch.setattr(config, 'ANAGRAFICA_INDEX_CHECK_SECONDS', 3600)
+    return db
+
+
+class TestIndexVersion:
+    """Test ricostruzione dell'indice al cambio di versione."""
+
+    def test_sql_until_built(self, version_db, monkeypatch):
+        """La prima chiamata avvia la costruzione e usa le query SQL."""
+        monkeypatch.setattr(matching, 'get_db', lambda: version_db)
+        assert isinstance(matching._anagrafica(), matching._SqlAnagrafica)
+        assert isinstance(matching._anagrafica(), index.AnagraficaIndex)
+
+    def test_built_in_background(self, version_db, monkeypatch):
+        monkeypatch.setattr(index, '_start_refresh', _start_refresh)
+        assert index.get_anagrafica_index() is None
+        for thread in threading.enumerate():
+            if thread.name == 'anagrafica-index':
+                thread.join(timeout=10)
+        assert index.get_anagrafica_index().versione == 1
+        assert version_db.loads == 1
+
+    def test_loaded_once_within_check_interval(self, version_db):
+        index.get_anagrafica_index()
+        first = index.get_anagrafica_index()
+        assert first.versione == 1
+        assert index.get_anagrafica_index() is first
+        assert version_db.loads == 1
+
+    def test_rebuilt_after_change(self, version_db):
+        index.get_anagrafica_index()
+        first = index.get_anagrafica_index()
+        version_db.farmacie = version_db.farmacie + [dict(version_db.farmacie[0], id_farmacia=2, min_id='054321')]
+        index.anagrafica_changed()
+
+        # Indice precedente finche' la ricostruzione non e' completata
+        assert index.get_anagrafica_index() is first
+        second = index.get_anagrafica_index()
+        assert second is not first
+        assert second.versione == 2
+        assert second.by_codice(FARMACIA, '54321')['id_farmacia'] == 2
+        # Indice precedente invariato (gia' in uso da altri thread)
+        assert first.by_codice(FARMACIA, '54321') is None
+
+    def test_unchanged_version_not_reloaded(self, version_db, monkeypatch):
+        index.get_anagrafica_index()
+        first = index.get_anagrafica_index()
+        monkeypatch.setattr(index, '_checked_at', None)
+        assert index.get_anagrafica_index() is first
+        assert version_db.loads == 1
+
+    def test_cache_loaded_after_first_build(self, version_db, monkeypatch):
+        loaded = []
+        monkeypatch.setattr(index, 'load_lookup_cache', loaded.append)
+        index.get_anagrafica_index()
+        index.anagrafica_changed()
+        index.get_anagrafica_index()
+        assert index.get_anagrafica_index().versione == 2
+        assert loaded == [1]
+
+    def test_disabled(self, version_db, monkeypatch):
+        monkeypatch.setattr(config, 'ANAGRAFICA_INDEX', False)
+        assert index.get_anagrafica_index() is None
+        assert version_db.loads == 0
+
+    def test_load_error_falls_back_to_sql(self, version_db, monkeypatch):
+        def broken(db):
+            raise RuntimeError("relation anagrafica_versione does not exist")
+        monkeypatch.setattr(index, 'get_anagrafica_version', broken)
+        monkeypatch.setattr(matching, 'get_db', lambda: version_db)
+        assert index.get_anagrafica_index() is None
+        assert isinstance(matching._anagrafica(), matching._SqlAnagrafica)
+
+
+# =============================================================================
+# PARITA' CON LA QUERY SQL (richiede PostgreSQL con pg_trgm)
+# =============================================================================
+
+@pytest.fixture
+def pg_trgm_db():
+    """Connessione reale con pg_trgm; test saltato se non disponibile."""
+    psycopg2 = pytest.importorskip('psycopg2')
+    from app.database_pg import get_db
+    try:
+        db = get_db()
+        if not db.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'").fetchone():
+            pytest.skip("pg_trgm non installata")
+    except psycopg2.Error:
+        pytest.skip("PostgreSQL non disponibile")
+    yield db
+    db.rollback()
+
+
+class TestSqlParity:
+    """Candidati dell'indice = candidati della query pg_trgm di _SqlAnagrafica."""
+
+    def test_word_similarity(self, pg_trgm_db):
+        rnd = random.Random(11)
+        records = _random_records(rnd, 50)
+        for r in records:
+            query = keys.chiave_fuzzy(*_estratto(rnd, rnd.choice(records)))
+            chiave = keys.chiave_fuzzy(r.ragione_sociale, r.indirizzo, r.cap, r.citta)
+            atteso = pg_trgm_db.execute("SELECT word_similarity(%s, %s) AS w", (query, chiave)).fetchone()['w']
+            calcolato = keys.word_similarity(keys.trigrams(query), keys.trigram_sequence(chiave))
+            assert calcolato == pytest.approx(atteso, abs=1e-6), (query, chiave)
+
+    def test_candidates(self, pg_trgm_db):
+        rnd = random.Random(13)
+        records = _random_records(rnd)
+        idx = AnagraficaIndex(records, [], farmacie_totali=len(records))
+        pg_trgm_db.execute("""
+            CREATE TEMP TABLE anagrafica_parita (id_farmacia INTEGER, chiave_fuzzy TEXT) ON COMMIT DROP
+        """)
+        for r in records:
+            pg_trgm_db.execute("INSERT INTO anagrafica_parita VALUES (%s, %s)",
+                               (r.id, keys.chiave_fuzzy(r.ragione_sociale, r.indirizzo, r.cap, r.citta)))
+        pg_trgm_db.execute("SELECT set_config('pg_trgm.word_similarity_threshold', %s, true)",
+                           (str(index.TRIGRAM_THRESHOLD),))
+
+        for _ in range(30):
+            estratto = _estratto(rnd, rnd.choice(records))
+            chiave = keys.chiave_fuzzy(*estratto)
+            # Stessa query di _SqlAnagrafica.fuzzy_candidates
+            rows = pg_trgm_db.execute("""
+                SELECT id_farmacia FROM anagrafica_parita
+                WHERE %s <%% chiave_fuzzy
+                ORDER BY word_similarity(%s, chiave_fuzzy) DESC, similarity(chiave_fuzzy, %s) DESC, id_farmacia
+                LIMIT %s
+            """, (chiave, chiave, chiave, 20)).fetchall()
+            found = [c['id_farmacia'] for c in idx.fuzzy_candidates(FARMACIA, *estratto, limit=20)]
+            assert found == [r['id_farmacia'] for r in rows], estratto
@@ -0,0 +1,233 @@
+# =============================================================================
+# SERV.O v11.7 - CHIAVI NORMALIZZATE ANAGRAFICHE TESTS
+# =============================================================================
+# Unit tests per le chiavi min_id_norm / codice_sito_norm / piva_norm:
+# normalizzazione Python allineata alle colonne generate, script di
+# migrazione, query di lookup sulle colonne
+# normalizzate, chiave fuzzy, trigrammi e word_similarity come pg_trgm, lettura dei piani
+# EXPLAIN. Non richiedono PostgreSQL.
+# =============================================================================
+
+import random
+
+from app.scripts import explain_anagrafica_keys, migrate_db
+from app.services.lookup import keys, matching
+
+
+class _Cursor:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return list(self._rows)
+
+
+class _FakeDb:
+    def __init__(self, columns=(), rows=()):
+        self.columns = columns
+        self.rows = list(rows)
+        self.queries = []
+        self.scripts = []
+
+    def execute(self, sql, params=None):
+        self.queries.append((sql, params))
+        if 'information_schema' in sql:
+            return _Cursor([{'table_name': t, 'column_name': c} for t, c in self.columns])
+        return _Cursor(self.rows)
+
+    def executescript(self, script):
+        self.scripts.append(script)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+def _iterate_word_similarity(query, sequence):
+    """iterate_word_similarity() di pg_trgm (trgm_op.c) trascritta riga per riga."""
+    ulen1 = len(query)
+    lastpos = {}
+    ulen2 = count = 0
+    lower = -1
+    smlr_max = 0.0
+    for i, trg in enumerate(sequence):
+        found = trg in query
+        if lower >= 0 or found:
+            if trg not in lastpos:
+                ulen2 += 1
+                if found:
+                    count += 1
+            lastpos[trg] = i
+        if found:
+            upper = i
+            if lower == -1:
+                lower = i
+                ulen2 = 1
+            smlr_cur = count / (ulen1 + ulen2 - count)
+            tmp_count, tmp_ulen2, prev_lower = count, ulen2, lower
+            for tmp_lower in range(lower, upper + 1):
+                smlr_tmp = tmp_count / (ulen1 + tmp_ulen2 - tmp_count)
+                if smlr_tmp > smlr_cur:
+                    smlr_cur, ulen2, lower, count = smlr_tmp, tmp_ulen2, tmp_lower, tmp_count
+                tmp_trg = sequence[tmp_lower]
+                if lastpos[tmp_trg] == tmp_lower:
+                    tmp_ulen2 -= 1
+                    if tmp_trg in query:
+                        tmp_count -= 1
+            smlr_max = max(smlr_max, smlr_cur)
+            for tmp_lower in range(prev_lower, lower):
+                tmp_trg = sequence[tmp_lower]
+                if lastpos.get(tmp_trg) == tmp_lower:
+                    del lastpos[tmp_trg]
+    return smlr_max
+
+
+class TestNormalization:
+    """Test chiavi Python con le espressioni delle colonne generate."""
+
+    def test_codice(self):
+        assert keys.normalize_codice('000123') == '123'
+        assert keys.normalize_codice('PF001') == 'PF001'
+        assert keys.normalize_codice(None) == ''
+
+    def test_piva(self):
+        assert keys.normalize_piva_key('0123 4567 890') == '1234567890'
+        assert keys.normalize_piva_key('') == ''
+        assert keys.normalize_piva_key(None) == ''
+
+    def test_chiave_fuzzy(self):
+        assert keys.chiave_fuzzy('FARMACIA ROSSI', None, '00100', 'ROMA') == 'FARMACIA ROSSI  00100 ROMA'
+
+    def test_trigrams_as_pg_trgm(self):
+        """Stessi trigrammi di show_trgm()."""
+        assert keys.trigrams('Via-Roma') == {'  v', ' vi', 'via', 'ia ', '  r', ' ro', 'rom', 'oma', 'ma '}
+        assert keys.trigrams('S.N.C. 1') == {'  s', ' s ', '  n', ' n ', '  c', ' c ', '  1', ' 1 '}
+        assert keys.trigrams('Città') == {'  c', ' ci', 'cit', 'itt', 'ttà', 'tà '}
+        assert keys.trigrams('... _ ') == frozenset()
+        assert keys.trigrams(None) == frozenset()
+
+    def test_trigram_sequence(self):
+        """Trigrammi in ordine e con ripetizioni, come generate_trgm_only()."""
+        assert keys.trigram_sequence('Roma roma') == ['  r', ' ro', 'rom', 'oma', 'ma '] * 2
+        assert keys.trigram_sequence(None) == []
+
+    def test_word_similarity_as_iterate_word_similarity(self):
+        """Stesso risultato della procedura di trgm_op.c su sequenze con molte ripetizioni."""
+        rnd = random.Random(3)
+        for _ in range(3000):
+            sequence = [rnd.randrange(8) for _ in range(rnd.randint(0, 40))]
+            query = set(rnd.sample(range(10), rnd.randint(1, 6)))
+            assert keys.word_similarity(query, sequence) == _iterate_word_similarity(query, sequence), \
+                (query, sequence)
+
+    def test_word_similarity_as_pg_trgm(self):
+        """Stessi valori di word_similarity() di pg_trgm."""
+        def word_similarity(query, testo):
+            return keys.word_similarity(keys.trigrams(query), keys.trigram_sequence(testo))
+
+        # Esempio della documentazione di pg_trgm
+        assert word_similarity('word', 'two words') == 0.8
+        assert word_similarity('two words', 'two words') == 1
+        assert word_similarity('MILANO', 'FARMACIA ROSSI VIA ROMA 1 20121 MILANO') == 1
+        assert word_similarity('ROMA', 'MILANO') == 0
+        assert word_similarity('', 'MILANO') == 0
+        # Solo l'estensione contigua migliore: 'roma' e 'via' lontani nel testo
+        assert word_similarity('VIA ROMA', 'VIA APPIA 10 00100 ROMA') == 5 / 9
+
+
+class TestMigration:
+    """Test script di migrazione (applicati da scripts/migrate_db.py)."""
+
+    def test_migration_defines_all_columns(self):
+        script = (migrate_db.MIGRATIONS_DIR / 'v11_7_anagrafica_chiavi.sql').read_text(encoding='utf-8')
+        for table, column in keys.NORM_COLUMNS:
+            assert f"ADD COLUMN IF NOT EXISTS {column}" in script
+            assert f"ON {table}({column})" in script
+
+    def test_trigram_migration(self):
+        script = (migrate_db.MIGRATIONS_DIR / 'v11_7_anagrafica_trigrammi.sql').read_text(encoding='utf-8')
+        assert 'CREATE EXTENSION IF NOT EXISTS pg_trgm' in script
+        for table in ('anagrafica_farmacie', 'anagrafica_parafarmacie'):
+            assert f"ON {table} USING GIN (chiave_fuzzy gin_trgm_ops)" in script
+
+    def test_trigram_available(self, monkeypatch):
+        db = _FakeDb(columns=[(table, 'chiave_fuzzy') for table in keys.TRIGRAM_TABLES])
+        monkeypatch.setattr(keys, '_trigram_available', None)
+        assert keys.trigram_key_available(db) is True
+
+    def test_trigram_missing(self, monkeypatch):
+        db = _FakeDb(columns=[('anagrafica_farmacie', 'chiave_fuzzy')])
+        monkeypatch.setattr(keys, '_trigram_available', None)
+        assert keys.trigram_key_available(db) is False
+
+
+class TestNormalizedQueries:
+    """Test query di lookup sulle colonne normalizzate."""
+
+    def test_cliente_by_piva_and_min_id(self, monkeypatch):
+        db = _FakeDb(rows=[{'min_id': '012345', 'deposito_riferimento': 'CT',
+                            'ragione_sociale_1': 'FARMACIA', 'codice_cliente': 'C1'}])
+        monkeypatch.setattr(matching, 'get_db', lambda: db)
+
+        cliente = matching.lookup_cliente_by_piva('01234567890', min_id='0012345')
+        assert cliente['deposito_riferimento'] == 'CT'
+        sql, params = db.queries[0]
+        assert 'piva_norm = %s AND min_id_norm = %s' in sql
+        assert 'LTRIM' not in sql
+        assert params == ('1234567890', '12345')
+
+    def test_sql_fallback_fuzzy_by_trigram(self, monkeypatch):
+        monkeypatch.setattr(keys, '_trigram_available', True)
+        db = _FakeDb()
+        matching._SqlAnagrafica(db).fuzzy_candidates(
+            matching.FARMACIA, 'FARMACIA ROSSI', 'VIA ROMA 1', '00100', 'ROMA', limit=50)
+        threshold_sql, threshold_params = db.queries[0]
+        assert 'pg_trgm.word_similarity_threshold' in threshold_sql
+        assert threshold_params == (str(matching.TRIGRAM_THRESHOLD),)
+        sql, params = db.queries[1]
+        assert '%s <%% chiave_fuzzy' in sql
+        assert 'ORDER BY word_similarity(%s, chiave_fuzzy) DESC, similarity(chiave_fuzzy, %s) DESC' in sql
+        assert params == ('FARMACIA ROSSI VIA ROMA 1 00100 ROMA',) * 3 + (50,)
+
+    def test_sql_fallback_fuzzy_without_trigram(self, monkeypatch):
+        monkeypatch.setattr(keys, '_trigram_available', False)
+        db = _FakeDb()
+        matching._SqlAnagrafica(db).fuzzy_candidates(matching.FARMACIA, 'FARMACIA ROSSI', '', '00100', 'ROMA')
+        sql, params = db.queries[0]
+        assert 'citta LIKE %s' in sql
+        assert params == ['%ROMA%', '%ROMA%', '00100%', matching.FUZZY_CANDIDATES]
+
+    def test_sql_fallback_uses_norm_columns(self):
+        db = _FakeDb()
+        anagrafica = matching._SqlAnagrafica(db)
+        anagrafica.by_codice(matching.PARAFARMACIA, '123')
+        anagrafica.by_piva(matching.FARMACIA, '1234567890')
+        assert 'codice_sito_norm = %s' in db.queries[0][0]
+        assert 'piva_norm = %s' in db.queries[1][0]
+
+
+class TestExplainPlan:
+    """Test lettura indici dal piano EXPLAIN (FORMAT JSON)."""
+
+    def test_nested_index_names(self):
+        plan = {
+            'Node Type': 'Hash Join',
+            'Plans': [
+                {'Node Type': 'Seq Scan', 'Relation Name': 'ordini_testata'},
+                {'Node Type': 'BitmapOr', 'Plans': [
+                    {'Node Type': 'Bitmap Index Scan', 'Index Name': 'idx_anagrafica_clienti_piva_norm'},
+                    {'Node Type': 'Bitmap Index Scan', 'Index Name': 'idx_anagrafica_clienti_min_id_norm'},
+                ]},
+            ],
+        }
+        assert explain_anagrafica_keys.plan_indexes(plan) == {
+            'idx_anagrafica_clienti_piva_norm', 'idx_anagrafica_clienti_min_id_norm',
+        }
+
+    def test_seq_scan(self):
+        assert explain_anagrafica_keys.plan_indexes({'Node Type': 'Seq Scan'}) == set()
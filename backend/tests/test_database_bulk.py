@@ -0,0 +1,169 @@
+# =============================================================================
+# SERV.O v11.7 - BULK COPY / UPSERT TESTS
+# =============================================================================
+# Unit tests per encoder formato COPY, stream righe e SQL di bulk_upsert /
+# bulk_update. Non richiedono PostgreSQL.
+# =============================================================================
+
+import io
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+
+from app import database_pg
+from app.database_pg import (
+    PostgreSQLConnection, encode_copy_value, bulk_copy, bulk_upsert, bulk_update,
+)
+
+
+class TestEncodeCopyValue:
+    """Test codifica valori nel formato testo di COPY."""
+
+    def test_null_and_scalars(self):
+        assert encode_copy_value(None) == '\\N'
+        assert encode_copy_value(True) == 't'
+        assert encode_copy_value(False) == 'f'
+        assert encode_copy_value(42) == '42'
+        assert encode_copy_value(Decimal('5.250')) == '5.250'
+
+    def test_dates(self):
+        assert encode_copy_value(date(2026, 1, 31)) == '2026-01-31'
+        assert encode_copy_value(datetime(2026, 1, 31, 8, 30)) == '2026-01-31T08:30:00'
+
+    def test_special_characters_escaped(self):
+        """Tab, newline e backslash non devono spezzare riga/colonna."""
+        assert encode_copy_value('VIA ROMA\t12\nINT. 3\\B') == 'VIA ROMA\\t12\\nINT. 3\\\\B'
+
+    def test_json_and_bytes(self):
+        assert encode_copy_value({'q': 1}) == '{"q": 1}'
+        assert encode_copy_value(b'\x00\xff') == '\\\\x00ff'
+
+
+class TestCopyStream:
+    """Test stream file-like letto da copy_expert."""
+
+    def test_rows_encoded_lazily(self):
+        stream = database_pg._CopyStream(iter([(1, 'a'), (2, None)]), 2)
+        assert stream.read(4) == '1\ta\n'
+        assert stream.count == 1
+        assert stream.read(100) == '2\t\\N\n'
+        assert stream.read(100) == ''
+        assert stream.count == 2
+
+    def test_wrong_column_count(self):
+        stream = database_pg._CopyStream([(1, 'a', 'extra')], 2)
+        with pytest.raises(ValueError):
+            stream.read()
+
+
+class _CopyCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = 3
+
+    def copy_expert(self, sql, file, size=8192):
+        self.conn.log.append(sql)
+        data = io.StringIO()
+        while True:
+            chunk = file.read(size)
+            if not chunk:
+                break
+            data.write(chunk)
+        self.conn.copied.append(data.getvalue())
+
+    def execute(self, sql, params=None):
+        self.conn.log.append(sql)
+
+    def fetchone(self):
+        return {'inserted': 2, 'updated': 1}
+
+    def close(self):
+        pass
+
+
+class _CopyConnection:
+    """Connessione finta che registra statement e dati COPY."""
+
+    def __init__(self):
+        self.log = []
+        self.copied = []
+        self.closed = 0
+        self.status = 1
+        self.autocommit = False
+
+    def cursor(self, cursor_factory=None):
+        return _CopyCursor(self)
+
+    def rollback(self):
+        self.log.append('ROLLBACK')
+
+    def commit(self):
+        self.log.append('COMMIT')
+
+
+class TestBulkCopy:
+    """Test bulk_copy / bulk_upsert / bulk_update."""
+
+    def test_copy_streams_rows(self):
+        raw = _CopyConnection()
+        db = PostgreSQLConnection(raw)
+        n = bulk_copy('listini_vendor', ['vendor', 'codice_aic'],
+                      (('CODIFI', f'{i:09d}') for i in range(3)), db=db)
+        assert n == 3
+        assert raw.log == ["COPY listini_vendor (vendor, codice_aic) FROM STDIN"]
+        assert raw.copied[0] == 'CODIFI\t000000000\nCODIFI\t000000001\nCODIFI\t000000002\n'
+        assert 'COMMIT' not in raw.log
+
+    def test_invalid_identifier_rejected(self):
+        db = PostgreSQLConnection(_CopyConnection())
+        with pytest.raises(ValueError):
+            bulk_copy('listini_vendor; DROP TABLE x', ['a'], [], db=db)
+        with pytest.raises(ValueError):
+            bulk_upsert('t', ['a', 'b c'], [], conflict_columns=['a'], db=db)
+
+    def test_upsert_through_staging(self):
+        raw = _CopyConnection()
+        db = PostgreSQLConnection(raw)
+        inserted, updated = bulk_upsert(
+            'listini_vendor', ['vendor', 'codice_aic', 'descrizione'],
+            [('CODIFI', '012345678', 'A'), ('CODIFI', '087654321', 'B')],
+            conflict_columns=['vendor', 'codice_aic'],
+            extra_values={'attivo': 'TRUE'},
+            db=db,
+        )
+        assert (inserted, updated) == (2, 1)
+        assert raw.log[1].startswith('CREATE TEMP TABLE _stg_listini_vendor ON COMMIT DROP')
+        assert raw.log[3] == "COPY _stg_listini_vendor (vendor, codice_aic, descrizione) FROM STDIN"
+        upsert = raw.log[4]
+        assert upsert.startswith('WITH upserted AS (INSERT INTO listini_vendor (vendor, codice_aic, descrizione, attivo)')
+        assert 'DISTINCT ON (vendor, codice_aic)' in upsert
+        assert 'DO UPDATE SET descrizione = EXCLUDED.descrizione, attivo = EXCLUDED.attivo' in upsert
+
+    def test_upsert_sql_do_nothing_and_update_extra(self):
+        sql = database_pg._bulk_upsert_sql(
+            'anagrafica_farmacie', ['min_id', 'citta'], '_stg', ['min_id'], [], {}, {})
+        assert 'ON CONFLICT (min_id) DO NOTHING' in sql
+
+        sql = database_pg._bulk_upsert_sql(
+            'anagrafica_clienti', ['codice_cliente', 'cap'], '_stg', ['codice_cliente'], ['cap'],
+            {'data_import': 'CURRENT_TIMESTAMP'}, {'data_aggiornamento': 'CURRENT_TIMESTAMP'})
+        assert ('DO UPDATE SET cap = EXCLUDED.cap, data_import = EXCLUDED.data_import, '
+                'data_aggiornamento = CURRENT_TIMESTAMP') in sql
+
+    def test_update_from_staging(self):
+        raw = _CopyConnection()
+        db = PostgreSQLConnection(raw)
+        updated = bulk_update(
+            'anagrafica_farmacie', ['min_id', 'citta'], [('000123456', 'ROMA')],
+            key_columns=['min_id'], extra_values={'data_import': 'CURRENT_TIMESTAMP'}, db=db,
+        )
+        assert updated == 3
+        assert (
+            "UPDATE anagrafica_farmacie t SET citta = s.citta, data_import = CURRENT_TIMESTAMP "
+            "FROM _stg_anagrafica_farmacie s WHERE t.min_id = s.min_id"
+        ) in raw.log
+
+    def test_update_requires_key_in_columns(self):
+        with pytest.raises(ValueError):
+            bulk_update('t', ['a'], [], key_columns=['id'], db=PostgreSQLConnection(_CopyConnection()))
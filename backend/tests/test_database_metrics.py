@@ -0,0 +1,140 @@
+# =============================================================================
+# SERV.O v11.7 - DATABASE QUERY METRICS TESTS
+# =============================================================================
+# Unit tests per registry metriche query e slow query log.
+# Non richiedono PostgreSQL.
+# =============================================================================
+
+import logging
+
+import pytest
+
+from app import database_pg
+from app.database_pg import PostgreSQLConnection
+
+
+class _Cursor:
+    def __init__(self, rowcount=3, fail=False):
+        self.rowcount = rowcount
+        self._fail = fail
+
+    def execute(self, sql, params=None):
+        if self._fail:
+            raise RuntimeError("boom")
+
+    def fetchone(self):
+        return None
+
+    def close(self):
+        pass
+
+
+class _Connection:
+    def __init__(self, fail=False):
+        self.closed = 0
+        self.status = 1
+        self.autocommit = False
+        self._fail = fail
+
+    def cursor(self, cursor_factory=None):
+        return _Cursor(fail=self._fail)
+
+    def rollback(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def clean_stats(monkeypatch):
+    monkeypatch.setattr(database_pg.config, 'PG_QUERY_STATS', True)
+    database_pg.reset_query_stats()
+    yield
+    database_pg.reset_query_stats()
+
+
+class TestFingerprint:
+    """Test normalizzazione statement."""
+
+    def test_literals_and_spacing(self):
+        fp = database_pg.sql_fingerprint("SELECT *\n  FROM ordini_testata WHERE stato = 'ESTRATTO'  LIMIT 50")
+        assert fp == "SELECT * FROM ordini_testata WHERE stato = ? LIMIT ?"
+
+    def test_in_lists_collapsed(self):
+        a = database_pg.sql_fingerprint("SELECT 1 FROM anomalie WHERE id_testata IN (%s, %s)")
+        b = database_pg.sql_fingerprint("SELECT 1 FROM anomalie WHERE id_testata IN (%s,%s,%s,%s)")
+        assert a == b
+
+
+class TestQueryStats:
+    """Test raccolta metriche da PostgreSQLConnection."""
+
+    def test_execute_recorded(self):
+        db = PostgreSQLConnection(_Connection())
+        for i in range(5):
+            db.execute("SELECT * FROM anomalie WHERE id_testata = %s", (i,))
+
+        data = database_pg.get_query_stats()
+        assert data['statements'] == 1
+        item = data['items'][0]
+        assert item['calls'] == 5
+        assert item['rows'] == 15
+        assert item['errors'] == 0
+        assert item['p50_ms'] <= item['p95_ms'] <= item['p99_ms'] <= item['max_ms'] + 1e-9
+        # Chiamante: il modulo di test, non database_pg
+        assert list(item['callers']) == [__name__]
+
+    def test_errors_counted(self):
+        db = PostgreSQLConnection(_Connection(fail=True))
+        with pytest.raises(RuntimeError):
+            db.execute("SELECT * FROM ordini_testata WHERE id_testata = %s", (1,))
+        assert database_pg.get_query_stats()['items'][0]['errors'] == 1
+
+    @pytest.mark.parametrize('order_by', ['callers', 'fingerprint', 'nonesiste'])
+    def test_order_by_not_numeric_defaults_to_total(self, order_by):
+        """Solo metriche numeriche: callers (dict) o fingerprint ordinano per total_ms."""
+        db = PostgreSQLConnection(_Connection())
+        db.execute("SELECT 1")
+        db.execute("SELECT 2 FROM anomalie")
+        items = database_pg.get_query_stats(order_by=order_by)['items']
+        assert [i['total_ms'] for i in items] == sorted((i['total_ms'] for i in items), reverse=True)
+
+    def test_order_by_calls(self):
+        db = PostgreSQLConnection(_Connection())
+        db.execute("SELECT 1")
+        for _ in range(3):
+            db.execute("SELECT * FROM anomalie WHERE id_testata = %s", (1,))
+        assert database_pg.get_query_stats(order_by='calls')['items'][0]['calls'] == 3
+
+    def test_reset(self):
+        db = PostgreSQLConnection(_Connection())
+        db.execute("SELECT 1")
+        database_pg.reset_query_stats()
+        assert database_pg.get_query_stats()['statements'] == 0
+
+    def test_disabled(self, monkeypatch):
+        monkeypatch.setattr(database_pg.config, 'PG_QUERY_STATS', False)
+        PostgreSQLConnection(_Connection()).execute("SELECT 1")
+        assert database_pg.get_query_stats()['statements'] == 0
+
+    def test_percentile_from_histogram(self):
+        stats = database_pg._StatementStats()
+        for ms in [1.0] * 90 + [100.0] * 10:
+            stats.calls += 1
+            stats.max_ms = max(stats.max_ms, ms)
+            stats.buckets[database_pg.bisect.bisect_left(database_pg._LATENCY_BUCKETS_MS, ms)] += 1
+        assert 1.0 <= stats.percentile(50) < 1.3
+        assert 80 <= stats.percentile(99) <= 100.0
+
+
+class TestSlowQueryLog:
+    """Test log query lente."""
+
+    def test_slow_query_logs_param_shape(self, monkeypatch, caplog):
+        monkeypatch.setattr(database_pg.config, 'PG_SLOW_QUERY_MS', 0)
+        db = PostgreSQLConnection(_Connection())
+        with caplog.at_level(logging.WARNING, logger='database_pg'):
+            db.execute("SELECT * FROM anagrafica_farmacie WHERE min_id = %s AND cap = %s",
+                       ('SEGRETO123', None))
+
+        assert 'Slow query' in caplog.text
+        assert '(str[10], None)' in caplog.text
+        assert 'SEGRETO123' not in caplog.text
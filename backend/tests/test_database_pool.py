@@ -0,0 +1,374 @@
+# =============================================================================
+# SERV.O v11.7 - DATABASE SCOPED CONNECTION TESTS
+# =============================================================================
+# Unit tests per db_scope()/get_db(): checkout per scope dal pool, rilascio,
+# commit/rollback. Usa un pool finto, non richiede PostgreSQL.
+# =============================================================================
+
+import asyncio
+import threading
+
+import pytest
+import psycopg2.extensions
+
+from app import database_pg
+
+
+class FakeRawConnection:
+    """Connessione psycopg2 minimale: traccia commit/rollback."""
+
+    def __init__(self, n):
+        self.n = n
+        self.closed = 0
+        self.autocommit = True
+        self.status = psycopg2.extensions.STATUS_READY
+        self.tx_status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        self.commits = 0
+        self.rollbacks = 0
+
+    def get_transaction_status(self):
+        return self.tx_status
+
+    def commit(self):
+        self.commits += 1
+        self.tx_status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.tx_status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+
+class FakePool:
+    """Pool thread-safe con contatori di checkout."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._free = []
+        self._created = 0
+        self.in_use = set()
+        self.checkout_threads = []
+
+    def getconn(self):
+        with self._lock:
+            if self._free:
+                conn = self._free.pop()
+            else:
+                self._created += 1
+                conn = FakeRawConnection(self._created)
+            self.in_use.add(conn)
+            self.checkout_threads.append(threading.get_ident())
+            return conn
+
+    def putconn(self, conn, close=False):
+        with self._lock:
+            self.in_use.discard(conn)
+            if not close:
+                self._free.append(conn)
+
+
+@pytest.fixture
+def fake_pool(monkeypatch):
+    """Sostituisce pool e semaforo del modulo con versioni finte."""
+    fake = FakePool()
+    monkeypatch.setattr(database_pg, '_pool', fake)
+    monkeypatch.setattr(database_pg, '_pool_slots', threading.BoundedSemaphore(4))
+    monkeypatch.setattr(database_pg.config, 'PG_POOL_ACQUIRE_TIMEOUT', 0.2)
+    return fake
+
+
+class TestDbScope:
+    """Test checkout/rilascio connessioni per scope."""
+
+    def test_get_db_inside_scope_returns_scoped_connection(self, fake_pool):
+        """Dentro uno scope get_db() ritorna sempre la stessa connessione dedicata."""
+        with database_pg.db_scope():
+            db1 = database_pg.get_db()
+            db2 = database_pg.get_db()
+            assert db1 is db2
+            assert db1._scoped is True
+            assert db1._conn in fake_pool.in_use
+
+        assert not fake_pool.in_use
+
+    def test_lazy_checkout(self, fake_pool):
+        """Uno scope che non usa il database non prende connessioni."""
+        with database_pg.db_scope() as scope:
+            assert scope.connection is None
+        assert fake_pool._created == 0
+
+    def test_commit_on_success(self, fake_pool):
+        """Transazione aperta committata all'uscita normale dallo scope."""
+        with database_pg.db_scope():
+            raw = database_pg.get_db()._conn
+            raw.tx_status = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+
+        assert raw.commits == 1
+        assert raw.rollbacks == 0
+
+    def test_rollback_on_exception(self, fake_pool):
+        """Eccezione nello scope: rollback e connessione restituita al pool."""
+        with pytest.raises(ValueError):
+            with database_pg.db_scope():
+                raw = database_pg.get_db()._conn
+                raw.tx_status = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+                raise ValueError("boom")
+
+        assert raw.commits == 0
+        assert raw.rollbacks == 1
+        assert not fake_pool.in_use
+
+    def test_nested_scope_reuses_outer(self, fake_pool):
+        """Scope annidati condividono la connessione dello scope esterno."""
+        with database_pg.db_scope():
+            outer = database_pg.get_db()
+            with database_pg.db_scope():
+                assert database_pg.get_db() is outer
+            assert outer._conn in fake_pool.in_use
+
+    def test_close_is_noop_for_scoped(self, fake_pool):
+        """db.close() del codice legacy non rilascia la connessione dello scope."""
+        with database_pg.db_scope():
+            db = database_pg.get_db()
+            db.close()
+            assert db._conn in fake_pool.in_use
+        assert not fake_pool.in_use
+
+    def test_threads_get_distinct_connections(self, fake_pool):
+        """Scope in thread diversi lavorano su connessioni diverse."""
+        barrier = threading.Barrier(3)
+        seen = []
+
+        def worker():
+            with database_pg.db_scope():
+                seen.append(database_pg.get_db()._conn)
+                barrier.wait(timeout=2)
+
+        threads = [threading.Thread(target=worker) for _ in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len({id(c) for c in seen}) == 3
+        assert not fake_pool.in_use
+
+    def test_pool_exhausted_raises_timeout(self, fake_pool, monkeypatch):
+        """Senza slot liberi il checkout fallisce dopo PG_POOL_ACQUIRE_TIMEOUT."""
+        monkeypatch.setattr(database_pg, '_pool_slots', threading.BoundedSemaphore(1))
+
+        with database_pg.db_scope():
+            database_pg.get_db()
+            errors = []
+
+            def worker():
+                try:
+                    with database_pg.db_scope():
+                        database_pg.get_db()
+                except database_pg.PoolTimeoutError as e:
+                    errors.append(e)
+
+            t = threading.Thread(target=worker)
+            t.start()
+            t.join()
+
+        assert len(errors) == 1
+
+
+class TestDbSession:
+    """Test dependency FastAPI db_session."""
+
+    def test_dependency_releases_connection(self, fake_pool):
+        """Il generatore rilascia la connessione alla chiusura."""
+        gen = database_pg.db_session()
+        db = next(gen)
+        assert db._conn in fake_pool.in_use
+        with pytest.raises(StopIteration):
+            next(gen)
+        assert not fake_pool.in_use
+
+    def test_dependency_reuses_request_scope(self, fake_pool):
+        """Con il middleware attivo la dependency usa la connessione della richiesta."""
+        with database_pg.db_scope():
+            request_db = database_pg.get_db()
+            gen = database_pg.db_session()
+            assert next(gen) is request_db
+            gen.close()
+            assert request_db._conn in fake_pool.in_use
+
+
+class FakeRequest:
+    """Request minimale per prefetch_db_connection: solo scope['endpoint']."""
+
+    def __init__(self, endpoint):
+        self.scope = {'endpoint': endpoint}
+
+
+def _run_middleware(app):
+    """Esegue DbScopeMiddleware su una richiesta HTTP, ritorna i messaggi inviati."""
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        sent.append(message)
+
+    middleware = database_pg.DbScopeMiddleware(app)
+    asyncio.run(middleware({'type': 'http', 'path': '/'}, receive, send))
+    return sent
+
+
+class TestDbScopeMiddleware:
+    """Test scope per richiesta: rilascio all'invio della risposta, mai sull'event loop."""
+
+    def test_released_before_streaming_body(self, fake_pool):
+        """La connessione torna al pool a http.response.start, prima del body."""
+        seen = {}
+
+        async def app(scope, receive, send):
+            raw = database_pg.get_db()._conn
+            raw.tx_status = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+            await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+            seen['raw'] = raw
+            seen['in_use_during_body'] = set(fake_pool.in_use)
+            await send({'type': 'http.response.body', 'body': b'ok'})
+
+        _run_middleware(app)
+
+        assert seen['in_use_during_body'] == set()
+        assert seen['raw'].commits == 1
+
+    def test_get_db_after_response_start_gets_new_connection(self, fake_pool):
+        """get_db() durante lo streaming riprende una connessione, rilasciata a fine richiesta."""
+        async def app(scope, receive, send):
+            database_pg.get_db()
+            await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+            database_pg.get_db()
+            assert len(fake_pool.in_use) == 1
+            await send({'type': 'http.response.body', 'body': b''})
+
+        _run_middleware(app)
+        assert not fake_pool.in_use
+
+    def test_rollback_on_exception(self, fake_pool):
+        """Eccezione non gestita prima della risposta: rollback e rilascio."""
+        seen = {}
+
+        async def app(scope, receive, send):
+            raw = database_pg.get_db()._conn
+            raw.tx_status = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+            seen['raw'] = raw
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError):
+            _run_middleware(app)
+
+        assert seen['raw'].rollbacks == 1
+        assert seen['raw'].commits == 0
+        assert not fake_pool.in_use
+
+    def test_release_off_event_loop(self, fake_pool, monkeypatch):
+        """Commit/rollback di rilascio girano in un thread, non sull'event loop."""
+        release_threads = []
+        original = database_pg._release
+
+        def tracking_release(db, commit):
+            release_threads.append(threading.get_ident())
+            original(db, commit)
+
+        monkeypatch.setattr(database_pg, '_release', tracking_release)
+
+        async def app(scope, receive, send):
+            app.loop_thread = threading.get_ident()
+            await database_pg.prefetch_db_connection(FakeRequest(app))
+            await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+
+        _run_middleware(app)
+
+        assert release_threads
+        assert app.loop_thread not in release_threads
+
+
+class TestPrefetchDbConnection:
+    """Test dependency globale per gli endpoint async def."""
+
+    def test_async_endpoint_checkout_in_thread(self, fake_pool):
+        """Endpoint async: checkout fatto fuori dall'event loop, get_db() lo riusa."""
+        async def endpoint():
+            pass
+
+        async def app(scope, receive, send):
+            app.loop_thread = threading.get_ident()
+            await database_pg.prefetch_db_connection(FakeRequest(endpoint))
+            app.prefetched = database_pg._current_scope.get().connection
+            assert database_pg.get_db() is app.prefetched
+            await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+
+        _run_middleware(app)
+
+        assert app.prefetched is not None
+        assert len(fake_pool.checkout_threads) == 1
+        assert fake_pool.checkout_threads[0] != app.loop_thread
+
+    def test_sync_endpoint_stays_lazy(self, fake_pool):
+        """Endpoint sync (threadpool): nessun checkout anticipato."""
+        def endpoint():
+            pass
+
+        async def app(scope, receive, send):
+            await database_pg.prefetch_db_connection(FakeRequest(endpoint))
+            await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+
+        _run_middleware(app)
+        assert fake_pool._created == 0
+
+    def test_connection_error_left_to_handler(self, fake_pool, monkeypatch):
+        """Database irraggiungibile: nessuna eccezione, il get_db() dell'handler la ripete."""
+        def failing_checkout():
+            raise psycopg2.OperationalError("connection refused")
+
+        monkeypatch.setattr(database_pg, '_checkout', failing_checkout)
+
+        async def endpoint():
+            pass
+
+        async def main():
+            state = database_pg._DbScope()
+            token = database_pg._current_scope.set(state)
+            try:
+                await database_pg.prefetch_db_connection(FakeRequest(endpoint))
+            finally:
+                database_pg._current_scope.reset(token)
+            return state
+
+        assert asyncio.run(main()).connection is None
+
+    def test_pool_exhausted_does_not_block_loop(self, fake_pool, monkeypatch):
+        """Con il pool esaurito l'attesa del semaforo non blocca le altre richieste."""
+        monkeypatch.setattr(database_pg, '_pool_slots', threading.BoundedSemaphore(1))
+        database_pg._pool_slots.acquire()
+
+        async def endpoint():
+            pass
+
+        async def main():
+            ticks = 0
+
+            async def other_request():
+                nonlocal ticks
+                for _ in range(5):
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            token = database_pg._current_scope.set(database_pg._DbScope())
+            try:
+                waiting = asyncio.ensure_future(database_pg.prefetch_db_connection(FakeRequest(endpoint)))
+                await other_request()
+                assert not waiting.done()
+                with pytest.raises(database_pg.PoolTimeoutError):
+                    await waiting
+            finally:
+                database_pg._current_scope.reset(token)
+            return ticks
+
+        assert asyncio.run(main()) == 5
@@ -0,0 +1,308 @@
+# =============================================================================
+# SERV.O v11.7 - SQL TRANSLATION / PREPARED STATEMENTS TESTS
+# =============================================================================
+# Unit tests per translate_sql (cache LRU), prepared statements e
+# RETURNING <pk> / execute_insert.
+# Non richiedono PostgreSQL.
+# =============================================================================
+
+import itertools
+
+import pytest
+
+from app import database_pg
+from app.database_pg import translate_sql, PostgreSQLConnection
+
+
+class TestTranslateSql:
+    """Test traduzione SQLite -> PostgreSQL e classificazione."""
+
+    def test_placeholder_conversion(self):
+        """? diventa %s."""
+        plan = translate_sql("SELECT * FROM vendor WHERE codice_vendor = ?")
+        assert plan.sql == "SELECT * FROM vendor WHERE codice_vendor = %s"
+        assert plan.is_insert is False
+        assert plan.auto_returning is False
+
+    def test_date_functions(self):
+        """Funzioni data SQLite convertite."""
+        plan = translate_sql("SELECT * FROM t WHERE data_ordine >= date('now', '-7 days') AND x < datetime('now')")
+        assert "CURRENT_DATE - INTERVAL '7 days'" in plan.sql
+        assert "CURRENT_TIMESTAMP" in plan.sql
+
+    def test_insert_gets_auto_returning(self):
+        """INSERT senza RETURNING/ON CONFLICT riceve RETURNING automatico."""
+        plan = translate_sql("INSERT INTO t (a, b) VALUES (?, ?);")
+        assert plan.is_insert is True
+        assert plan.auto_returning is True
+        assert plan.sql.endswith('RETURNING *')
+
+    def test_upsert_and_explicit_returning_untouched(self):
+        """ON CONFLICT e RETURNING esplicito non vengono modificati."""
+        upsert = translate_sql("INSERT INTO t (a) VALUES (%s) ON CONFLICT (a) DO NOTHING")
+        returning = translate_sql("INSERT INTO t (a) VALUES (%s) RETURNING id")
+        assert upsert.auto_returning is False
+        assert returning.auto_returning is False
+        assert returning.sql.endswith('RETURNING id')
+
+    def test_cache_hit(self):
+        """Stesso testo SQL: risultato servito dalla cache."""
+        sql = "SELECT 1 FROM t WHERE cache_test = %s"
+        translate_sql(sql)
+        before = translate_sql.cache_info().hits
+        first = translate_sql(sql)
+        assert translate_sql.cache_info().hits == before + 1
+        assert translate_sql(sql) is first
+
+
+class TestPrepareSql:
+    """Test conversione placeholder per PREPARE."""
+
+    def test_numbered_placeholders(self):
+        plan = translate_sql("UPDATE t SET a = %s WHERE id = %s")
+        assert plan.prepare_sql == "UPDATE t SET a = $1 WHERE id = $2"
+        assert plan.param_count == 2
+
+    def test_quoted_literals_preserved(self):
+        plan = translate_sql("SELECT * FROM t WHERE a = %s AND b = 'x?y'")
+        # ? dentro al literal viene convertito da _convert_sql_dialect (come prima),
+        # ma il %s tra apici non e' un placeholder
+        assert plan.prepare_sql == "SELECT * FROM t WHERE a = $1 AND b = 'x%sy'"
+        assert plan.param_count == 1
+
+    def test_not_preparable(self):
+        """Named placeholder, %% letterali e DDL non vengono preparati."""
+        assert translate_sql("UPDATE t SET a = %(a)s").prepare_sql is None
+        assert translate_sql("SELECT * FROM t WHERE a LIKE 'x%%' AND b = %s").prepare_sql is None
+        assert translate_sql("ALTER TABLE t ADD COLUMN c TEXT").prepare_sql is None
+        assert translate_sql("SELECT 1").prepare_sql is None
+
+
+class _RecordingCursor:
+    def __init__(self, log, fail_on=None):
+        self.log = log
+        self.fail_on = fail_on
+        self.rowcount = 0
+
+    def execute(self, sql, params=None):
+        self.log.append(sql)
+        if self.fail_on and sql.startswith(self.fail_on):
+            raise Exception("prepare failed")
+
+    def fetchone(self):
+        return None
+
+    def close(self):
+        pass
+
+
+class _RecordingConnection:
+    """Connessione finta che registra gli statement eseguiti."""
+
+    def __init__(self, fail_on=None):
+        self.log = []
+        self.closed = 0
+        self.status = 1
+        self.autocommit = False
+        self.fail_on = fail_on
+
+    def cursor(self, cursor_factory=None):
+        return _RecordingCursor(self.log, self.fail_on)
+
+    def rollback(self):
+        self.log.append('ROLLBACK')
+
+    def commit(self):
+        self.log.append('COMMIT')
+
+
+@pytest.fixture
+def prepared_enabled(monkeypatch):
+    monkeypatch.setattr(database_pg.config, 'PG_PREPARED_STATEMENTS', True)
+    monkeypatch.setattr(database_pg.config, 'PG_PREPARED_THRESHOLD', 2)
+
+
+class TestPreparedStatements:
+    """Test modalita' prepared statement (opt-in)."""
+
+    def test_prepare_after_threshold(self, prepared_enabled):
+        raw = _RecordingConnection()
+        db = PostgreSQLConnection(raw)
+        sql = "SELECT * FROM listini_vendor WHERE codice_aic = %s"
+
+        db.execute(sql, ('012345678',))
+        assert raw.log == ["SELECT * FROM listini_vendor WHERE codice_aic = %s"]
+
+        db.execute(sql, ('012345678',))
+        db.execute(sql, ('087654321',))
+
+        prepares = [s for s in raw.log if s.startswith('PREPARE')]
+        executes = [s for s in raw.log if s.startswith('EXECUTE')]
+        assert len(prepares) == 1
+        assert prepares[0].endswith('AS SELECT * FROM listini_vendor WHERE codice_aic = $1')
+        assert len(executes) == 2
+        assert 'SAVEPOINT servo_prepare' in raw.log
+
+    def test_failed_prepare_falls_back(self, prepared_enabled):
+        """PREPARE fallito: rollback al savepoint e niente piu' tentativi."""
+        raw = _RecordingConnection(fail_on='PREPARE')
+        db = PostgreSQLConnection(raw)
+        sql = "SELECT %s::text AS x WHERE %s IS NULL"
+
+        for _ in range(4):
+            db.execute(sql, ('a', None))
+
+        assert sum(1 for s in raw.log if s.startswith('PREPARE')) == 1
+        assert 'ROLLBACK TO SAVEPOINT servo_prepare' in raw.log
+        assert not any(s.startswith('EXECUTE') for s in raw.log)
+        assert 'ROLLBACK' not in raw.log
+
+    def test_disabled_by_default(self):
+        raw = _RecordingConnection()
+        db = PostgreSQLConnection(raw)
+        for _ in range(10):
+            db.execute("SELECT * FROM vendor WHERE id_vendor = %s", (1,))
+        assert not any(s.startswith('PREPARE') for s in raw.log)
+
+
+class _PkCursor:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def execute(self, sql, params=None):
+        pass
+
+    def fetchall(self):
+        return self._rows
+
+    def close(self):
+        pass
+
+
+class _PkConnection:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def cursor(self):
+        return _PkCursor(self._rows)
+
+    def commit(self):
+        pass
+
+
+@pytest.fixture
+def pk_registry(monkeypatch):
+    """Registry PK caricato da un information_schema finto."""
+    monkeypatch.setattr(database_pg, '_pk_registry', {})
+    database_pg.load_pk_registry(_PkConnection([
+        ('ordini_dettaglio', 'id_dettaglio', 1),
+        ('anomalie', 'id_anomalia', 1),
+        ('tabella_pk_composta', 'a', 2),
+    ]))
+    yield
+    database_pg.translate_sql.cache_clear()
+    database_pg._insert_batch_sql.cache_clear()
+
+
+class TestPkReturning:
+    """Test RETURNING <pk> da registry."""
+
+    def test_registry_skips_composite_keys(self, pk_registry):
+        assert database_pg.get_primary_key('ORDINI_DETTAGLIO') == 'id_dettaglio'
+        assert database_pg.get_primary_key('tabella_pk_composta') is None
+
+    def test_insert_returns_pk_only(self, pk_registry):
+        plan = translate_sql("INSERT INTO ordini_dettaglio (id_testata, n_riga) VALUES (?, ?)")
+        assert plan.sql.endswith('RETURNING id_dettaglio')
+
+    def test_unknown_table_falls_back(self, pk_registry):
+        plan = translate_sql("INSERT INTO tabella_pk_composta (a, b) VALUES (?, ?)")
+        assert plan.sql.endswith('RETURNING *')
+
+
+class TestInsertBatchSql:
+    """Test riscrittura INSERT per execute_insert."""
+
+    def test_values_template_extracted(self, pk_registry):
+        sql, template = database_pg._insert_batch_sql(
+            "INSERT INTO anomalie (id_testata, descrizione, data) "
+            "VALUES (?, COALESCE(?, 'n/d (x)'), datetime('now'))"
+        )
+        assert sql == "INSERT INTO anomalie (id_testata, descrizione, data) VALUES %s RETURNING id_anomalia"
+        assert template == "(%s, COALESCE(%s, 'n/d (x)'), CURRENT_TIMESTAMP)"
+
+    def test_explicit_returning_and_conflict_kept(self, pk_registry):
+        sql, template = database_pg._insert_batch_sql(
+            "INSERT INTO anomalie (codice) VALUES (%s) ON CONFLICT (codice) DO NOTHING RETURNING codice"
+        )
+        assert sql == "INSERT INTO anomalie (codice) VALUES %s ON CONFLICT (codice) DO NOTHING RETURNING codice"
+        assert template == "(%s)"
+
+    def test_params_outside_values_rejected(self, pk_registry):
+        with pytest.raises(ValueError):
+            database_pg._insert_batch_sql(
+                "INSERT INTO anomalie (a) VALUES (%s) ON CONFLICT (a) DO UPDATE SET b = %s"
+            )
+
+
+class _NamedCursor:
+    def __init__(self, conn, name, cursor_factory):
+        self.conn = conn
+        self.name = name
+        self.cursor_factory = cursor_factory
+        self.itersize = 2000
+        self._rows = iter(conn.rows)
+
+    def execute(self, sql, params=None):
+        self.conn.log.append(sql)
+
+    def fetchmany(self, size):
+        self.conn.fetches.append(size)
+        return list(itertools.islice(self._rows, size))
+
+    def close(self):
+        self.conn.log.append('CLOSE')
+
+
+class _NamedCursorConnection(_RecordingConnection):
+    """Connessione finta con cursor server-side (named)."""
+
+    def __init__(self, rows):
+        super().__init__()
+        self.rows = rows
+        self.fetches = []
+        self.names = []
+
+    def cursor(self, name=None, cursor_factory=None):
+        self.names.append(name)
+        return _NamedCursor(self, name, cursor_factory)
+
+
+class TestIterRows:
+    """Test streaming con cursor server-side."""
+
+    def test_rows_fetched_in_batches(self):
+        raw = _NamedCursorConnection([(i,) for i in range(5)])
+        db = PostgreSQLConnection(raw)
+        rows = list(db.iter_rows("SELECT id FROM ordini_dettaglio WHERE vendor = ?", ('ANGELINI',),
+                                 batch_size=2))
+        assert rows == [(0,), (1,), (2,), (3,), (4,)]
+        assert raw.fetches == [2, 2, 2, 2]
+        assert raw.log == ["SELECT id FROM ordini_dettaglio WHERE vendor = %s", 'CLOSE']
+        assert raw.names[0].startswith('servo_iter_')
+
+    def test_unique_cursor_names(self):
+        raw = _NamedCursorConnection([])
+        db = PostgreSQLConnection(raw)
+        list(db.iter_rows("SELECT 1"))
+        list(db.iter_rows("SELECT 1"))
+        assert raw.names[0] != raw.names[1]
+
+    def test_abandoned_generator_closes_cursor(self):
+        raw = _NamedCursorConnection([(i,) for i in range(10)])
+        db = PostgreSQLConnection(raw)
+        it = db.iter_rows("SELECT id FROM t", batch_size=3)
+        next(it)
+        it.close()
+        assert raw.log[-1] == 'CLOSE'
+        assert 'ROLLBACK' not in raw.log
@@ -0,0 +1,124 @@
+# =============================================================================
+# SERV.O v11.7 - FIX ENCODING TESTO PDF TESTS
+# =============================================================================
+# Unit tests per il fix encoding con pre-scan: pagine pulite restituite senza
+# chiamare ftfy, mojibake corretto come prima, sostituzioni manuali in un
+# solo passaggio e contatori per percorso.
+# Non richiedono PostgreSQL.
+# =============================================================================
+
+import random
+import string
+
+import pytest
+
+from app.services.extraction import encoding
+from app.services.extraction.encoding import (
+    fix_text_encoding, fix_encoding_manual, needs_encoding_fix,
+    get_encoding_stats, reset_encoding_stats,
+)
+
+
+@pytest.fixture(autouse=True)
+def stats():
+    reset_encoding_stats()
+    yield
+    reset_encoding_stats()
+
+
+def _old_fix(text):
+    """Pipeline precedente: ftfy sempre, poi fix manuale con replace in sequenza."""
+    text = encoding.ftfy.fix_text(text)
+    if 'Ã' in text:
+        fixed = text.encode('latin-1', errors='ignore').decode('utf-8', errors='ignore')
+        if fixed:
+            return fixed
+    for mojibake, correct in encoding._MANUAL_REPLACEMENTS.items():
+        text = text.replace(mojibake, correct)
+    return text
+
+
+class TestPreScan:
+    """Test marker di mojibake."""
+
+    @pytest.mark.parametrize('text', [
+        'ORDINE N. 123 del 15/03/2026\nPARACETAMOLO 500MG  10,50',
+        'PERCHÉ CITTÀ è già più 5° € 12,50',
+        'FARMACIA ROSSI & C. S.N.C.',
+    ])
+    def test_clean_text(self, text):
+        assert not needs_encoding_fix(text)
+
+    @pytest.mark.parametrize('text', [
+        'BONDÃ¬',               # UTF-8 letto come Latin-1
+        'lâ€™ordine',           # UTF-8 letto come cp1252
+        'Ã',                    # fix manuale anche isolato
+        'l’ordine',             # virgolette curve (uncurl di ftfy)
+        'ﬁale',                 # legatura
+        'riga\r\n',
+        'A &amp; B',
+        'CITTÀÈ',               # due non ASCII consecutivi
+    ])
+    def test_marked_text(self, text):
+        assert needs_encoding_fix(text)
+
+    def test_clean_text_unchanged_by_old_pipeline(self):
+        """Sul testo che il pre-scan considera pulito ftfy e fix manuale non cambiano nulla."""
+        if not encoding.FTFY_AVAILABLE:
+            pytest.skip("ftfy non disponibile")
+        rnd = random.Random(11)
+        alfabeto = ([c for c in string.printable if c not in '\r\x0b\x0c']
+                    + [chr(i) for i in range(0xA0, 0x100)] + ['€'])
+        verificati = 0
+        for _ in range(20000):
+            text = ''.join(rnd.choice(alfabeto) for _ in range(rnd.randint(1, 30)))
+            if needs_encoding_fix(text):
+                continue
+            verificati += 1
+            assert _old_fix(text) == text
+        assert verificati > 1000
+
+
+class TestFixTextEncoding:
+    """Test percorsi del fix encoding e contatori."""
+
+    def test_clean_page_skips_ftfy(self, monkeypatch):
+        def fail(text):
+            raise AssertionError("ftfy chiamato su pagina pulita")
+
+        monkeypatch.setattr(encoding, 'ftfy', type('ftfy', (), {'fix_text': staticmethod(fail)}))
+        monkeypatch.setattr(encoding, 'FTFY_AVAILABLE', True)
+
+        assert fix_text_encoding('PARACETAMOLO è 10,50') == 'PARACETAMOLO è 10,50'
+        assert fix_text_encoding('') == ''
+        assert get_encoding_stats() == {'pulite': 2, 'riparate': 0, 'modificate': 0}
+
+    @pytest.mark.parametrize('text', ['BONDÃ¬ 10,50', 'lâ€™ordine', 'CAFÃ\xa0 Ã ', 'A &amp; B'])
+    def test_repaired_like_before(self, text):
+        if not encoding.FTFY_AVAILABLE:
+            pytest.skip("ftfy non disponibile")
+        assert fix_text_encoding(text) == _old_fix(text)
+        assert get_encoding_stats() == {'pulite': 0, 'riparate': 1, 'modificate': 1}
+
+    def test_repair_without_ftfy(self, monkeypatch):
+        monkeypatch.setattr(encoding, 'FTFY_AVAILABLE', False)
+        assert fix_text_encoding('BONDÃ¬') == 'BONDì'
+        # Solo ftfy (es. MENARINI): senza ftfy il testo resta invariato
+        assert fix_text_encoding('BONDÃ¬', manual=False) == 'BONDÃ¬'
+        assert get_encoding_stats() == {'pulite': 0, 'riparate': 2, 'modificate': 1}
+
+
+class TestFixEncodingManual:
+    """Test sostituzioni manuali in un solo passaggio."""
+
+    def test_single_pass_matches_sequential_replace(self):
+        sequenziale = 'Ã¬Ã¨Ã²Ã¹Ã Ã©Ã³'
+        for mojibake, correct in encoding._MANUAL_REPLACEMENTS.items():
+            sequenziale = sequenziale.replace(mojibake, correct)
+        assert encoding._MANUAL_REPLACEMENTS_RE.sub(
+            lambda m: encoding._MANUAL_REPLACEMENTS[m.group()], 'Ã¬Ã¨Ã²Ã¹Ã Ã©Ã³'
+        ) == sequenziale == 'ìèòùàéó'
+
+    def test_latin1_roundtrip(self):
+        assert fix_encoding_manual('CITTÃ\xa0') == 'CITTà'
+        assert fix_encoding_manual('nessun marker') == 'nessun marker'
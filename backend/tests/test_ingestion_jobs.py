@@ -0,0 +1,224 @@
+# =============================================================================
+# SERV.O v11.7 - CODA INGESTION TESTS
+# =============================================================================
+# Unit tests per transizioni di stato, backoff, spool e ciclo del worker.
+# Non richiedono PostgreSQL.
+# =============================================================================
+
+import os
+import time
+
+import pytest
+
+from app.services import ingestion
+from app.services.ingestion import jobs, worker
+from app.utils import compute_file_hash
+from app.services.ingestion import (
+    next_state, retry_delay, JOB_DONE, JOB_FAILED, JOB_RETRY, JOB_DEAD,
+)
+
+
+def _job(tentativi=1, max_tentativi=3, **extra):
+    job = {'id_job': 7, 'filename': 'ordine.pdf', 'tentativi': tentativi,
+           'max_tentativi': max_tentativi, 'percorso_spool': '/tmp/none.pdf'}
+    job.update(extra)
+    return job
+
+
+class TestNextState:
+    """Test decisione stato successivo di un job."""
+
+    def test_ok_and_duplicate_are_done(self):
+        assert next_state(_job(), {'status': 'OK'}) == (JOB_DONE, 0)
+        assert next_state(_job(), {'status': 'DUPLICATO', 'id_acquisizione': 3}) == (JOB_DONE, 0)
+
+    def test_error_after_acquisition_is_final(self):
+        """Retry vedrebbe il PDF come duplicato: errore definitivo."""
+        result = {'status': 'ERRORE', 'id_acquisizione': 12}
+        assert next_state(_job(), result) == (JOB_FAILED, 0)
+
+    def test_error_before_acquisition_retried(self, monkeypatch):
+        monkeypatch.setattr(jobs.config, 'INGESTION_RETRY_BACKOFF', 30)
+        assert next_state(_job(tentativi=1), {'status': 'ERRORE', 'id_acquisizione': None}) == (JOB_RETRY, 30)
+        assert next_state(_job(tentativi=2), None) == (JOB_RETRY, 60)
+
+    def test_dead_letter_after_max_attempts(self):
+        assert next_state(_job(tentativi=3, max_tentativi=3), None) == (JOB_DEAD, 0)
+
+    def test_backoff_doubles(self, monkeypatch):
+        monkeypatch.setattr(jobs.config, 'INGESTION_RETRY_BACKOFF', 10)
+        assert [retry_delay(n) for n in (1, 2, 3, 4)] == [10, 20, 40, 80]
+
+
+class TestSpool:
+    """Test salvataggio PDF in spool."""
+
+    def test_spool_writes_file(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(jobs.config, 'INGESTION_SPOOL_DIR', str(tmp_path / 'spool'))
+        path = jobs.spool_pdf(b'%PDF-1.4 test')
+        assert path.endswith('.pdf')
+        with open(path, 'rb') as f:
+            assert f.read() == b'%PDF-1.4 test'
+        assert not [p for p in os.listdir(tmp_path / 'spool') if p.endswith('.part')]
+
+
+class _FakeDb:
+    """Registra le query eseguite."""
+
+    def __init__(self, rowcount=0):
+        self.queries = []
+        self.rowcount = rowcount
+        self.commits = 0
+
+    def execute(self, sql, params=None):
+        self.queries.append((sql, params))
+        return self
+
+    def fetchone(self):
+        return None
+
+    def commit(self):
+        self.commits += 1
+
+
+class TestLease:
+    """Test lease dei job RUNNING: recupero solo a lease scaduto."""
+
+    def test_claim_sets_lease(self, monkeypatch):
+        db = _FakeDb()
+        monkeypatch.setattr(jobs, 'get_db', lambda: db)
+        monkeypatch.setattr(jobs.config, 'INGESTION_JOB_LEASE', 120)
+        jobs.claim_job('w1')
+        sql, params = db.queries[0]
+        assert 'lease_scade = NOW() + make_interval(secs => %s)' in sql
+        assert params[:3] == (jobs.JOB_RUNNING, 'w1', 120)
+
+    def test_recover_only_expired_lease(self, monkeypatch):
+        db = _FakeDb(rowcount=2)
+        monkeypatch.setattr(jobs, 'get_db', lambda: db)
+        assert jobs.recover_stale_jobs() == 2
+        sql, params = db.queries[0]
+        where = sql[sql.index('WHERE'):]
+        assert 'lease_scade < NOW()' in where
+        # started_at solo per job senza lease (claim precedenti alla colonna)
+        assert 'lease_scade IS NULL AND started_at <' in where
+        assert params[:3] == (JOB_DEAD, JOB_RETRY, jobs.JOB_RUNNING)
+
+    def test_recover_dead_sets_completed_at(self, monkeypatch):
+        db = _FakeDb()
+        monkeypatch.setattr(jobs, 'get_db', lambda: db)
+        jobs.recover_stale_jobs()
+        sql, _ = db.queries[0]
+        assert 'completed_at = CASE WHEN tentativi >= max_tentativi THEN NOW() ELSE NULL END' in sql
+
+    def test_finish_only_own_running_job(self, monkeypatch):
+        """Lease scaduto e job ripreso: l'esito del worker perso non sovrascrive lo stato."""
+        db = _FakeDb(rowcount=0)
+        removed = []
+        monkeypatch.setattr(jobs, 'get_db', lambda: db)
+        monkeypatch.setattr(jobs, 'remove_spool', removed.append)
+
+        assert jobs.finish_job(_job(worker='w1', tentativi=2), {'status': 'OK'}) is None
+        sql, params = db.queries[0]
+        assert 'WHERE id_job = %s AND stato = %s AND worker = %s AND tentativi = %s' in sql
+        assert params[-4:] == (7, jobs.JOB_RUNNING, 'w1', 2)
+        assert removed == []
+
+    def test_finish_removes_spool_when_done(self, monkeypatch):
+        db = _FakeDb(rowcount=1)
+        removed = []
+        monkeypatch.setattr(jobs, 'get_db', lambda: db)
+        monkeypatch.setattr(jobs, 'remove_spool', removed.append)
+
+        assert jobs.finish_job(_job(worker='w1'), {'status': 'OK'}) == JOB_DONE
+        assert removed == ['/tmp/none.pdf']
+
+    def test_renew_lease_only_own_running_job(self, monkeypatch):
+        db = _FakeDb(rowcount=0)
+        monkeypatch.setattr(jobs, 'get_db', lambda: db)
+        assert jobs.renew_lease(7, 'w1') is False
+        sql, params = db.queries[0]
+        assert 'WHERE id_job = %s AND stato = %s AND worker = %s' in sql
+        assert params[1:] == (7, jobs.JOB_RUNNING, 'w1')
+
+
+@pytest.fixture
+def fake_queue(monkeypatch, tmp_path):
+    """Coda in memoria al posto di claim_job/finish_job."""
+    spool = tmp_path / 'job.pdf'
+    spool.write_bytes(b'%PDF-1.4')
+    state = {'queue': [_job(percorso_spool=str(spool))], 'finished': [], 'spool': str(spool)}
+
+    def claim(name):
+        return state['queue'].pop(0) if state['queue'] else None
+
+    def finish(job, result=None, error=None):
+        stato, _ = next_state(job, result)
+        state['finished'].append((job['id_job'], stato, result, error))
+        return stato
+
+    monkeypatch.setattr(worker, 'claim_job', claim)
+    monkeypatch.setattr(worker, 'finish_job', finish)
+    return state
+
+
+class TestWorker:
+    """Test ciclo worker su coda finta."""
+
+    def test_run_once_processes_job(self, fake_queue, monkeypatch):
+        from app.services import pdf_processor
+        calls = []
+
+        def fake_process(filename, content):
+            calls.append((filename, content))
+            return {'status': 'OK', 'filename': filename, 'id_acquisizione': 99}
+
+        monkeypatch.setattr(pdf_processor, 'process_pdf', fake_process)
+
+        assert worker.run_once('test') is True
+        # v11.7: il worker passa il file di spool, non il contenuto
+        [(filename, spooled)] = calls
+        assert filename == 'ordine.pdf'
+        assert spooled.path == fake_queue['spool'] and spooled.size == len(b'%PDF-1.4')
+        assert spooled.hash_file == compute_file_hash(b'%PDF-1.4')
+        assert fake_queue['finished'][0][:2] == (7, JOB_DONE)
+        assert worker.run_once('test') is False
+
+    def test_exception_goes_to_retry(self, fake_queue, monkeypatch):
+        from app.services import pdf_processor
+
+        def boom(filename, content):
+            raise RuntimeError("connessione persa")
+
+        monkeypatch.setattr(pdf_processor, 'process_pdf', boom)
+
+        assert worker.run_once('test') is True
+        job_id, stato, result, error = fake_queue['finished'][0]
+        assert stato == JOB_RETRY
+        assert result is None
+        assert error == "connessione persa"
+
+    def test_heartbeat_renews_lease_while_processing(self, fake_queue, monkeypatch):
+        """Job lento ma vivo: il lease viene rinnovato fino alla fine dell'elaborazione."""
+        from app.services import pdf_processor
+        renewed = []
+
+        def slow_process(filename, content):
+            time.sleep(0.2)
+            return {'status': 'OK', 'filename': filename, 'id_acquisizione': 1}
+
+        monkeypatch.setattr(pdf_processor, 'process_pdf', slow_process)
+        monkeypatch.setattr(worker.config, 'INGESTION_JOB_LEASE', 0.06)
+        monkeypatch.setattr(worker, 'renew_lease', lambda id_job, name: renewed.append((id_job, name)) or True)
+
+        assert worker.run_once('w1') is True
+        assert len(renewed) >= 2
+        assert set(renewed) == {(7, 'w1')}
+        count = len(renewed)
+        time.sleep(0.1)
+        assert len(renewed) == count
+
+    def test_no_workers_when_disabled(self, monkeypatch):
+        monkeypatch.setattr(worker.config, 'INGESTION_WORKERS', 0)
+        assert ingestion.start_ingestion_workers() == 0
+        assert ingestion.get_workers_status()['running'] == 0
@@ -0,0 +1,238 @@
+# =============================================================================
+# SERV.O v11.7 - INSERIMENTO ORDINE IN BLOCCO TESTS
+# =============================================================================
+# Unit tests per _insert_order con righe e anomalie inserite in blocco:
+# query per ordine indipendenti dal numero di righe, collegamento
+# parent/child espositore, controlli LST-A01/AIC-A01 in memoria e
+# supervisioni listino/AIC create con INSERT multi-riga.
+# Non richiedono PostgreSQL.
+# =============================================================================
+
+import pytest
+
+from app import database_pg
+from app.services import pdf_processor, ordini, lookup
+from app.services.supervision import requests as supervision_requests
+from app.services.supervision.aic import queries as aic_queries
+
+
+class _Row(dict):
+    """Riga tipo RealDictRow: accesso per nome e per posizione."""
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return list(self.values())[key]
+        return super().__getitem__(key)
+
+
+class _Cursor:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return list(self._rows)
+
+
+class _FakeDb:
+    """Registra ogni round-trip (execute / execute_insert)."""
+
+    def __init__(self, patterns_aic=None):
+        self.statements = []
+        self.batches = []
+        self.patterns_aic = patterns_aic or []
+        self._next_id = 1000
+
+    def _id(self):
+        self._next_id += 1
+        return self._next_id
+
+    def execute(self, sql, params=None):
+        self.statements.append((' '.join(sql.split()), params))
+        if 'FROM criteri_ordinari_aic' in sql:
+            return _Cursor([_Row(p) for p in self.patterns_aic])
+        if 'RETURNING' in sql:
+            return _Cursor([_Row(id=self._id())])
+        if 'COUNT(' in sql:
+            return _Cursor([_Row(cnt=0)])
+        return _Cursor([])
+
+    def execute_insert(self, sql, rows):
+        sql = ' '.join(sql.split())
+        self.statements.append((sql, rows))
+        self.batches.append((sql, list(rows)))
+        if 'ON CONFLICT' in sql:
+            return []
+        return [self._id() for _ in rows]
+
+    def commit(self):
+        pass
+
+    def batch(self, fragment):
+        return [rows for sql, rows in self.batches if fragment in sql]
+
+
+@pytest.fixture
+def use_db(monkeypatch):
+    """Installa un _FakeDb come get_db() dei moduli coinvolti."""
+    def install(db):
+        for module in (database_pg, supervision_requests, aic_queries):
+            monkeypatch.setattr(module, 'get_db', lambda: db)
+        return db
+    return install
+
+
+@pytest.fixture
+def fake_db(monkeypatch, use_db):
+    db = use_db(_FakeDb())
+    monkeypatch.setattr(pdf_processor, 'lookup_farmacia_extended', lambda order: {
+        'id_farmacia': 7, 'id_parafarmacia': None, 'lookup_method': 'MIN_ID',
+        'lookup_source': 'FARMACIA', 'score': 100, 'codice_ministeriale': '123456',
+        'deposito_riferimento': 'CT', 'cliente_trovato': True, 'min_id_cliente': '123456',
+    })
+    monkeypatch.setattr(pdf_processor, 'lookup_cliente_by_piva',
+                        lambda piva, min_id=None: {'deposito_riferimento': 'CT'})
+    monkeypatch.setattr(lookup, 'popola_header_da_anagrafica', lambda id_testata: True)
+    monkeypatch.setattr(ordini, '_aggiorna_contatori_ordine', lambda id_testata: None)
+    monkeypatch.setattr(pdf_processor, 'blocca_ordine_per_supervisione', lambda id_testata: None)
+    return db
+
+
+def _riga(n, **campi):
+    riga = {
+        'n_riga': n,
+        'codice_aic': f"{n:09d}",
+        'descrizione': f"PRODOTTO {n}",
+        'q_venduta': 2,
+        'prezzo_netto': 4.5,
+    }
+    riga.update(campi)
+    return riga
+
+
+def _ordine(n_righe):
+    righe = [_riga(n) for n in range(1, n_righe + 1)]
+    righe[0].update(prezzo_netto=0)                    # LST-A01
+    righe[1].update(codice_aic='ABC')                  # AIC-A01
+    righe.append(_riga(n_righe + 1, tipo_riga='PARENT_ESPOSITORE', is_espositore=True,
+                       prezzo_netto=0, espositore_metadata={'child_dettaglio': []}))
+    righe.append(_riga(n_righe + 2, is_child=True, _belongs_to_parent=True,
+                       codice_aic='', prezzo_netto=0))
+    return {
+        'numero_ordine': 'ORD1',
+        'codice_ministeriale': '123456',
+        'partita_iva': '12345678901',
+        'data_consegna': '15/03/2026',
+        'righe': righe,
+    }
+
+
+class TestInsertOrderBatch:
+    """Test _insert_order con righe e anomalie in blocco."""
+
+    def _run(self, db, order_data):
+        return pdf_processor._insert_order(db, 1, 2, 'MENARINI', order_data)
+
+    def test_round_trips_independent_of_row_count(self, fake_db, use_db):
+        self._run(fake_db, _ordine(5))
+        small = len(fake_db.statements)
+
+        big_db = use_db(_FakeDb())
+        self._run(big_db, _ordine(300))
+        assert len(big_db.statements) == small
+
+    def test_rows_inserted_in_one_statement(self, fake_db):
+        result = self._run(fake_db, _ordine(10))
+        [righe] = fake_db.batch('INSERT INTO ordini_dettaglio')
+        assert len(righe) == result['righe'] == 12
+        colonne = pdf_processor._COLONNE_DETTAGLIO
+        assert tuple(pdf_processor._valori_riga_dettaglio(1, _riga(1))) == colonne
+        # data_consegna della testata propagata alle righe
+        assert righe[0][colonne.index('data_consegna_riga')] == '2026-03-15'
+
+    def test_child_linked_to_parent(self, fake_db):
+        order_data = _ordine(3)
+        self._run(fake_db, order_data)
+        parent, child = order_data['righe'][-2:]
+        [(sql, (ids_child, ids_parent))] = [s for s in fake_db.statements if 'unnest' in s[0]
+                                            and 'id_parent_espositore' in s[0]]
+        assert child['id_parent_espositore'] == ids_parent[0]
+        assert len(ids_child) == 1
+        # Anomalia INFO per il parent espositore
+        [info] = fake_db.batch("'ESPOSITORE', 'INFO'")
+        assert len(info) == 1 and info[0][2] == "Riga espositore parent elaborata"
+
+    def test_missing_price_and_aic_detected_in_memory(self, fake_db):
+        self._run(fake_db, _ordine(6))
+        assert not any(s.startswith('SELECT') and 'ordini_dettaglio' in s.lower()
+                       for s, _ in fake_db.statements)
+
+        [lst] = fake_db.batch("'LST-A01'")
+        # Solo la riga 1: parent espositore e child esclusi
+        assert [r[3] for r in lst] == ['000000001']
+        [sup_lst] = fake_db.batch('INSERT INTO supervisione_listino')
+        assert [r[6] for r in sup_lst] == [1]
+
+        [aic] = fake_db.batch("'AIC-A01'")
+        assert len(aic) == 1 and aic[0][3].startswith('Codice originale: N/D')
+        [sup_aic] = fake_db.batch('INSERT INTO supervisione_aic')
+        assert [r[5] for r in sup_aic] == [2]
+
+    def test_generic_listino_anomaly_skipped_for_same_aic(self, fake_db):
+        order_data = _ordine(4)
+        order_data['anomalie_listino'] = [
+            {'codice_anomalia': 'LST-A01', 'valore_anomalo': '000000001'},
+            {'codice_anomalia': 'LST-A01', 'valore_anomalo': '000000003'},
+            {'codice_anomalia': 'LST-A01', 'valore_anomalo': '000000003'},
+        ]
+        self._run(fake_db, order_data)
+        generiche = [p for s, p in fake_db.statements
+                     if s.startswith('INSERT INTO anomalie') and 'pattern_signature' in s]
+        assert [p[5] for p in generiche] == ['000000003']
+
+
+class TestControlliInMemoria:
+    """Test controlli LST-A01 sui valori salvati."""
+
+    @pytest.mark.parametrize('q_venduta,atteso', [(0.4, False), (0.5, True), ('3', True), (None, False)])
+    def test_quantity_rounded_like_integer_column(self, q_venduta, atteso):
+        valori = pdf_processor._valori_riga_dettaglio(1, _riga(1, q_venduta=q_venduta, prezzo_netto=0))
+        assert pdf_processor._riga_senza_prezzo(valori) is atteso
+
+    @pytest.mark.parametrize('campi', [
+        {'q_sconto_merce': 1},
+        {'merce_sconto_extra': 1},
+        {'q_omaggio': 2},
+        {'tipo_riga': 'MATERIALE_POP'},
+        {'prezzo_netto': '0.01'},
+    ])
+    def test_excluded_rows(self, campi):
+        campi.setdefault('prezzo_netto', None)
+        valori = pdf_processor._valori_riga_dettaglio(1, _riga(1, **campi))
+        assert pdf_processor._riga_senza_prezzo(valori) is False
+
+    def test_order_by_n_riga_nulls_last(self):
+        valori = [{'n_riga': None}, {'n_riga': 3}, {'n_riga': 1}]
+        assert [v['n_riga'] for v in sorted(valori, key=pdf_processor._ordine_n_riga)] == [1, 3, None]
+
+
+class TestValutaAnomalieAic:
+    """Test valutazione batch dei pattern AIC."""
+
+    def test_auto_apply_in_one_update(self, use_db):
+        anomalie = [
+            {'vendor': 'MENARINI', 'id_dettaglio': 10, 'descrizione_prodotto': 'PRODOTTO A'},
+            {'vendor': 'MENARINI', 'id_dettaglio': 11, 'descrizione_prodotto': 'PRODOTTO B'},
+        ]
+        firma_a = aic_queries.calcola_pattern_signature('MENARINI', 'PRODOTTO A')
+        db = use_db(_FakeDb(patterns_aic=[{'pattern_signature': firma_a, 'codice_aic_default': '012345678'}]))
+
+        esiti = aic_queries.valuta_anomalie_aic(1, anomalie)
+
+        assert [applicato for applicato, _ in esiti] == [True, False]
+        [update] = [p for s, p in db.statements if s.startswith('UPDATE ordini_dettaglio')]
+        assert update == ([10], ['012345678'])
+        [log] = db.batch('INSERT INTO log_operazioni')
+        assert log[0][:3] == ('AUTO_APPLY_AIC', 'ORDINI_DETTAGLIO', 10)
@@ -0,0 +1,267 @@
+# =============================================================================
+# SERV.O v11.7 - CACHE RISULTATI LOOKUP TESTS
+# =============================================================================
+# Unit tests per la cache di lookup_farmacia_extended: chiave normalizzata,
+# LRU, contatori, invalidazione per MIN_ID/P.IVA modificati al cambio di
+# versione anagrafica, ricarica delle voci salvate. Non richiedono PostgreSQL.
+# =============================================================================
+
+import json
+from collections import OrderedDict
+
+import pytest
+
+from app.config import config
+from app.services.anagrafica import sync_ministero
+from app.services.lookup import cache, index, matching
+from app.services.lookup.index import AnagraficaIndex, _Record
+
+
+class _Cursor:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return list(self._rows)
+
+
+class _CacheDb:
+    """Tabelle lookup_cache e lookup_cache_invalidazioni simulate."""
+
+    def __init__(self):
+        self.invalidazioni = {}
+        self.salvate = {}
+        self.versione = 1
+
+    def execute(self, sql, params=None):
+        if 'information_schema' in sql:
+            return _Cursor([{'table_name': 'lookup_cache'}, {'table_name': 'lookup_cache_invalidazioni'}])
+        if 'UPDATE anagrafica_versione' in sql:
+            self.versione += 1
+            return _Cursor([{'versione': self.versione}])
+        if 'INSERT INTO lookup_cache_invalidazioni' in sql:
+            versione, codici, pive, tutto = params
+            self.invalidazioni[versione] = {'versione': versione, 'codici': codici, 'pive': pive, 'tutto': tutto}
+            return _Cursor([])
+        if 'FROM lookup_cache_invalidazioni' in sql:
+            da, a = params
+            return _Cursor([r for v, r in self.invalidazioni.items() if da < v <= a])
+        if 'INSERT INTO lookup_cache' in sql:
+            chiave, versione, risultato, codici, pive, globale = params
+            self.salvate[chiave] = {'chiave': chiave, 'versione': versione, 'risultato': json.loads(risultato),
+                                    'codici': codici, 'pive': pive, 'globale': globale}
+            return _Cursor([])
+        if 'DELETE FROM lookup_cache' in sql:
+            self.salvate = {k: v for k, v in self.salvate.items() if k in params[0]}
+        elif 'FROM lookup_cache' in sql:
+            return _Cursor(list(reversed(list(self.salvate.values()))))
+        return _Cursor([])
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+@pytest.fixture
+def cache_db(monkeypatch):
+    db = _CacheDb()
+    for module in (cache, index):
+        monkeypatch.setattr(module, 'get_db', lambda: db)
+    monkeypatch.setattr(cache, '_entries', OrderedDict())
+    monkeypatch.setattr(cache, '_versione', None)
+    monkeypatch.setattr(cache, '_stats', {'hits': 0, 'misses': 0, 'invalidate': 0, 'svuotamenti': 0})
+    monkeypatch.setattr(cache, '_tables_available', None)
+    monkeypatch.setattr(config, 'LOOKUP_CACHE', True)
+    monkeypatch.setattr(config, 'LOOKUP_CACHE_SIZE', 100)
+    monkeypatch.setattr(config, 'LOOKUP_CACHE_PERSIST', False)
+    return db
+
+
+_FARMACIE = [
+    _Record(1, '012345', '01234567890', 'FARMACIA APPIA', 'VIA APPIA 10', '00100', 'ROMA', 'RM'),
+    _Record(2, '000777', '12345678901', 'FARMACIA AURELIA', 'VIA AURELIA 5', '00165', 'ROMA', 'RM'),
+]
+
+
+@pytest.fixture
+def lookup_env(cache_db, monkeypatch):
+    """lookup_farmacia_extended sull'indice in memoria, con contatore dei calcoli."""
+    state = {'index': AnagraficaIndex(_FARMACIE, [], farmacie_totali=2, versione=1), 'calcoli': 0}
+    monkeypatch.setattr(matching, 'get_anagrafica_index', lambda: state['index'])
+    monkeypatch.setattr(matching, 'lookup_cliente_by_piva',
+                        lambda piva, min_id=None: {'min_id': min_id, 'deposito_riferimento': 'CT'})
+    original = matching.lookup_farmacia
+
+    def counting(data):
+        state['calcoli'] += 1
+        return original(data)
+    monkeypatch.setattr(matching, 'lookup_farmacia', counting)
+    return state
+
+
+def _ordine(**campi):
+    data = {'partita_iva': '12345678901', 'codice_ministeriale': '', 'ragione_sociale': 'FARMACIA AURELIA',
+            'indirizzo': 'VIA AURELIA 5', 'cap': '00165', 'citta': 'ROMA', 'provincia': 'RM'}
+    data.update(campi)
+    return data
+
+
+class TestCacheKey:
+    """Test chiave normalizzata dei dati estratti."""
+
+    def test_normalized_piva_and_spaces(self):
+        a = cache.lookup_cache_key(_ordine(partita_iva='12345678901', indirizzo='VIA  AURELIA 5 '))
+        b = cache.lookup_cache_key(_ordine(partita_iva=' 12345678901', indirizzo='VIA AURELIA 5'))
+        assert a == b
+        assert a[1] == '12345678901'
+
+    def test_min_id_as_used_by_lookup(self):
+        assert cache.lookup_cache_key(_ordine(codice_ministeriale='000777'))[2] == '777'
+        # MIN_ID con meno di 4 caratteri ignorato dal lookup
+        assert cache.lookup_cache_key(_ordine(codice_ministeriale='777'))[0] == \
+            cache.lookup_cache_key(_ordine())[0]
+
+    def test_different_fields(self):
+        base = cache.lookup_cache_key(_ordine())[0]
+        assert cache.lookup_cache_key(_ordine(cap='00100'))[0] != base
+        assert cache.lookup_cache_key(_ordine(indirizzo='VIA APPIA 10'))[0] != base
+        assert cache.lookup_cache_key(_ordine(partita_iva='01234567890'))[0] != base
+
+
+class TestLookupExtendedCache:
+    """Test lookup_farmacia_extended servito dalla cache."""
+
+    def test_hit_after_miss(self, lookup_env):
+        first = matching.lookup_farmacia_extended(_ordine())
+        second = matching.lookup_farmacia_extended(_ordine(indirizzo=' VIA AURELIA  5'))
+        assert first == second
+        assert first['id_farmacia'] == 2
+        assert first['codice_ministeriale'] == '000777'
+        assert lookup_env['calcoli'] == 1
+        stats = cache.get_lookup_cache_stats()
+        assert (stats['hits'], stats['misses'], stats['voci']) == (1, 1, 1)
+
+    def test_returns_copy(self, lookup_env):
+        matching.lookup_farmacia_extended(_ordine())['deposito_riferimento'] = 'XX'
+        assert matching.lookup_farmacia_extended(_ordine())['deposito_riferimento'] == 'CT'
+
+    def test_lru_eviction(self, lookup_env, monkeypatch):
+        monkeypatch.setattr(config, 'LOOKUP_CACHE_SIZE', 2)
+        for cap in ('00165', '00166', '00165', '00167'):
+            matching.lookup_farmacia_extended(_ordine(cap=cap))
+        assert lookup_env['calcoli'] == 3
+        matching.lookup_farmacia_extended(_ordine(cap='00166'))
+        assert lookup_env['calcoli'] == 4
+
+    def test_disabled(self, lookup_env, monkeypatch):
+        monkeypatch.setattr(config, 'LOOKUP_CACHE', False)
+        matching.lookup_farmacia_extended(_ordine())
+        matching.lookup_farmacia_extended(_ordine())
+        assert lookup_env['calcoli'] == 2
+
+    def test_not_used_without_index(self, lookup_env, monkeypatch):
+        monkeypatch.setattr(matching, 'get_anagrafica_index', lambda: None)
+        monkeypatch.setattr(matching, '_anagrafica', lambda: lookup_env['index'])
+        matching.lookup_farmacia_extended(_ordine())
+        matching.lookup_farmacia_extended(_ordine())
+        assert lookup_env['calcoli'] == 2
+        assert cache.get_lookup_cache_stats()['voci'] == 0
+
+
+class TestInvalidation:
+    """Test invalidazione al cambio di versione anagrafica."""
+
+    def _nuova_versione(self, lookup_env, cache_db, **modifiche):
+        index.anagrafica_changed(**modifiche)
+        lookup_env['index'] = AnagraficaIndex(_FARMACIE, [], farmacie_totali=2, versione=cache_db.versione)
+
+    def test_only_changed_codes_dropped(self, lookup_env, cache_db):
+        matching.lookup_farmacia_extended(_ordine())
+        matching.lookup_farmacia_extended(_ordine(partita_iva='01234567890', ragione_sociale='FARMACIA APPIA',
+                                                  indirizzo='VIA APPIA 10', cap='00100'))
+        self._nuova_versione(lookup_env, cache_db, codici=['0777'], partite_iva=[])
+
+        matching.lookup_farmacia_extended(_ordine())
+        matching.lookup_farmacia_extended(_ordine(partita_iva='01234567890', ragione_sociale='FARMACIA APPIA',
+                                                  indirizzo='VIA APPIA 10', cap='00100'))
+        assert lookup_env['calcoli'] == 3
+        assert cache.get_lookup_cache_stats()['invalidate'] == 1
+
+    def test_changed_piva_dropped(self, lookup_env, cache_db):
+        matching.lookup_farmacia_extended(_ordine())
+        self._nuova_versione(lookup_env, cache_db, codici=[], partite_iva=['012345678901'])
+        matching.lookup_farmacia_extended(_ordine())
+        assert lookup_env['calcoli'] == 2
+
+    def test_fuzzy_dropped_on_any_change(self, lookup_env, cache_db):
+        result = matching.lookup_farmacia_extended(_ordine(partita_iva=''))
+        assert result['lookup_method'] == 'FUZZY'
+        self._nuova_versione(lookup_env, cache_db, codici=['999999'], partite_iva=[])
+        matching.lookup_farmacia_extended(_ordine(partita_iva=''))
+        assert lookup_env['calcoli'] == 2
+
+    def test_unchanged_sync_keeps_entries(self, lookup_env, cache_db):
+        matching.lookup_farmacia_extended(_ordine(partita_iva=''))
+        self._nuova_versione(lookup_env, cache_db, codici=[], partite_iva=[])
+        matching.lookup_farmacia_extended(_ordine(partita_iva=''))
+        assert lookup_env['calcoli'] == 1
+
+    def test_change_without_detail_clears(self, lookup_env, cache_db):
+        matching.lookup_farmacia_extended(_ordine())
+        self._nuova_versione(lookup_env, cache_db)
+        assert cache_db.invalidazioni[2]['tutto'] is True
+        matching.lookup_farmacia_extended(_ordine())
+        assert lookup_env['calcoli'] == 2
+        assert cache.get_lookup_cache_stats()['svuotamenti'] == 1
+
+    def test_missing_version_clears(self, lookup_env, cache_db):
+        matching.lookup_farmacia_extended(_ordine())
+        lookup_env['index'] = AnagraficaIndex(_FARMACIE, [], farmacie_totali=2, versione=3)
+        matching.lookup_farmacia_extended(_ordine())
+        assert lookup_env['calcoli'] == 2
+
+    def test_recorded_codes_normalized(self, cache_db):
+        index.anagrafica_changed(codici=['000777', '', None], partite_iva=['0123 4567 890'])
+        assert cache_db.invalidazioni[2] == {'versione': 2, 'codici': ['777'], 'pive': ['1234567890'], 'tutto': False}
+
+
+class TestSyncCodes:
+    """Test codici modificati riportati dalla sync ministero."""
+
+    def test_codici_modificati(self):
+        existing = {'001': {'partita_iva': '111'}, '002': {'partita_iva': '222'}, '003': {'partita_iva': '333'}}
+        aggiornate = [('001', '999', 'FARMACIA')]
+        nuove = [('004', '444', 'FARMACIA')]
+        codici, pive = sync_ministero._codici_modificati(existing, aggiornate, nuove, ['003'])
+        assert codici == ['001', '004', '003']
+        assert sorted(pive) == ['111', '333', '444', '999']
+
+
+class TestPersistence:
+    """Test salvataggio e ricarica delle voci (LOOKUP_CACHE_PERSIST)."""
+
+    def test_reload_skips_invalidated(self, lookup_env, cache_db, monkeypatch):
+        monkeypatch.setattr(config, 'LOOKUP_CACHE_PERSIST', True)
+        matching.lookup_farmacia_extended(_ordine())
+        matching.lookup_farmacia_extended(_ordine(partita_iva='01234567890', ragione_sociale='FARMACIA APPIA',
+                                                  indirizzo='VIA APPIA 10', cap='00100'))
+        assert len(cache_db.salvate) == 2
+        index.anagrafica_changed(codici=['12345'], partite_iva=[])
+
+        # Riavvio: cache vuota, ricaricata alla versione corrente
+        monkeypatch.setattr(cache, '_entries', OrderedDict())
+        monkeypatch.setattr(cache, '_versione', None)
+        assert cache.load_lookup_cache(cache_db.versione) == 1
+        lookup_env['index'] = AnagraficaIndex(_FARMACIE, [], farmacie_totali=2, versione=cache_db.versione)
+
+        matching.lookup_farmacia_extended(_ordine())
+        assert lookup_env['calcoli'] == 2
+        assert list(cache_db.salvate) == [cache.lookup_cache_key(_ordine())[0]]
+
+    def test_not_loaded_without_persist(self, cache_db):
+        assert cache.load_lookup_cache(1) == 0
@@ -0,0 +1,154 @@
+# =============================================================================
+# SERV.O v11.7 - SCORING FUZZY IN BLOCCO TESTS
+# =============================================================================
+# Unit tests per fuzzy_match_full_batch / fuzzy_match_address_batch: stessi
+# punteggi di fuzzy_match_full / fuzzy_match_address (fuzzywuzzy) su dati
+# casuali, accentati e casi limite; lookup_farmacia sceglie lo stesso match.
+# =============================================================================
+
+import random
+
+import pytest
+
+from app.services.lookup import matching, scoring
+from app.services.lookup.index import AnagraficaIndex, _Record
+
+pytestmark = pytest.mark.skipif(not scoring.FUZZY_AVAILABLE, reason="fuzzywuzzy non installato")
+
+
+_PAROLE = ['FARMACIA', 'SAN', 'CENTRALE', "DELL'OSPEDALE", 'S.N.C.', 'VIA', 'P.ZZA', 'ROMA',
+           'PATERNÒ', 'CITTÀ', 'NUOVA', 'Ärzte', 'ŁÓDŹ', '東京', '—', '...', '12', '  ', '']
+
+
+def _testo(rnd):
+    return ' '.join(rnd.choice(_PAROLE) for _ in range(rnd.randint(0, 4)))
+
+
+def _candidato(rnd):
+    return {
+        'ragione_sociale': rnd.choice([_testo(rnd), None]),
+        'indirizzo': rnd.choice([_testo(rnd), '   ', None]),
+        'cap': rnd.choice(['95100', '00100', '', None]),
+        'citta': rnd.choice([_testo(rnd), None]),
+        'provincia': rnd.choice(['CT', 'RM', '', None]),
+    }
+
+
+def _full(ordine, c):
+    return scoring.fuzzy_match_full(
+        ordine['ragione_sociale'], ordine['citta'], ordine['indirizzo'],
+        c['ragione_sociale'] or '', c['citta'] or '', c['indirizzo'] or '',
+        ordine['cap'], c['cap'] or '',
+        ordine['provincia'], c['provincia'] or ''
+    )
+
+
+def _address(ordine, c):
+    return scoring.fuzzy_match_address(
+        ordine['citta'], ordine['indirizzo'],
+        c['citta'] or '', c['indirizzo'] or '',
+        ordine['cap'], c['cap'] or '',
+        ordine['provincia'], c['provincia'] or ''
+    )
+
+
+def _batch_args(ordine):
+    return ordine['citta'], ordine['indirizzo'], ordine['cap'], ordine['provincia']
+
+
+class TestTokenSortScores:
+    """Test equivalenza con fuzz.token_sort_ratio."""
+
+    @pytest.mark.parametrize('query', ['VIA ROMA 1', 'città di PATERNÒ', '...', '', '  ', 'ŁÓDŹ 東京'])
+    def test_same_as_fuzzywuzzy(self, query):
+        choices = ['VIA ROMA 1', 'ROMA VIA 1', 'CITTÀ DI PATERNO', '---', '', 'łódź', '東京 ŁÓDŹ', 'x']
+        assert scoring.token_sort_scores(query, choices) == \
+            [scoring.fuzz.token_sort_ratio(query, c) for c in choices]
+
+    def test_empty_choices(self):
+        assert scoring.token_sort_scores('VIA ROMA', []) == []
+
+    def test_without_rapidfuzz(self, monkeypatch):
+        monkeypatch.setattr(scoring, 'RAPIDFUZZ_AVAILABLE', False)
+        assert scoring.token_sort_scores('VIA ROMA 1', ['ROMA VIA 1', 'VIA MILANO']) == \
+            [100, scoring.fuzz.token_sort_ratio('VIA ROMA 1', 'VIA MILANO')]
+
+
+class TestBatchEquivalence:
+    """Test punteggi in blocco identici al calcolo un candidato alla volta."""
+
+    @pytest.mark.parametrize('seed', range(20))
+    def test_random(self, seed):
+        rnd = random.Random(seed)
+        ordine = {
+            'ragione_sociale': _testo(rnd),
+            'indirizzo': rnd.choice([_testo(rnd), '   ']),
+            'cap': rnd.choice(['95100', '']),
+            'citta': _testo(rnd),
+            'provincia': rnd.choice(['CT', '']),
+        }
+        candidati = [_candidato(rnd) for _ in range(60)]
+
+        assert scoring.fuzzy_match_full_batch(ordine['ragione_sociale'], ordine['citta'], ordine['indirizzo'],
+                                              ordine['cap'], ordine['provincia'], candidati) == \
+            [_full(ordine, c) for c in candidati]
+        assert scoring.fuzzy_match_address_batch(*_batch_args(ordine), candidati) == \
+            [_address(ordine, c) for c in candidati]
+
+    def test_empty_extracted_address(self):
+        """Indirizzo estratto vuoto: ramo citta'/indirizzo separati."""
+        ordine = {'ragione_sociale': 'FARMACIA ROSSI', 'indirizzo': '', 'cap': '', 'citta': '', 'provincia': ''}
+        candidati = [{'ragione_sociale': 'FARMACIA ROSSI SNC', 'indirizzo': 'VIA ROMA 1',
+                      'cap': '95100', 'citta': 'CATANIA', 'provincia': 'CT'}]
+        assert scoring.fuzzy_match_full_batch('FARMACIA ROSSI', '', '', '', '', candidati) == \
+            [_full(ordine, c) for c in candidati]
+        assert scoring.fuzzy_match_address_batch('', '', '', '', candidati) == [0]
+
+    def test_no_candidates(self):
+        assert scoring.fuzzy_match_full_batch('FARMACIA', 'ROMA', 'VIA ROMA', '', '', []) == []
+        assert scoring.fuzzy_match_address_batch('ROMA', 'VIA ROMA', '', '', []) == []
+
+
+class TestLookupSameMatch:
+    """Test lookup_farmacia con punteggi in blocco."""
+
+    def test_fuzzy_prefers_first_on_ties(self, monkeypatch):
+        """A parita' di punteggio vince la prima farmacia (confronto stretto)."""
+        farmacie = [
+            _Record(1, '000001', '', 'FARMACIA CENTRALE', 'VIA ROMA 1', '95100', 'CATANIA', 'CT'),
+            _Record(2, '000002', '', 'FARMACIA CENTRALE', 'VIA ROMA 1', '95100', 'CATANIA', 'CT'),
+        ]
+        parafarmacie = [
+            _Record(10, 'PF001', '', 'FARMACIA CENTRALE', 'VIA ROMA 1', '95100', 'CATANIA', 'CT'),
+        ]
+        idx = AnagraficaIndex(farmacie, parafarmacie, farmacie_totali=2)
+        monkeypatch.setattr(matching, 'get_anagrafica_index', lambda: idx)
+
+        result = matching.lookup_farmacia({
+            'ragione_sociale': 'FARMACIA CENTRALE', 'citta': 'CATANIA', 'indirizzo': 'VIA ROMA 1',
+            'cap': '95100', 'provincia': 'CT',
+        })
+        assert result == (1, None, 'FUZZY', 'FARMACIA', 100)
+
+    def test_fuzzy_parafarmacia(self, monkeypatch):
+        farmacie = [_Record(1, '000001', '', 'FARMACIA ROSSI', 'VIA ETNEA 300', '95100', 'CATANIA', 'CT')]
+        parafarmacie = [_Record(10, 'PF001', '', 'PARAFARMACIA SOLE', 'VIA ROMA 1', '95100', 'CATANIA', 'CT')]
+        idx = AnagraficaIndex(farmacie, parafarmacie, farmacie_totali=1)
+        monkeypatch.setattr(matching, 'get_anagrafica_index', lambda: idx)
+
+        result = matching.lookup_farmacia({
+            'ragione_sociale': 'PARAFARMACIA SOLE', 'citta': 'CATANIA', 'indirizzo': 'VIA ROMA 1',
+            'cap': '95100', 'provincia': 'CT',
+        })
+        assert result == (None, 10, 'FUZZY', 'PARAFARMACIA', 100)
+
+    def test_multipunto(self):
+        records = [
+            {'id_farmacia': 1, 'citta': 'CATANIA', 'indirizzo': 'VIA ETNEA 300', 'cap': '95100', 'provincia': 'CT'},
+            {'id_farmacia': 2, 'citta': 'CATANIA', 'indirizzo': 'VIA ROMA 1', 'cap': '95100', 'provincia': 'CT'},
+        ]
+        best, score = matching._disambiguate_multipunto(
+            records, 'CATANIA', 'VIA ROMA 1', 'id_farmacia', cap='95100', provincia='CT'
+        )
+        assert best['id_farmacia'] == 2
+        assert score == 100
@@ -0,0 +1,71 @@
+# =============================================================================
+# SERV.O v11.7 - MIGRAZIONI DATABASE TESTS
+# =============================================================================
+# Unit tests per app.scripts.migrate_db: script v11.7 in migrations/ applicati
+# dalla migrazione (non all'avvio), rollback sugli errori. DB finto, non
+# richiede PostgreSQL.
+# =============================================================================
+
+from app.scripts import migrate_db
+
+
+class _FakeDb:
+    """Registra statement e script; check senza righe (migrazione necessaria)."""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.statements = []
+        self.scripts = []
+        self.commits = 0
+        self.rollbacks = 0
+
+    def execute(self, sql, params=None):
+        self.statements.append(sql)
+        return self
+
+    def executescript(self, script):
+        if self.fail:
+            raise RuntimeError('canceling statement due to lock timeout')
+        self.scripts.append(script)
+
+    def fetchone(self):
+        return None
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+def _migration(file):
+    return next(m for m in migrate_db.MIGRATIONS if m.get('file') == file)
+
+
+class TestMigrationFiles:
+    """Test step v11.7 con script in migrations/."""
+
+    def test_files_exist(self):
+        files = [m['file'] for m in migrate_db.MIGRATIONS if 'file' in m]
+        assert files
+        for file in files:
+            assert (migrate_db.MIGRATIONS_DIR / file).is_file()
+
+    def test_applies_script(self):
+        db = _FakeDb()
+        migration = _migration('v11_7_anagrafica_versione.sql')
+        assert migrate_db.check_migration_needed(db, migration)
+        assert migrate_db.apply_migration(db, migration)
+        assert db.scripts == [(migrate_db.MIGRATIONS_DIR / migration['file']).read_text(encoding='utf-8')]
+
+    def test_failure_rolled_back(self):
+        db = _FakeDb(fail=True)
+        assert not migrate_db.apply_migration(db, _migration('v11_7_anagrafica_versione.sql'))
+        assert db.rollbacks == 1
+
+    def test_no_statement_timeout(self, monkeypatch):
+        db = _FakeDb()
+        monkeypatch.setattr('app.database_pg.get_db', lambda: db)
+        monkeypatch.setattr(migrate_db, 'MIGRATIONS', [_migration('v11_7_anagrafica_versione.sql')])
+        assert migrate_db.run_migrations() == 1
+        assert db.statements[0] == 'SET statement_timeout = 0'
@@ -0,0 +1,142 @@
+# =============================================================================
+# SERV.O v11.7 - PARSED DOCUMENT TESTS
+# =============================================================================
+# Unit tests per cache per pagina del documento PDF condiviso tra
+# estrazione testo ed estrattori vendor. pdfplumber (backend di default)
+# sostituito da un finto.
+# =============================================================================
+
+import pytest
+
+from app.services.extraction import backends
+from app.services.extraction.document import ParsedDocument, open_document, full_text
+
+
+class _FakePage:
+    def __init__(self, n, calls):
+        self.n = n
+        self.calls = calls
+
+    def extract_text(self, x_tolerance=3, y_tolerance=3):
+        self.calls.append(('text', self.n, x_tolerance))
+        return f"pagina {self.n} x={x_tolerance}"
+
+    def extract_words(self, x_tolerance=3, y_tolerance=3):
+        self.calls.append(('words', self.n, x_tolerance))
+        return [{'text': 'ORDINE', 'x0': 10, 'top': 5}]
+
+    def extract_tables(self, table_settings=None):
+        self.calls.append(('tables', self.n, repr(table_settings)))
+        return [[['AIC', 'QTA'], ['012345678', '3']]]
+
+
+class _FakePdf:
+    def __init__(self, source, calls):
+        self.source = source
+        self.pages = [_FakePage(n, calls) for n in range(2)]
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    calls = []
+
+    class _Plumber:
+        @staticmethod
+        def open(source):
+            return _FakePdf(source, calls)
+
+    monkeypatch.setattr(backends, 'pdfplumber', _Plumber, raising=False)
+    monkeypatch.setattr(backends, 'PDFPLUMBER_AVAILABLE', True)
+    return calls
+
+
+class TestParsedDocument:
+    """Test cache lazy di testo, parole e tabelle."""
+
+    def test_text_parsed_once_per_settings(self, calls):
+        doc = ParsedDocument(b'%PDF')
+        assert doc.text(0, x_tolerance=5) == "pagina 0 x=5"
+        assert doc.text(0, x_tolerance=5) == "pagina 0 x=5"
+        assert doc.text(0, x_tolerance=1) == "pagina 0 x=1"
+        assert calls == [('text', 0, 5), ('text', 0, 1)]
+
+    def test_words_and_tables_cached(self, calls):
+        doc = ParsedDocument(b'%PDF')
+        doc.words(1, x_tolerance=5)
+        doc.words(1, x_tolerance=5)
+        doc.tables(0)
+        doc.tables(0)
+        doc.tables(0, {'text_x_tolerance': 1})
+        assert calls == [
+            ('words', 1, 5),
+            ('tables', 0, 'None'),
+            ('tables', 0, "{'text_x_tolerance': 1}"),
+        ]
+
+    def test_page_count_and_close(self, calls):
+        doc = ParsedDocument(b'%PDF')
+        pdf = doc._pdf._pdf
+        assert doc.page_count == 2
+        doc.close()
+        doc.close()
+        assert pdf.closed
+
+
+class TestJoinedText:
+    """Test testo normalizzato letto pagina per pagina (v11.7)."""
+
+    def test_all_pages(self, calls):
+        doc = ParsedDocument(b'%PDF', text_fixer=str.upper)
+        text, lines = doc.joined_text()
+        assert text == "PAGINA 0 X=5\nPAGINA 1 X=5\n"
+        assert lines == ["PAGINA 0 X=5", "PAGINA 1 X=5"]
+        assert not doc.text_truncated
+
+    def test_prefix_reads_only_needed_pages(self, calls):
+        doc = ParsedDocument(b'%PDF')
+        text, lines = doc.joined_text(max_chars=5)
+        assert text == "pagina 0 x=5\n"
+        assert doc.text_truncated
+        assert calls == [('text', 0, 5)]
+
+        # Le pagine gia' lette vengono dalla cache
+        full, _ = doc.joined_text()
+        assert full.startswith(text)
+        assert calls == [('text', 0, 5), ('text', 1, 5)]
+        assert not doc.text_truncated
+
+    def test_full_text(self, calls):
+        doc = ParsedDocument(b'%PDF')
+        text, lines = doc.joined_text(max_chars=5)
+        assert full_text(text, lines, doc)[1] == ["pagina 0 x=5", "pagina 1 x=5"]
+        assert full_text("intero", ["intero"], doc) == ("intero", ["intero"])
+        assert full_text("intero", ["intero"], None) == ("intero", ["intero"])
+
+
+class TestOpenDocument:
+    """Test riuso del documento passato dal chiamante."""
+
+    def test_shared_document_not_closed(self, calls):
+        doc = ParsedDocument(b'%PDF')
+        with open_document(doc) as same:
+            assert same is doc
+        assert doc.page_count == 2
+
+    def test_path_opened_and_closed(self, calls):
+        with open_document('/tmp/ordine.pdf') as doc:
+            pdf = doc._pdf._pdf
+            assert pdf.source == '/tmp/ordine.pdf'
+        assert pdf.closed
+
+    def test_none(self):
+        with open_document(None) as doc:
+            assert doc is None
+
+    def test_pdfplumber_missing(self, monkeypatch):
+        monkeypatch.setattr(backends, 'PDFPLUMBER_AVAILABLE', False)
+        with pytest.raises(ImportError):
+            ParsedDocument(b'%PDF')
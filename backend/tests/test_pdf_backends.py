@@ -0,0 +1,143 @@
+# =============================================================================
+# SERV.O v11.7 - BACKEND TESTO PDF TESTS
+# =============================================================================
+# Equivalenza pdfplumber / pdfium sul corpus sintetico: per ogni vendor gli
+# ordini estratti devono essere identici con i due backend (condizione per
+# abilitare un vendor in PDF_FAST_TEXT_VENDORS). Inoltre: pagine rilette con
+# pdfplumber per i vendor non abilitati, pagine non gestite da PDFium.
+# Richiede pdfplumber e pypdfium2, non PostgreSQL.
+# =============================================================================
+
+import pytest
+
+pytest.importorskip('pdfplumber')
+pytest.importorskip('pypdfium2')
+
+from app.config import config
+from app.scripts.synthetic_corpus import LAYOUTS, generate_pdf
+from app.services import pdf_processor
+from app.services.extraction import backends
+from app.services.extraction.backends import PdfiumBackend, PdfplumberBackend
+from app.services.extraction.document import ParsedDocument
+
+
+def _extract(monkeypatch, content, detect='pdfplumber', vendors=''):
+    monkeypatch.setattr(config, 'PDF_DETECT_BACKEND', detect)
+    monkeypatch.setattr(config, 'PDF_FAST_TEXT_VENDORS', vendors)
+    data = pdf_processor.extract_pdf_data('ordine.pdf', content)
+    data.pop('tempi')
+    return data
+
+
+class TestGoldenEquivalence:
+    """Ordini identici con i due backend, per ogni vendor."""
+
+    @pytest.mark.parametrize('vendor', sorted(LAYOUTS))
+    def test_same_orders(self, monkeypatch, vendor):
+        content, _ = generate_pdf(vendor, pages=3, rows=6, seed=7)
+
+        riferimento = _extract(monkeypatch, content)
+        veloce = _extract(monkeypatch, content, detect='pdfium', vendors=vendor)
+
+        assert riferimento['orders_data']
+        assert veloce == riferimento
+
+    @pytest.mark.parametrize('vendor', sorted(LAYOUTS))
+    def test_same_page_text(self, vendor):
+        content, _ = generate_pdf(vendor, pages=2, rows=6, seed=3)
+        plumber, pdfium = PdfplumberBackend(content), PdfiumBackend(content)
+        try:
+            for page_no in range(plumber.page_count):
+                for x_tolerance in (1, 3, 5):
+                    assert pdfium.text(page_no, x_tolerance, 3) == plumber.text(page_no, x_tolerance, 3)
+            # Tabelle lette con pdfplumber, aperto solo alla prima richiesta
+            assert pdfium._plumber is None
+            assert pdfium.tables(0, None) == plumber.tables(0, None)
+        finally:
+            plumber.close()
+            pdfium.close()
+
+    def test_fast_backend_used(self, monkeypatch):
+        monkeypatch.setattr(config, 'PDF_FAST_TEXT_VENDORS', 'angelini')
+        content, _ = generate_pdf('ANGELINI', pages=2, rows=4)
+        with pdf_processor.open_pdf_document(content) as doc:
+            data = pdf_processor.extract_document_data(doc, 'a.pdf')
+            assert data['vendor'] == 'ANGELINI'
+            assert doc.backend_name == 'pdfium'
+            assert isinstance(doc._pdf, PdfiumBackend)
+            # Documento pdfplumber del detect riusato, non riaperto
+            assert isinstance(doc._pdf._plumber, PdfplumberBackend)
+
+
+class TestUseBackend:
+    """Passaggio di backend su un documento aperto."""
+
+    def test_disabled_vendor_rereads_with_pdfplumber(self):
+        content, _ = generate_pdf('CHIESI', pages=2, rows=4)
+        with ParsedDocument(content, backend='pdfium') as doc:
+            testo = doc.plain_text(0)
+            letti = doc.parsed
+
+            assert doc.use_backend('pdfplumber') is True
+            assert doc.plain_text(0) == testo
+            assert doc.parsed == letti + 1
+            assert isinstance(doc._pdf, PdfplumberBackend)
+
+    def test_reference_extractions_kept(self):
+        content, _ = generate_pdf('CHIESI', pages=2, rows=4)
+        with ParsedDocument(content) as doc:
+            doc.plain_text(0)
+            assert doc.use_backend('pdfium') is False
+            letti = doc.parsed
+            doc.plain_text(0)
+            assert doc.parsed == letti
+
+    def test_detect_with_pdfium_disabled_vendor(self, monkeypatch):
+        content, _ = generate_pdf('VIATRIS', pages=2, rows=4)
+        assert _extract(monkeypatch, content, detect='pdfium') == _extract(monkeypatch, content)
+
+
+class TestPdfiumFallback:
+    """Pagine che PDFium non descrive come pdfminer: lette con pdfplumber."""
+
+    def test_rotated_page(self):
+        content, _ = generate_pdf('CODIFI', pages=1, rows=4)
+        content = content.replace(b'/Type /Page /Parent', b'/Type /Page /Rotate 90 /Parent')
+        plumber, pdfium = PdfplumberBackend(content), PdfiumBackend(content)
+        try:
+            assert pdfium._page_chars(0) is None
+            assert pdfium.words(0, 3, 3) == plumber.words(0, 3, 3)
+        finally:
+            plumber.close()
+            pdfium.close()
+
+
+class TestBackendConfig:
+    """Test scelta del backend da configurazione."""
+
+    def test_backend_for_vendor(self, monkeypatch):
+        monkeypatch.setattr(config, 'PDF_FAST_TEXT_VENDORS', ' angelini , VIATRIS')
+        assert backends.backend_for_vendor('ANGELINI') == 'pdfium'
+        assert backends.backend_for_vendor('VIATRIS') == 'pdfium'
+        assert backends.backend_for_vendor('COOPER') == 'pdfplumber'
+        assert backends.backend_for_vendor(None) == 'pdfplumber'
+
+    def test_pdfium_missing(self, monkeypatch):
+        monkeypatch.setattr(config, 'PDF_FAST_TEXT_VENDORS', 'ANGELINI')
+        monkeypatch.setattr(config, 'PDF_DETECT_BACKEND', 'pdfium')
+        monkeypatch.setattr(backends, 'PDFIUM_AVAILABLE', False)
+        assert backends.backend_for_vendor('ANGELINI') == 'pdfplumber'
+        assert backends.detect_backend() == 'pdfplumber'
+
+    def test_incomplete_backend_not_instantiable(self):
+        """Un backend senza un metodo dell'interfaccia fallisce alla creazione."""
+
+        class _SenzaTabelle(PdfplumberBackend):
+            tables = backends.PdfBackend.tables
+
+        with pytest.raises(TypeError, match='tables'):
+            _SenzaTabelle(b'')
+
+    def test_unknown_backend(self):
+        with pytest.raises(ValueError):
+            backends.open_backend('mupdf', b'%PDF')
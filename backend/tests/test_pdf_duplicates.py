@@ -0,0 +1,144 @@
+# =============================================================================
+# SERV.O v11.7 - DUPLICATI PDF PER HASH TESTS
+# =============================================================================
+# Unit tests per il percorso rapido dei duplicati in process_pdf (nessun
+# parsing ne' scrittura su disco) e per la verifica hash in blocco.
+# Non richiedono PostgreSQL.
+# =============================================================================
+
+from app.services import pdf_processor
+from app.services.ingestion import parallel
+from app.utils import compute_file_hash
+
+
+class _Cursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+
+class _FakeDB:
+    """Connessione finta: registra gli statement, risponde con righe predefinite."""
+
+    def __init__(self, rows=None):
+        self.rows = rows or []
+        self.executed = []
+        self.commits = 0
+
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+        if 'DISTINCT ON' in sql:
+            return _Cursor(self.rows)
+        return _Cursor([(501,)])
+
+    def commit(self):
+        self.commits += 1
+
+
+_ORIGINALE = {
+    'hash_file': 'a' * 64, 'id_acquisizione': 12, 'vendor': 'ANGELINI',
+    'numero_ordine_vendor': 'ORD-77', 'stato': 'EVASO', 'ragione_sociale_1': 'FARMACIA ROSSI',
+}
+
+
+class TestCheckDuplicateHashes:
+    """Test verifica duplicati in blocco."""
+
+    def test_single_query_for_all_hashes(self, monkeypatch):
+        db = _FakeDB([_ORIGINALE])
+        monkeypatch.setattr(pdf_processor, 'get_db', lambda: db)
+
+        duplicati = pdf_processor.check_duplicate_hashes(['a' * 64, 'b' * 64, 'a' * 64])
+        assert len(db.executed) == 1
+        assert sorted(db.executed[0][1][0]) == ['a' * 64, 'b' * 64]
+        assert list(duplicati) == ['a' * 64]
+        assert duplicati['a' * 64] == {
+            'id_acquisizione_originale': 12,
+            'vendor': 'ANGELINI',
+            'stato_ordine': 'EVASO',
+            'info_ordine': 'Ordine ORD-77 (ANGELINI) - FARMACIA ROSSI',
+        }
+
+    def test_acquisition_without_order(self, monkeypatch):
+        row = dict(_ORIGINALE, numero_ordine_vendor=None, stato=None, ragione_sociale_1=None)
+        monkeypatch.setattr(pdf_processor, 'get_db', lambda: _FakeDB([row]))
+
+        info = pdf_processor.check_duplicate_hashes(['a' * 64])['a' * 64]
+        assert info['stato_ordine'] == 'SCONOSCIUTO'
+        assert info['info_ordine'] == ''
+
+    def test_empty_list_no_query(self, monkeypatch):
+        db = _FakeDB()
+        monkeypatch.setattr(pdf_processor, 'get_db', lambda: db)
+        assert pdf_processor.check_duplicate_hashes([]) == {}
+        assert db.executed == []
+
+
+class TestDuplicateFastPath:
+    """Test process_pdf su PDF gia' acquisito."""
+
+    def test_no_parsing_no_disk_write(self, monkeypatch, tmp_path):
+        content = b'%PDF-1.4 duplicato'
+        db = _FakeDB([dict(_ORIGINALE, hash_file=compute_file_hash(content))])
+        monkeypatch.setattr(pdf_processor, 'get_db', lambda: db)
+        monkeypatch.setattr(pdf_processor.config, 'UPLOAD_DIR', str(tmp_path))
+
+        def no_parsing(*args):
+            raise AssertionError("parsing non atteso per un duplicato")
+
+        monkeypatch.setattr(pdf_processor, '_extract_text', no_parsing)
+        monkeypatch.setattr(pdf_processor, 'detect_vendor', no_parsing)
+
+        result = pdf_processor.process_pdf('ordine.pdf', content)
+        assert result['status'] == 'DUPLICATO'
+        assert result['vendor'] == 'ANGELINI'
+        assert result['id_acquisizione'] == 501
+        assert result['duplicato_info']['id_acquisizione_originale'] == 12
+        assert 'ORD-77' in result['anomalie'][0]
+        assert list(tmp_path.iterdir()) == []
+
+        # Lookup + acquisizione/anomalia in un solo statement, un commit
+        assert len(db.executed) == 2
+        sql, params = db.executed[1]
+        assert 'INSERT INTO anomalie' in sql
+        assert params == ('ordine.pdf', len(content), 12)
+        assert db.commits == 1
+
+
+class TestParallelSkipsDuplicates:
+    """Test upload multiplo: i duplicati non vengono inviati al pool."""
+
+    def test_duplicates_not_submitted(self, monkeypatch):
+        submitted = []
+
+        class _Pool:
+            def submit(self, fn, filename, content):
+                submitted.append(filename)
+
+        monkeypatch.setattr(parallel, 'get_extraction_pool', lambda: _Pool())
+        monkeypatch.setattr(parallel, '_duplicate_flags', lambda files: [True, False])
+
+        futures = parallel._extract_async([('dup.pdf', b'1'), ('nuovo.pdf', b'2')])
+        assert submitted == ['nuovo.pdf']
+        assert futures[0] is None
+
+    def test_check_failure_extracts_everything(self, monkeypatch):
+        submitted = []
+
+        class _Pool:
+            def submit(self, fn, filename, content):
+                submitted.append(filename)
+
+        def db_down(files):
+            raise ConnectionError("db non raggiungibile")
+
+        monkeypatch.setattr(parallel, 'get_extraction_pool', lambda: _Pool())
+        monkeypatch.setattr(parallel, '_duplicate_flags', db_down)
+
+        parallel._extract_async([('a.pdf', b'1'), ('b.pdf', b'2')])
+        assert submitted == ['a.pdf', 'b.pdf']
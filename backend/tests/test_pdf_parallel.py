@@ -0,0 +1,147 @@
+# =============================================================================
+# SERV.O v11.7 - ELABORAZIONE PDF PARALLELA TESTS
+# =============================================================================
+# Unit tests per la fase di estrazione separata da process_pdf e per
+# l'orchestrazione estrazione (processi) / inserimento DB (thread).
+# Non richiedono PostgreSQL.
+# =============================================================================
+
+from concurrent.futures import Future
+
+import pytest
+
+from app.services import pdf_processor
+from app.services.ingestion import parallel
+
+
+class _FakeDocument:
+    """ParsedDocument finto: registra la chiusura."""
+    opened = []
+
+    def __init__(self, content, text_fixer=None, backend=None):
+        self.content = content
+        self.closed = False
+        self.text_truncated = False
+        _FakeDocument.opened.append(self)
+
+    def close(self):
+        self.closed = True
+
+    def use_backend(self, backend):
+        return False
+
+
+@pytest.fixture
+def fake_document(monkeypatch):
+    _FakeDocument.opened = []
+    monkeypatch.setattr(pdf_processor, 'ParsedDocument', _FakeDocument)
+    return _FakeDocument
+
+
+class TestExtractPdfData:
+    """Test errori riportati (non sollevati) da extract_pdf_data."""
+
+    def test_text_error_reported(self, fake_document, monkeypatch):
+        def broken(doc, max_chars=None):
+            raise ValueError("PDF corrotto")
+
+        monkeypatch.setattr(pdf_processor, '_extract_text', broken)
+        data = pdf_processor.extract_pdf_data('ordine.pdf', b'xx')
+        assert data['errore_testo'] == "PDF corrotto"
+        assert data['orders_data'] is None
+        assert fake_document.opened[0].closed
+
+    def test_extractor_error_reported(self, fake_document, monkeypatch):
+        def extractor(text, lines, doc):
+            raise KeyError('n_ordine')
+
+        monkeypatch.setattr(pdf_processor, '_extract_text', lambda d, max_chars=None: ("testo", ["testo"]))
+        monkeypatch.setattr(pdf_processor, 'detect_vendor', lambda t, f: ('ANGELINI', 0.9))
+        monkeypatch.setattr(pdf_processor, 'get_extractor', lambda v: extractor)
+
+        data = pdf_processor.extract_pdf_data('ordine.pdf', b'%PDF')
+        assert data['vendor'] == 'ANGELINI'
+        assert data['confidence'] == 0.9
+        assert data['errore_testo'] is None
+        assert 'n_ordine' in data['errore_estrattore']
+        assert fake_document.opened[0].closed
+
+    def test_extractor_receives_same_document(self, fake_document, monkeypatch):
+        received = []
+
+        def extractor(text, lines, doc):
+            received.append(doc)
+            return [{'numero_ordine': '1'}]
+
+        monkeypatch.setattr(pdf_processor, '_extract_text', lambda d, max_chars=None: ("t", ["t"]))
+        monkeypatch.setattr(pdf_processor, 'detect_vendor', lambda t, f: ('DOC_GENERICI', 1.0))
+        monkeypatch.setattr(pdf_processor, 'get_extractor', lambda v: extractor)
+
+        data = pdf_processor.extract_pdf_data('ordine.pdf', b'%PDF')
+        assert data['orders_data'] == [{'numero_ordine': '1'}]
+        assert data['errore_estrattore'] is None
+        assert received == fake_document.opened
+        assert len(fake_document.opened) == 1
+
+
+def _done(value=None, error=None) -> Future:
+    future = Future()
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(value)
+    return future
+
+
+@pytest.fixture
+def fake_store(monkeypatch):
+    """process_pdf finto: registra il parametro extracted ricevuto."""
+    calls = {}
+
+    def fake_process(filename, content, extracted=None):
+        calls[filename] = extracted
+        if filename == 'boom.pdf':
+            raise RuntimeError("connessione persa")
+        return {'filename': filename, 'status': 'OK', 'ordini': 1, 'righe': 2}
+
+    monkeypatch.setattr(pdf_processor, 'process_pdf', fake_process)
+    return calls
+
+
+class TestProcessPdfsParallel:
+    """Test orchestrazione con pool di processi sostituito da future gia' risolte."""
+
+    def test_results_in_input_order(self, fake_store, monkeypatch):
+        files = [(f'{n}.pdf', b'%PDF') for n in range(6)]
+        monkeypatch.setattr(parallel, '_extract_async',
+                            lambda f: [_done({'vendor': name}) for name, _ in f])
+
+        results = parallel.process_pdfs_parallel(files)
+        assert [r['filename'] for r in results] == [name for name, _ in files]
+        assert fake_store['3.pdf'] == {'vendor': '3.pdf'}
+
+    def test_broken_pool_falls_back_to_inline_extraction(self, fake_store, monkeypatch):
+        monkeypatch.setattr(parallel, '_extract_async',
+                            lambda f: [_done(error=RuntimeError("BrokenProcessPool"))])
+
+        results = parallel.process_pdfs_parallel([('a.pdf', b'%PDF')])
+        assert results[0]['status'] == 'OK'
+        assert fake_store['a.pdf'] is None
+
+    def test_db_error_becomes_result(self, fake_store, monkeypatch):
+        monkeypatch.setattr(parallel, '_extract_async', lambda f: [None] * len(f))
+
+        results = parallel.process_pdfs_parallel([('boom.pdf', b'%PDF'), ('ok.pdf', b'%PDF')])
+        assert results[0]['status'] == 'ERRORE'
+        assert results[0]['anomalie'] == ["connessione persa"]
+        assert results[1]['status'] == 'OK'
+
+    def test_empty(self):
+        assert parallel.process_pdfs_parallel([]) == []
+
+    def test_processes_default_to_cpu_count(self, monkeypatch):
+        monkeypatch.setattr(parallel.config, 'PDF_EXTRACT_PROCESSES', 0)
+        monkeypatch.setattr(parallel.os, 'cpu_count', lambda: 8)
+        assert parallel.extraction_processes() == 8
+        monkeypatch.setattr(parallel.config, 'PDF_EXTRACT_PROCESSES', 3)
+        assert parallel.extraction_processes() == 3
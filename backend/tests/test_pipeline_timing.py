@@ -0,0 +1,206 @@
+# =============================================================================
+# SERV.O v11.7 - TEMPI PIPELINE PDF TESTS
+# =============================================================================
+# Unit tests per i tempi per fase di process_pdf: giri del timer, unione dei
+# tempi misurati nel processo di estrazione, salvataggio e statistiche.
+# Non richiedono PostgreSQL.
+# =============================================================================
+
+from decimal import Decimal
+
+import pytest
+
+from app.services import pdf_processor
+from app.services.ingestion import timing
+from app.services.ingestion.timing import PipelineTimer, pipeline_timer, lap
+
+
+class _FakeDb:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.inserted = []
+        self.committed = False
+        self.rolled_back = False
+
+    def execute_insert(self, sql, rows):
+        if self.fail:
+            raise RuntimeError("relation acquisizioni_tempi does not exist")
+        self.inserted.extend(rows)
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        self.rolled_back = True
+
+
+class TestPipelineTimer:
+    """Test giri del timer e timer attivo nel contesto."""
+
+    def test_laps_accumulate_per_stage(self):
+        timer = PipelineTimer()
+        timer.lap('testo')
+        timer.lap('ftfy')
+        timer.lap('testo')
+        assert set(timer.stages) == {'testo', 'ftfy'}
+        assert all(wall >= 0 and cpu >= 0 for wall, cpu in timer.stages.values())
+        assert timer.totals()[0] == pytest.approx(sum(v[0] for v in timer.stages.values()))
+
+    def test_lap_without_timer_is_noop(self):
+        lap('hash')
+        timing.record_pages(3)
+
+    def test_active_timer_receives_laps(self):
+        with pipeline_timer() as timer:
+            lap('hash')
+            timing.record_pages(2)
+        lap('dopo')
+        assert list(timer.stages) == ['hash']
+        assert timer.n_pagine == 2
+
+    def test_merge(self):
+        timer = PipelineTimer()
+        timer.stages['estrattore'] = [1.0, 1.0]
+        timer.merge({'estrattore': [10.0, 8.0], 'testo': [5.0, 4.0]}, n_pagine=3)
+        assert timer.stages == {'estrattore': [11.0, 9.0], 'testo': [5.0, 4.0]}
+        assert timer.n_pagine == 3
+        timer.merge(None)
+        assert timer.n_pagine == 3
+
+
+class TestSaveTimings:
+    """Test righe salvate in acquisizioni_tempi."""
+
+    def test_rows_with_total(self):
+        db = _FakeDb()
+        timer = PipelineTimer()
+        timer.stages = {'testo': [30.0, 25.0], 'inserimento_righe': [10.0, 2.0]}
+        timer.n_pagine = 2
+
+        timing.save_timings(db, 7, 'OPELLA', timer, n_righe=12)
+        assert db.inserted == [
+            (7, 'OPELLA', 'testo', 30.0, 25.0, 2, 12),
+            (7, 'OPELLA', 'inserimento_righe', 10.0, 2.0, 2, 12),
+            (7, 'OPELLA', 'totale', 40.0, 27.0, 2, 12),
+        ]
+        assert db.committed
+
+    def test_error_does_not_raise(self):
+        db = _FakeDb(fail=True)
+        timer = PipelineTimer()
+        timer.lap('hash')
+        timing.save_timings(db, 7, 'OPELLA', timer)
+        assert db.rolled_back
+
+    def test_disabled(self, monkeypatch):
+        monkeypatch.setattr(timing.config, 'PDF_STAGE_TIMINGS', False)
+        db = _FakeDb()
+        timer = PipelineTimer()
+        timer.lap('hash')
+        timing.save_timings(db, 7, 'OPELLA', timer)
+        assert db.inserted == []
+
+
+class TestVariazione:
+    """Test confronto con la finestra precedente."""
+
+    def test_percentage(self):
+        row = timing._variazione({'wall_ms_medio': Decimal('120.0'),
+                                  'wall_ms_medio_precedente': Decimal('100.0')})
+        assert row['variazione_pct'] == 20.0
+
+    def test_no_previous_window(self):
+        row = timing._variazione({'wall_ms_medio': Decimal('120.0'),
+                                  'wall_ms_medio_precedente': None})
+        assert row['variazione_pct'] is None
+
+
+class TestProcessPdfTimings:
+    """Test integrazione con process_pdf ed extract_pdf_data."""
+
+    def test_extracted_times_merged_and_saved(self, monkeypatch):
+        saved = {}
+
+        def fake_body(filename, content, save_to_disk, extracted):
+            lap('hash')
+            return {'filename': filename, 'status': 'OK', 'vendor': 'OPELLA',
+                    'ordini': 1, 'righe': 4, 'anomalie': [], 'id_acquisizione': 9}
+
+        def fake_save(db, id_acquisizione, vendor, timer, n_righe=None):
+            saved.update(id=id_acquisizione, vendor=vendor, stages=dict(timer.stages),
+                         n_pagine=timer.n_pagine, n_righe=n_righe)
+
+        monkeypatch.setattr(pdf_processor, '_process_pdf', fake_body)
+        monkeypatch.setattr(pdf_processor, 'save_timings', fake_save)
+        monkeypatch.setattr(pdf_processor, 'get_db', lambda: None)
+
+        extracted = {'tempi': {'estrattore': [50.0, 45.0]}, 'n_pagine': 3}
+        pdf_processor.process_pdf('a.pdf', b'%PDF', extracted=extracted)
+
+        assert saved['id'] == 9
+        assert saved['n_righe'] == 4
+        assert saved['n_pagine'] == 3
+        assert set(saved['stages']) == {'estrattore', 'hash', 'finalizza'}
+        assert saved['stages']['estrattore'][0] >= 50.0
+
+    def test_no_acquisition_not_saved(self, monkeypatch):
+        monkeypatch.setattr(pdf_processor, '_process_pdf', lambda *a: {
+            'status': 'ERRORE', 'vendor': '', 'righe': 0, 'id_acquisizione': None})
+        monkeypatch.setattr(pdf_processor, 'save_timings',
+                            lambda *a, **k: pytest.fail("salvataggio non atteso"))
+        assert pdf_processor.process_pdf('a.pdf', b'x')['status'] == 'ERRORE'
+
+    def test_extract_pdf_data_returns_stage_times(self, monkeypatch):
+        class _Doc:
+            page_count = 2
+            text_truncated = False
+
+            def __init__(self, content, text_fixer=None, backend=None):
+                pass
+
+            def use_backend(self, backend):
+                return False
+
+            def close(self):
+                pass
+
+        monkeypatch.setattr(pdf_processor, 'ParsedDocument', _Doc)
+        monkeypatch.setattr(pdf_processor, '_extract_text', lambda d, max_chars=None: ("t", ["t"]))
+        monkeypatch.setattr(pdf_processor, 'detect_vendor', lambda t, f: ('OPELLA', 1.0))
+        monkeypatch.setattr(pdf_processor, 'get_extractor', lambda v: lambda t, l, d: [])
+        monkeypatch.setattr(pdf_processor, 'save_artefact', lambda h, d: None)
+
+        data = pdf_processor.extract_pdf_data('a.pdf', b'%PDF')
+        assert set(data['tempi']) == {'detect_vendor', 'estrattore', 'artefatto'}
+
+
+class TestDetectAndRead:
+    """Test detect vendor sulle prime pagine e testo completo solo se serve."""
+
+    class _Doc:
+        page_count = 3
+
+        def __init__(self):
+            self.text_truncated = False
+            self.requests = []
+
+        def joined_text(self, max_chars=None):
+            self.requests.append(max_chars)
+            self.text_truncated = max_chars is not None
+            return ("prima", ["prima"]) if max_chars else ("tutto", ["tutto"])
+
+        def use_backend(self, backend):
+            return False
+
+    @pytest.mark.parametrize('vendor,requests,text', [
+        ('DOC_GENERICI', [pdf_processor.DETECT_CHARS, None], "tutto"),
+        ('COOPER', [pdf_processor.DETECT_CHARS], "prima"),
+    ])
+    def test_remaining_pages_only_when_needed(self, monkeypatch, vendor, requests, text):
+        seen = []
+        monkeypatch.setattr(pdf_processor, 'detect_vendor',
+                            lambda t, f: seen.append(t) or (vendor, 1.0))
+        doc = self._Doc()
+        assert pdf_processor._detect_and_read(doc, 'a.pdf') == (vendor, 1.0, text, [text])
+        assert seen == ["prima"]
+        assert doc.requests == requests
@@ -0,0 +1,153 @@
+# =============================================================================
+# SERV.O v11.7 - ARTEFATTI DI ESTRAZIONE E RI-ESTRAZIONE TESTS
+# =============================================================================
+# Unit tests per il salvataggio delle estrazioni pdfplumber per hash, la
+# ricostruzione del documento dall'artefatto e il confronto degli ordini
+# ri-estratti con quelli salvati. Non richiedono PostgreSQL ne' pdfplumber.
+# =============================================================================
+
+import zlib
+from datetime import date
+
+import pytest
+
+from app.services.extraction import artefacts
+from app.services.extraction.document import ParsedDocument
+from app.services.ingestion import reextraction as reextract_module
+from app.services.ingestion.reextraction import normalize_extracted, diff_orders
+
+
+def _doc():
+    words = [{'text': 'ORDINE', 'x0': 10.5, 'top': 5.0, 'upright': True},
+             {'text': '123', 'x0': 60.0, 'top': 5.0, 'upright': True}]
+    return ParsedDocument.from_cache({
+        ('text', 0, "[('x', 5), ('y', 3)]"): "ORDINE 123",
+        ('plain_text', 0, '[]'): "ORDINE 123",
+        ('words', 0, "[('x', 5), ('y', 3)]"): words,
+        ('tables', 1, '[]'): [[['AIC', 'QTA'], ['012345678', None]]],
+    }, page_count=2)
+
+
+@pytest.fixture
+def artefact_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(artefacts.config, 'ARTEFACT_DIR', str(tmp_path))
+    monkeypatch.setattr(artefacts.config, 'PDF_ARTEFACTS', True)
+    return tmp_path
+
+
+class TestArtefact:
+    """Test serializzazione e ricostruzione del documento."""
+
+    def test_round_trip(self):
+        doc = _doc()
+        loaded = artefacts.load_document(artefacts.dump_artefact(doc))
+        assert loaded.page_count == 2
+        assert dict(loaded.cache_items()) == dict(doc.cache_items())
+        assert loaded.words(0, x_tolerance=5)[1] == {'text': '123', 'x0': 60.0, 'top': 5.0, 'upright': True}
+        assert loaded.joined_text(max_chars=1) == ("ORDINE 123\n", ["ORDINE 123"])
+        assert loaded.parsed == 0
+
+    def test_words_packed_by_column(self):
+        assert artefacts._pack_words([{'a': 1, 'b': 2}, {'a': 3, 'b': 4}]) == {'k': ['a', 'b'], 'r': [[1, 2], [3, 4]]}
+        mixed = [{'a': 1}, {'b': 2}]
+        assert artefacts._unpack_words(artefacts._pack_words(mixed)) == mixed
+
+    def test_missing_extraction_without_pdf(self):
+        loaded = artefacts.load_document(artefacts.dump_artefact(_doc()))
+        with pytest.raises(LookupError):
+            loaded.tables(0)
+
+    def test_unreadable_or_old_version(self):
+        with pytest.raises(ValueError):
+            artefacts.load_document(b'non compresso')
+        with pytest.raises(ValueError):
+            artefacts.load_document(zlib.compress(b'{"v": 0, "pagine": 1, "voci": []}'))
+
+    def test_save_and_read(self, artefact_dir):
+        path = artefacts.save_artefact('ab' + '0' * 62, _doc())
+        assert path == str(artefact_dir / 'ab' / ('ab' + '0' * 62 + '.json.z'))
+        assert artefacts.read_artefact('ab' + '0' * 62) is not None
+        assert artefacts.read_artefact('cd' + '0' * 62) is None
+
+    def test_save_disabled(self, artefact_dir, monkeypatch):
+        monkeypatch.setattr(artefacts.config, 'PDF_ARTEFACTS', False)
+        assert artefacts.save_artefact('ab' + '0' * 62, _doc()) is None
+        assert not list(artefact_dir.iterdir())
+
+
+class TestDiffOrders:
+    """Test confronto ordini ri-estratti / salvati."""
+
+    ORDER = {
+        'numero_ordine': '4501', 'partita_iva': '01234567890', 'ragione_sociale': 'FARMACIA ' + 'X' * 60,
+        'data_ordine': '12/11/2025', 'citta': 'MILANO',
+        'righe': [{'codice_aic': '012345678', 'q_venduta': 3, 'descrizione': 'TACHIPIRINA'}],
+    }
+
+    def _stored(self):
+        stored = normalize_extracted([self.ORDER])
+        stored['4501']['testata']['data_ordine_estratta'] = reextract_module._text(date(2025, 11, 12))
+        return stored
+
+    def test_identical(self):
+        assert diff_orders(self._stored(), normalize_extracted([self.ORDER])) == []
+
+    def test_normalized_like_insert(self):
+        testata = normalize_extracted([self.ORDER])['4501']['testata']
+        assert len(testata['ragione_sociale_1_estratta']) == 50
+        assert testata['data_ordine_estratta'] == '2025-11-12'
+        assert testata['cap_estratto'] == ''
+
+    def test_changed_field_and_rows(self):
+        changed = dict(self.ORDER, citta='ROMA',
+                       righe=[{'codice_aic': '012345678', 'q_venduta': 5, 'descrizione': 'TACHIPIRINA'}])
+        diffs = diff_orders(self._stored(), normalize_extracted([changed]))
+        assert "Ordine 4501: citta_estratta 'MILANO' -> 'ROMA'" in diffs
+        assert "Ordine 4501: righe 1 -> 1 (1 non piu' estratte, 1 nuove/diverse)" in diffs
+        assert "Ordine 4501:   + 012345678 q=5 TACHIPIRINA" in diffs
+
+    def test_orders_added_and_missing(self):
+        other = dict(self.ORDER, numero_ordine='4502')
+        diffs = diff_orders(self._stored(), normalize_extracted([other]))
+        assert diffs == ["Ordine 4501: non piu' estratto", "Ordine 4502: nuovo (non presente nel DB)"]
+
+    def test_empty_orders_ignored(self):
+        assert normalize_extracted([{'numero_ordine': '', 'righe': []}]) == {}
+        assert normalize_extracted(None) == {}
+
+
+class TestReextract:
+    """Test conteggi della ri-estrazione (DB e pool sostituiti da finti)."""
+
+    def test_counters(self, monkeypatch):
+        order = TestDiffOrders.ORDER
+        rows = [
+            {'id_acquisizione': 1, 'hash_file': 'a', 'nome_file_originale': 'a.pdf', 'percorso_storage': None, 'vendor': 'CHIESI'},
+            {'id_acquisizione': 2, 'hash_file': 'b', 'nome_file_originale': 'b.pdf', 'percorso_storage': None, 'vendor': 'CHIESI'},
+            {'id_acquisizione': 3, 'hash_file': 'c', 'nome_file_originale': 'c.pdf', 'percorso_storage': None, 'vendor': 'CHIESI'},
+        ]
+        results = {
+            'a': {'vendor': 'CHIESI', 'orders_data': [order], 'fonte': 'artefatto', 'pdf_riletti': 0, 'errore': None},
+            'b': {'vendor': 'CHIESI', 'orders_data': [dict(order, citta='ROMA')], 'fonte': 'pdf', 'pdf_riletti': 4, 'errore': None},
+            'c': {'vendor': '', 'orders_data': None, 'fonte': None, 'pdf_riletti': 0, 'errore': 'PDF non disponibile'},
+        }
+        monkeypatch.setattr(reextract_module, '_select_acquisitions',
+                            lambda after, vendor, limit: [r for r in rows if r['id_acquisizione'] > after][:limit])
+        monkeypatch.setattr(reextract_module, '_replay_batch', lambda jobs: [results[h] for h, _, _ in jobs])
+        monkeypatch.setattr(reextract_module, '_stored_orders',
+                            lambda ids: {i: normalize_extracted([order]) for i in ids})
+
+        report = reextract_module.reextract(vendor='chiesi')
+        assert {k: report[k] for k in ('acquisizioni', 'identiche', 'differenti', 'errori',
+                                        'da_artefatto', 'da_pdf', 'pdf_riletti')} == {
+            'acquisizioni': 3, 'identiche': 1, 'differenti': 1, 'errori': 1,
+            'da_artefatto': 1, 'da_pdf': 1, 'pdf_riletti': 4,
+        }
+        assert [d['id_acquisizione'] for d in report['dettaglio']] == [2, 3]
+
+        assert reextract_module.reextract(limit=2)['acquisizioni'] == 2
+
+    def test_replay_without_artefact_and_pdf(self, artefact_dir):
+        res = reextract_module.replay_acquisition('ff' + '0' * 62, 'x.pdf', '/non/esiste.pdf')
+        assert res['errore'] == 'Artefatto e PDF originale non disponibili'
+        assert res['orders_data'] is None
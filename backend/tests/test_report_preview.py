@@ -0,0 +1,81 @@
+# =============================================================================
+# SERV.O v11.7 - ANTEPRIMA REPORT TESTS
+# =============================================================================
+# Unit tests per /report/export/data: pagina limitata a MAX_PREVIEW_ROWS,
+# offset e ordinamento deterministico. DB finto, non richiede PostgreSQL.
+# =============================================================================
+
+import asyncio
+from collections import namedtuple
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.auth import get_current_user
+from app.routers import report
+
+_Row = namedtuple('_Row', 'vendor codice_aic descrizione n_ordini pezzi valore')
+
+
+class _FakeDb:
+    """Conteggio fisso e righe dal cursor server-side."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def execute(self, sql, params=None):
+        self.queries.append(sql)
+        return self
+
+    def fetchone(self):
+        return {'total': 5000}
+
+    def iter_rows(self, sql, params=None):
+        self.queries.append(sql)
+        return iter(self.rows)
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    db = _FakeDb([_Row('DOC', '012345678', 'PRODOTTO', 2, 10, 12.5)])
+    monkeypatch.setattr(report, 'get_db', lambda: db)
+    monkeypatch.setattr(report, 'track_from_user', lambda *args, **kwargs: None)
+    return db
+
+
+def _call(**kwargs):
+    params = dict(tipo_data='ordine', data_inizio=None, data_fine=None, vendors=None, depositi=None,
+                  tipo_prodotto=None, stati=None, clienti=None, aic=None, limit=10, offset=0,
+                  current_user=None)
+    params.update(kwargs)
+    return asyncio.run(report.get_report_data(request=None, **params))
+
+
+class TestReportPreview:
+    """Test paginazione dell'anteprima report."""
+
+    def test_page_query(self, fake_db):
+        result = _call(limit=50, offset=100)
+        sql = fake_db.queries[-1]
+        assert 'OFFSET 100 ROWS' in sql
+        assert 'FETCH FIRST 50 ROWS ONLY' in sql
+        assert 'ORDER BY t.vendor, d.codice_aic, d.descrizione' in sql
+        assert result['total_count'] == 5000
+        assert result['offset'] == 100
+        assert result['data'] == [{'vendor': 'DOC', 'codice_aic': '012345678', 'descrizione': 'PRODOTTO',
+                                   'n_ordini': 2, 'pezzi': 10, 'valore': 12.5}]
+
+    @pytest.mark.parametrize('query', [
+        f'limit={report.MAX_PREVIEW_ROWS + 1}', 'limit=0', 'offset=-1',
+    ])
+    def test_limit_capped(self, fake_db, query):
+        """limit oltre MAX_PREVIEW_ROWS (o offset negativo) rifiutato prima della query."""
+        app = FastAPI()
+        app.include_router(report.router)
+        app.dependency_overrides[get_current_user] = lambda: None
+
+        response = TestClient(app).get(f'/report/export/data?{query}')
+        assert response.status_code == 422
+        assert fake_db.queries == []
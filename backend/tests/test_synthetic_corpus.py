@@ -0,0 +1,54 @@
+# =============================================================================
+# SERV.O v11.7 - CORPUS PDF SINTETICO TESTS
+# =============================================================================
+# Verifica che i PDF sintetici del benchmark di estrazione siano riconosciuti
+# ed estratti correttamente per ogni vendor: se un estrattore cambia formato
+# atteso, il benchmark misurerebbe un percorso di errore.
+# Richiede pdfplumber, non PostgreSQL.
+# =============================================================================
+
+import pytest
+
+pytest.importorskip('pdfplumber')
+
+from app.scripts import bench_extraction
+from app.scripts.synthetic_corpus import LAYOUTS, generate_pdf, check_extraction
+from app.services.pdf_processor import extract_pdf_data
+
+
+class TestSyntheticCorpus:
+    """Test layout sintetici per vendor."""
+
+    @pytest.mark.parametrize('vendor', sorted(LAYOUTS))
+    def test_vendor_extracted(self, vendor):
+        content, expected = generate_pdf(vendor, pages=2, rows=4)
+        data = extract_pdf_data(f"{vendor}.pdf", content)
+        assert check_extraction(expected, data) == []
+        assert data['n_pagine'] == 2
+
+    def test_reproducible(self):
+        assert generate_pdf('CHIESI', seed=3) == generate_pdf('CHIESI', seed=3)
+        assert generate_pdf('CHIESI', seed=3)[1] != generate_pdf('CHIESI', seed=4)[1]
+
+    def test_table_overflow(self):
+        with pytest.raises(ValueError):
+            generate_pdf('COOPER', rows=200)
+
+    def test_check_extraction_reports_differences(self):
+        _, expected = generate_pdf('CHIESI', rows=2)
+        data = {'vendor': 'CHIESI', 'orders_data': [{'righe': [{'codice_aic': expected['aic'][0]}]}]}
+        assert check_extraction(expected, data) == ["1 righe/AIC estratte, attese 2"]
+
+
+class TestRegressions:
+    """Test confronto con la baseline del benchmark."""
+
+    def test_threshold(self):
+        baseline = {'vendors': {'OPELLA': {'pagine_s': 10.0, 'righe_s': 100.0, 'picco_mb': 4.0}}}
+        ok = {'OPELLA': {'pagine_s': 8.5, 'righe_s': 90.0, 'picco_mb': 4.5}}
+        slow = {'OPELLA': {'pagine_s': 7.0, 'righe_s': 90.0, 'picco_mb': 5.0}}
+        assert bench_extraction._regressions(ok, baseline, 0.2) == []
+        assert len(bench_extraction._regressions(slow, baseline, 0.2)) == 2
+
+    def test_vendor_missing_from_baseline(self):
+        assert bench_extraction._regressions({'BAYER': {'pagine_s': 1}}, {'vendors': {}}, 0.2) == []
@@ -0,0 +1,105 @@
+# =============================================================================
+# SERV.O v11.7 - AREA TABELLA PRODOTTI TESTS
+# =============================================================================
+# Unit tests per la lettura delle tabelle prodotti ritagliata all'area
+# appresa sulla prima pagina di ogni layout: stesse tabelle prodotti della
+# pagina intera, tabelle di intestazione/pie' di pagina escluse, rilettura
+# intera se il ritaglio taglia una tabella, ri-estrazione da artefatto.
+# Richiedono pdfplumber, non PostgreSQL.
+# =============================================================================
+
+import pytest
+
+pytest.importorskip('pdfplumber')
+
+from app.scripts.synthetic_corpus import SyntheticPdf, PAGE_A4_LANDSCAPE
+from app.services.extraction import artefacts, table_regions
+from app.services.extraction.document import ParsedDocument
+from app.services.extraction.table_regions import TableProfile, TableRegions
+from app.services.extraction.vendors import cooper, menarini
+
+_COOPER_HEADER = ["Codice", "Codice Aic", "Prodotto", "Formato", "Fascia", "IVA", "Imballo",
+                  "Q.tà vendita", "Sc. merce", "Sconto (%)", "Prezzo Totale", "Prezzo Unit."]
+
+
+def _cooper_pdf(pages: int, rows: int = 12) -> bytes:
+    """Pagine COOPER con tabella anagrafica in testa e tabella note a pie' di pagina."""
+    pdf = SyntheticPdf()
+    for p in range(pages):
+        page = pdf.new_page(PAGE_A4_LANDSCAPE)
+        page.table(40, 20, [120, 200, 120], [[f"Campo {i}", f"Valore {p}-{i}", "Note"] for i in range(5)])
+        page.lines(40, 95, ["Condizioni di fornitura e note di consegna"] * 3)
+        page.table(40, 140, [50, 60, 170, 60, 35, 35, 45, 55, 55, 50, 65, 65], [_COOPER_HEADER] + [
+            [f"CO{p}{r:03d}", f"{100000000 + 100 * p + r}", f"COMPRESSE {p} {r}", "BLISTER", "C", "10",
+             "6", str(r + 1), "0", "5,00", "10,00", "3,33"]
+            for r in range(rows)
+        ])
+        page.table(40, 480, [360, 385], [[f"Nota {i}", "Pie' di pagina"] for i in range(4)])
+    return pdf.to_bytes()
+
+
+def _product_rows(profile: TableProfile, tables):
+    return [tables[i] for i in profile.product_tables(tables)]
+
+
+@pytest.fixture(autouse=True)
+def _reset_stats():
+    table_regions.reset_table_region_stats()
+
+
+class TestTableRegions:
+    """Test ritaglio all'area appresa e rilettura della pagina intera."""
+
+    def test_cropped_pages_keep_product_tables(self):
+        with ParsedDocument(_cooper_pdf(4)) as doc:
+            regions = TableRegions(doc, cooper.COOPER_TABLES)
+            cropped = [regions.tables(n) for n in range(doc.page_count)]
+            full = [doc.tables(n, cooper.COOPER_TABLES.table_settings) for n in range(doc.page_count)]
+
+        for page_tables, page_full in zip(cropped, full):
+            assert _product_rows(cooper.COOPER_TABLES, page_tables) == \
+                _product_rows(cooper.COOPER_TABLES, page_full)
+        # Pagina 1 intera (layout delle pagine seguenti), 2 e 3 ritagliate:
+        # tabella anagrafica esclusa, note a pie' di pagina incluse (to_page_bottom)
+        assert len(full[2]) == 3
+        assert len(cropped[2]) == 2
+        assert table_regions.get_table_region_stats() == {'intere': 2, 'ritagliate': 2, 'rilette': 0}
+
+    def test_longer_table_rereads_full_page(self):
+        pdf = SyntheticPdf()
+        for p, rows in enumerate([4, 4, 12]):
+            page = pdf.new_page()
+            top = page.lines(40, 40, ["A. MENARINI INDUSTRIE FARMACEUTICHE RIUNITE S.r.l."] * 4)
+            page.table(30, top + 10, [170, 55, 30], [["Prodotto", "Cod. Min.", "Qta"]] + [
+                [f"FASTUM {r}", f"{100000000 + r}", "1"] for r in range(rows)
+            ])
+        with ParsedDocument(pdf.to_bytes()) as doc:
+            regions = TableRegions(doc, menarini.MENARINI_TABLES)
+            tables = [regions.tables(n) for n in range(doc.page_count)]
+            assert tables[2] == doc.tables(2)
+
+        assert len(tables[2][0]) == 13
+        assert table_regions.get_table_region_stats() == {'intere': 1, 'ritagliate': 1, 'rilette': 1}
+
+    def test_replay_from_artefact(self):
+        content = _cooper_pdf(3)
+        with ParsedDocument(content) as doc:
+            righe = cooper._extract_products_from_pdf(doc)
+            data = artefacts.dump_artefact(doc)
+
+        # Stesse letture (e stessi ritagli) senza il PDF
+        replay = artefacts.load_document(data, source=None)
+        assert cooper._extract_products_from_pdf(replay) == righe
+        assert replay.parsed == 0
+        assert len(righe) == 36
+
+
+class TestMenariniDataTable:
+    """Test scelta della tabella dati MENARINI (indici usati per l'area)."""
+
+    def test_header_and_data_in_separate_tables(self):
+        tables = [[['Cliente', 'X']], [['Prodotto', 'Cod. Min.']], [['FASTUM', '012345678']]]
+        assert menarini._find_data_table(tables) == ([['FASTUM', '012345678']], [1, 2])
+
+    def test_no_data_table(self):
+        assert menarini._find_data_table([[['Cliente', 'X']], []]) == (None, [])
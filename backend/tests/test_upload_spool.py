@@ -0,0 +1,189 @@
+# =============================================================================
+# SERV.O v11.7 - SPOOL UPLOAD PDF TESTS
+# =============================================================================
+# Unit tests per la copia a blocchi degli upload nello spool con hash
+# incrementale, l'archiviazione in UPLOAD_DIR senza rilettura in memoria e
+# process_pdf/upload multiplo su PDF in spool.
+# Non richiedono PostgreSQL.
+# =============================================================================
+
+import io
+import os
+import pickle
+
+import pytest
+
+from app.services import pdf_processor
+from app.services.ingestion import jobs, parallel, spool
+from app.services.ingestion.spool import SpooledPdf, spool_stream, spool_file, store_spooled
+from app.utils import compute_file_hash
+
+
+class _ChunkRecorder(io.BytesIO):
+    """Stream che registra la dimensione delle letture richieste."""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.reads = []
+
+    def read(self, size=-1):
+        self.reads.append(size)
+        return super().read(size)
+
+
+@pytest.fixture
+def spool_dir(tmp_path, monkeypatch):
+    path = tmp_path / 'spool'
+    monkeypatch.setattr(spool.config, 'INGESTION_SPOOL_DIR', str(path))
+    return path
+
+
+class TestSpoolStream:
+    """Test copia a blocchi con hash incrementale."""
+
+    def test_hash_and_size_match_content(self, spool_dir):
+        content = b'%PDF-1.4 ' + os.urandom(300_000)
+        stream = _ChunkRecorder(content)
+
+        spooled = spool_stream(stream, chunk_size=64 * 1024)
+
+        assert spooled.hash_file == compute_file_hash(content)
+        assert spooled.size == len(content)
+        with open(spooled.path, 'rb') as f:
+            assert f.read() == content
+        # Letture a blocchi, mai l'intero stream
+        assert set(stream.reads) == {64 * 1024}
+        assert os.listdir(spool_dir) == [os.path.basename(spooled.path)]
+
+    def test_too_large_removes_partial_file(self, spool_dir):
+        stream = _ChunkRecorder(b'x' * 5000)
+        with pytest.raises(ValueError, match="troppo grande"):
+            spool_stream(stream, max_size=3000, chunk_size=1000)
+        # Interrotto al primo blocco oltre il limite
+        assert len(stream.reads) == 4
+        assert os.listdir(spool_dir) == []
+
+    def test_empty_file_rejected(self, spool_dir):
+        with pytest.raises(ValueError, match="vuoto"):
+            spool_stream(io.BytesIO(b''))
+        assert os.listdir(spool_dir) == []
+
+    def test_spool_file_hashes_existing_file(self, tmp_path):
+        path = tmp_path / 'job.pdf'
+        path.write_bytes(b'%PDF-1.4 job')
+        assert spool_file(str(path), chunk_size=4) == SpooledPdf(
+            str(path), compute_file_hash(b'%PDF-1.4 job'), 12
+        )
+
+
+class TestStoreSpooled:
+    """Test archiviazione dello spool in UPLOAD_DIR."""
+
+    def test_hard_link_keeps_spool(self, spool_dir, tmp_path):
+        spooled = spool_stream(io.BytesIO(b'%PDF-1.4 link'))
+        dest = tmp_path / 'uploads' / 'ordine.pdf'
+
+        store_spooled(spooled, str(dest))
+
+        assert dest.read_bytes() == b'%PDF-1.4 link'
+        assert os.path.samefile(dest, spooled.path)
+        assert os.path.exists(spooled.path)
+
+    def test_copy_when_link_not_possible(self, spool_dir, tmp_path, monkeypatch):
+        spooled = spool_stream(io.BytesIO(b'%PDF-1.4 copia'))
+        dest = tmp_path / 'uploads' / 'ordine.pdf'
+
+        def cross_device(src, dst):
+            raise OSError(18, "Invalid cross-device link")
+
+        monkeypatch.setattr(spool.os, 'link', cross_device)
+        store_spooled(spooled, str(dest))
+
+        assert dest.read_bytes() == b'%PDF-1.4 copia'
+        assert not os.path.samefile(dest, spooled.path)
+        assert os.listdir(dest.parent) == ['ordine.pdf']
+
+
+class _FakeDB:
+    def __init__(self, rows=None):
+        self.rows = rows or []
+        self.executed = []
+
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+        rows = self.rows if 'DISTINCT ON' in sql else [(501,)]
+
+        class _Cursor:
+            def fetchall(self):
+                return rows
+
+            def fetchone(self):
+                return rows[0] if rows else None
+        return _Cursor()
+
+    def commit(self):
+        pass
+
+
+class TestSpooledProcessing:
+    """Test process_pdf, coda e upload multiplo con PDF in spool."""
+
+    def test_duplicate_uses_spool_hash_and_size(self, monkeypatch):
+        spooled = SpooledPdf('/nonexistent/spool.pdf', 'c' * 64, 4321)
+        db = _FakeDB([{
+            'hash_file': 'c' * 64, 'id_acquisizione': 12, 'vendor': 'ANGELINI',
+            'numero_ordine_vendor': 'ORD-1', 'stato': 'EVASO', 'ragione_sociale_1': 'FARMACIA',
+        }])
+        monkeypatch.setattr(pdf_processor, 'get_db', lambda: db)
+
+        # Il file di spool non viene letto: hash e dimensione gia' noti
+        result = pdf_processor.process_pdf('ordine.pdf', spooled)
+
+        assert result['status'] == 'DUPLICATO'
+        assert db.executed[0][1] == (['c' * 64],)
+        assert db.executed[1][1] == ('ordine.pdf', 4321, 12)
+
+    def test_extract_reads_from_spool_path(self, monkeypatch):
+        opened = []
+
+        def fake_open(source, artefact=None):
+            opened.append(source)
+            raise RuntimeError("PDF illeggibile")
+
+        monkeypatch.setattr(pdf_processor, 'open_pdf_document', fake_open)
+        data = pdf_processor.extract_pdf_data('a.pdf', SpooledPdf('/spool/a.pdf', 'd' * 64, 10))
+        assert opened == ['/spool/a.pdf']
+        assert data['errore_testo'] == "PDF illeggibile"
+
+    def test_pool_receives_only_the_path(self, monkeypatch):
+        submitted = []
+
+        class _Pool:
+            def submit(self, fn, filename, content):
+                submitted.append(content)
+
+        spooled = SpooledPdf('/spool/b.pdf', 'e' * 64, 8 * 1024 * 1024)
+        monkeypatch.setattr(parallel, 'get_extraction_pool', lambda: _Pool())
+        monkeypatch.setattr(parallel, '_duplicate_flags', lambda files: [False])
+
+        parallel._extract_async([('b.pdf', spooled)])
+        assert submitted == [spooled]
+        assert len(pickle.dumps(spooled)) < 1024
+
+    def test_enqueue_spooled_hands_over_file(self, monkeypatch):
+        db = _FakeDB()
+
+        def execute(sql, params=None):
+            db.executed.append((sql, params))
+
+            class _Cursor:
+                def fetchone(self):
+                    return {'id_job': 3, 'filename': 'c.pdf', 'stato': 'PENDING'}
+            return _Cursor()
+
+        db.execute = execute
+        monkeypatch.setattr(jobs, 'get_db', lambda: db)
+
+        job = jobs.enqueue_spooled('c.pdf', SpooledPdf('/spool/c.pdf', 'f' * 64, 77), fonte='EMAIL')
+        assert job['id_job'] == 3
+        assert db.executed[0][1][:4] == ('c.pdf', '/spool/c.pdf', 77, 'EMAIL')
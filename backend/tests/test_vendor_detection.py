@@ -0,0 +1,259 @@
+# =============================================================================
+# SERV.O v11.7 - DETECTION VENDOR TESTS
+# =============================================================================
+# Unit tests per il motore di detection a regole dichiarative: risultati
+# identici alla catena di if precedente, priorita', regole non valide,
+# ricaricamento dal DB (DB finto) e pool di estrazione.
+# =============================================================================
+
+import pytest
+
+from app.config import config
+from app.services.extraction import detector, detection_rules
+from app.services.extraction.detector import (
+    DEFAULT_RULES,
+    VendorDetector,
+    detect_vendor,
+    score_vendors,
+    set_detection_rules,
+    get_detection_rules,
+)
+
+_DOC_BASE = "Grossista SOFAD Agente 12345 Ind.Fiscale Ind.Consegna Merce COD. A.I.C. "
+
+
+@pytest.fixture(autouse=True)
+def default_rules():
+    set_detection_rules(DEFAULT_RULES)
+    yield
+    set_detection_rules(DEFAULT_RULES)
+
+
+class TestDefaultRules:
+    """Stessi risultati della catena di if v11.3 (casi per ogni regola)."""
+
+    @pytest.mark.parametrize('text, expected', [
+        ("ANGELINI PHARMA", ('ANGELINI', 0.95)),
+        ("Tipo ZT01 Area vendite", ('ANGELINI', 0.95)),
+        ("zt01 trans ferorder", ('ANGELINI', 0.90)),
+        ("ordini@chiesi.com", ('CHIESI', 0.95)),
+        ("P.IVA 02944970348", ('CHIESI', 0.90)),
+        ("COOPER  CONSUMER", ('COOPER', 0.95)),
+        ("De Salute Srl Dati Spedizione", ('COOPER', 0.90)),
+        ("De Salute Srl", ('UNKNOWN', 0.0)),
+        ("IT04-HEALTH CARE", ('RECKITT', 0.90)),
+        ("TRANSFER ORDER DUREX", ('RECKITT', 0.85)),
+        ("OR1234567 TRACC.F12", ('VIATRIS', 0.90)),
+        ("XOR1234567 TRACC.F12", ('UNKNOWN', 0.0)),
+        ("INFORMAZIONI SULL'ORDINE", ('OPELLA', 0.95)),
+        ("A. Menarini", ('MENARINI', 0.95)),
+        ("TRANSFER ORDER Num. 1234567890 Grossista SOFAD Agente 12345 Ind.Fiscale Ind.Consegna Merce",
+         ('DOC_GENERICI', 0.75)),
+        (_DOC_BASE + "DOC " * 5, ('DOC_GENERICI', 0.75)),
+        (_DOC_BASE + "DOC " * 4, ('UNKNOWN', 0.0)),
+        # Grossista oltre i primi 500 caratteri: non conta
+        ("TRANSFER ORDER Num. 1234567890 " + "x" * 500 + " Grossista SOFAD Agente 12345 COD. A.I.C.",
+         ('UNKNOWN', 0.50)),
+        ("NUM. PROP. D'ORDINE IT25O-12345", ('BAYER', 0.95)),
+        ("COOPERATIVA/ GROSSISTA (SAP: 1)", ('BAYER', 0.90)),
+        ("(SAP: 1) (SAP: 2)", ('BAYER', 0.85)),
+        ("(SAP: 1)", ('UNKNOWN', 0.0)),
+        ("TRANSFER ORDER CODIFI", ('CODIFI', 0.95)),
+        ("TRANSFER ORDER", ('UNKNOWN', 0.50)),
+        ("", ('UNKNOWN', 0.0)),
+        # Solo i primi 5000 caratteri
+        ("x" * 5000 + "ANGELINI", ('UNKNOWN', 0.0)),
+    ])
+    def test_detect(self, text, expected):
+        vendor, confidence = detect_vendor(text)
+        assert vendor == expected[0]
+        assert confidence == pytest.approx(expected[1])
+
+    def test_candidates_in_priority_order(self):
+        text = "TRANSFER ORDER DUREX BAYER CODIFI"
+        assert [c['vendor'] for c in score_vendors(text)] == ['RECKITT', 'BAYER', 'CODIFI', 'UNKNOWN']
+
+
+class TestVendorDetector:
+    """Test compilazione e valutazione delle regole."""
+
+    def test_priority_not_list_order(self):
+        engine = VendorDetector([
+            {'vendor': 'B', 'priorita': 20, 'confidenza': 0.9, 'segnali': [{'tipo': 'testo', 'valore': 'X'}]},
+            {'vendor': 'A', 'priorita': 10, 'confidenza': 0.8, 'segnali': [{'tipo': 'testo', 'valore': 'X'}]},
+        ])
+        assert engine.detect("x") == ('A', 0.8)
+
+    def test_signal_evaluated_once(self, monkeypatch):
+        calls = []
+        compile_signal = detector._compile_signal
+
+        def counting(signal):
+            check = compile_signal(signal)
+            return lambda x: calls.append(signal['valore']) or check(x)
+
+        monkeypatch.setattr(detector, '_compile_signal', counting)
+        engine = VendorDetector([
+            {'vendor': 'A', 'priorita': 1, 'confidenza': 1, 'segnali': [
+                {'tipo': 'testo', 'valore': 'ZZ'}, {'tipo': 'testo', 'valore': 'YY'}]},
+            {'vendor': 'B', 'priorita': 2, 'confidenza': 1, 'segnali': [
+                {'tipo': 'testo', 'valore': 'YY'}, {'tipo': 'testo', 'valore': 'ZZ'}]},
+        ])
+        assert engine.detect("YY") == ('UNKNOWN', 0.0)
+        assert sorted(calls) == ['YY', 'ZZ']
+
+    @pytest.mark.parametrize('rule', [
+        {'vendor': 'A', 'confidenza': 1, 'segnali': [{'tipo': 'regex', 'valore': '(unclosed'}]},
+        {'vendor': 'A', 'confidenza': 1, 'segnali': [{'tipo': 'sconosciuto', 'valore': 'X'}]},
+        {'vendor': 'A', 'confidenza': 1},
+        {'confidenza': 1, 'segnali': [{'tipo': 'testo', 'valore': 'X'}]},
+    ])
+    def test_invalid_rules(self, rule):
+        with pytest.raises(ValueError):
+            VendorDetector([rule])
+
+    def test_invalid_rules_keep_current(self):
+        with pytest.raises(ValueError):
+            set_detection_rules([{'vendor': 'A', 'confidenza': 1}], 'rotta')
+        assert get_detection_rules()[1] == 'default'
+
+    @pytest.mark.parametrize('src, text', [
+        (r'\bOR\d{7,}', "XOR1234567 OR7654321 OR12"),
+        (r'\bDOC\b', "DOC XDOC DOCX DOC-DOC"),
+        (r'\bABC?', "AB ABC XAB"),
+    ])
+    def test_literal_first_equivalent(self, src, text):
+        import re
+        rewritten = detector._literal_first(src)
+        assert re.findall(rewritten, text) == re.findall(src, text)
+
+    def test_compact_and_window(self):
+        engine = VendorDetector([
+            {'vendor': 'A', 'priorita': 1, 'confidenza': 1,
+             'segnali': [{'tipo': 'compatto', 'valore': 'ABC', 'finestra': 5}]},
+        ])
+        assert engine.detect("a b c")[0] == 'A'
+        assert engine.detect("xxxx a b c")[0] == 'UNKNOWN'
+
+
+class _FakeDb:
+    def __init__(self, rows, version):
+        self.rows = rows
+        self.version = version
+
+    def execute(self, sql, params=None):
+        rows = [{'versione': self.version}] if 'md5' in sql else self.rows
+
+        class _Cursor:
+            def fetchone(self):
+                return rows[0] if rows else None
+
+            def fetchall(self):
+                return rows
+        return _Cursor()
+
+
+class TestReloadFromDb:
+    """Test ricaricamento regole da vendor_detection_rules."""
+
+    def _row(self, vendor, valore):
+        from decimal import Decimal
+        return {'id_regola': 1, 'vendor': vendor, 'priorita': 10, 'confidenza': Decimal('0.90'),
+                'soglia': None, 'segnali': [{'tipo': 'testo', 'valore': valore}], 'criteri': None}
+
+    def test_reload_and_unchanged(self, monkeypatch):
+        db = _FakeDb([self._row('NUOVO', 'NUOVO VENDOR SPA')], 'abc')
+        monkeypatch.setattr(detection_rules, 'get_db', lambda: db)
+
+        result = detection_rules.reload_detection_rules(force=False)
+        assert result == {'versione': 'abc', 'regole': 1, 'cambiato': True}
+        assert detect_vendor("Nuovo Vendor SpA") == ('NUOVO', 0.90)
+        assert detection_rules.refresh_detection_rules() is False
+
+    def test_empty_table_uses_defaults(self, monkeypatch):
+        set_detection_rules([], 'vuota')
+        monkeypatch.setattr(detection_rules, 'get_db', lambda: _FakeDb([], None))
+        assert detection_rules.refresh_detection_rules() is True
+        assert get_detection_rules()[1] == 'default'
+        assert detect_vendor("ANGELINI")[0] == 'ANGELINI'
+
+    def test_invalid_rules_not_applied(self, monkeypatch):
+        row = self._row('ROTTO', 'X')
+        row['segnali'] = [{'tipo': 'regex', 'valore': '('}]
+        monkeypatch.setattr(detection_rules, 'get_db', lambda: _FakeDb([row], 'v2'))
+        assert detection_rules.refresh_detection_rules() is False
+        assert get_detection_rules()[1] == 'default'
+
+    def test_check_throttled(self, monkeypatch):
+        """Reload fatto da un altro processo: visto al primo controllo dopo l'intervallo."""
+        db = _FakeDb([self._row('NUOVO', 'NUOVO VENDOR SPA')], 'abc')
+        monkeypatch.setattr(detection_rules, 'get_db', lambda: db)
+        monkeypatch.setattr(detection_rules, '_checked_at', None)
+        monkeypatch.setattr(config, 'DETECTION_RULES_CHECK_SECONDS', 3600)
+
+        detection_rules.check_detection_rules()
+        assert get_detection_rules()[1] == 'abc'
+
+        db.version = 'def'
+        detection_rules.check_detection_rules()
+        assert get_detection_rules()[1] == 'abc'
+
+        monkeypatch.setattr(detection_rules, '_checked_at', None)
+        detection_rules.check_detection_rules()
+        assert get_detection_rules()[1] == 'def'
+
+    def test_default_rules_round_trip(self):
+        import json
+        for rule in DEFAULT_RULES:
+            vendor, priorita, confidenza, soglia, segnali, criteri = detection_rules._rule_to_row(rule)
+            row = {'vendor': vendor, 'priorita': priorita, 'confidenza': confidenza, 'soglia': soglia,
+                   'segnali': json.loads(segnali) if segnali else None,
+                   'criteri': json.loads(criteri) if criteri else None}
+            assert detection_rules._row_to_rule(row) == rule
+
+
+class TestExtractionPoolRules:
+    """Test pool di estrazione ricreato quando cambiano le regole."""
+
+    def test_pool_recreated(self, monkeypatch):
+        from app.services.ingestion import parallel
+
+        created = []
+
+        class _Pool:
+            def __init__(self, **kwargs):
+                self.kwargs = kwargs
+                self.closed = False
+                created.append(self)
+
+            def shutdown(self, wait=True, cancel_futures=False):
+                self.closed = True
+
+        monkeypatch.setattr(parallel, 'ProcessPoolExecutor', _Pool)
+        monkeypatch.setattr(parallel, '_executor', None)
+        monkeypatch.setattr(parallel, 'check_detection_rules', lambda: None)
+
+        first = parallel.get_extraction_pool()
+        assert parallel.get_extraction_pool() is first
+        assert first.kwargs['initargs'][1] == 'default'
+
+        set_detection_rules(DEFAULT_RULES[:3], 'v2')
+        second = parallel.get_extraction_pool()
+        assert first.closed and second is not first
+        assert second.kwargs['initargs'] == (DEFAULT_RULES[:3], 'v2')
+        monkeypatch.setattr(parallel, '_executor', None)
+
+
+class TestDetectionRulesEndpoints:
+    """Test endpoint regole di detection riservati agli admin."""
+
+    @pytest.mark.parametrize('path,method', [
+        ('/upload/vendors/detection-rules', 'GET'),
+        ('/upload/vendors/detection-rules/reload', 'POST'),
+    ])
+    def test_require_admin(self, path, method):
+        from app.auth.dependencies import require_admin
+        from app.routers.upload import router
+
+        route = next(r for r in router.routes if r.path == path and method in r.methods)
+        assert require_admin in [d.call for d in route.dependant.dependencies]
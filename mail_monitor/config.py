@@ -50,6 +50,10 @@ class Config:
     BACKEND_URL: str = os.getenv('BACKEND_URL', 'http://localhost:8000')
     UPLOAD_ENDPOINT: str = '/api/v1/upload'
     UPLOAD_TIMEOUT: int = int(os.getenv('UPLOAD_TIMEOUT', '120'))
+    # Accoda i PDF sul backend invece di attendere l'elaborazione. Disattivo di
+    # default: in coda l'id_acquisizione non e' ancora noto e la mail risulta
+    # processata anche se il job finisce poi in dead-letter (DEAD)
+    UPLOAD_BACKGROUND: bool = os.getenv('UPLOAD_BACKGROUND', 'false').lower() == 'true'
 
     # ========== COMPORTAMENTO ==========
     MARK_AS_READ: bool = os.getenv('MARK_AS_READ', 'true').lower() == 'true'
@@ -164,6 +164,11 @@ def main():
                     mail.marca_come_letta(uid)
                     continue
 
+                # Duplicati già acquisiti dal backend (anche da upload manuale):
+                # una sola chiamata per email, nessun upload
+                duplicati_backend = uploader.verifica_duplicati(
+                    [att['hash'] for att in email_data['attachments']])
+
                 # Processa allegati
                 for attachment in email_data['attachments']:
                     try:
@@ -173,6 +178,25 @@ def main():
                                 f"PDF {attachment['filename']} gia presente - skip")
                             continue
 
+                        duplicato = duplicati_backend.get(attachment['hash'])
+                        if duplicato:
+                            logger.info(
+                                f"PDF {attachment['filename']} gia acquisito "
+                                f"(acquisizione {duplicato['id_acquisizione_originale']}) - skip")
+                            # Registra l'hash per saltarlo localmente ai prossimi scan
+                            EmailDB.inserisci_email({
+                                'message_id': email_data['message_id'],
+                                'subject': email_data['subject'],
+                                'sender_email': email_data['sender_email'],
+                                'sender_name': email_data['sender_name'],
+                                'received_date': email_data['received_date'],
+                                'attachment_filename': attachment['filename'],
+                                'attachment_size': attachment['size'],
+                                'attachment_hash': attachment['hash'],
+                                'stato': 'SCARTATO'
+                            })
+                            continue
+
                         # Salva temporaneamente
                         pdf_path = mail.salva_allegato(
                             attachment, Config.TEMP_DIR)
@@ -202,7 +226,10 @@ def main():
                                 id_acq,
                                 Config.APPLY_LABEL
                             )
-                            logger.info(f"OK - ID acquisizione: {id_acq}")
+                            if result['data'].get('queued'):
+                                logger.info(f"OK - Job elaborazione: {result['data'].get('id_job')}")
+                            else:
+                                logger.info(f"OK - ID acquisizione: {id_acq}")
                             processate += 1
                             mark_as_examined(uid, has_valid_pdf=True)
                         else:
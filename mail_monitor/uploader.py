@@ -6,7 +6,7 @@ Gestisce upload via API, retry, e verifica disponibilità backend
 import time
 import logging
 from pathlib import Path
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 import requests
 
 from config import Config
@@ -105,6 +105,9 @@ class PDFUploader:
                     data = {}
                     if vendor:
                         data['vendor'] = vendor
+                    if Config.UPLOAD_BACKGROUND:
+                        data['background'] = 'true'
+                        data['fonte'] = 'EMAIL'
 
                     # Esegui POST
                     response = requests.post(
@@ -120,6 +123,9 @@ class PDFUploader:
 
                     if result.get('success'):
                         logger.info(f"✅ Upload riuscito: {pdf_path.name}")
+                        if result['data'].get('queued'):
+                            logger.info(f"   Accodato: job #{result['data'].get('id_job')}")
+                            return result
                         logger.info(
                             f"   ID acquisizione: {result['data'].get('id_acquisizione')}")
                         logger.info(
@@ -212,6 +218,36 @@ class PDFUploader:
             logger.debug(f"Errore recupero statistiche: {e}")
             return None
 
+    def verifica_duplicati(self, hashes: List[str]) -> Dict[str, Dict]:
+        """
+        Verifica in blocco quali file sono già stati acquisiti dal backend
+        (POST /upload/check-hashes), senza caricarli.
+
+        Args:
+            hashes: SHA256 hash dei file
+
+        Returns:
+            Dizionario hash -> info acquisizione originale, solo per i duplicati.
+            Vuoto se il backend non risponde: il backend farà il suo check
+            durante l'upload
+        """
+        if not hashes:
+            return {}
+        try:
+            response = requests.post(
+                f"{self.upload_endpoint}/check-hashes",
+                json={'hashes': hashes},
+                timeout=10
+            )
+            if response.status_code == 200:
+                return response.json()['data']['duplicati']
+            logger.debug(f"Verifica duplicati: status {response.status_code}")
+            return {}
+
+        except Exception as e:
+            logger.debug(f"Errore verifica duplicati: {e}")
+            return {}
+
     def verifica_duplicato(self, hash_file: str) -> bool:
         """
         Verifica se un file con questo hash è già stato caricato
@@ -222,15 +258,7 @@ class PDFUploader:
         Returns:
             True se duplicato, False altrimenti
         """
-        try:
-            # Questa funzionalità richiede un endpoint specifico nel backend
-            # Per ora facciamo solo un check locale tramite email_db
-            # Il backend farà il suo check durante l'upload
-            return False
-
-        except Exception as e:
-            logger.debug(f"Errore verifica duplicato: {e}")
-            return False
+        return hash_file in self.verifica_duplicati([hash_file])
 
 
 # =============================================================